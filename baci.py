@@ -0,0 +1,255 @@
+"""
+Before-After-Control-Impact (BACI) engine for Orun.io
+Difference-in-differences between project and control index series with
+bootstrap confidence intervals drawn as one resampling index matrix and
+randomization-inference p-values
+"""
+
+import warnings
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Any, Tuple
+
+import numpy as np
+
+from randomization import N_PERMUTATIONS, permutation_pvalues
+
+N_BOOTSTRAP = 10000
+CONFIDENCE_LEVEL = 0.95
+SIGNIFICANCE_LEVEL = 0.05
+
+# Upper bound on gathered elements per bootstrap chunk (indices x resamples x dates)
+MAX_BOOTSTRAP_ELEMENTS = 8_000_000
+
+
+def align_series(
+    treatment: Dict[str, List[Dict[str, Any]]],
+    control: Dict[str, List[Dict[str, Any]]],
+    index_names: List[str]
+) -> Tuple[List[str], np.ndarray, np.ndarray]:
+    """
+    Treatment and control values on their union of dates
+
+    Returns:
+        Sorted dates and (n_indices, n_dates) treatment and control arrays,
+        NaN where a series has no observation
+    """
+    dates = sorted({
+        point['date']
+        for series in (treatment, control)
+        for index_name in index_names
+        for point in series.get(index_name, [])
+    })
+    position = {date: i for i, date in enumerate(dates)}
+    arrays = []
+    for series in (treatment, control):
+        values = np.full((len(index_names), len(dates)), np.nan)
+        for row, index_name in enumerate(index_names):
+            for point in series.get(index_name, []):
+                values[row, position[point['date']]] = point['value']
+        arrays.append(values)
+    return dates, arrays[0], arrays[1]
+
+
+def bootstrap_indices(n_before: int, n_after: int, n_bootstrap: int,
+                      rng: np.random.Generator) -> np.ndarray:
+    """
+    (n_bootstrap, n_before + n_after) resampling matrix, stratified by period
+
+    Columns [0, n_before) draw from the before observations and the rest
+    from the after observations, so every row is one BACI resample.
+    """
+    return np.concatenate([
+        rng.integers(0, n_before, size=(n_bootstrap, n_before)),
+        n_before + rng.integers(0, n_after, size=(n_bootstrap, n_after))
+    ], axis=1)
+
+
+def did_estimates(differences: np.ndarray, n_before: int) -> np.ndarray:
+    """
+    Mean after minus mean before of treatment-control differences, per row
+
+    The last axis holds the before observations first, then the after ones.
+    """
+    before, after = differences[..., :n_before], differences[..., n_before:]
+    if not np.isnan(differences).any():
+        return after.mean(axis=-1) - before.mean(axis=-1)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        return np.nanmean(after, axis=-1) - np.nanmean(before, axis=-1)
+
+
+def baci_effect(
+    dates: List[str],
+    treatment: np.ndarray,
+    control: np.ndarray,
+    intervention_date: str,
+    n_bootstrap: int = N_BOOTSTRAP,
+    confidence: float = CONFIDENCE_LEVEL,
+    seed: Optional[int] = None,
+    n_permutations: int = N_PERMUTATIONS
+) -> Dict[str, np.ndarray]:
+    """
+    Difference-in-differences and bootstrap intervals for several indices
+
+    Per date the treatment-control difference d_t is formed; the effect is
+    mean(d | after) - mean(d | before). Dates are resampled with
+    replacement within each period. One (n_bootstrap, n_dates) index
+    matrix is shared by all indices and reduced with a single gather.
+    P-values come from a permutation test of the treatment/control labels
+    (randomization.permutation_pvalues).
+
+    Args:
+        treatment, control (np.ndarray): (n_indices, n_dates) aligned values
+        intervention_date (str): First 'after' date ('%Y-%m-%d')
+
+    Returns:
+        Dict of per-index arrays: 'effect', 'ci_lower', 'ci_upper',
+        'std_error', 'p_value', 'n_before', 'n_after'
+    """
+    treatment = np.atleast_2d(np.asarray(treatment, dtype=float))
+    control = np.atleast_2d(np.asarray(control, dtype=float))
+    n_indices = treatment.shape[0]
+    differences = treatment - control
+
+    # Keep dates where at least one index has both areas observed
+    observed = ~np.all(np.isnan(differences), axis=0)
+    date_array = np.array(dates)[observed]
+    differences = differences[:, observed]
+    before = date_array < intervention_date
+    # Before dates first, so the resampling matrix can be stratified by column
+    order = np.argsort(~before, kind='stable')
+    differences, before = differences[:, order], before[order]
+    n_before, n_after = int(before.sum()), int((~before).sum())
+
+    result = {
+        name: np.full(n_indices, np.nan)
+        for name in ('effect', 'ci_lower', 'ci_upper', 'std_error', 'p_value')
+    }
+    result['n_before'] = np.full(n_indices, n_before)
+    result['n_after'] = np.full(n_indices, n_after)
+    if n_before == 0 or n_after == 0:
+        return result
+
+    effect = did_estimates(differences, n_before)
+    rng = np.random.default_rng(seed)
+    n_dates = n_before + n_after
+    chunk = max(1, MAX_BOOTSTRAP_ELEMENTS // (n_indices * n_dates))
+
+    boot = np.empty((n_indices, n_bootstrap))
+    for start in range(0, n_bootstrap, chunk):
+        stop = min(start + chunk, n_bootstrap)
+        indices = bootstrap_indices(n_before, n_after, stop - start, rng)
+        samples = differences[:, indices]                      # (k, chunk, n_dates)
+        boot[:, start:stop] = did_estimates(samples, n_before)
+
+    alpha = 1 - confidence
+    with warnings.catch_warnings():
+        # Indices without observations in both periods stay NaN
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        lower, upper = np.nanquantile(boot, [alpha / 2, 1 - alpha / 2], axis=1)
+        std_error = np.nanstd(boot, axis=1, ddof=1)
+    permutation = permutation_pvalues(differences, ~before, n_permutations, rng=rng)
+    result.update({
+        'effect': effect,
+        'ci_lower': lower,
+        'ci_upper': upper,
+        'std_error': std_error,
+        'p_value': permutation['p_value']
+    })
+    return result
+
+
+def _area_stats(values: np.ndarray, index_names: List[str]) -> Dict[str, Optional[float]]:
+    stats = {}
+    for row, index_name in enumerate(index_names):
+        series = values[row][~np.isnan(values[row])]
+        key = index_name.lower()
+        stats[f'{key}_mean'] = round(float(series.mean()), 4) if series.size else None
+        stats[f'{key}_std'] = round(float(series.std()), 4) if series.size else None
+    return stats
+
+
+def _rounded(value: float, digits: int = 4) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def baci_analysis(
+    treatment: Dict[str, List[Dict[str, Any]]],
+    control: Dict[str, List[Dict[str, Any]]],
+    intervention_date: str,
+    index_names: Optional[List[str]] = None,
+    primary_index: str = 'NDVI',
+    n_bootstrap: int = N_BOOTSTRAP,
+    confidence: float = CONFIDENCE_LEVEL,
+    seed: Optional[int] = None,
+    n_permutations: int = N_PERMUTATIONS
+) -> Dict[str, Any]:
+    """
+    BACI comparison of project and control index series
+
+    Args:
+        treatment, control: Index series as returned by get_indices
+            (index name -> [{'date', 'value'}, ...])
+        primary_index (str): Index reported as the headline treatment effect
+
+    Returns:
+        Dict with area statistics, the headline 'treatment_effect',
+        'confidence_interval', 'p_value' and 'significance', and per-index
+        results under 'indices'
+    """
+    index_names = index_names or list(treatment.keys())
+    dates, treatment_values, control_values = align_series(treatment, control, index_names)
+    effects = baci_effect(dates, treatment_values, control_values, intervention_date,
+                          n_bootstrap, confidence, seed, n_permutations)
+
+    indices = {}
+    for row, index_name in enumerate(index_names):
+        p_value = _rounded(effects['p_value'][row])
+        indices[index_name] = {
+            'treatment_effect': _rounded(effects['effect'][row]),
+            'confidence_interval': {
+                'lower': _rounded(effects['ci_lower'][row]),
+                'upper': _rounded(effects['ci_upper'][row])
+            },
+            'std_error': _rounded(effects['std_error'][row]),
+            'p_value': p_value,
+            'significance': p_value is not None and p_value < SIGNIFICANCE_LEVEL
+        }
+
+    headline = indices.get(primary_index) or next(iter(indices.values()), {})
+    return {
+        'intervention_date': intervention_date,
+        'observations': {
+            'before': int(effects['n_before'][0]) if index_names else 0,
+            'after': int(effects['n_after'][0]) if index_names else 0
+        },
+        'treatment_area_stats': _area_stats(treatment_values, index_names),
+        'control_area_stats': _area_stats(control_values, index_names),
+        'treatment_effect': headline.get('treatment_effect'),
+        'confidence_interval': headline.get('confidence_interval'),
+        'p_value': headline.get('p_value'),
+        'significance': headline.get('significance', False),
+        'bootstrap_resamples': n_bootstrap,
+        'permutations': n_permutations,
+        'indices': indices
+    }
+
+
+def _baci_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    return baci_analysis(**job)
+
+
+def baci_many(
+    jobs: Dict[Any, Dict[str, Any]],
+    workers: Optional[int] = None
+) -> Dict[Any, Dict[str, Any]]:
+    """
+    Run baci_analysis for many projects across a process pool
+
+    Args:
+        jobs: project_id -> baci_analysis keyword arguments
+    """
+    if len(jobs) <= 1:
+        return {key: baci_analysis(**job) for key, job in jobs.items()}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(jobs.keys(), executor.map(_baci_job, jobs.values())))
@@ -0,0 +1,247 @@
+"""
+Carbon-stock engine for Orun.io
+Applies per-biome allometric biomass models to every pixel of EVI/NDVI
+cubes tile by tile in a process pool, integrates carbon over each
+project's area per acquisition date and derives sequestration as the
+change in stock against the pre-project baseline
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+
+from raster_products import DEFAULT_TILE_SIZE, IndexCube, row_pixel_areas
+from shared_raster import stream_tiled
+
+# Biome -> above-ground biomass model AGB (t/ha) = a * index ** b, capped at
+# max_agb, with the root:shoot ratio adding below-ground biomass
+BIOME_MODELS = {
+    'mangrove': {'index': 'EVI', 'a': 310.0, 'b': 1.45, 'max_agb': 450.0, 'root_shoot': 0.49},
+    'dryland_cropland': {'index': 'NDVI', 'a': 18.0, 'b': 1.6, 'max_agb': 25.0, 'root_shoot': 0.22},
+    'wetland': {'index': 'NDVI', 'a': 42.0, 'b': 1.3, 'max_agb': 60.0, 'root_shoot': 0.9}
+}
+
+# Biome raster codes: 0 is unmodelled land cover, i + 1 is BIOMES[i]
+BIOMES = list(BIOME_MODELS)
+
+CARBON_FRACTION = 0.47          # IPCC default carbon fraction of dry biomass
+CO2_PER_CARBON = 44.0 / 12.0
+
+# Dates where less of the modelled area than this is cloud-free are dropped
+MIN_VALID_FRACTION = 0.5
+
+# Days at the end of the record averaged into the current stock (one full
+# seasonal cycle, like the pre-project baseline year)
+CURRENT_PERIOD_DAYS = 365
+
+
+def biomass_density(values: np.ndarray, biome: str) -> np.ndarray:
+    """Total (above- plus below-ground) biomass in t/ha from index values; NaN stays NaN"""
+    model = BIOME_MODELS[biome]
+    above = np.minimum(model['a'] * np.maximum(values, 0.0) ** model['b'], model['max_agb'])
+    return above * (1.0 + model['root_shoot'])
+
+
+def check_biome_codes(biome_codes: np.ndarray):
+    """Raise ValueError for raster codes outside 0..len(BIOMES)"""
+    biome_codes = np.asarray(biome_codes)
+    if biome_codes.size and (biome_codes.min() < 0 or biome_codes.max() > len(BIOMES)):
+        invalid = np.unique(biome_codes[(biome_codes < 0) | (biome_codes > len(BIOMES))])
+        raise ValueError(f"Unknown biome codes: {invalid.tolist()}")
+
+
+def carbon_density(cubes: Dict[str, np.ndarray], biome_codes: np.ndarray) -> np.ndarray:
+    """
+    tCO2e/ha per pixel and date
+
+    Args:
+        cubes: Index name -> (n_dates, rows, cols) block
+        biome_codes: (rows, cols) biome raster codes
+
+    Returns:
+        (n_dates, rows, cols) array, NaN where the pixel is unmodelled or
+        its index is missing
+    """
+    check_biome_codes(biome_codes)
+    shape = next(iter(cubes.values())).shape
+    density = np.full(shape, np.nan, dtype=np.float32)
+    for code in np.unique(biome_codes):
+        if code == 0:
+            continue
+        biome = BIOMES[code - 1]
+        mask = biome_codes == code
+        values = np.asarray(cubes[BIOME_MODELS[biome]['index']][:, mask], dtype=np.float32)
+        density[:, mask] = biomass_density(values, biome)
+    return density * np.float32(CARBON_FRACTION * CO2_PER_CARBON)
+
+
+def _carbon_tile_worker(inputs, outputs, window, biome=None, transform=None, geographic=True,
+                        pixel_area_m2=100.0, n_projects=0):
+    rows, cols = window
+    names = {BIOME_MODELS[name]['index'] for name in BIOMES}
+    cubes = {name: inputs[name][:, rows, cols] for name in names if name in inputs}
+    height, width = rows.stop - rows.start, cols.stop - cols.start
+    if 'biomes' in inputs:
+        codes = np.asarray(inputs['biomes'][rows, cols], dtype=np.int64)
+    else:
+        codes = np.full((height, width), BIOMES.index(biome) + 1, dtype=np.int64)
+    if n_projects:
+        labels = np.asarray(inputs['projects'][rows, cols], dtype=np.int64)
+    else:
+        labels = np.ones((height, width), dtype=np.int64)
+    size = n_projects + 1 if n_projects else 2
+
+    density = carbon_density(cubes, codes)
+    n_dates = density.shape[0]
+    areas = np.broadcast_to(row_pixel_areas(transform, rows, geographic, pixel_area_m2)[:, None],
+                            (height, width))
+    modelled = (codes > 0).reshape(-1)
+    flat_labels = labels.reshape(-1)[modelled]
+    flat_areas = areas.reshape(-1)[modelled]
+
+    # One bincount over (date, project) bins covers every date of the tile
+    density = density.reshape(n_dates, -1)[:, modelled]
+    valid = ~np.isnan(density)
+    bins = (np.arange(n_dates)[:, None] * size + flat_labels).reshape(-1)
+    weights = np.broadcast_to(flat_areas, density.shape)
+    return {
+        'stock': np.bincount(bins, weights=np.where(valid, density * weights, 0.0).reshape(-1),
+                             minlength=n_dates * size).reshape(n_dates, size),
+        'valid_area': np.bincount(bins, weights=(valid * weights).reshape(-1),
+                                  minlength=n_dates * size).reshape(n_dates, size),
+        'modelled_area': np.bincount(flat_labels, weights=flat_areas, minlength=size)
+    }
+
+
+def carbon_stock_series(
+    cubes: Dict[str, IndexCube],
+    biome: Optional[str] = None,
+    biome_codes: Optional[np.ndarray] = None,
+    project_labels: Optional[np.ndarray] = None,
+    project_ids: Optional[List[int]] = None,
+    geographic: bool = True,
+    pixel_area_m2: float = 100.0,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    workers: Optional[int] = None,
+    executor: Optional[ProcessPoolExecutor] = None
+) -> Dict[str, Any]:
+    """
+    Carbon stock per project and acquisition date
+
+    Each date's stock is the modelled area times the mean carbon density
+    of its cloud-free pixels, so partly clouded dates are not biased low.
+    Dates are independent, so a refresh only needs the new acquisitions.
+
+    Args:
+        cubes: Index name ('EVI', 'NDVI') -> IndexCube on the same dates and grid
+        biome (str): BIOMES entry used for every pixel when there is no biome raster
+        biome_codes (np.ndarray): Biome raster (0 unmodelled, i + 1 for BIOMES[i]);
+            other codes raise ValueError
+        project_labels (np.ndarray): Label raster (0 background, i + 1 for
+            project_ids[i]); without it the whole grid is one area
+        geographic (bool): Transform in degrees (area scaled by latitude)
+        pixel_area_m2 (float): Pixel area when the cubes have no transform
+
+    Returns:
+        Dict with 'dates' and, per project ('projects', or 'total' without
+        labels), 'carbon_stock_tco2e' (None on dropped dates),
+        'valid_fraction' and 'modelled_area_ha'
+    """
+    if biome is None and biome_codes is None:
+        raise ValueError("Either biome or biome_codes is required")
+    if biome is not None and biome not in BIOME_MODELS:
+        raise ValueError(f"Unknown biome: {biome}")
+    if biome_codes is not None:
+        # Checked here so a bad raster fails before any tile is dispatched
+        check_biome_codes(biome_codes)
+    elif BIOME_MODELS[biome]['index'] not in cubes:
+        raise ValueError(f"Biome {biome} needs an {BIOME_MODELS[biome]['index']} cube")
+    first = next(iter(cubes.values()))
+    inputs = {name: cube.values for name, cube in cubes.items()}
+    if biome_codes is not None:
+        inputs['biomes'] = biome_codes
+    n_projects = len(project_ids) if project_ids is not None else 0
+    if n_projects:
+        inputs['projects'] = project_labels
+
+    size = n_projects + 1 if n_projects else 2
+    stock = np.zeros((len(first.dates), size))
+    valid_area = np.zeros((len(first.dates), size))
+    modelled_area = np.zeros(size)
+    params = {
+        'biome': biome, 'transform': first.transform or None, 'geographic': geographic,
+        'pixel_area_m2': pixel_area_m2, 'n_projects': n_projects
+    }
+    for _, result in stream_tiled(_carbon_tile_worker, inputs, shape=first.shape, tile_size=tile_size,
+                                  workers=workers, params=params, executor=executor):
+        stock += result['stock']
+        valid_area += result['valid_area']
+        modelled_area += result['modelled_area']
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        valid_fraction = valid_area / modelled_area
+        totals = stock / valid_area * modelled_area
+    totals[~(valid_fraction >= MIN_VALID_FRACTION)] = np.nan
+
+    def _series(column: int) -> Dict[str, Any]:
+        return {
+            'carbon_stock_tco2e': [None if np.isnan(v) else round(float(v), 2) for v in totals[:, column]],
+            'valid_fraction': [round(float(np.nan_to_num(v)), 4) for v in valid_fraction[:, column]],
+            'modelled_area_ha': round(float(modelled_area[column]), 4)
+        }
+
+    result = {'dates': list(first.dates)}
+    if n_projects:
+        result['projects'] = {project_id: _series(i + 1) for i, project_id in enumerate(project_ids)}
+    else:
+        result['total'] = _series(1)
+    return result
+
+
+def sequestration(
+    day_offsets: np.ndarray,
+    stocks: np.ndarray,
+    start_offset: float
+) -> Dict[str, np.ndarray]:
+    """
+    Carbon sequestered since the project start for many stock series
+
+    The baseline is the mean stock over the year before the start and the
+    current stock the mean over the last CURRENT_PERIOD_DAYS, so both
+    average out the seasonal cycle of the indices.
+
+    Args:
+        day_offsets (np.ndarray): (n,) acquisition times in days
+        stocks (np.ndarray): (m, n) stocks in tCO2e, NaN on dropped dates
+        start_offset (float): Project start in the same day units
+
+    Returns:
+        Dict of (m,) arrays 'baseline_stock', 'current_stock',
+        'sequestration' (current - baseline) and 'annual_rate' (per year
+        between the period midpoints); NaN without data in both periods
+    """
+    stocks = np.atleast_2d(np.asarray(stocks, dtype=float))
+    day_offsets = np.asarray(day_offsets, dtype=float)
+    observed = ~np.isnan(stocks)
+    baseline = (day_offsets < start_offset) & (day_offsets >= start_offset - 365.25)
+    current = (day_offsets >= start_offset) & (day_offsets > day_offsets.max() - CURRENT_PERIOD_DAYS)
+
+    def _period_mean(period: np.ndarray, values: np.ndarray) -> np.ndarray:
+        mask = observed & period
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.where(mask, values, 0.0).sum(axis=1) / mask.sum(axis=1)
+
+    baseline_stock = _period_mean(baseline, stocks)
+    current_stock = _period_mean(current, stocks)
+    elapsed = (_period_mean(current, np.broadcast_to(day_offsets, stocks.shape))
+               - _period_mean(baseline, np.broadcast_to(day_offsets, stocks.shape))) / 365.25
+    change = current_stock - baseline_stock
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = change / elapsed
+    return {
+        'baseline_stock': baseline_stock,
+        'current_stock': current_stock,
+        'sequestration': change,
+        'annual_rate': rate
+    }
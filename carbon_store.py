@@ -0,0 +1,110 @@
+"""
+Stored carbon-stock series for Orun.io
+Per-project, per-date carbon stocks from the carbon engine, tagged with the
+model version that produced them so a model change forces a recompute
+"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+import numpy as np
+from sqlalchemy import Column, Date, DateTime, Float, Integer, UniqueConstraint
+from sqlalchemy.orm import Session
+from models import Base
+
+from carbon import sequestration
+
+# Bump when the biomass models change: rows from older versions are no
+# longer read, and the satellite pipeline recomputes a project's whole
+# series on its next run (SatelliteService.refresh_carbon_stock)
+MODEL_VERSION = 1
+
+
+class CarbonStock(Base):
+    """Carbon stock for one project and acquisition"""
+
+    __tablename__ = 'carbon_stock'
+    __table_args__ = (
+        UniqueConstraint('project_id', 'acquisition_date', name='uq_carbon_stock_acquisition'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, nullable=False, index=True)
+    acquisition_date = Column(Date, nullable=False)
+    carbon_stock_tco2e = Column(Float)
+    valid_fraction = Column(Float, nullable=False)
+    modelled_area_ha = Column(Float, nullable=False)
+    model_version = Column(Integer, nullable=False, default=MODEL_VERSION)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+def store_carbon_stock(db: Session, result: Dict[str, Any]) -> int:
+    """
+    Upsert per-project, per-date rows from a carbon_stock_series() result
+    with project labels
+
+    The caller commits.
+    """
+    dates = [datetime.strptime(date, '%Y-%m-%d').date() for date in result['dates']]
+    written = 0
+    for project_id, series in result.get('projects', {}).items():
+        existing = {
+            row.acquisition_date: row
+            for row in db.query(CarbonStock).filter(
+                CarbonStock.project_id == project_id,
+                CarbonStock.acquisition_date.in_(dates)
+            )
+        }
+        for i, acquisition_date in enumerate(dates):
+            row = existing.get(acquisition_date)
+            if row is None:
+                row = CarbonStock(project_id=project_id, acquisition_date=acquisition_date)
+                db.add(row)
+            row.carbon_stock_tco2e = series['carbon_stock_tco2e'][i]
+            row.valid_fraction = series['valid_fraction'][i]
+            row.modelled_area_ha = series['modelled_area_ha']
+            row.model_version = MODEL_VERSION
+            written += 1
+    return written
+
+
+def has_current_carbon_stock(db: Session, project_id: int) -> bool:
+    """True when the project has stored stocks from the current MODEL_VERSION"""
+    return db.query(CarbonStock.id).filter(
+        CarbonStock.project_id == project_id,
+        CarbonStock.model_version == MODEL_VERSION
+    ).first() is not None
+
+
+def get_carbon_series(db: Session, project_id: int, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    """Stored carbon-stock series for a project from the current model version"""
+    rows = db.query(CarbonStock).filter(
+        CarbonStock.project_id == project_id,
+        CarbonStock.model_version == MODEL_VERSION,
+        CarbonStock.acquisition_date >= datetime.strptime(start_date, '%Y-%m-%d').date(),
+        CarbonStock.acquisition_date <= datetime.strptime(end_date, '%Y-%m-%d').date()
+    ).order_by(CarbonStock.acquisition_date).all()
+    return [
+        {
+            'date': row.acquisition_date.strftime('%Y-%m-%d'),
+            'carbon_stock_tco2e': row.carbon_stock_tco2e,
+            'valid_fraction': row.valid_fraction,
+            'modelled_area_ha': row.modelled_area_ha
+        }
+        for row in rows
+    ]
+
+
+def project_sequestration(db: Session, project_id: int, start_date: str) -> Optional[Dict[str, float]]:
+    """Sequestration since start_date from the stored series, or None without a baseline"""
+    rows = get_carbon_series(db, project_id, '1900-01-01', datetime.utcnow().strftime('%Y-%m-%d'))
+    rows = [row for row in rows if row['carbon_stock_tco2e'] is not None]
+    if not rows:
+        return None
+    start = datetime.strptime(start_date, '%Y-%m-%d').toordinal()
+    offsets = np.array([datetime.strptime(row['date'], '%Y-%m-%d').toordinal() - start for row in rows],
+                       dtype=float)
+    estimate = sequestration(offsets, np.array([[row['carbon_stock_tco2e'] for row in rows]]), 0.0)
+    if np.isnan(estimate['sequestration'][0]):
+        return None
+    return {name: round(float(values[0]), 2) for name, values in estimate.items()}
@@ -0,0 +1,200 @@
+"""
+Per-pixel change detection for Orun.io
+BFAST-monitor style structural-break detection over every pixel's index
+series: a seasonal model is fitted on a stable history period and the
+CUSUM of standardized residuals in the monitoring period flags breaks,
+giving break dates and magnitudes for loss and regrowth maps
+"""
+
+import os
+from typing import Dict, Optional, Any
+
+import numpy as np
+
+from phenology import fit_harmonic
+from raster_products import (
+    DEFAULT_TILE_SIZE, PRODUCTS_DIR, IndexCube, TiledRasterStore, iter_windows
+)
+from shared_raster import run_tiled
+
+# 5% critical value for the monitoring CUSUM with a linear boundary
+# (sup |W(t)| on [0, 1]; Horvath et al. 2004, gamma = 0)
+CUSUM_CRITICAL = 2.24
+
+CHANGE_STABLE = 0
+CHANGE_LOSS = 1
+CHANGE_REGROWTH = 2
+
+
+def detect_breaks(
+    values: np.ndarray,
+    times: np.ndarray,
+    monitor_start: float,
+    harmonics: int = 1,
+    trend: bool = False,
+    critical: float = CUSUM_CRITICAL,
+    min_magnitude: float = 0.0
+) -> Dict[str, np.ndarray]:
+    """
+    First structural break in the monitoring period of every series
+
+    A harmonic model is fitted to each series' history (times before
+    monitor_start) in one batched solve. Monitoring residuals are scaled by
+    the history residual standard deviation and cumulated; a break is the
+    first observation where the CUSUM leaves the boundary
+    critical * sqrt(n) * (1 + k / n), n being the history length and k the
+    monitoring observation count. Magnitude is the median residual from
+    the break onward: negative for loss, positive for regrowth.
+
+    Args:
+        values (np.ndarray): (n_series, n_times) index values, NaN for gaps
+        times (np.ndarray): Sample times in days
+        monitor_start (float): First monitoring time, in the same days
+        min_magnitude (float): Breaks with smaller |magnitude| are ignored
+
+    Returns:
+        Dict with 'break_time' (NaN without a break), 'magnitude',
+        'change_class' (CHANGE_* codes, NaN without enough history) and
+        'history_sigma'
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    times = np.asarray(times, dtype=float)
+    history = times < monitor_start
+    n_series = values.shape[0]
+
+    fit = fit_harmonic(values[:, history], times[history], harmonics=harmonics, trend=trend,
+                       eval_times=times)
+    residuals = values - fit['fitted']
+    n_params = fit['coefficients'].shape[1]
+
+    history_residuals = residuals[:, history]
+    history_valid = ~np.isnan(history_residuals)
+    n_history = history_valid.sum(axis=1)
+    dof = np.maximum(n_history - n_params, 1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sigma = np.sqrt(np.where(history_valid, history_residuals ** 2, 0.0).sum(axis=1) / dof)
+    usable = (n_history > n_params) & (sigma > 0)
+
+    monitor = residuals[:, ~history]
+    monitor_times = times[~history]
+    observed = ~np.isnan(monitor)
+    steps = np.cumsum(observed, axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        cusum = np.cumsum(np.where(observed, monitor, 0.0), axis=1) / sigma[:, None]
+        boundary = critical * np.sqrt(n_history)[:, None] * (1 + steps / n_history[:, None])
+    exceeded = observed & (np.abs(cusum) > boundary) & usable[:, None]
+
+    has_break = exceeded.any(axis=1)
+    break_idx = np.argmax(exceeded, axis=1) if monitor.shape[1] else np.zeros(n_series, dtype=int)
+    after = np.arange(monitor.shape[1])[None, :] >= break_idx[:, None]
+
+    magnitude = np.full(n_series, np.nan)
+    if has_break.any():
+        tail = np.where(after[has_break] & observed[has_break], monitor[has_break], np.nan)
+        magnitude[has_break] = np.nanmedian(tail, axis=1)
+    has_break &= np.abs(magnitude) >= min_magnitude
+
+    break_time = np.where(has_break, monitor_times[break_idx] if monitor_times.size else np.nan, np.nan)
+    change_class = np.where(
+        has_break, np.where(magnitude < 0, CHANGE_LOSS, CHANGE_REGROWTH), CHANGE_STABLE
+    ).astype(float)
+    change_class[~usable] = np.nan
+    return {
+        'break_time': break_time,
+        'magnitude': np.where(has_break, magnitude, np.nan),
+        'change_class': change_class,
+        'history_sigma': np.where(usable, sigma, np.nan)
+    }
+
+
+def _change_worker(inputs, outputs, window, times=None, options=None):
+    rows, cols = window
+    block = np.asarray(inputs['cube'][:, rows, cols], dtype=float)
+    n_dates, height, width = block.shape
+    breaks = detect_breaks(block.reshape(n_dates, -1).T, times, **options)
+    for name in ('break_time', 'magnitude', 'change_class'):
+        outputs[name][rows, cols] = breaks[name].reshape(height, width)
+    classes = breaks['change_class']
+    return {'loss': int((classes == CHANGE_LOSS).sum()), 'regrowth': int((classes == CHANGE_REGROWTH).sum())}
+
+
+def change_maps(
+    cube: IndexCube,
+    monitor_start: str,
+    workers: Optional[int] = None,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    **options
+) -> Dict[str, Any]:
+    """
+    Break time, magnitude and change class rasters for an index cube
+
+    Tiles are processed in a process pool against the shared cube; each
+    worker fits and monitors (tile_size^2) series in one batch.
+
+    Args:
+        monitor_start (str): First monitoring date ('%Y-%m-%d')
+        options: detect_breaks() keyword arguments
+
+    Returns:
+        Dict with 'break_time' (days since the cube's first date),
+        'magnitude' and 'change_class' arrays, plus 'loss_pixels' and
+        'regrowth_pixels' counts
+    """
+    times = cube.day_offsets()
+    origin = np.datetime64(cube.dates[0])
+    options['monitor_start'] = float((np.datetime64(monitor_start) - origin).astype(int))
+    products = {name: (cube.shape, np.float32, np.nan) for name in ('break_time', 'magnitude', 'change_class')}
+
+    maps, counts = run_tiled(
+        _change_worker, {'cube': cube.values}, outputs=products,
+        tile_size=tile_size, workers=workers, params={'times': times, 'options': options}
+    )
+    maps['loss_pixels'] = sum(c['loss'] for c in counts)
+    maps['regrowth_pixels'] = sum(c['regrowth'] for c in counts)
+    return maps
+
+
+def write_change_products(
+    project_id: int,
+    cube: IndexCube,
+    monitor_start: str,
+    output_dir: str = PRODUCTS_DIR,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    workers: Optional[int] = None,
+    **options
+) -> Dict[str, Any]:
+    """
+    Compute and store break-time, magnitude and loss/regrowth rasters
+
+    Returns:
+        Dict with store paths keyed by product name and the loss and
+        regrowth pixel counts
+    """
+    maps = change_maps(cube, monitor_start, workers=workers, tile_size=tile_size, **options)
+    base = os.path.join(output_dir, f'project_{project_id}', cube.index_name.lower())
+    metadata = {
+        'project_id': project_id,
+        'index': cube.index_name,
+        'dates': [cube.dates[0], cube.dates[-1]] if cube.dates else [],
+        'monitor_start': monitor_start,
+        'transform': cube.transform
+    }
+    units = {
+        'break_time': f'days since {cube.dates[0]}',
+        'magnitude': 'index units',
+        'change_class': f'{CHANGE_STABLE} stable, {CHANGE_LOSS} loss, {CHANGE_REGROWTH} regrowth'
+    }
+
+    paths = {}
+    for name, unit in units.items():
+        store = TiledRasterStore(os.path.join(base, name))
+        store.create(cube.shape, tile_size, dict(metadata, units=unit))
+        for tile_row, tile_col, rows, cols in iter_windows(cube.shape, tile_size):
+            store.write_tile(tile_row, tile_col, maps[name][rows, cols])
+        paths[name] = store.path
+
+    return {
+        'products': paths,
+        'loss_pixels': maps['loss_pixels'],
+        'regrowth_pixels': maps['regrowth_pixels']
+    }
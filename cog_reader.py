@@ -0,0 +1,464 @@
+"""
+Windowed Cloud-Optimized GeoTIFF reads for Orun.io
+Fetches only the tiles of a scene band that intersect a project window,
+through local file reads or HTTP range requests, behind a process-wide
+LRU block cache keyed by (scene, band, block)
+"""
+
+import http.server
+import os
+import re
+import socketserver
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Dict, List, Optional, Any, Tuple
+
+import numpy as np
+import requests
+
+# Bytes fetched up front; COG layout keeps the IFDs at the start of the file
+HEADER_BYTES = 16384
+
+# Tile byte ranges separated by less than this are fetched in one request
+MERGE_GAP_BYTES = 65536
+
+BLOCK_CACHE_BYTES = int(os.getenv('COG_BLOCK_CACHE_MB', '512')) * 1024 * 1024
+
+# Open readers (parsed header and IFD) kept per process, least recently used dropped
+MAX_READERS = 64
+
+TAGS = {
+    256: 'width', 257: 'height', 258: 'bits_per_sample', 259: 'compression',
+    277: 'samples_per_pixel', 284: 'planar_configuration', 317: 'predictor',
+    322: 'tile_width', 323: 'tile_height', 324: 'tile_offsets', 325: 'tile_byte_counts',
+    339: 'sample_format', 33550: 'pixel_scale', 33922: 'tiepoint', 42113: 'nodata'
+}
+
+# TIFF field type -> (struct code, size)
+FIELD_TYPES = {
+    1: ('B', 1), 2: ('c', 1), 3: ('H', 2), 4: ('I', 4), 5: ('II', 8), 6: ('b', 1),
+    7: ('B', 1), 8: ('h', 2), 9: ('i', 4), 10: ('ii', 8), 11: ('f', 4), 12: ('d', 8),
+    16: ('Q', 8), 17: ('q', 8)
+}
+
+SAMPLE_DTYPES = {
+    (1, 8): 'u1', (1, 16): 'u2', (1, 32): 'u4', (2, 8): 'i1', (2, 16): 'i2',
+    (2, 32): 'i4', (3, 32): 'f4', (3, 64): 'f8'
+}
+
+
+class BlockCache:
+    """Thread-safe LRU cache of decoded tiles bounded by total bytes"""
+
+    def __init__(self, max_bytes: int = BLOCK_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._blocks: 'OrderedDict[Tuple, np.ndarray]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Tuple) -> Optional[np.ndarray]:
+        with self._lock:
+            block = self._blocks.get(key)
+            if block is None:
+                self.misses += 1
+                return None
+            self._blocks.move_to_end(key)
+            self.hits += 1
+            return block
+
+    def put(self, key: Tuple, block: np.ndarray):
+        with self._lock:
+            if key in self._blocks:
+                self.current_bytes -= self._blocks.pop(key).nbytes
+            self._blocks[key] = block
+            self.current_bytes += block.nbytes
+            while self.current_bytes > self.max_bytes and self._blocks:
+                _, evicted = self._blocks.popitem(last=False)
+                self.current_bytes -= evicted.nbytes
+
+    def clear(self):
+        with self._lock:
+            self._blocks.clear()
+            self.current_bytes = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'blocks': len(self._blocks), 'bytes': self.current_bytes,
+            'hits': self.hits, 'misses': self.misses
+        }
+
+
+# Shared by every reader in the process
+BLOCK_CACHE = BlockCache()
+
+
+class LocalSource:
+    """Byte-range reads from a local file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.bytes_read = 0
+
+    def read(self, offset: int, length: int) -> bytes:
+        with open(self.path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+        self.bytes_read += len(data)
+        return data
+
+
+class HttpRangeSource:
+    """Byte-range reads over HTTP(S) with Range requests"""
+
+    def __init__(self, url: str, session: Optional[requests.Session] = None, timeout: int = 30):
+        self.url = url
+        self.session = session or requests.Session()
+        self.timeout = timeout
+        self.bytes_read = 0
+
+    def read(self, offset: int, length: int) -> bytes:
+        response = self.session.get(
+            self.url,
+            headers={'Range': f'bytes={offset}-{offset + length - 1}'},
+            timeout=self.timeout
+        )
+        if response.status_code == 200:
+            # Server ignored the Range header; slice the full body
+            data = response.content[offset:offset + length]
+        elif response.status_code == 206:
+            data = response.content
+        else:
+            raise IOError(f"Range request to {self.url} failed with status {response.status_code}")
+        self.bytes_read += len(data)
+        return data
+
+
+def open_source(location: str):
+    if location.startswith(('http://', 'https://')):
+        return HttpRangeSource(location)
+    return LocalSource(location)
+
+
+class CogReader:
+    """Tiled GeoTIFF reader returning windows assembled from cached tiles"""
+
+    def __init__(
+        self,
+        location: str,
+        scene_id: Optional[str] = None,
+        band: Optional[str] = None,
+        overview: int = 0,
+        cache: Optional[BlockCache] = None
+    ):
+        """
+        Open a COG and parse its image file directory
+
+        Args:
+            location (str): Local path or http(s) URL
+            scene_id (str): Scene identifier for the cache key (defaults to location)
+            band (str): Band identifier for the cache key
+            overview (int): IFD to read; 0 is full resolution, 1.. are overviews
+            cache (BlockCache): Cache to use; defaults to the process-wide cache
+        """
+        self.location = location
+        self.source = open_source(location)
+        self.cache = cache or BLOCK_CACHE
+        self.key_prefix = (scene_id or location, band, overview)
+        self._header = self.source.read(0, HEADER_BYTES)
+        self._parse(overview)
+
+    def _fetch(self, offset: int, length: int) -> bytes:
+        if offset + length <= len(self._header):
+            return self._header[offset:offset + length]
+        return self.source.read(offset, length)
+
+    def _parse(self, overview: int):
+        order = self._header[:2]
+        if order not in (b'II', b'MM'):
+            raise ValueError(f"{self.location} is not a TIFF file")
+        self.endian = '<' if order == b'II' else '>'
+        version = struct.unpack(self.endian + 'H', self._header[2:4])[0]
+        self.bigtiff = version == 43
+        if self.bigtiff:
+            ifd_offset = struct.unpack(self.endian + 'Q', self._header[8:16])[0]
+        else:
+            ifd_offset = struct.unpack(self.endian + 'I', self._header[4:8])[0]
+
+        for _ in range(overview):
+            ifd_offset = self._read_ifd(ifd_offset)[1]
+            if not ifd_offset:
+                raise ValueError(f"{self.location} has no overview {overview}")
+        tags, _ = self._read_ifd(ifd_offset)
+
+        if 'tile_width' not in tags:
+            raise ValueError(f"{self.location} is not tiled; windowed reads need a COG")
+        if tags.get('samples_per_pixel', [1])[0] != 1:
+            raise NotImplementedError("Only single-band COGs are supported")
+
+        self.width = tags['width'][0]
+        self.height = tags['height'][0]
+        self.tile_width = tags['tile_width'][0]
+        self.tile_height = tags['tile_height'][0]
+        self.compression = tags.get('compression', [1])[0]
+        self.predictor = tags.get('predictor', [1])[0]
+        self.tile_offsets = np.asarray(tags['tile_offsets'], dtype=np.int64)
+        self.tile_byte_counts = np.asarray(tags['tile_byte_counts'], dtype=np.int64)
+        self.tiles_across = -(-self.width // self.tile_width)
+        self.tiles_down = -(-self.height // self.tile_height)
+        bits = tags.get('bits_per_sample', [8])[0]
+        sample_format = tags.get('sample_format', [1])[0]
+        self.dtype = np.dtype(self.endian + SAMPLE_DTYPES[(sample_format, bits)])
+
+        nodata = tags.get('nodata')
+        self.nodata = float(nodata.strip('\x00')) if isinstance(nodata, str) and nodata.strip('\x00') else None
+        self.transform = None
+        if 'pixel_scale' in tags and 'tiepoint' in tags:
+            scale, tiepoint = tags['pixel_scale'], tags['tiepoint']
+            self.transform = {
+                'x0': tiepoint[3] - tiepoint[0] * scale[0],
+                'y0': tiepoint[4] + tiepoint[1] * scale[1],
+                'dx': scale[0],
+                'dy': -scale[1]
+            }
+
+    def _read_ifd(self, offset: int) -> Tuple[Dict[str, Any], int]:
+        count_format, count_size = ('Q', 8) if self.bigtiff else ('H', 2)
+        entry_size = 20 if self.bigtiff else 12
+        inline_size = 8 if self.bigtiff else 4
+        offset_format = 'Q' if self.bigtiff else 'I'
+
+        entry_count = struct.unpack(self.endian + count_format, self._fetch(offset, count_size))[0]
+        raw = self._fetch(offset + count_size, entry_count * entry_size + inline_size)
+        tags = {}
+        for i in range(entry_count):
+            entry = raw[i * entry_size:(i + 1) * entry_size]
+            tag, field_type = struct.unpack(self.endian + 'HH', entry[:4])
+            if tag not in TAGS or field_type not in FIELD_TYPES:
+                continue
+            count = struct.unpack(self.endian + offset_format, entry[4:4 + inline_size])[0]
+            code, size = FIELD_TYPES[field_type]
+            total = count * size
+            if total <= inline_size:
+                data = entry[4 + inline_size:4 + inline_size + total]
+            else:
+                value_offset = struct.unpack(self.endian + offset_format, entry[4 + inline_size:])[0]
+                data = self._fetch(value_offset, total)
+            if field_type == 2:
+                tags[TAGS[tag]] = data.decode('ascii', errors='ignore')
+            else:
+                tags[TAGS[tag]] = list(struct.unpack(self.endian + code * count, data))
+        next_offset = struct.unpack(self.endian + offset_format, raw[-inline_size:])[0]
+        return tags, next_offset
+
+    def _decode(self, data: bytes) -> np.ndarray:
+        if self.compression in (8, 32946):
+            data = zlib.decompress(data)
+        elif self.compression != 1:
+            raise NotImplementedError(f"TIFF compression {self.compression} is not supported")
+        tile = np.frombuffer(data, dtype=self.dtype,
+                             count=self.tile_width * self.tile_height).reshape(self.tile_height, self.tile_width)
+        if self.predictor == 2:
+            tile = np.cumsum(tile, axis=1, dtype=self.dtype)
+        elif self.predictor != 1:
+            raise NotImplementedError(f"TIFF predictor {self.predictor} is not supported")
+        return tile
+
+    def _load_tiles(self, tile_indices: List[int]) -> Dict[int, np.ndarray]:
+        """Tiles by index, from the cache or fetched with merged range reads"""
+        tiles = {}
+        missing = []
+        for index in tile_indices:
+            block = self.cache.get(self.key_prefix + (index,))
+            if block is None:
+                missing.append(index)
+            else:
+                tiles[index] = block
+
+        # Coalesce nearby byte ranges so a row of tiles is one request
+        missing.sort(key=lambda i: self.tile_offsets[i])
+        runs: List[List[int]] = []
+        for index in missing:
+            if self.tile_byte_counts[index] == 0:
+                tiles[index] = np.zeros((self.tile_height, self.tile_width), dtype=self.dtype)
+                continue
+            if runs:
+                last = runs[-1][-1]
+                gap = self.tile_offsets[index] - (self.tile_offsets[last] + self.tile_byte_counts[last])
+                if 0 <= gap <= MERGE_GAP_BYTES:
+                    runs[-1].append(index)
+                    continue
+            runs.append([index])
+
+        for run in runs:
+            start = int(self.tile_offsets[run[0]])
+            stop = int(self.tile_offsets[run[-1]] + self.tile_byte_counts[run[-1]])
+            data = self.source.read(start, stop - start)
+            for index in run:
+                offset = int(self.tile_offsets[index]) - start
+                tile = self._decode(data[offset:offset + int(self.tile_byte_counts[index])])
+                self.cache.put(self.key_prefix + (index,), tile)
+                tiles[index] = tile
+        return tiles
+
+    def read_window(self, row_off: int, col_off: int, height: int, width: int) -> np.ndarray:
+        """
+        Read a pixel window, fetching only the tiles that intersect it
+
+        The result is always (height, width) and lines up with the requested
+        window: pixels outside the raster are nodata. Windows reaching
+        outside a raster without a nodata value raise ValueError.
+        """
+        height, width = max(height, 0), max(width, 0)
+        row_start, row_stop = max(row_off, 0), min(row_off + height, self.height)
+        col_start, col_stop = max(col_off, 0), min(col_off + width, self.width)
+        inside = (row_start, row_stop, col_start, col_stop) == (row_off, row_off + height, col_off, col_off + width)
+        if inside:
+            result = np.zeros((height, width), dtype=self.dtype)
+        elif self.nodata is None:
+            raise ValueError(f"Window ({row_off}, {col_off}, {height}, {width}) extends outside "
+                             f"{self.location}, which has no nodata value")
+        else:
+            result = np.full((height, width), self.nodata, dtype=self.dtype)
+        if row_start >= row_stop or col_start >= col_stop:
+            return result
+
+        tile_rows = range(row_start // self.tile_height, (row_stop - 1) // self.tile_height + 1)
+        tile_cols = range(col_start // self.tile_width, (col_stop - 1) // self.tile_width + 1)
+        tiles = self._load_tiles([r * self.tiles_across + c for r in tile_rows for c in tile_cols])
+
+        for tile_row in tile_rows:
+            for tile_col in tile_cols:
+                tile = tiles[tile_row * self.tiles_across + tile_col]
+                top, left = tile_row * self.tile_height, tile_col * self.tile_width
+                r0, r1 = max(row_start, top), min(row_stop, top + self.tile_height)
+                c0, c1 = max(col_start, left), min(col_stop, left + self.tile_width)
+                result[r0 - row_off:r1 - row_off, c0 - col_off:c1 - col_off] = \
+                    tile[r0 - top:r1 - top, c0 - left:c1 - left]
+        return result
+
+    def window_for_bounds(self, bounds: List[float]) -> Tuple[int, int, int, int]:
+        """Pixel window (row_off, col_off, height, width) covering bounds in the raster CRS"""
+        if self.transform is None:
+            raise ValueError(f"{self.location} has no georeferencing tags")
+        min_x, min_y, max_x, max_y = bounds
+        t = self.transform
+        # Tolerance keeps bounds that sit on pixel edges from gaining a pixel
+        eps = 1e-6
+        col0 = int(np.floor((min_x - t['x0']) / t['dx'] + eps))
+        col1 = int(np.ceil((max_x - t['x0']) / t['dx'] - eps))
+        row0 = int(np.floor((max_y - t['y0']) / t['dy'] + eps))
+        row1 = int(np.ceil((min_y - t['y0']) / t['dy'] - eps))
+        return row0, col0, row1 - row0, col1 - col0
+
+    def read_bounds(self, bounds: List[float]) -> np.ndarray:
+        """Read the window covering bounds; nodata becomes NaN for float output"""
+        window = self.read_window(*self.window_for_bounds(bounds))
+        if self.nodata is None:
+            return window
+        result = window.astype(np.float32)
+        result[window == self.nodata] = np.nan
+        return result
+
+
+_READERS: 'OrderedDict[Tuple, CogReader]' = OrderedDict()
+_READERS_LOCK = threading.Lock()
+
+
+def open_reader(
+    location: str,
+    scene_id: Optional[str] = None,
+    band: Optional[str] = None,
+    overview: int = 0
+) -> CogReader:
+    """
+    Process-wide reader for a COG, parsing its header and IFD only on first use
+
+    Later windows of the same scene band cost only their uncached tiles.
+    """
+    key = (location, scene_id, band, overview)
+    with _READERS_LOCK:
+        reader = _READERS.get(key)
+        if reader is not None:
+            _READERS.move_to_end(key)
+            return reader
+    # Parse outside the lock so one slow header fetch doesn't serialize others
+    reader = CogReader(location, scene_id, band, overview)
+    with _READERS_LOCK:
+        reader = _READERS.setdefault(key, reader)
+        _READERS.move_to_end(key)
+        while len(_READERS) > MAX_READERS:
+            _READERS.popitem(last=False)
+    return reader
+
+
+def clear_readers():
+    with _READERS_LOCK:
+        _READERS.clear()
+
+
+def read_scene_bands(
+    scene: Dict[str, Any],
+    band_ids: List[str],
+    bounds: List[float]
+) -> Dict[str, np.ndarray]:
+    """Read a window from several bands of a catalog scene"""
+    return {
+        band_id: open_reader(scene['bands'][band_id], scene['scene_id'], band_id).read_bounds(bounds)
+        for band_id in band_ids
+    }
+
+
+class RangeRequestHandler(http.server.SimpleHTTPRequestHandler):
+    """Static file handler that honours single 'Range: bytes=a-b' requests"""
+
+    def send_head(self):
+        range_header = self.headers.get('Range')
+        match = re.match(r'bytes=(\d+)-(\d*)$', range_header or '')
+        path = self.translate_path(self.path)
+        if not match or not os.path.isfile(path):
+            self._range = None
+            return super().send_head()
+
+        size = os.path.getsize(path)
+        start = int(match.group(1))
+        stop = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+        if start > stop:
+            self.send_error(416, "Requested Range Not Satisfiable")
+            return None
+
+        f = open(path, 'rb')
+        f.seek(start)
+        self._range = stop - start + 1
+        self.send_response(206)
+        self.send_header('Content-Type', self.guess_type(path))
+        self.send_header('Content-Range', f'bytes {start}-{stop}/{size}')
+        self.send_header('Content-Length', str(self._range))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+        return f
+
+    def copyfile(self, source, outputfile):
+        if getattr(self, '_range', None) is None:
+            return super().copyfile(source, outputfile)
+        outputfile.write(source.read(self._range))
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_static_ranges(directory: str, port: int = 0) -> Tuple[socketserver.TCPServer, str]:
+    """
+    Serve a directory over HTTP with range support in a background thread
+
+    A local stand-in for object storage. Returns the server (call
+    shutdown() to stop) and its base URL.
+    """
+    handler = lambda *args, **kwargs: RangeRequestHandler(*args, directory=directory, **kwargs)
+    server = socketserver.ThreadingTCPServer(('127.0.0.1', port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
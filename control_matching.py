@@ -0,0 +1,312 @@
+"""
+Covariate-matched control-area selection for Orun.io
+Precomputed candidate grid with baseline index, climate-normal, elevation
+and land-cover features; controls for a project are its k nearest
+neighbours in standardized feature space, found on a KD-tree, outside
+buffers around project polygons
+"""
+
+import heapq
+import os
+import warnings
+from typing import Dict, List, Optional, Any, Sequence, Tuple
+
+import numpy as np
+
+# Continuous matching covariates, in column order
+FEATURE_COLUMNS = [
+    'ndvi_baseline',     # mean NDVI over the baseline period
+    'ndwi_baseline',     # mean NDWI over the baseline period
+    'precip_normal',     # NASA POWER annual precipitation normal (mm/day)
+    'temp_normal',       # NASA POWER mean air temperature normal (deg C)
+    'elevation'          # metres
+]
+
+DEFAULT_LEAF_SIZE = 64
+DEFAULT_BUFFER_DEGREES = 0.05
+CONTROL_GRID_PATH = os.getenv('CONTROL_GRID_PATH', os.path.join('data', 'control_grid.npz'))
+
+
+class KDTree:
+    """
+    Array-backed KD-tree for exact k-nearest-neighbour queries
+
+    Nodes split at the median of their widest dimension down to leaves of
+    at most leaf_size points. Every node keeps its bounding box, so a query
+    visits nodes best-first and stops once no box can hold a closer point;
+    leaf points are scored in one vectorized step.
+    """
+
+    def __init__(self, points: np.ndarray, leaf_size: int = DEFAULT_LEAF_SIZE):
+        self.points = np.ascontiguousarray(points, dtype=float)
+        self.leaf_size = leaf_size
+        n_points = len(self.points)
+        self.order = np.arange(n_points)
+
+        starts, stops, lefts, rights = [], [], [], []
+        stack = [(0, n_points, -1, False)]
+        while stack:
+            start, stop, parent, is_right = stack.pop()
+            node = len(starts)
+            starts.append(start)
+            stops.append(stop)
+            lefts.append(-1)
+            rights.append(-1)
+            if parent >= 0:
+                (rights if is_right else lefts)[parent] = node
+            if stop - start <= leaf_size:
+                continue
+            members = self.order[start:stop]
+            block = self.points[members]
+            dim = int(np.argmax(block.max(axis=0) - block.min(axis=0)))
+            middle = (stop - start) // 2
+            self.order[start:stop] = members[np.argpartition(block[:, dim], middle)]
+            stack.append((start + middle, stop, node, True))
+            stack.append((start, start + middle, node, False))
+
+        self.node_start = np.array(starts)
+        self.node_stop = np.array(stops)
+        self.node_left = np.array(lefts)
+        self.node_right = np.array(rights)
+        ordered = self.points[self.order]
+        dims = self.points.shape[1] if self.points.ndim == 2 else 0
+        self.node_lo = np.empty((len(starts), dims))
+        self.node_hi = np.empty((len(starts), dims))
+        for node, (start, stop) in enumerate(zip(starts, stops)):
+            if stop > start:
+                self.node_lo[node] = ordered[start:stop].min(axis=0)
+                self.node_hi[node] = ordered[start:stop].max(axis=0)
+            else:
+                self.node_lo[node] = np.inf
+                self.node_hi[node] = -np.inf
+
+    def _box_distance(self, node: int, query: np.ndarray) -> float:
+        gap = np.maximum(self.node_lo[node] - query, 0.0) + np.maximum(query - self.node_hi[node], 0.0)
+        return float(gap @ gap)
+
+    def query(self, query: np.ndarray, k: int, allowed: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        k nearest points to query
+
+        Args:
+            allowed (np.ndarray): Optional boolean mask over points; others
+                are skipped
+
+        Returns:
+            Point indices and Euclidean distances, nearest first (fewer than
+            k when not enough points are allowed)
+        """
+        query = np.asarray(query, dtype=float)
+        best_index = np.empty(0, dtype=np.int64)
+        best_distance = np.empty(0)
+        if len(self.points) == 0:
+            return best_index, best_distance
+
+        heap = [(self._box_distance(0, query), 0)]
+        while heap:
+            bound, node = heapq.heappop(heap)
+            if len(best_distance) == k and bound > best_distance[-1]:
+                break
+            left = self.node_left[node]
+            if left >= 0:
+                for child in (left, self.node_right[node]):
+                    child_bound = self._box_distance(child, query)
+                    if len(best_distance) < k or child_bound <= best_distance[-1]:
+                        heapq.heappush(heap, (child_bound, child))
+                continue
+
+            members = self.order[self.node_start[node]:self.node_stop[node]]
+            if allowed is not None:
+                members = members[allowed[members]]
+            if members.size == 0:
+                continue
+            diff = self.points[members] - query
+            distance = np.einsum('ij,ij->i', diff, diff)
+            candidates = np.concatenate([best_index, members])
+            distances = np.concatenate([best_distance, distance])
+            keep = np.argsort(distances, kind='stable')[:k]
+            best_index, best_distance = candidates[keep], distances[keep]
+
+        return best_index, np.sqrt(best_distance)
+
+
+def _ring_bounds(coordinates: Sequence[Sequence[float]]) -> np.ndarray:
+    ring = np.asarray(coordinates, dtype=float)
+    return np.array([ring[:, 0].min(), ring[:, 1].min(), ring[:, 0].max(), ring[:, 1].max()])
+
+
+class ControlCandidateGrid:
+    """Candidate control cells with standardized features and one KD-tree per land-cover class"""
+
+    def __init__(
+        self,
+        centers: np.ndarray,
+        cell_size: float,
+        features: np.ndarray,
+        land_cover: Optional[np.ndarray] = None,
+        excluded: Optional[np.ndarray] = None,
+        weights: Optional[Sequence[float]] = None,
+        leaf_size: int = DEFAULT_LEAF_SIZE
+    ):
+        """
+        Args:
+            centers (np.ndarray): (n, 2) cell centers [lon, lat]
+            cell_size (float): Cell edge length in degrees
+            features (np.ndarray): (n, len(FEATURE_COLUMNS)) raw covariates;
+                cells with NaN features are never matched
+            land_cover (np.ndarray): (n,) land-cover class codes; matches
+                are restricted to the project's majority class
+            excluded (np.ndarray): (n,) cells never usable as controls
+            weights (Sequence[float]): Per-feature weights after
+                standardization
+        """
+        self.centers = np.asarray(centers, dtype=float)
+        self.cell_size = float(cell_size)
+        self.features = np.asarray(features, dtype=float)
+        n_cells = len(self.centers)
+        self.land_cover = np.zeros(n_cells, dtype=np.int32) if land_cover is None else np.asarray(land_cover)
+        self.excluded = np.zeros(n_cells, dtype=bool) if excluded is None else np.asarray(excluded, dtype=bool)
+        self.weights = np.ones(self.features.shape[1]) if weights is None else np.asarray(weights, dtype=float)
+
+        with warnings.catch_warnings():
+            # Features without any observed cell give NaN means and scales
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            self.mean = np.nanmean(self.features, axis=0)
+            self.scale = np.nanstd(self.features, axis=0)
+        self.scale[~(self.scale > 0)] = 1.0
+        self.scaled = (self.features - self.mean) / self.scale * self.weights
+        usable = ~np.isnan(self.scaled).any(axis=1)
+
+        # One tree per land-cover class over usable cells; tree point i -> cell ids[i]
+        self.trees: Dict[int, Tuple[KDTree, np.ndarray]] = {}
+        self.tree_position = np.full(n_cells, -1, dtype=np.int64)
+        for land_class in np.unique(self.land_cover[usable]):
+            ids = np.flatnonzero(usable & (self.land_cover == land_class))
+            self.trees[int(land_class)] = (KDTree(self.scaled[ids], leaf_size), ids)
+            self.tree_position[ids] = np.arange(len(ids))
+        self._allowed: Dict[int, np.ndarray] = {}
+
+        # Longitude-sorted cells for bounding-box lookups
+        self._by_lon = np.argsort(self.centers[:, 0], kind='stable')
+        self._sorted_lon = self.centers[self._by_lon, 0]
+
+    @classmethod
+    def from_rasters(
+        cls,
+        feature_rasters: Dict[str, np.ndarray],
+        transform: Dict[str, float],
+        land_cover: Optional[np.ndarray] = None,
+        **kwargs
+    ) -> 'ControlCandidateGrid':
+        """
+        Build the grid from co-registered feature rasters
+
+        Args:
+            feature_rasters: FEATURE_COLUMNS name -> (height, width) raster
+            transform: Grid origin and cell size ('x0', 'y0', 'dx', 'dy')
+        """
+        shape = next(iter(feature_rasters.values())).shape
+        rows, cols = np.indices(shape)
+        centers = np.column_stack([
+            transform['x0'] + (cols.ravel() + 0.5) * transform['dx'],
+            transform['y0'] + (rows.ravel() + 0.5) * transform['dy']
+        ])
+        features = np.column_stack([feature_rasters[name].ravel() for name in FEATURE_COLUMNS])
+        return cls(centers, abs(transform['dx']), features,
+                   None if land_cover is None else land_cover.ravel(), **kwargs)
+
+    def cells_in_box(self, box: Sequence[float]) -> np.ndarray:
+        """Cells whose centers fall in [min_lon, min_lat, max_lon, max_lat]"""
+        min_x, min_y, max_x, max_y = box
+        start = np.searchsorted(self._sorted_lon, min_x, side='left')
+        stop = np.searchsorted(self._sorted_lon, max_x, side='right')
+        cells = self._by_lon[start:stop]
+        lats = self.centers[cells, 1]
+        return cells[(lats >= min_y) & (lats <= max_y)]
+
+    def exclude_projects(self, polygons: Sequence[Sequence[Sequence[float]]],
+                         buffer: float = DEFAULT_BUFFER_DEGREES) -> int:
+        """Exclude cells within buffer of project polygons (by bounding box); returns cells excluded"""
+        excluded_before = int(self.excluded.sum())
+        for ring in polygons:
+            self.excluded[self.cells_in_box(_ring_bounds(ring) + [-buffer, -buffer, buffer, buffer])] = True
+        self._allowed.clear()
+        return int(self.excluded.sum()) - excluded_before
+
+    def project_profile(self, coordinates: Sequence[Sequence[float]]) -> Optional[Tuple[np.ndarray, int]]:
+        """
+        Mean standardized features and majority land-cover class of usable
+        cells in a project; None when the grid has no usable cell at all
+        """
+        box = _ring_bounds(coordinates)
+        inside = self.cells_in_box(box)
+        inside = inside[self.tree_position[inside] >= 0]
+        if inside.size == 0:
+            # Small projects, or projects over cells without features: the
+            # usable cell nearest the polygon center
+            usable = np.flatnonzero(self.tree_position >= 0)
+            if usable.size == 0:
+                return None
+            center = np.array([(box[0] + box[2]) / 2, (box[1] + box[3]) / 2])
+            offsets = self.centers[usable] - center
+            inside = usable[[np.argmin(np.einsum('ij,ij->i', offsets, offsets))]]
+        classes, counts = np.unique(self.land_cover[inside], return_counts=True)
+        return self.scaled[inside].mean(axis=0), int(classes[np.argmax(counts)])
+
+    def match(
+        self,
+        coordinates: Sequence[Sequence[float]],
+        k: int = 10,
+        buffer: float = DEFAULT_BUFFER_DEGREES
+    ) -> List[Dict[str, Any]]:
+        """
+        k covariate-matched control cells for a project polygon
+
+        Cells inside the project's own buffer and excluded cells are
+        skipped. Returns cells nearest first with their center, bounds,
+        standardized feature distance and raw features.
+        """
+        profiled = self.project_profile(coordinates)
+        if profiled is None:
+            return []
+        profile, land_class = profiled
+        tree, ids = self.trees[land_class]
+
+        if land_class not in self._allowed:
+            self._allowed[land_class] = ~self.excluded[ids]
+        allowed = self._allowed[land_class].copy()
+        own_cells = self.cells_in_box(_ring_bounds(coordinates) + [-buffer, -buffer, buffer, buffer])
+        own_points = self.tree_position[own_cells[self.land_cover[own_cells] == land_class]]
+        allowed[own_points[own_points >= 0]] = False
+        points, distances = tree.query(profile, k, allowed)
+
+        half = self.cell_size / 2
+        matches = []
+        for point, distance in zip(points, distances):
+            cell = int(ids[point])
+            lon, lat = self.centers[cell]
+            matches.append({
+                'cell': cell,
+                'center': [float(lon), float(lat)],
+                'bounds': [float(lon - half), float(lat - half), float(lon + half), float(lat + half)],
+                'distance': round(float(distance), 6),
+                'land_cover': int(self.land_cover[cell]),
+                'features': {
+                    name: round(float(value), 4) for name, value in zip(FEATURE_COLUMNS, self.features[cell])
+                }
+            })
+        return matches
+
+    def save(self, path: str = CONTROL_GRID_PATH):
+        """Store the grid inputs; trees are rebuilt on load"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        np.savez_compressed(
+            path, centers=self.centers, cell_size=self.cell_size, features=self.features,
+            land_cover=self.land_cover, excluded=self.excluded, weights=self.weights
+        )
+
+    @classmethod
+    def load(cls, path: str = CONTROL_GRID_PATH) -> 'ControlCandidateGrid':
+        with np.load(path) as data:
+            return cls(data['centers'], float(data['cell_size']), data['features'],
+                       data['land_cover'], data['excluded'], data['weights'])
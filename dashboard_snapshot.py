@@ -0,0 +1,106 @@
+"""
+Dashboard analytics snapshot for Orun.io
+Computes the funder dashboard figures concurrently, each aggregate on its
+own session in a worker thread, and serves them from an in-memory snapshot
+that writes mark stale and that is refreshed in the background once it
+is older than the snapshot interval
+"""
+
+import asyncio
+import os
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+# Seconds a snapshot is served before a background refresh; writes made
+# through the API mark it stale at once, the interval catches the rest
+SNAPSHOT_TTL_SECONDS = float(os.getenv('DASHBOARD_SNAPSHOT_TTL', '30'))
+
+Metric = Callable[[Session], Awaitable[Any]]
+
+
+def _run_metric(metric: Metric, session_factory: Callable[[], Session]) -> Any:
+    """Run one metric to completion on its own session and event loop"""
+    db = session_factory()
+    try:
+        return asyncio.run(metric(db))
+    finally:
+        db.close()
+
+
+def _retrieve_exception(task: asyncio.Future):
+    # A failed background refresh keeps the previous snapshot; don't warn
+    if not task.cancelled():
+        task.exception()
+
+
+class DashboardSnapshot:
+    """Dashboard figures computed together and read from memory"""
+
+    def __init__(
+        self,
+        metrics: Dict[str, Metric],
+        session_factory: Callable[[], Session],
+        ttl: float = SNAPSHOT_TTL_SECONDS
+    ):
+        """
+        Args:
+            metrics: Result key -> coroutine function taking a session
+            session_factory: Creates a session per metric, since one
+                session must not be shared between threads
+            ttl (float): Seconds before a snapshot is refreshed
+        """
+        self.metrics = metrics
+        self.session_factory = session_factory
+        self.ttl = ttl
+        self._snapshot: Optional[Dict[str, Any]] = None
+        self._snapshot_version = -1
+        self._taken_at = 0.0
+        self._version = 0
+        self._refresh: Optional[asyncio.Future] = None
+        self._refresh_version = -1
+
+    def invalidate(self):
+        """Mark the snapshot stale after a write; the next read recomputes it"""
+        self._version += 1
+
+    async def compute(self) -> Dict[str, Any]:
+        """All metrics at once, each aggregate query running in its own thread"""
+        names = list(self.metrics)
+        values = await asyncio.gather(*(
+            asyncio.to_thread(_run_metric, self.metrics[name], self.session_factory)
+            for name in names
+        ))
+        return dict(zip(names, values))
+
+    async def _run_refresh(self, version: int) -> Dict[str, Any]:
+        snapshot = await self.compute()
+        # An older refresh finishing late must not replace a newer snapshot
+        if version >= self._snapshot_version:
+            self._snapshot = snapshot
+            self._snapshot_version = version
+            self._taken_at = time.monotonic()
+        return snapshot
+
+    def _start_refresh(self) -> asyncio.Future:
+        """The refresh in flight for the current version, starting one if needed"""
+        if self._refresh is None or self._refresh.done() or self._refresh_version != self._version:
+            self._refresh_version = self._version
+            self._refresh = asyncio.ensure_future(self._run_refresh(self._version))
+            self._refresh.add_done_callback(_retrieve_exception)
+        return self._refresh
+
+    async def get(self) -> Dict[str, Any]:
+        """
+        Current dashboard figures
+
+        A snapshot taken since the last write is returned as is, refreshing
+        in the background once it is older than the TTL; after a write the
+        read waits for a new snapshot, shared by all concurrent readers.
+        """
+        if self._snapshot is not None and self._snapshot_version == self._version:
+            if time.monotonic() - self._taken_at > self.ttl:
+                self._start_refresh()
+            return self._snapshot
+        return await asyncio.shield(self._start_refresh())
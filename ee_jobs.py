@@ -0,0 +1,195 @@
+"""
+Earth Engine job manager for Orun.io
+Combines index reductions into one evaluation per geometry and runs
+Earth Engine calls on a thread pool so async endpoints never block
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Any
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_TASK_STATES = {'COMPLETED', 'FAILED', 'CANCELLED'}
+
+
+class EarthEngineJobManager:
+    """Submits Earth Engine evaluations and batch exports off the event loop"""
+
+    def __init__(
+        self,
+        ee_module: Any = None,
+        max_workers: int = 8,
+        poll_interval: float = 10.0,
+        export_timeout: float = 3600.0
+    ):
+        """
+        Initialize the job manager
+
+        Args:
+            ee_module: The `ee` module to use; pass `fake_ee` in tests
+            max_workers (int): Concurrent getInfo() calls
+            poll_interval (float): Seconds between export status polls
+            export_timeout (float): Seconds before an export poll gives up
+        """
+        if ee_module is None:
+            import ee as ee_module
+        self.ee = ee_module
+        self.poll_interval = poll_interval
+        self.export_timeout = export_timeout
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ee-job')
+
+    def build_index_reduction(
+        self,
+        collection: Any,
+        geometry: Any,
+        index_names: List[str],
+        scale: int = 10
+    ) -> Any:
+        """
+        Build a single reduction returning every index for every image
+
+        All requested index bands are reduced together with one reduceRegion
+        per image, then collected with one reduceColumns, so a whole time
+        series costs one evaluation instead of one per index.
+        """
+        ee = self.ee
+
+        def reduce_image(image):
+            means = image.select(index_names).reduceRegion(
+                reducer=ee.Reducer.mean(),
+                geometry=geometry,
+                scale=scale,
+                maxPixels=1e9
+            )
+            return ee.Feature(None, means).set({
+                'system:time_start': image.get('system:time_start'),
+                'CLOUDY_PIXEL_PERCENTAGE': image.get('CLOUDY_PIXEL_PERCENTAGE')
+            })
+
+        selectors = ['system:time_start', 'CLOUDY_PIXEL_PERCENTAGE'] + list(index_names)
+        return ee.FeatureCollection(collection.map(reduce_image)).reduceColumns(
+            ee.Reducer.toList(len(selectors)), selectors
+        )
+
+    def build_zonal_reduction(
+        self,
+        collection: Any,
+        features: Any,
+        index_names: List[str],
+        scale: int = 10
+    ) -> Any:
+        """
+        Build a single reduction returning every index for every feature and image
+
+        Each image is reduced once over all features with reduceRegions, so
+        scenes shared by many projects are read once per group.
+        """
+        ee = self.ee
+
+        def reduce_image(image):
+            time_start = image.get('system:time_start')
+            cloud = image.get('CLOUDY_PIXEL_PERCENTAGE')
+            return image.select(index_names).reduceRegions(
+                collection=features,
+                reducer=ee.Reducer.mean(),
+                scale=scale
+            ).map(lambda feature: feature.set({
+                'system:time_start': time_start,
+                'CLOUDY_PIXEL_PERCENTAGE': cloud
+            }))
+
+        selectors = ['project_id', 'system:time_start', 'CLOUDY_PIXEL_PERCENTAGE'] + list(index_names)
+        return ee.FeatureCollection(collection.map(reduce_image)).flatten().reduceColumns(
+            ee.Reducer.toList(len(selectors)), selectors
+        )
+
+    def submit(self, ee_object: Any) -> Future:
+        """Submit getInfo() for an Earth Engine object to the thread pool"""
+        return self.executor.submit(ee_object.getInfo)
+
+    async def evaluate(self, ee_object: Any) -> Any:
+        """Evaluate an Earth Engine object without blocking the event loop"""
+        return await asyncio.wrap_future(self.submit(ee_object))
+
+    async def evaluate_many(self, ee_objects: List[Any]) -> List[Any]:
+        """Evaluate several Earth Engine objects concurrently"""
+        return await asyncio.gather(*(self.evaluate(obj) for obj in ee_objects))
+
+    async def evaluate_index_series(
+        self,
+        collection: Any,
+        geometry: Any,
+        index_names: List[str],
+        scale: int = 10
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Evaluate the combined reduction and split it into per-index series"""
+        reduction = self.build_index_reduction(collection, geometry, index_names, scale)
+        rows = (await self.evaluate(reduction)).get('list', [])
+        return rows_to_index_series(rows, index_names)
+
+    async def evaluate_zonal_series(
+        self,
+        collection: Any,
+        features: Any,
+        index_names: List[str],
+        scale: int = 10
+    ) -> Dict[int, Dict[str, List[Dict[str, Any]]]]:
+        """Evaluate the zonal reduction and split it into per-project index series"""
+        reduction = self.build_zonal_reduction(collection, features, index_names, scale)
+        rows = (await self.evaluate(reduction)).get('list', [])
+
+        by_project: Dict[int, List[List[Any]]] = {}
+        for row in rows:
+            by_project.setdefault(int(row[0]), []).append(row[1:])
+        return {
+            project_id: rows_to_index_series(project_rows, index_names)
+            for project_id, project_rows in by_project.items()
+        }
+
+    async def run_export(self, task: Any) -> Dict[str, Any]:
+        """Start a batch export task and poll it until it reaches a terminal state"""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self.executor, task.start)
+        deadline = time.monotonic() + self.export_timeout
+
+        while True:
+            status = await loop.run_in_executor(self.executor, task.status)
+            state = status.get('state')
+            if state in TERMINAL_TASK_STATES:
+                if state != 'COMPLETED':
+                    logger.error(f"Earth Engine export {status.get('id')} ended as {state}: "
+                                 f"{status.get('error_message', '')}")
+                return status
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"Earth Engine export {status.get('id')} still {state}")
+            await asyncio.sleep(self.poll_interval)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False)
+
+
+def rows_to_index_series(
+    rows: List[List[Any]],
+    index_names: List[str]
+) -> Dict[str, List[Dict[str, Any]]]:
+    """Convert reduceColumns rows [time_ms, cloud, *indices] into index series"""
+    indices_data = {index_name: [] for index_name in index_names}
+
+    for row in sorted(rows, key=lambda r: r[0]):
+        date = datetime.fromtimestamp(row[0] / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+        cloud_cover = round(row[1], 2) if row[1] is not None else None
+        for index_name, value in zip(index_names, row[2:]):
+            # Fully masked regions reduce to None and are left out of the series
+            if value is None:
+                continue
+            indices_data[index_name].append({
+                'date': date,
+                'value': round(value, 4),
+                'cloud_cover': cloud_cover
+            })
+
+    return indices_data
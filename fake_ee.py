@@ -0,0 +1,328 @@
+"""
+In-process fake of the Earth Engine `ee` module for Orun.io
+Implements the subset of the API used by SatelliteService and the job
+manager with deterministic synthetic Sentinel-2 scenes, so the pipeline
+can be exercised without credentials or network access.
+
+Usage:
+    import fake_ee
+    fake_ee.install()          # registers the fake as `ee` in sys.modules
+    from satellite_service import SatelliteService
+"""
+
+import ast
+import math
+import operator
+import random
+import sys
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Any
+
+# Synthetic acquisitions are generated every REVISIT_DAYS
+REVISIT_DAYS = 5
+
+# Mean surface reflectance (0-1) per band for synthetic scenes
+BASE_REFLECTANCE = {'B2': 0.05, 'B3': 0.08, 'B4': 0.07, 'B8': 0.30, 'B11': 0.20, 'B12': 0.12}
+
+# Counters so tests can assert how many evaluations were made
+calls = {'initialize': 0, 'getInfo': 0, 'reduceRegion': 0}
+_calls_lock = threading.Lock()
+
+
+def _count(name: str):
+    with _calls_lock:
+        calls[name] += 1
+
+
+def reset_calls():
+    for name in calls:
+        calls[name] = 0
+
+
+def install():
+    """Register this module as `ee` so `import ee` resolves to the fake"""
+    sys.modules['ee'] = sys.modules[__name__]
+
+
+def Initialize(*args, **kwargs):
+    _count('initialize')
+
+
+def _to_millis(date: str) -> int:
+    parsed = datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=timezone.utc)
+    return int(parsed.timestamp() * 1000)
+
+
+class ComputedObject:
+    """Wraps an already-computed Python value"""
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def getInfo(self) -> Any:
+        _count('getInfo')
+        return self.value
+
+
+class Geometry:
+    def __init__(self, coordinates: List[Any]):
+        # A list of rings is an exterior ring followed by holes
+        self.rings = coordinates if coordinates and isinstance(coordinates[0][0], list) else [coordinates]
+        self.coordinates = self.rings[0]
+
+    @staticmethod
+    def Polygon(coordinates: List[Any]) -> 'Geometry':
+        return Geometry(coordinates)
+
+    @staticmethod
+    def Rectangle(coordinates: List[float]) -> 'Geometry':
+        x0, y0, x1, y1 = coordinates
+        return Geometry([[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]])
+
+    def bounds_key(self) -> float:
+        return round(sum(x + y for ring in self.rings for x, y in ring), 6)
+
+
+class Filter:
+    _ops = {'lt': operator.lt, 'gt': operator.gt, 'eq': operator.eq}
+
+    def __init__(self, op: str, name: str, value: Any):
+        self.op, self.name, self.value = op, name, value
+
+    @staticmethod
+    def lt(name: str, value: Any) -> 'Filter':
+        return Filter('lt', name, value)
+
+    @staticmethod
+    def gt(name: str, value: Any) -> 'Filter':
+        return Filter('gt', name, value)
+
+    @staticmethod
+    def eq(name: str, value: Any) -> 'Filter':
+        return Filter('eq', name, value)
+
+    def matches(self, properties: Dict[str, Any]) -> bool:
+        return self._ops[self.op](properties.get(self.name), self.value)
+
+
+class Reducer:
+    def __init__(self, kind: str, size: int = 1):
+        self.kind, self.size = kind, size
+
+    @staticmethod
+    def mean() -> 'Reducer':
+        return Reducer('mean')
+
+    @staticmethod
+    def toList(size: int = 1) -> 'Reducer':
+        return Reducer('toList', size)
+
+
+_BIN_OPS = {ast.Add: operator.add, ast.Sub: operator.sub, ast.Mult: operator.mul,
+            ast.Div: operator.truediv, ast.Pow: operator.pow}
+_FUNCTIONS = {'sqrt': math.sqrt, 'abs': abs}
+
+
+def _evaluate_expression(node: ast.AST, variables: Dict[str, float]) -> float:
+    if isinstance(node, ast.Expression):
+        return _evaluate_expression(node.body, variables)
+    if isinstance(node, ast.Constant):
+        return float(node.value)
+    if isinstance(node, ast.Name):
+        return variables[node.id]
+    if isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.USub):
+        return -_evaluate_expression(node.operand, variables)
+    if isinstance(node, ast.Call) and node.func.id in _FUNCTIONS:
+        return _FUNCTIONS[node.func.id](_evaluate_expression(node.args[0], variables))
+    if isinstance(node, ast.BinOp) and type(node.op) in _BIN_OPS:
+        return _BIN_OPS[type(node.op)](_evaluate_expression(node.left, variables),
+                                       _evaluate_expression(node.right, variables))
+    raise ValueError(f"Unsupported expression element: {ast.dump(node)}")
+
+
+class Image:
+    """Single synthetic scene; each band holds its area-mean value"""
+
+    def __init__(self, bands: Dict[str, Optional[float]], properties: Optional[Dict[str, Any]] = None):
+        self.bands = dict(bands)
+        self.properties = dict(properties or {})
+
+    def _band_value(self) -> Optional[float]:
+        return next(iter(self.bands.values()))
+
+    def select(self, names: Any) -> 'Image':
+        names = [names] if isinstance(names, str) else list(names)
+        return Image({name: self.bands[name] for name in names}, self.properties)
+
+    def rename(self, name: str) -> 'Image':
+        return Image({name: self._band_value()}, self.properties)
+
+    def normalizedDifference(self, names: List[str]) -> 'Image':
+        a, b = self.bands[names[0]], self.bands[names[1]]
+        value = None if a is None or b is None or a + b == 0 else (a - b) / (a + b)
+        return Image({'nd': value}, self.properties)
+
+    def expression(self, expression: str, mapping: Dict[str, 'Image']) -> 'Image':
+        variables = {name: image._band_value() for name, image in mapping.items()}
+        if any(value is None for value in variables.values()):
+            return Image({'constant': None}, self.properties)
+        tree = ast.parse(expression, mode='eval')
+        return Image({'constant': _evaluate_expression(tree, variables)}, self.properties)
+
+    def addBands(self, images: Any) -> 'Image':
+        images = images if isinstance(images, list) else [images]
+        bands = dict(self.bands)
+        for image in images:
+            bands.update(image.bands)
+        return Image(bands, self.properties)
+
+    def reduceRegion(self, reducer: Reducer, geometry: Geometry = None, scale: int = None,
+                     maxPixels: float = None, **kwargs) -> 'Dictionary':
+        _count('reduceRegion')
+        return Dictionary(dict(self.bands))
+
+    def reduceRegions(self, collection: 'FeatureCollection', reducer: Reducer,
+                      scale: int = None, **kwargs) -> 'FeatureCollection':
+        _count('reduceRegion')
+        return FeatureCollection([feature.set(dict(self.bands)) for feature in collection.elements])
+
+    def set(self, *args) -> 'Image':
+        updates = args[0] if len(args) == 1 else {args[0]: args[1]}
+        if isinstance(updates, Dictionary):
+            updates = updates.value
+        return Image(self.bands, dict(self.properties, **updates))
+
+    def get(self, name: str) -> Any:
+        return self.properties.get(name)
+
+    def getInfo(self) -> Dict[str, Any]:
+        _count('getInfo')
+        return {'bands': list(self.bands), 'properties': self.properties}
+
+
+class Dictionary(ComputedObject):
+    pass
+
+
+class Feature:
+    def __init__(self, geometry: Optional[Geometry], properties: Any = None):
+        if isinstance(properties, Dictionary):
+            properties = properties.value
+        self.geometry = geometry
+        self.properties = dict(properties or {})
+
+    def set(self, *args) -> 'Feature':
+        updates = args[0] if len(args) == 1 else {args[0]: args[1]}
+        return Feature(self.geometry, dict(self.properties, **updates))
+
+    def get(self, name: str) -> Any:
+        return self.properties.get(name)
+
+
+class _Collection:
+    def __init__(self, elements: List[Any]):
+        self.elements = elements
+
+    def map(self, function) -> '_Collection':
+        return type(self)([function(element) for element in self.elements])
+
+    def filter(self, ee_filter: Filter) -> '_Collection':
+        return type(self)([e for e in self.elements if ee_filter.matches(e.properties)])
+
+    def flatten(self) -> 'FeatureCollection':
+        return FeatureCollection([e for collection in self.elements for e in collection.elements])
+
+    def size(self) -> ComputedObject:
+        return ComputedObject(len(self.elements))
+
+    def aggregate_array(self, name: str) -> ComputedObject:
+        return ComputedObject([e.properties.get(name) for e in self.elements])
+
+
+class ImageCollection(_Collection):
+    """Synthetic Sentinel-2 collection; scenes materialize on filterDate"""
+
+    def __init__(self, source: Any = None):
+        super().__init__(source if isinstance(source, list) else [])
+        self.collection_id = source if isinstance(source, str) else None
+
+    def filterDate(self, start: str, end: str) -> 'ImageCollection':
+        if self.collection_id is None:
+            start_ms, end_ms = _to_millis(start), _to_millis(end)
+            return ImageCollection([
+                e for e in self.elements
+                if start_ms <= e.properties['system:time_start'] < end_ms
+            ])
+        return ImageCollection(_synthetic_scenes(start, end))
+
+    def filterBounds(self, geometry: Geometry) -> 'ImageCollection':
+        return ImageCollection(self.elements) if self.collection_id is None else self
+
+
+class FeatureCollection(_Collection):
+    def __init__(self, source: Any = None):
+        if isinstance(source, _Collection):
+            source = source.elements
+        super().__init__(list(source or []))
+
+    def reduceColumns(self, reducer: Reducer, selectors: List[str]) -> ComputedObject:
+        rows = [[feature.properties.get(name) for name in selectors] for feature in self.elements]
+        return ComputedObject({'list': rows})
+
+
+def _synthetic_scenes(start: str, end: str) -> List[Image]:
+    """Deterministic scenes every REVISIT_DAYS with seasonal greenness"""
+    current = datetime.strptime(start, '%Y-%m-%d')
+    stop = datetime.strptime(end, '%Y-%m-%d')
+    scenes = []
+    while current < stop:
+        rng = random.Random(current.toordinal())
+        season = 0.5 + 0.5 * math.sin(2 * math.pi * current.timetuple().tm_yday / 365.25)
+        bands = {band: value * (1 + rng.uniform(-0.1, 0.1)) for band, value in BASE_REFLECTANCE.items()}
+        bands['B8'] *= 0.8 + 0.4 * season
+        scenes.append(Image(bands, {
+            'system:time_start': _to_millis(current.strftime('%Y-%m-%d')),
+            'CLOUDY_PIXEL_PERCENTAGE': round(rng.uniform(0, 40), 2),
+            'system:index': current.strftime('%Y%m%d')
+        }))
+        current += timedelta(days=REVISIT_DAYS)
+    return scenes
+
+
+class Task:
+    """Fake batch export task that completes after a few status polls"""
+
+    def __init__(self, description: str, polls_to_complete: int = 2):
+        self.id = f'FAKE_{description}'
+        self.description = description
+        self._remaining = polls_to_complete
+        self._state = 'UNSUBMITTED'
+
+    def start(self):
+        self._state = 'READY'
+
+    def status(self) -> Dict[str, Any]:
+        if self._state in ('READY', 'RUNNING'):
+            self._remaining -= 1
+            self._state = 'COMPLETED' if self._remaining <= 0 else 'RUNNING'
+        return {'id': self.id, 'state': self._state, 'description': self.description}
+
+
+class _TableExport:
+    @staticmethod
+    def toDrive(collection: Any = None, description: str = 'export', **kwargs) -> Task:
+        return Task(description)
+
+    @staticmethod
+    def toCloudStorage(collection: Any = None, description: str = 'export', **kwargs) -> Task:
+        return Task(description)
+
+
+class _Export:
+    table = _TableExport
+    image = _TableExport
+
+
+class batch:
+    Export = _Export
@@ -0,0 +1,150 @@
+"""
+Versioned impact-analysis result cache for Orun.io
+Persists impact and BACI results per project under a
+data-version fingerprint built from the satellite-data watermark, the
+community report count and the analysis parameter version, so a stored
+result is reused until one of its inputs changes
+"""
+
+import asyncio
+import hashlib
+import json
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional, Any, Tuple
+
+from sqlalchemy import Column, DateTime, Integer, String, Text, UniqueConstraint, func
+from sqlalchemy.orm import Session
+from models import Base, CommunityReport, SatelliteData
+
+# Bump an analysis' version whenever its method or parameters change so
+# stored results computed the old way are invalidated
+PARAMETER_VERSIONS = {
+    'impact': 1,
+    'baci': 2
+}
+
+
+class ImpactResult(Base):
+    """Latest stored result of one analysis for one project"""
+
+    __tablename__ = 'impact_results'
+    __table_args__ = (
+        UniqueConstraint('project_id', 'analysis', name='uq_impact_result_analysis'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, nullable=False, index=True)
+    analysis = Column(String(32), nullable=False)
+    fingerprint = Column(String(64), nullable=False)
+    result = Column(Text, nullable=False)
+    computed_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+
+def data_version(db: Session, project_id: int) -> Dict[str, Any]:
+    """
+    Inputs an impact result depends on
+
+    The watermark and row count of stored satellite data change whenever
+    acquisitions are processed; the report count changes with every
+    community submission. Both lookups are single aggregate queries.
+    """
+    watermark, acquisitions = db.query(
+        func.max(SatelliteData.acquisition_date), func.count(SatelliteData.id)
+    ).filter(SatelliteData.project_id == project_id).one()
+    reports = db.query(func.count(CommunityReport.id)).filter(
+        CommunityReport.project_id == project_id
+    ).scalar()
+    return {
+        'watermark': watermark.isoformat() if watermark else None,
+        'acquisitions': acquisitions,
+        'reports': reports
+    }
+
+
+def fingerprint(version: Dict[str, Any], analysis: str,
+                parameters: Optional[Dict[str, Any]] = None) -> str:
+    """SHA-256 of the data version, the analysis parameter version and request parameters"""
+    payload = json.dumps({
+        'data': version,
+        'analysis': analysis,
+        'parameter_version': PARAMETER_VERSIONS.get(analysis, 0),
+        'parameters': parameters or {}
+    }, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+# Computations in flight, so concurrent reloads of a stale result share one run
+_pending: Dict[Tuple[int, str, str], asyncio.Future] = {}
+
+
+async def get_or_compute(
+    db: Session,
+    project_id: int,
+    analysis: str,
+    compute: Callable[[], Awaitable[Any]],
+    parameters: Optional[Dict[str, Any]] = None
+) -> Any:
+    """
+    Stored result for the current data version, computing it on a miss
+
+    Args:
+        analysis (str): Key into PARAMETER_VERSIONS
+        compute: Coroutine factory producing a JSON-serializable result
+        parameters: Request parameters that also select the result
+
+    Returns:
+        The cached or freshly computed result
+    """
+    key = fingerprint(data_version(db, project_id), analysis, parameters)
+    stored = db.query(ImpactResult).filter(
+        ImpactResult.project_id == project_id,
+        ImpactResult.analysis == analysis
+    ).first()
+    if stored is not None and stored.fingerprint == key:
+        return json.loads(stored.result)
+
+    pending = _pending.get((project_id, analysis, key))
+    if pending is not None:
+        return await asyncio.shield(pending)
+
+    future = asyncio.get_running_loop().create_future()
+    _pending[(project_id, analysis, key)] = future
+    try:
+        encoded = json.dumps(await compute(), default=str)
+        if stored is None:
+            stored = ImpactResult(project_id=project_id, analysis=analysis)
+            db.add(stored)
+        stored.fingerprint = key
+        stored.result = encoded
+        # Hits and misses return the same decoded form
+        result = json.loads(encoded)
+        db.commit()
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # Waiters re-raise it; retrieve it here so an unawaited future stays quiet
+        future.exception()
+        raise
+    finally:
+        del _pending[(project_id, analysis, key)]
+
+
+def stored_result(db: Session, project_id: int, analysis: str) -> Optional[Any]:
+    """Last stored result whatever its data version, e.g. to warm-start a refit"""
+    stored = db.query(ImpactResult.result).filter(
+        ImpactResult.project_id == project_id,
+        ImpactResult.analysis == analysis
+    ).scalar()
+    return json.loads(stored) if stored else None
+
+
+def invalidate(db: Session, project_id: int, analysis: Optional[str] = None):
+    """Drop a project's stored results, e.g. after data is rewritten in place. The caller commits."""
+    query = db.query(ImpactResult).filter(ImpactResult.project_id == project_id)
+    if analysis is not None:
+        query = query.filter(ImpactResult.analysis == analysis)
+    query.delete(synchronize_session=False)
@@ -3,11 +3,14 @@ Orun.io Backend API - Climate Impact Verification Platform
 Main FastAPI application with satellite data processing and community engagement
 """
 
-from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends, BackgroundTasks, Query, Request, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import HTTPBearer
-from sqlalchemy.orm import Session
-from typing import List, Optional
+from sqlalchemy.orm import Session, sessionmaker
+from typing import Any, Dict, List, Optional, Union
+import asyncio
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -22,12 +25,25 @@ from services import (
     ImpactAnalysisService, PaymentService, AuthService
 )
 from tasks import process_satellite_data, send_community_incentive
+from dashboard_snapshot import DashboardSnapshot
+from impact_cache import get_or_compute
+from project_listing import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, ensure_indexes, list_projects, \
+    parse_bbox, parse_fields
+from resilience_store import get_resilience_score as get_materialized_resilience, \
+    get_resilience_history, refresh_resilience_scores
 
 # Load environment variables
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# Seconds between portfolio-wide resilience refreshes; a community report
+# refreshes its own project's score as soon as it is submitted
+RESILIENCE_REFRESH_SECONDS = float(os.getenv('RESILIENCE_REFRESH_INTERVAL', '3600'))
+
 # Create database tables
 Base.metadata.create_all(bind=engine)
+ensure_indexes(engine)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -58,6 +74,43 @@ impact_service = ImpactAnalysisService()
 payment_service = PaymentService()
 auth_service = AuthService()
 
+# Sessions for work outside a request (background and periodic tasks)
+SessionLocal = sessionmaker(bind=engine)
+
+# Funder dashboard figures, computed together and served from memory
+dashboard = DashboardSnapshot({
+    "total_projects": project_service.count_projects,
+    "active_communities": community_service.count_active_communities,
+    "total_reports": community_service.count_reports,
+    "verified_impact": impact_service.count_verified_impacts,
+    "funding_unlocked": impact_service.calculate_funding_unlocked
+}, SessionLocal)
+
+def refresh_resilience_in_session(project_ids: Optional[List[int]] = None) -> Dict[str, int]:
+    """Refresh resilience scores on a session of its own"""
+    db = SessionLocal()
+    try:
+        return refresh_resilience_scores(db, project_ids)
+    finally:
+        db.close()
+
+async def refresh_resilience_periodically():
+    """Fold satellite updates into the materialized scores every RESILIENCE_REFRESH_SECONDS"""
+    while True:
+        await asyncio.sleep(RESILIENCE_REFRESH_SECONDS)
+        try:
+            await asyncio.to_thread(refresh_resilience_in_session)
+        except Exception:
+            logger.exception("Periodic resilience score refresh failed")
+
+@app.on_event("startup")
+async def start_resilience_refresh():
+    app.state.resilience_refresh = asyncio.create_task(refresh_resilience_periodically())
+
+@app.on_event("shutdown")
+async def stop_resilience_refresh():
+    app.state.resilience_refresh.cancel()
+
 @app.get("/")
 async def root():
     """Root endpoint with API information"""
@@ -98,16 +151,44 @@ async def create_project(
     current_user = Depends(auth_service.get_current_user)
 ):
     """Create a new climate adaptation project"""
-    return await project_service.create_project(project, db, current_user)
+    result = await project_service.create_project(project, db, current_user)
+    dashboard.invalidate()
+    return result
 
-@app.get("/projects", response_model=List[ProjectResponse])
+@app.get("/projects", response_model=Union[List[ProjectResponse], List[Dict[str, Any]]])
 async def get_projects(
-    skip: int = 0, 
-    limit: int = 100, 
+    request: Request,
+    response: Response,
+    cursor: Optional[str] = None,
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    country: Optional[List[str]] = Query(None),
+    project_type: Optional[List[str]] = Query(None),
+    status: Optional[List[str]] = Query(None),
+    bbox: Optional[str] = Query(None, description="min_lon,min_lat,max_lon,max_lat"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields, e.g. id,name,coordinates"),
     db: Session = Depends(get_db)
 ):
-    """Get all projects with pagination"""
-    return await project_service.get_projects(skip, limit, db)
+    """
+    Get projects a page at a time
+
+    Pages follow project id; pass the X-Next-Cursor header of one page as
+    `cursor` to get the next (also given as a Link header).
+    """
+    try:
+        items, next_cursor = list_projects(
+            db,
+            cursor=cursor,
+            limit=limit,
+            filters={"country": country, "project_type": project_type, "status": status},
+            bbox=parse_bbox(bbox),
+            fields=parse_fields(fields)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'<{request.url.include_query_params(cursor=next_cursor)}>; rel="next"'
+    return items
 
 @app.get("/projects/{project_id}", response_model=ProjectResponse)
 async def get_project(project_id: int, db: Session = Depends(get_db)):
@@ -120,7 +201,9 @@ async def get_project_impact(
     db: Session = Depends(get_db)
 ):
     """Get impact analysis for a specific project"""
-    return await impact_service.analyze_project_impact(project_id, db)
+    async def compute():
+        return jsonable_encoder(await impact_service.analyze_project_impact(project_id, db))
+    return await get_or_compute(db, project_id, 'impact', compute)
 
 # Community engagement endpoints
 @app.post("/community/reports", response_model=CommunityReportResponse)
@@ -131,6 +214,7 @@ async def submit_community_report(
 ):
     """Submit community ground truth data"""
     result = await community_service.submit_report(report, db)
+    dashboard.invalidate()
     
     # Trigger incentive payment in background
     background_tasks.add_task(
@@ -138,6 +222,8 @@ async def submit_community_report(
         report.community_member_id, 
         report.project_id
     )
+    # The report changes the project's community engagement score
+    background_tasks.add_task(refresh_resilience_in_session, [report.project_id])
     
     return result
 
@@ -176,6 +262,16 @@ async def get_satellite_indices(
     """Get satellite-derived indices (NDVI, NDWI, etc.) for a project area"""
     return await satellite_service.get_indices(project_id, start_date, end_date, db)
 
+@app.get("/satellite/indices")
+async def get_satellite_indices_batch(
+    start_date: str,
+    end_date: str,
+    project_ids: List[int] = Query(...),
+    db: Session = Depends(get_db)
+):
+    """Get satellite-derived indices for many projects, sharing scene reads"""
+    return await satellite_service.get_indices_batch(project_ids, start_date, end_date, db)
+
 # Impact analysis endpoints
 @app.get("/impact/baci/{project_id}")
 async def get_baci_analysis(
@@ -183,15 +279,52 @@ async def get_baci_analysis(
     db: Session = Depends(get_db)
 ):
     """Get Before-After-Control-Impact analysis for a project"""
-    return await impact_service.get_baci_analysis(project_id, db)
+    async def compute():
+        return await satellite_service.get_control_area_comparison(project_id, db)
+    try:
+        return await get_or_compute(db, project_id, 'baci', compute)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+# Resilience endpoints query and score synchronously, so they are plain
+# functions that FastAPI runs in its thread pool, off the event loop
+@app.post("/impact/resilience-score/refresh")
+def refresh_resilience(
+    force: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Recompute resilience scores for every project whose inputs changed"""
+    return refresh_resilience_scores(db, force=force)
 
 @app.get("/impact/resilience-score/{project_id}")
-async def get_resilience_score(
+def get_resilience_score(
     project_id: int,
+    history: bool = False,
     db: Session = Depends(get_db)
 ):
-    """Get calculated resilience score for a project"""
-    return await impact_service.get_resilience_score(project_id, db)
+    """Get the materialized resilience score for a project"""
+    score = get_materialized_resilience(db, project_id)
+    if score is None:
+        # Not materialized yet: score this project alone
+        refresh_resilience_scores(db, [project_id])
+        score = get_materialized_resilience(db, project_id)
+    if score is None:
+        raise HTTPException(status_code=404, detail="Project not found")
+    if history:
+        score['history'] = get_resilience_history(db, project_id)
+    return score
+
+@app.get("/impact/carbon/{project_id}")
+def get_carbon_sequestration(
+    project_id: int,
+    history: bool = False,
+    db: Session = Depends(get_db)
+):
+    """Get carbon sequestration since project start from the stored carbon-stock series"""
+    try:
+        return satellite_service.get_carbon_sequestration(project_id, db, history)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
 
 # Payment and incentives endpoints
 @app.post("/payments/incentive")
@@ -202,9 +335,11 @@ async def send_incentive_payment(
     db: Session = Depends(get_db)
 ):
     """Send mobile money incentive to community member"""
-    return await payment_service.send_incentive(
+    result = await payment_service.send_incentive(
         community_member_id, project_id, amount, db
     )
+    dashboard.invalidate()
+    return result
 
 @app.get("/payments/history/{community_member_id}")
 async def get_payment_history(
@@ -216,15 +351,9 @@ async def get_payment_history(
 
 # Analytics and reporting endpoints
 @app.get("/analytics/dashboard")
-async def get_dashboard_analytics(db: Session = Depends(get_db)):
+async def get_dashboard_analytics():
     """Get dashboard analytics for funders and project managers"""
-    return {
-        "total_projects": await project_service.count_projects(db),
-        "active_communities": await community_service.count_active_communities(db),
-        "total_reports": await community_service.count_reports(db),
-        "verified_impact": await impact_service.count_verified_impacts(db),
-        "funding_unlocked": await impact_service.calculate_funding_unlocked(db)
-    }
+    return await dashboard.get()
 
 @app.get("/analytics/project/{project_id}/timeline")
 async def get_project_timeline(
@@ -2,14 +2,22 @@
 ORUN.IO MVP Backend - Simplified FastAPI server for demo
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Query
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional, Tuple
 import json
+import math
 import random
 from datetime import datetime, timedelta
 
+import numpy as np
+
+from baci import baci_analysis
+from carbon import carbon_stock_series, sequestration
+from portfolio_cube import build_cube
+from raster_products import IndexCube
+
 # Initialize FastAPI app
 app = FastAPI(
     title="ORUN.IO MVP API",
@@ -55,7 +63,7 @@ class CommunityReport(BaseModel):
     report_type: str
     description: str
     location: str
-    timestamp: str
+    timestamp: datetime
     verified: bool
 
 class ImpactAnalysis(BaseModel):
@@ -110,19 +118,40 @@ SAMPLE_PROJECTS = [
     }
 ]
 
+# Portfolio aggregates by country, project type, funding source and month
+PORTFOLIO_CUBE = build_cube(
+    [dict(p, funding=p["funding_amount"]) for p in SAMPLE_PROJECTS],
+    resilience={p["id"]: p["resilience_score"] for p in SAMPLE_PROJECTS}
+)
+
+# Base index values for the sample projects
+SAMPLE_BASE_VALUES = {
+    1: {"ndvi": 0.35, "ndwi": 0.12, "evi": 0.25},  # Makueni
+    2: {"ndvi": 0.45, "ndwi": 0.18, "evi": 0.32},  # Niger Delta
+    3: {"ndvi": 0.28, "ndwi": 0.15, "evi": 0.22}   # Okavango
+}
+
+# Sample index uplift after project start in the project area
+SAMPLE_UPLIFT = {1: 0.13, 2: 0.18, 3: 0.11}
+
+# Allometric biome and area (ha) of each sample project, for carbon estimates
+SAMPLE_BIOMES = {1: "dryland_cropland", 2: "mangrove", 3: "wetland"}
+SAMPLE_AREA_HA = {1: 1500.0, 2: 800.0, 3: 2500.0}
+
+# Pixels per side of the sample index cubes and share of cloudy pixels
+SAMPLE_GRID_SIZE = 64
+SAMPLE_CLOUD_COVER = 0.2
+
+# (project_id, day) -> estimated sequestration; the sample series are
+# fixed within a day, so each project is computed once per day
+_CARBON_ESTIMATES: Dict[Tuple[int, str], float] = {}
+
 def generate_satellite_data(project_id: int, days: int = 30) -> List[Dict]:
     """Generate sample satellite data for a project"""
     data = []
     base_date = datetime.now() - timedelta(days=days)
     
-    # Base values for different projects
-    base_values = {
-        1: {"ndvi": 0.35, "ndwi": 0.12, "evi": 0.25},  # Makueni
-        2: {"ndvi": 0.45, "ndwi": 0.18, "evi": 0.32},  # Niger Delta
-        3: {"ndvi": 0.28, "ndwi": 0.15, "evi": 0.22}   # Okavango
-    }
-    
-    base = base_values.get(project_id, {"ndvi": 0.3, "ndwi": 0.1, "evi": 0.2})
+    base = SAMPLE_BASE_VALUES.get(project_id, {"ndvi": 0.3, "ndwi": 0.1, "evi": 0.2})
     
     for i in range(days):
         date = base_date + timedelta(days=i)
@@ -142,6 +171,76 @@ def generate_satellite_data(project_id: int, days: int = 30) -> List[Dict]:
     
     return data
 
+def generate_baci_series(
+    project_id: int,
+    baseline_days: int = 365,
+    revisit_days: int = 5
+) -> Tuple[Dict[str, List[Dict]], Dict[str, List[Dict]]]:
+    """Generate sample project and control index series around the project start"""
+    project = next(p for p in SAMPLE_PROJECTS if p["id"] == project_id)
+    start = datetime.strptime(project["start_date"], "%Y-%m-%d")
+    base = SAMPLE_BASE_VALUES.get(project_id, {"ndvi": 0.3, "ndwi": 0.1, "evi": 0.2})
+    rng = random.Random(project_id)  # stable figures per project
+    
+    treatment = {name.upper(): [] for name in base}
+    control = {name.upper(): [] for name in base}
+    date = start - timedelta(days=baseline_days)
+    while date <= datetime.now():
+        season = 0.05 * math.sin(2 * math.pi * date.timetuple().tm_yday / 365.25)
+        uplift = SAMPLE_UPLIFT.get(project_id, 0.0) if date >= start else 0.0
+        for name, value in base.items():
+            scale = 1.0 if name == "ndvi" else 0.5
+            shared = value + season + rng.uniform(-0.03, 0.03)
+            treatment[name.upper()].append({
+                "date": date.strftime("%Y-%m-%d"),
+                "value": round(shared + uplift * scale + rng.uniform(-0.02, 0.02), 4)
+            })
+            control[name.upper()].append({
+                "date": date.strftime("%Y-%m-%d"),
+                "value": round(shared - 0.02 + rng.uniform(-0.02, 0.02), 4)
+            })
+        date += timedelta(days=revisit_days)
+    
+    return treatment, control
+
+def generate_index_cubes(project_id: int) -> Dict[str, IndexCube]:
+    """Generate sample NDVI and EVI cubes over the project area from its index series"""
+    treatment, _ = generate_baci_series(project_id)
+    rng = np.random.default_rng(project_id)
+    shape = (SAMPLE_GRID_SIZE, SAMPLE_GRID_SIZE)
+    dates = [point["date"] for point in treatment["NDVI"]]
+    # Fixed per-pixel departures from the project mean, plus random cloud
+    texture = rng.normal(0.0, 0.05, shape)
+    clouds = rng.random((len(dates),) + shape) < SAMPLE_CLOUD_COVER
+    cubes = {}
+    for name in ("NDVI", "EVI"):
+        means = np.array([point["value"] for point in treatment[name]])
+        values = (means[:, None, None] + texture).astype(np.float32)
+        values[clouds] = np.nan
+        cubes[name] = IndexCube(name, values, dates)
+    return cubes
+
+def estimate_carbon_sequestration(project_id: int) -> float:
+    """Carbon sequestered since project start (tCO2e) from the sample index cubes"""
+    key = (project_id, datetime.now().strftime("%Y-%m-%d"))
+    if key not in _CARBON_ESTIMATES:
+        project = next(p for p in SAMPLE_PROJECTS if p["id"] == project_id)
+        cubes = generate_index_cubes(project_id)
+        series = carbon_stock_series(
+            cubes,
+            biome=SAMPLE_BIOMES[project_id],
+            pixel_area_m2=SAMPLE_AREA_HA[project_id] * 10000 / SAMPLE_GRID_SIZE ** 2,
+            workers=1
+        )
+        start = datetime.strptime(project["start_date"], "%Y-%m-%d").toordinal()
+        offsets = np.array([
+            datetime.strptime(date, "%Y-%m-%d").toordinal() - start for date in series["dates"]
+        ], dtype=float)
+        stocks = np.array(series["total"]["carbon_stock_tco2e"], dtype=float)
+        estimate = sequestration(offsets, stocks, 0.0)
+        _CARBON_ESTIMATES[key] = round(float(estimate["sequestration"][0]), 1)
+    return _CARBON_ESTIMATES[key]
+
 def generate_community_reports(project_id: int) -> List[Dict]:
     """Generate sample community reports"""
     report_types = ["Water Access", "Vegetation Health", "Infrastructure", "Community Impact"]
@@ -175,7 +274,8 @@ async def root():
             "satellite": "/satellite/{project_id}",
             "community": "/community/{project_id}",
             "impact": "/impact/{project_id}",
-            "analytics": "/analytics"
+            "analytics": "/analytics",
+            "analytics_cube": "/analytics/cube"
         }
     }
 
@@ -219,62 +319,69 @@ async def get_impact_analysis(project_id: int):
     if project_id not in [1, 2, 3]:
         raise HTTPException(status_code=404, detail="Project not found")
     
-    # Sample impact analysis data
-    impact_data = {
-        1: {
-            "treatment_effect": 0.13,
-            "confidence_interval": {"lower": 0.08, "upper": 0.18},
-            "p_value": 0.02,
-            "significance": True,
-            "resilience_score": 78.5,
-            "carbon_sequestration": 1200.0
-        },
-        2: {
-            "treatment_effect": 0.18,
-            "confidence_interval": {"lower": 0.12, "upper": 0.24},
-            "p_value": 0.01,
-            "significance": True,
-            "resilience_score": 82.3,
-            "carbon_sequestration": 2400.0
-        },
-        3: {
-            "treatment_effect": 0.11,
-            "confidence_interval": {"lower": 0.06, "upper": 0.16},
-            "p_value": 0.03,
-            "significance": True,
-            "resilience_score": 75.2,
-            "carbon_sequestration": 1800.0
-        }
-    }
+    # BACI difference-in-differences on project vs control series
+    project = next(p for p in SAMPLE_PROJECTS if p["id"] == project_id)
+    treatment, control = generate_baci_series(project_id)
+    baci = baci_analysis(treatment, control, project["start_date"], seed=project_id)
     
-    data = impact_data[project_id]
     return ImpactAnalysis(
         project_id=project_id,
-        **data
+        treatment_effect=baci["treatment_effect"],
+        confidence_interval=baci["confidence_interval"],
+        p_value=baci["p_value"],
+        significance=baci["significance"],
+        resilience_score=project["resilience_score"],
+        carbon_sequestration=estimate_carbon_sequestration(project_id)
     )
 
 @app.get("/analytics")
 async def get_analytics():
     """Get dashboard analytics"""
-    total_projects = len(SAMPLE_PROJECTS)
-    total_beneficiaries = sum(p["beneficiaries"] for p in SAMPLE_PROJECTS)
-    total_funding = sum(p["funding_amount"] for p in SAMPLE_PROJECTS)
-    avg_resilience = sum(p["resilience_score"] for p in SAMPLE_PROJECTS) / total_projects
+    totals = PORTFOLIO_CUBE.query()["totals"]
+    countries = PORTFOLIO_CUBE.query(["country"])["rows"]
+    project_types = PORTFOLIO_CUBE.query(["project_type"])["rows"]
     
     return {
-        "total_projects": total_projects,
-        "total_beneficiaries": total_beneficiaries,
-        "total_funding": total_funding,
-        "average_resilience_score": round(avg_resilience, 1),
+        "total_projects": totals["projects"],
+        "total_beneficiaries": totals["beneficiaries"],
+        "total_funding": totals["funding"],
+        "average_resilience_score": totals["resilience_score"],
         "active_projects": len([p for p in SAMPLE_PROJECTS if p["status"] == "Active"]),
-        "countries_covered": len(set(p["country"] for p in SAMPLE_PROJECTS)),
-        "project_types": list(set(p["project_type"] for p in SAMPLE_PROJECTS))
+        "countries_covered": len(countries),
+        "project_types": [row["project_type"] for row in project_types]
     }
 
+@app.get("/analytics/cube")
+async def get_analytics_cube(
+    group_by: List[str] = Query([]),
+    country: Optional[List[str]] = Query(None),
+    project_type: Optional[List[str]] = Query(None),
+    funding_source: Optional[List[str]] = Query(None),
+    month_from: Optional[str] = None,
+    month_to: Optional[str] = None
+):
+    """Slice and dice portfolio aggregates, e.g. ?group_by=country&group_by=month"""
+    filters = {
+        name: values
+        for name, values in (("country", country), ("project_type", project_type),
+                             ("funding_source", funding_source))
+        if values
+    }
+    try:
+        return PORTFOLIO_CUBE.query(group_by, filters, month_from, month_to)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.post("/community/reports")
 async def submit_community_report(report: CommunityReport):
     """Submit a new community report"""
     # In a real implementation, this would save to database
+    if report.project_id in PORTFOLIO_CUBE:
+        PORTFOLIO_CUBE.add_report({
+            "project_id": report.project_id,
+            "created_at": report.timestamp.isoformat(),
+            "is_verified": report.verified
+        })
     return {
         "message": "Report submitted successfully",
         "report_id": report.id,
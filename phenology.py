@@ -0,0 +1,346 @@
+"""
+Vectorized phenology and gap-filling engine for Orun.io
+Fits harmonic or Savitzky-Golay smoothers to many cloud-gapped index
+series at once and derives season timing and integrated greenness for
+every season year the series covers
+"""
+
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+DAYS_PER_YEAR = 365.25
+
+# Grid spacing irregular acquisitions are binned onto before Savitzky-Golay
+# smoothing (the Sentinel-2 revisit)
+SAVGOL_GRID_DAYS = 5.0
+
+# Share of a season year the smoothed curve must span for its metrics to be
+# reported; partial years at either end of the range are left out
+MIN_SEASON_COVERAGE = 0.9
+
+# phenology_metrics() outputs
+METRIC_NAMES = ['season_start', 'season_end', 'peak_time', 'peak_value', 'base_value',
+                'amplitude', 'season_length', 'integrated_greenness']
+
+
+def series_to_grid(
+    indices_data: Dict[str, List[Dict[str, Any]]]
+) -> Tuple[np.ndarray, np.ndarray, List[str]]:
+    """
+    Align get_indices series onto their union of dates
+
+    Returns:
+        Tuple of values (n_indices, n_dates) with NaN gaps, day offsets from
+        the first date, and the sorted date strings
+    """
+    dates = sorted({point['date'] for series in indices_data.values() for point in series})
+    position = {date: i for i, date in enumerate(dates)}
+    values = np.full((len(indices_data), len(dates)), np.nan)
+    for row, series in enumerate(indices_data.values()):
+        for point in series:
+            values[row, position[point['date']]] = point['value']
+    ordinals = np.array([datetime.strptime(d, '%Y-%m-%d').toordinal() for d in dates], dtype=float)
+    return values, ordinals - ordinals[0] if len(dates) else ordinals, dates
+
+
+def harmonic_design(times: np.ndarray, harmonics: int = 2, trend: bool = True) -> np.ndarray:
+    """Design matrix [1, t, cos(k w t), sin(k w t), ...] for times in days"""
+    columns = [np.ones_like(times)]
+    if trend:
+        columns.append(times / DAYS_PER_YEAR)
+    for k in range(1, harmonics + 1):
+        angle = 2 * np.pi * k * times / DAYS_PER_YEAR
+        columns.extend([np.cos(angle), np.sin(angle)])
+    return np.stack(columns, axis=1)
+
+
+def fit_harmonic(
+    values: np.ndarray,
+    times: np.ndarray,
+    harmonics: int = 2,
+    trend: bool = True,
+    ridge: float = 1e-6,
+    eval_times: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """
+    Fit a harmonic regression to every row of a gapped 2-D array at once
+
+    Each series has its own observation mask, so the normal equations differ
+    per row; they are assembled for all rows with two matrix products
+    against the shared design matrix and solved as one batched system.
+
+    Returns:
+        Dict with 'coefficients' (n, p), 'fitted' at eval_times (n, m) and
+        'observations' per row
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    design = harmonic_design(np.asarray(times, dtype=float), harmonics, trend)
+    n_params = design.shape[1]
+
+    mask = ~np.isnan(values)
+    weights = mask.astype(float)
+    filled = np.where(mask, values, 0.0)
+
+    # X^T diag(m_i) X for every row i via one (n x T) @ (T x p^2) product
+    outer = (design[:, :, None] * design[:, None, :]).reshape(len(times), -1)
+    gram = (weights @ outer).reshape(-1, n_params, n_params)
+    gram += ridge * np.eye(n_params)
+    rhs = filled @ design
+
+    observations = mask.sum(axis=1)
+    solvable = observations >= n_params
+    coefficients = np.full((values.shape[0], n_params), np.nan)
+    if solvable.any():
+        coefficients[solvable] = np.linalg.solve(gram[solvable], rhs[solvable][:, :, None])[:, :, 0]
+
+    eval_design = design if eval_times is None else harmonic_design(
+        np.asarray(eval_times, dtype=float), harmonics, trend
+    )
+    return {
+        'coefficients': coefficients,
+        'fitted': coefficients @ eval_design.T,
+        'observations': observations
+    }
+
+
+def savgol_smooth(
+    values: np.ndarray,
+    window: int = 7,
+    order: int = 2,
+    min_points: Optional[int] = None
+) -> np.ndarray:
+    """
+    Gap-aware Savitzky-Golay smoothing of every row on a regular sample grid
+
+    Each output sample is a local polynomial fitted by weighted least squares
+    to the observed samples in its window. The local moments are sliding
+    dot products with fixed kernels u^j, so all rows and positions are
+    solved together as one batch of small (order+1) systems. Samples whose
+    window holds fewer than min_points observations are left NaN.
+    """
+    if window % 2 == 0 or window <= order:
+        raise ValueError("window must be odd and larger than order")
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    min_points = order + 1 if min_points is None else min_points
+    half = window // 2
+
+    mask = ~np.isnan(values)
+    padded_values = np.pad(np.where(mask, values, 0.0), ((0, 0), (half, half)))
+    padded_mask = np.pad(mask.astype(float), ((0, 0), (half, half)))
+    value_windows = np.lib.stride_tricks.sliding_window_view(padded_values, window, axis=1)
+    mask_windows = np.lib.stride_tricks.sliding_window_view(padded_mask, window, axis=1)
+
+    offsets = np.arange(-half, half + 1, dtype=float)
+    powers = offsets[None, :] ** np.arange(2 * order + 1)[:, None]      # (2d+1, w)
+    moments = np.einsum('ntw,jw->ntj', mask_windows, powers)             # sum m u^j
+    weighted = np.einsum('ntw,jw->ntj', value_windows, powers[:order + 1])  # sum m y u^j
+
+    index = np.arange(order + 1)
+    gram = moments[..., index[:, None] + index[None, :]]
+    counts = mask_windows.sum(axis=2)
+    usable = counts >= min_points
+    gram[~usable] = np.eye(order + 1)
+
+    coefficients = np.linalg.solve(gram, weighted[..., None])[..., 0]
+    smoothed = coefficients[..., 0]                                      # polynomial at u = 0
+    smoothed[~usable] = np.nan
+    return smoothed
+
+
+def regular_grid(
+    values: np.ndarray,
+    times: np.ndarray,
+    step_days: float = SAVGOL_GRID_DAYS
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Bin irregularly sampled series onto a regular time grid
+
+    Each observation goes to the nearest grid point; several observations
+    in one bin are averaged and empty bins are NaN.
+
+    Returns:
+        Tuple of grid values (n_series, n_grid), grid times and the grid
+        position of each input time
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    times = np.asarray(times, dtype=float)
+    positions = np.rint((times - times.min()) / step_days).astype(np.int64)
+    n_grid = int(positions.max()) + 1
+    observed = ~np.isnan(values)
+    sums = np.zeros((values.shape[0], n_grid))
+    counts = np.zeros((values.shape[0], n_grid))
+    np.add.at(sums, (slice(None), positions), np.where(observed, values, 0.0))
+    np.add.at(counts, (slice(None), positions), observed)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        grid_values = sums / counts
+    return grid_values, times.min() + step_days * np.arange(n_grid), positions
+
+
+def interpolate_gaps(curves: np.ndarray, times: np.ndarray) -> np.ndarray:
+    """
+    Linearly interpolate NaN samples of each row; rows with under two
+    samples stay as they are
+
+    Every gap is blended from the previous and next observed samples of its
+    row, found for all rows at once with running max/min over sample
+    positions; leading and trailing gaps take the nearest observed value,
+    as np.interp does.
+    """
+    curves = np.array(curves, dtype=float, ndmin=2)
+    times = np.asarray(times, dtype=float)
+    observed = ~np.isnan(curves)
+    n_samples = curves.shape[1]
+    positions = np.arange(n_samples)
+    previous = np.maximum.accumulate(np.where(observed, positions, -1), axis=1)
+    following = np.minimum.accumulate(np.where(observed, positions, n_samples)[:, ::-1], axis=1)[:, ::-1]
+    previous = np.where(previous < 0, following, previous)
+    following = np.where(following >= n_samples, previous, following)
+    # Rows without observations keep out-of-range positions; clip to gather safely
+    previous = np.clip(previous, 0, n_samples - 1)
+    following = np.clip(following, 0, n_samples - 1)
+
+    rows = np.arange(curves.shape[0])[:, None]
+    start, stop = times[previous], times[following]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        fraction = np.where(stop > start, (times - start) / (stop - start), 0.0)
+    filled = curves[rows, previous] + fraction * (curves[rows, following] - curves[rows, previous])
+    gaps = ~observed & (observed.sum(axis=1) >= 2)[:, None]
+    return np.where(gaps, filled, curves)
+
+
+def season_windows(
+    times: np.ndarray,
+    origin: float = 0.0,
+    length: float = DAYS_PER_YEAR
+) -> np.ndarray:
+    """
+    (start, end) day offsets of the season years [origin + k * length,
+    origin + (k + 1) * length) that times span by at least MIN_SEASON_COVERAGE
+    """
+    times = np.asarray(times, dtype=float)
+    first = np.floor((times.min() - origin) / length)
+    last = np.floor((times.max() - origin) / length)
+    starts = origin + length * np.arange(first, last + 1)
+    covered = np.minimum(starts + length, times.max()) - np.maximum(starts, times.min())
+    starts = starts[covered >= MIN_SEASON_COVERAGE * length]
+    return np.stack([starts, starts + length], axis=1) if len(starts) else np.empty((0, 2))
+
+
+def phenology_metrics(
+    curves: np.ndarray,
+    times: np.ndarray,
+    threshold: float = 0.5
+) -> Dict[str, np.ndarray]:
+    """
+    Season metrics from smooth single-season curves sampled at times
+
+    Season start and end are where the curve first rises above, and last
+    stays above, base + threshold * amplitude around its peak. Integrated
+    greenness is the area above base between start and end, in index-days.
+    """
+    curves = np.atleast_2d(curves)
+    times = np.asarray(times, dtype=float)
+    valid = ~np.all(np.isnan(curves), axis=1)
+    safe = np.where(np.isnan(curves), -np.inf, curves)
+
+    peak_idx = np.argmax(safe, axis=1)
+    rows = np.arange(curves.shape[0])
+    peak_value = curves[rows, peak_idx]
+    base = np.nanmin(np.where(valid[:, None], curves, 0.0), axis=1)
+    amplitude = peak_value - base
+    level = base + threshold * amplitude
+
+    above = safe >= level[:, None]
+    positions = np.arange(curves.shape[1])
+    # Contiguous run above the threshold containing the peak
+    below_before = ~above & (positions[None, :] < peak_idx[:, None])
+    below_after = ~above & (positions[None, :] > peak_idx[:, None])
+    start_idx = np.where(below_before.any(axis=1),
+                         curves.shape[1] - 1 - np.argmax(below_before[:, ::-1], axis=1) + 1, 0)
+    end_idx = np.where(below_after.any(axis=1),
+                       np.argmax(below_after, axis=1) - 1, curves.shape[1] - 1)
+
+    in_season = (positions[None, :] >= start_idx[:, None]) & (positions[None, :] <= end_idx[:, None])
+    excess = np.where(in_season, np.nan_to_num(curves - base[:, None]), 0.0)
+    integrated = np.trapezoid(excess, times, axis=1) if hasattr(np, 'trapezoid') \
+        else np.trapz(excess, times, axis=1)
+
+    metrics = {
+        'season_start': times[start_idx],
+        'season_end': times[end_idx],
+        'peak_time': times[peak_idx],
+        'peak_value': peak_value,
+        'base_value': base,
+        'amplitude': amplitude,
+        'season_length': times[end_idx] - times[start_idx],
+        'integrated_greenness': integrated
+    }
+    for name in metrics:
+        metrics[name] = np.where(valid, metrics[name], np.nan)
+    return metrics
+
+
+def gap_fill_and_phenology(
+    values: np.ndarray,
+    times: np.ndarray,
+    method: str = 'harmonic',
+    harmonics: int = 2,
+    window: int = 7,
+    order: int = 2,
+    step_days: float = 1.0,
+    threshold: float = 0.5,
+    season_origin: float = 0.0,
+    grid_days: float = SAVGOL_GRID_DAYS
+) -> Dict[str, np.ndarray]:
+    """
+    Gap-fill many index series and derive per-season phenology metrics in one batch
+
+    Args:
+        values (np.ndarray): (n_series, n_times) index values, NaN for gaps
+        times (np.ndarray): Shared sample times in days
+        method (str): 'harmonic' or 'savgol'; savgol first bins the samples
+            onto a regular grid_days grid
+        step_days (float): Resolution of the harmonic curve used for metrics
+        season_origin (float): Day offset where a season year starts, e.g.
+            the offset of 1 January; metrics are taken per season year
+        grid_days (float): Savitzky-Golay grid spacing; window counts grid steps
+
+    Returns:
+        Dict with 'filled' (observations kept, gaps filled), 'smoothed',
+        'seasons' ((n_seasons, 2) season-year bounds) and the
+        phenology_metrics() arrays, each (n_series, n_seasons)
+    """
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    times = np.asarray(times, dtype=float)
+
+    if method == 'harmonic':
+        curve_times = np.arange(times.min(), times.max() + step_days, step_days)
+        fit = fit_harmonic(values, times, harmonics=harmonics, eval_times=np.concatenate([times, curve_times]))
+        smoothed = fit['fitted'][:, :len(times)]
+        curves = fit['fitted'][:, len(times):]
+    elif method == 'savgol':
+        grid_values, curve_times, positions = regular_grid(values, times, grid_days)
+        # Windows with too few observations stay NaN; bridge them so a
+        # cloudy spell does not cut a season short
+        curves = interpolate_gaps(savgol_smooth(grid_values, window, order), curve_times)
+        smoothed = curves[:, positions]
+    else:
+        raise ValueError(f"Unknown smoothing method {method}")
+
+    result = {
+        'filled': np.where(np.isnan(values), smoothed, values),
+        'smoothed': smoothed
+    }
+
+    # A multi-year curve has one season per year; each is measured on its own
+    seasons = season_windows(curve_times, season_origin)
+    per_season = []
+    for start, end in seasons:
+        in_season = (curve_times >= start) & (curve_times < end)
+        per_season.append(phenology_metrics(curves[:, in_season], curve_times[in_season], threshold))
+    result['seasons'] = seasons
+    for name in METRIC_NAMES:
+        result[name] = np.stack([metrics[name] for metrics in per_season], axis=1) \
+            if per_season else np.empty((values.shape[0], 0))
+    return result
@@ -0,0 +1,379 @@
+"""
+Portfolio aggregation cube for Orun.io
+Keeps beneficiaries, funding, community reports, verified reports and
+resilience sums per (country, project type, funding source, month) cell
+in flat NumPy arrays, maintained incrementally as projects and reports
+change, and answers slice/dice queries with one bincount per measure
+"""
+
+from typing import Dict, Iterable, List, Optional, Any, Sequence
+
+import numpy as np
+
+DIMENSIONS = ['country', 'project_type', 'funding_source', 'month']
+CATEGORIES = DIMENSIONS[:3]
+
+# Stored per cell; resilience is kept as sum and count so means roll up exactly
+MEASURES = ['projects', 'beneficiaries', 'funding', 'reports', 'verified_reports',
+            'resilience_sum', 'resilience_count']
+_PROJECTS, _REPORTS, _VERIFIED, _RESILIENCE_SUM, _RESILIENCE_COUNT = (
+    MEASURES.index(name) for name in
+    ('projects', 'reports', 'verified_reports', 'resilience_sum', 'resilience_count')
+)
+_PROJECT_MEASURES = [MEASURES.index(name) for name in
+                     ('projects', 'beneficiaries', 'funding', 'resilience_sum', 'resilience_count')]
+
+# Each dimension's code takes 15 bits of a cell's int64 key, month last
+# (year * 12 + month - 1), so a cell is one integer and a slice is a mask
+DIMENSION_BITS = 15
+_SHIFTS = {name: DIMENSION_BITS * (len(DIMENSIONS) - 1 - i) for i, name in enumerate(DIMENSIONS)}
+_FIELD = (1 << DIMENSION_BITS) - 1
+
+INITIAL_CAPACITY = 1024
+
+# Largest group-by space rolled up with a dense bincount; bigger ones
+# (e.g. every dimension at once) group the present keys with np.unique
+DENSE_GROUP_LIMIT = 1 << 20
+
+
+def month_ordinal(value: str) -> int:
+    """'YYYY-MM', an ISO date or an ISO timestamp -> year * 12 + month - 1"""
+    try:
+        year, month = int(value[:4]), int(value[5:7])
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid month: {value!r}")
+    if not 1 <= month <= 12:
+        raise ValueError(f"Invalid month: {value!r}")
+    return year * 12 + month - 1
+
+
+def month_label(ordinal: int) -> str:
+    return f"{ordinal // 12:04d}-{ordinal % 12 + 1:02d}"
+
+
+class CellTable:
+    """Cells keyed by packed dimension codes with measure sums, grown in place"""
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self._rows: Dict[int, int] = {}
+        self._keys = np.zeros(capacity, dtype=np.int64)
+        # Measure-major so each measure's bincount reads contiguous memory
+        self._values = np.zeros((len(MEASURES), capacity))
+        self.size = 0
+
+    @property
+    def keys(self) -> np.ndarray:
+        return self._keys[:self.size]
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._values[:, :self.size]
+
+    def apply(self, keys: np.ndarray, deltas: np.ndarray):
+        """Add (n, n_measures) delta rows into their cells, creating cells as needed"""
+        keys = np.asarray(keys, dtype=np.int64)
+        if keys.size == 0:
+            return
+        unique, inverse = np.unique(keys, return_inverse=True)
+        sums = np.stack([np.bincount(inverse, deltas[:, m], len(unique)) for m in range(len(MEASURES))])
+        rows = np.empty(len(unique), dtype=np.int64)
+        for i, key in enumerate(unique.tolist()):
+            row = self._rows.get(key)
+            if row is None:
+                row = self._new_row(key)
+            rows[i] = row
+        self._values[:, rows] += sums
+
+    def _new_row(self, key: int) -> int:
+        if self.size == len(self._keys):
+            self._keys = np.concatenate([self._keys, np.zeros_like(self._keys)])
+            self._values = np.concatenate([self._values, np.zeros_like(self._values)], axis=1)
+        row = self.size
+        self._keys[row] = key
+        self._rows[key] = row
+        self.size += 1
+        return row
+
+
+class PortfolioCube:
+    """Sparse aggregation cube over the project portfolio"""
+
+    def __init__(self, capacity: int = INITIAL_CAPACITY):
+        self._codes: Dict[str, Dict[str, int]] = {name: {} for name in CATEGORIES}
+        self._labels: Dict[str, List[str]] = {name: [] for name in CATEGORIES}
+        self._cells = CellTable(capacity)
+        # The same measures with month rolled up, for queries that don't
+        # touch month: far fewer cells to scan than the monthly table
+        self._rollup = CellTable()
+        # project_id -> (category key bits, start month, project measure deltas)
+        self._projects: Dict[int, tuple] = {}
+        # project_id -> report month -> [reports, verified reports]
+        self._reports: Dict[int, Dict[int, List[float]]] = {}
+
+    def __contains__(self, project_id: int) -> bool:
+        return project_id in self._projects
+
+    # Maintenance --------------------------------------------------------------
+
+    def _code(self, dimension: str, value: Optional[str]) -> int:
+        value = value or 'Unknown'
+        codes = self._codes[dimension]
+        if value not in codes:
+            if len(codes) > _FIELD:
+                raise ValueError(f"Too many distinct {dimension} values")
+            codes[value] = len(codes)
+            self._labels[dimension].append(value)
+        return codes[value]
+
+    def _category_bits(self, project: Dict[str, Any]) -> int:
+        return sum(self._code(name, project.get(name)) << _SHIFTS[name] for name in CATEGORIES)
+
+    def _apply(self, keys: np.ndarray, deltas: np.ndarray):
+        keys = np.asarray(keys, dtype=np.int64)
+        self._cells.apply(keys, deltas)
+        self._rollup.apply(keys & ~np.int64(_FIELD), deltas)
+
+    def _project_deltas(self, project: Dict[str, Any], resilience_score: Optional[float]) -> np.ndarray:
+        deltas = np.zeros(len(MEASURES))
+        scored = resilience_score is not None
+        deltas[_PROJECT_MEASURES] = (
+            1.0, project.get('beneficiaries') or 0, project.get('funding') or 0,
+            resilience_score if scored else 0.0, float(scored)
+        )
+        return deltas
+
+    def add_projects(
+        self,
+        projects: Iterable[Dict[str, Any]],
+        resilience: Optional[Dict[int, float]] = None
+    ):
+        """
+        Add projects in bulk
+
+        Args:
+            projects: Dicts with 'id', 'country', 'project_type',
+                'funding_source', 'start_date' and optional 'beneficiaries'
+                and 'funding'
+            resilience: project_id -> current resilience score
+        """
+        resilience = resilience or {}
+        keys, deltas = [], []
+        for project in projects:
+            if project['id'] in self._projects:
+                raise ValueError(f"Project {project['id']} is already in the cube")
+            bits = self._category_bits(project)
+            month = month_ordinal(project['start_date'])
+            delta = self._project_deltas(project, resilience.get(project['id']))
+            self._projects[project['id']] = (bits, month, delta)
+            keys.append(bits | month)
+            deltas.append(delta)
+        if keys:
+            self._apply(np.array(keys), np.array(deltas))
+
+    def add_project(self, project: Dict[str, Any], resilience_score: Optional[float] = None):
+        self.add_projects([project], {project['id']: resilience_score})
+
+    def remove_project(self, project_id: int):
+        """Withdraw a project and its reports"""
+        bits, month, delta = self._projects.pop(project_id)
+        reports = self._reports.pop(project_id, {})
+        self._apply(np.array([bits | month]), -delta[None, :])
+        self._apply_report_counts({(project_id, report_month): [-reports_, -verified]
+                                   for report_month, (reports_, verified) in reports.items()}, bits)
+
+    def update_project(self, project: Dict[str, Any], resilience_score: Optional[float] = None):
+        """
+        Replace a project's attributes; its reports move with it and it keeps
+        its stored resilience score unless a new one is given
+        """
+        _, _, delta = self._projects[project['id']]
+        if resilience_score is None and delta[_RESILIENCE_COUNT]:
+            resilience_score = float(delta[_RESILIENCE_SUM])
+        reports = self._reports.get(project['id'], {})
+        self.remove_project(project['id'])
+        self.add_project(project, resilience_score)
+        self._add_report_counts({(project['id'], month): counts for month, counts in reports.items()})
+
+    def set_resilience(self, project_id: int, resilience_score: Optional[float]):
+        bits, month, delta = self._projects[project_id]
+        updated = delta.copy()
+        scored = resilience_score is not None
+        updated[_RESILIENCE_SUM] = resilience_score if scored else 0.0
+        updated[_RESILIENCE_COUNT] = float(scored)
+        self._projects[project_id] = (bits, month, updated)
+        self._apply(np.array([bits | month]), (updated - delta)[None, :])
+
+    def _apply_report_counts(self, counts: Dict[tuple, List[float]], bits: Optional[int] = None):
+        """Apply (project_id, month) -> [reports, verified] deltas to the cells"""
+        if not counts:
+            return
+        keys = np.array([
+            (self._projects[project_id][0] if bits is None else bits) | month
+            for project_id, month in counts
+        ])
+        deltas = np.zeros((len(counts), len(MEASURES)))
+        deltas[:, [_REPORTS, _VERIFIED]] = list(counts.values())
+        self._apply(keys, deltas)
+
+    def _add_report_counts(self, counts: Dict[tuple, List[float]]):
+        # Checked up front so an unknown project leaves the cube untouched
+        unknown = sorted({project_id for project_id, _ in counts} - self._projects.keys())
+        if unknown:
+            raise KeyError(f"Projects not in the cube: {unknown}")
+        for (project_id, month), (reports, verified) in counts.items():
+            months = self._reports.setdefault(project_id, {})
+            previous = months.get(month, (0.0, 0.0))
+            months[month] = [previous[0] + reports, previous[1] + verified]
+        self._apply_report_counts(counts)
+
+    def add_reports(self, reports: Iterable[Dict[str, Any]]):
+        """Add community reports ('project_id', 'created_at', 'is_verified') in bulk"""
+        counts: Dict[tuple, List[float]] = {}
+        for report in reports:
+            key = (report['project_id'], month_ordinal(report['created_at']))
+            total = counts.setdefault(key, [0.0, 0.0])
+            total[0] += 1
+            total[1] += bool(report.get('is_verified'))
+        self._add_report_counts(counts)
+
+    def add_report(self, report: Dict[str, Any]):
+        self.add_reports([report])
+
+    def verify_report(self, report: Dict[str, Any]):
+        """Count a previously added, unverified report as verified"""
+        self._add_report_counts({(report['project_id'], month_ordinal(report['created_at'])): [0.0, 1.0]})
+
+    # Queries ------------------------------------------------------------------
+
+    def _filter_mask(self, keys: np.ndarray, filters: Dict[str, Sequence[str]],
+                     month_from: Optional[str], month_to: Optional[str]) -> Optional[np.ndarray]:
+        """Cells passing the filters, or None when nothing is filtered"""
+        mask = None
+        for name, wanted in filters.items():
+            if name not in CATEGORIES:
+                raise ValueError(f"Unknown filter dimension: {name}")
+            accepted = np.zeros(len(self._labels[name]) + 1, dtype=bool)
+            accepted[[self._codes[name][value] for value in wanted if value in self._codes[name]]] = True
+            selected = accepted[(keys >> _SHIFTS[name]) & _FIELD]
+            mask = selected if mask is None else mask & selected
+        if month_from or month_to:
+            months = keys & _FIELD
+            low = month_ordinal(month_from) if month_from else 0
+            high = month_ordinal(month_to) if month_to else _FIELD
+            selected = (months >= low) & (months <= high)
+            mask = selected if mask is None else mask & selected
+        return mask
+
+    @staticmethod
+    def _measure_rows(sums: np.ndarray) -> List[Dict[str, Any]]:
+        """Output measures for (n_groups, n_measures) sums, formatted in bulk"""
+        counts = np.rint(sums[:, [_PROJECTS, MEASURES.index('beneficiaries'), _REPORTS, _VERIFIED]])
+        funding = np.round(sums[:, MEASURES.index('funding')], 2)
+        scored = sums[:, _RESILIENCE_COUNT] > 0
+        with np.errstate(invalid='ignore', divide='ignore'):
+            resilience = np.round(sums[:, _RESILIENCE_SUM] / sums[:, _RESILIENCE_COUNT], 1)
+        return [
+            {
+                'projects': projects, 'beneficiaries': beneficiaries, 'funding': funds,
+                'reports': reports, 'verified_reports': verified,
+                'resilience_score': score if has_score else None
+            }
+            for (projects, beneficiaries, reports, verified), funds, score, has_score in zip(
+                counts.astype(np.int64).tolist(), funding.tolist(), resilience.tolist(), scored.tolist()
+            )
+        ]
+
+    def query(
+        self,
+        group_by: Sequence[str] = (),
+        filters: Optional[Dict[str, Sequence[str]]] = None,
+        month_from: Optional[str] = None,
+        month_to: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Slice and dice the cube
+
+        Cells passing the filters get a group index from the codes of the
+        group_by dimensions unpacked from their keys; the measures of each
+        group are then one bincount each.
+
+        Args:
+            group_by: DIMENSIONS to break down by (none for totals)
+            filters: Category dimension -> accepted values
+            month_from, month_to: Inclusive 'YYYY-MM' bounds on the month
+
+        Returns:
+            Dict with 'group_by', 'rows' (dimension labels plus measures,
+            ordered by dimension codes, months ascending) and 'totals'
+        """
+        unknown = [name for name in group_by if name not in DIMENSIONS]
+        if unknown:
+            raise ValueError(f"Unknown group_by dimension: {', '.join(unknown)}")
+        table = self._cells if 'month' in group_by or month_from or month_to else self._rollup
+        keys, values = table.keys, table.values
+        mask = self._filter_mask(keys, filters or {}, month_from, month_to)
+        if mask is not None:
+            selected = np.flatnonzero(mask)
+            keys, values = keys[selected], values.take(selected, axis=1)
+
+        # Dense group index over the grouped dimensions' codes
+        sizes, codes, month_offset = [], [], 0
+        for name in group_by:
+            code = (keys >> _SHIFTS[name]) & _FIELD
+            if name == 'month':
+                month_offset = int(code.min()) if code.size else 0
+                code = code - month_offset
+                sizes.append(int(code.max()) + 1 if code.size else 1)
+            else:
+                sizes.append(len(self._labels[name]))
+            codes.append(code)
+        index = np.zeros(len(keys), dtype=np.int64)
+        for code, size in zip(codes, sizes):
+            index = index * size + code
+
+        n_groups = int(np.prod(sizes, dtype=np.int64))
+        if not group_by:
+            # Plain totals: a reduction beats bincount into a single bin
+            groups = np.zeros(1, dtype=np.int64)
+            sums = values.sum(axis=1)[None, :]
+        elif n_groups <= DENSE_GROUP_LIMIT:
+            groups = np.arange(n_groups)
+            sums = np.stack([np.bincount(index, column, n_groups) for column in values], axis=1)
+        else:
+            groups, inverse = np.unique(index, return_inverse=True)
+            sums = np.stack([np.bincount(inverse, column, len(groups)) for column in values], axis=1)
+        totals = sums.sum(axis=0)
+        # Empty groups, and cells whose deltas cancelled out, are left out
+        present = np.flatnonzero((sums[:, _PROJECTS] != 0) | (sums[:, _REPORTS] != 0))
+
+        labels = {}
+        remainder = groups[present]
+        for name, size in reversed(list(zip(group_by, sizes))):
+            remainder, code = np.divmod(remainder, size)
+            if name == 'month':
+                labels[name] = [month_label(value + month_offset) for value in code.tolist()]
+            else:
+                labels[name] = [self._labels[name][value] for value in code.tolist()]
+        rows = [
+            dict({name: labels[name][i] for name in group_by}, **measures)
+            for i, measures in enumerate(self._measure_rows(sums[present]))
+        ]
+        return {'group_by': list(group_by), 'rows': rows, 'totals': self._measure_rows(totals[None, :])[0]}
+
+    def dimension_values(self) -> Dict[str, List[str]]:
+        """Known values of each category dimension, e.g. for filter pickers"""
+        return {name: list(labels) for name, labels in self._labels.items()}
+
+
+def build_cube(
+    projects: Iterable[Dict[str, Any]],
+    reports: Iterable[Dict[str, Any]] = (),
+    resilience: Optional[Dict[int, float]] = None
+) -> PortfolioCube:
+    """Cube over a portfolio; reports of projects not in it are skipped"""
+    projects = list(projects)
+    cube = PortfolioCube(max(INITIAL_CAPACITY, 2 * len(projects)))
+    cube.add_projects(projects, resilience)
+    known = {project['id'] for project in projects}
+    cube.add_reports(report for report in reports if report['project_id'] in known)
+    return cube
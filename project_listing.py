@@ -0,0 +1,156 @@
+"""
+Project listing queries for Orun.io
+Keyset (cursor) pagination over projects by id with indexed filters and
+column projection, so a page costs the same wherever it falls in the
+portfolio and map views load only the columns they draw
+"""
+
+import base64
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Float, Index, cast, func
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from models import Project
+
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Equality filters; each gets a (column, id) index so a filtered page is
+# one index range scan in id order
+FILTER_COLUMNS = ['country', 'project_type', 'status']
+
+# The geometry is never serialized as is; 'coordinates' gives its centroid
+GEOMETRY_COLUMN = 'project_area'
+COMPUTED_FIELDS = ['coordinates']
+
+# SRID of stored project areas and of bbox envelopes
+SRID = 4326
+
+PROJECT_INDEXES = [
+    Index(f'ix_projects_{name}_id', Project.__table__.c[name], Project.__table__.c.id)
+    for name in FILTER_COLUMNS if name in Project.__table__.c
+]
+
+
+def ensure_indexes(engine: Engine):
+    """Create the listing indexes on an existing projects table (create_all skips them there)"""
+    for index in PROJECT_INDEXES:
+        index.create(bind=engine, checkfirst=True)
+
+
+def project_fields() -> List[str]:
+    """Fields a client may request: mapped columns plus computed fields"""
+    return [name for name in Project.__table__.c.keys() if name != GEOMETRY_COLUMN] + COMPUTED_FIELDS
+
+
+def encode_cursor(last_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps({'id': last_id}).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> int:
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        return int(json.loads(base64.urlsafe_b64decode(padded.encode()))['id'])
+    except (ValueError, KeyError, TypeError):
+        raise ValueError("Invalid cursor")
+
+
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """Comma-separated field list -> validated names (id always included), None for full objects"""
+    if not fields:
+        return None
+    requested = [name.strip() for name in fields.split(',') if name.strip()]
+    allowed = project_fields()
+    unknown = [name for name in requested if name not in allowed]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return ['id'] + [name for name in dict.fromkeys(requested) if name != 'id']
+
+
+def parse_bbox(bbox: Optional[str]) -> Optional[Tuple[float, float, float, float]]:
+    """'min_lon,min_lat,max_lon,max_lat' -> tuple"""
+    if not bbox:
+        return None
+    try:
+        min_lon, min_lat, max_lon, max_lat = (float(value) for value in bbox.split(','))
+    except ValueError:
+        raise ValueError("bbox must be min_lon,min_lat,max_lon,max_lat")
+    if min_lon > max_lon or min_lat > max_lat:
+        raise ValueError("bbox minimum exceeds maximum")
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _columns(fields: Sequence[str]) -> list:
+    columns = []
+    for name in fields:
+        if name == 'coordinates':
+            centroid = func.ST_Centroid(getattr(Project, GEOMETRY_COLUMN))
+            columns.append(cast(func.ST_X(centroid), Float).label('longitude'))
+            columns.append(cast(func.ST_Y(centroid), Float).label('latitude'))
+        else:
+            columns.append(getattr(Project, name))
+    return columns
+
+
+def _projected(row: Any, fields: Sequence[str]) -> Dict[str, Any]:
+    values = row._mapping
+    item = {}
+    for name in fields:
+        if name == 'coordinates':
+            longitude, latitude = values['longitude'], values['latitude']
+            item[name] = [longitude, latitude] if longitude is not None else None
+        else:
+            item[name] = values[name]
+    return item
+
+
+def list_projects(
+    db: Session,
+    cursor: Optional[str] = None,
+    limit: int = DEFAULT_PAGE_SIZE,
+    filters: Optional[Dict[str, Sequence[str]]] = None,
+    bbox: Optional[Tuple[float, float, float, float]] = None,
+    fields: Optional[Sequence[str]] = None
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    One page of projects in id order
+
+    Args:
+        cursor (str): next_cursor of the previous page; None for the first
+        limit (int): Page size, capped at MAX_PAGE_SIZE
+        filters: FILTER_COLUMNS name -> accepted values
+        bbox: (min_lon, min_lat, max_lon, max_lat); projects whose area
+            intersects it, via the area's spatial index
+        fields: Validated projection from parse_fields(); only these columns
+            are loaded and items are dicts. None loads full Project objects.
+
+    Returns:
+        (items, next_cursor), next_cursor None on the last page
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    query = db.query(*_columns(fields)) if fields else db.query(Project)
+    for name, values in (filters or {}).items():
+        if not values:
+            continue
+        if name not in FILTER_COLUMNS or name not in Project.__table__.c:
+            raise ValueError(f"Unknown filter: {name}")
+        query = query.filter(getattr(Project, name).in_(list(values)))
+    if bbox is not None:
+        envelope = func.ST_MakeEnvelope(*bbox, SRID)
+        query = query.filter(func.ST_Intersects(getattr(Project, GEOMETRY_COLUMN), envelope))
+    if cursor:
+        query = query.filter(Project.id > decode_cursor(cursor))
+
+    # One extra row tells whether another page follows without a count query
+    rows = query.order_by(Project.id).limit(limit + 1).all()
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if fields:
+        items = [_projected(row, fields) for row in rows]
+        last_id = items[-1]['id'] if items else None
+    else:
+        items = rows
+        last_id = rows[-1].id if rows else None
+    return items, encode_cursor(last_id) if more else None
@@ -0,0 +1,217 @@
+"""
+Per-pixel raster products for Orun.io
+Computes trend-slope and latest-anomaly rasters from index cubes in spatial
+chunks and stores them as tiled, compressed arrays for auditor map views
+"""
+
+import json
+import os
+import numpy as np
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Tuple
+
+from trend_engine import ols_slopes
+
+DEFAULT_TILE_SIZE = 256
+PRODUCTS_DIR = os.getenv('RASTER_PRODUCTS_DIR', os.path.join('data', 'raster_products'))
+
+METERS_PER_DEGREE = 111320.0
+SQUARE_METERS_PER_HECTARE = 10000.0
+
+
+class IndexCube:
+    """Time stack of one spectral index over a project area"""
+
+    def __init__(
+        self,
+        index_name: str,
+        values: np.ndarray,
+        dates: List[str],
+        transform: Optional[Dict[str, float]] = None
+    ):
+        """
+        Wrap an index cube
+
+        Args:
+            index_name (str): Index name, e.g. 'NDVI'
+            values (np.ndarray): Array of shape (n_dates, height, width); NaN
+                marks cloud or no-data pixels. May be a memory-mapped array.
+            dates (List[str]): Acquisition dates ('%Y-%m-%d'), one per slice
+            transform (Dict[str, float]): Pixel grid origin and size
+                ('x0', 'y0', 'dx', 'dy') in geographic coordinates
+        """
+        if values.ndim != 3 or values.shape[0] != len(dates):
+            raise ValueError("values must have shape (len(dates), height, width)")
+        self.index_name = index_name
+        self.values = values
+        self.dates = dates
+        self.transform = transform or {}
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.values.shape[1], self.values.shape[2]
+
+    def day_offsets(self) -> np.ndarray:
+        """Acquisition times in days since the first date"""
+        ordinals = np.array([
+            datetime.strptime(date, '%Y-%m-%d').toordinal() for date in self.dates
+        ], dtype=float)
+        return ordinals - ordinals[0] if len(ordinals) else ordinals
+
+
+def iter_windows(shape: Tuple[int, int], tile_size: int = DEFAULT_TILE_SIZE):
+    """Yield (tile_row, tile_col, row_slice, col_slice) covering a raster"""
+    height, width = shape
+    for tile_row, row in enumerate(range(0, height, tile_size)):
+        for tile_col, col in enumerate(range(0, width, tile_size)):
+            yield (tile_row, tile_col,
+                   slice(row, min(row + tile_size, height)),
+                   slice(col, min(col + tile_size, width)))
+
+
+def row_pixel_areas(transform: Optional[Dict[str, float]], rows: slice,
+                    geographic: bool = True, pixel_area_m2: float = 100.0) -> np.ndarray:
+    """Pixel area in hectares for each row of a window"""
+    n_rows = rows.stop - rows.start
+    if transform is None:
+        return np.full(n_rows, pixel_area_m2 / SQUARE_METERS_PER_HECTARE)
+    area = abs(transform['dx'] * transform['dy'])
+    if geographic:
+        lat = transform['y0'] + (np.arange(rows.start, rows.stop) + 0.5) * transform['dy']
+        area = area * METERS_PER_DEGREE ** 2 * np.cos(np.radians(lat))
+    return np.broadcast_to(area / SQUARE_METERS_PER_HECTARE, (n_rows,)).astype(float)
+
+
+class TiledRasterStore:
+    """Directory of compressed tiles plus a JSON manifest for one raster"""
+
+    MANIFEST = 'manifest.json'
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def _tile_path(self, tile_row: int, tile_col: int) -> str:
+        return os.path.join(self.path, f'tile_{tile_row}_{tile_col}.npz')
+
+    def create(
+        self,
+        shape: Tuple[int, int],
+        tile_size: int = DEFAULT_TILE_SIZE,
+        metadata: Optional[Dict[str, Any]] = None
+    ):
+        """Create an empty store, replacing any previous manifest"""
+        os.makedirs(self.path, exist_ok=True)
+        manifest = {
+            'shape': list(shape),
+            'tile_size': tile_size,
+            'dtype': 'float32',
+            'metadata': metadata or {},
+            'created_at': datetime.now().isoformat()
+        }
+        with open(os.path.join(self.path, self.MANIFEST), 'w') as f:
+            json.dump(manifest, f, indent=2)
+
+    def manifest(self) -> Dict[str, Any]:
+        with open(os.path.join(self.path, self.MANIFEST)) as f:
+            return json.load(f)
+
+    def write_tile(self, tile_row: int, tile_col: int, data: np.ndarray):
+        """Write one tile as a compressed float32 array"""
+        np.savez_compressed(self._tile_path(tile_row, tile_col), data=data.astype(np.float32))
+
+    def read_tile(self, tile_row: int, tile_col: int) -> np.ndarray:
+        with np.load(self._tile_path(tile_row, tile_col)) as tile:
+            return tile['data']
+
+    def read(self, window: Optional[Tuple[slice, slice]] = None) -> np.ndarray:
+        """Read a window (row slice, col slice) by loading only intersecting tiles"""
+        manifest = self.manifest()
+        height, width = manifest['shape']
+        tile_size = manifest['tile_size']
+        rows, cols = window or (slice(0, height), slice(0, width))
+        row_start, row_stop, _ = rows.indices(height)
+        col_start, col_stop, _ = cols.indices(width)
+
+        result = np.full((row_stop - row_start, col_stop - col_start), np.nan, dtype=np.float32)
+        for tile_row in range(row_start // tile_size, (row_stop - 1) // tile_size + 1):
+            for tile_col in range(col_start // tile_size, (col_stop - 1) // tile_size + 1):
+                tile = self.read_tile(tile_row, tile_col)
+                top, left = tile_row * tile_size, tile_col * tile_size
+                r0, r1 = max(row_start, top), min(row_stop, top + tile.shape[0])
+                c0, c1 = max(col_start, left), min(col_stop, left + tile.shape[1])
+                result[r0 - row_start:r1 - row_start, c0 - col_start:c1 - col_start] = \
+                    tile[r0 - top:r1 - top, c0 - left:c1 - left]
+        return result
+
+
+def trend_anomaly_block(
+    block: np.ndarray,
+    day_offsets: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Trend slope (per year) and latest anomaly for a (n_dates, rows, cols) block
+
+    The latest anomaly is each pixel's most recent valid observation minus the
+    mean of its earlier observations.
+    """
+    n_dates, rows, cols = block.shape
+    series = block.reshape(n_dates, -1).T.astype(float)
+
+    slope = ols_slopes(series, times=day_offsets) * 365.25
+
+    valid = ~np.isnan(series)
+    has_valid = valid.any(axis=1)
+    latest_idx = n_dates - 1 - np.argmax(valid[:, ::-1], axis=1)
+    latest = series[np.arange(series.shape[0]), latest_idx]
+
+    earlier = valid & (np.arange(n_dates)[None, :] < latest_idx[:, None])
+    earlier_count = earlier.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        baseline = np.where(earlier, series, 0.0).sum(axis=1) / earlier_count
+    anomaly = np.where(has_valid & (earlier_count > 0), latest - baseline, np.nan)
+
+    return slope.reshape(rows, cols), anomaly.reshape(rows, cols)
+
+
+def write_trend_anomaly_products(
+    project_id: int,
+    cube: IndexCube,
+    output_dir: str = PRODUCTS_DIR,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    products: Optional[Dict[str, np.ndarray]] = None
+) -> Dict[str, str]:
+    """
+    Compute and store per-pixel trend and latest-anomaly rasters for a cube
+
+    The cube is processed one spatial tile at a time, so only a
+    (n_dates, tile_size, tile_size) block is in memory at once. Rasters
+    already computed elsewhere (shared_raster.pixel_trends across a
+    process pool) are passed as `products` and only stored.
+
+    Returns:
+        Dict[str, str]: Store paths keyed by product name
+    """
+    base = os.path.join(output_dir, f'project_{project_id}', cube.index_name.lower())
+    metadata = {
+        'project_id': project_id,
+        'index': cube.index_name,
+        'dates': [cube.dates[0], cube.dates[-1]] if cube.dates else [],
+        'transform': cube.transform
+    }
+    stores = {
+        'trend_slope': TiledRasterStore(os.path.join(base, 'trend_slope')),
+        'latest_anomaly': TiledRasterStore(os.path.join(base, 'latest_anomaly'))
+    }
+    stores['trend_slope'].create(cube.shape, tile_size, dict(metadata, units='index units per year'))
+    stores['latest_anomaly'].create(cube.shape, tile_size, dict(metadata, units='index units'))
+
+    day_offsets = cube.day_offsets()
+    for tile_row, tile_col, rows, cols in iter_windows(cube.shape, tile_size):
+        if products is None:
+            slope, anomaly = trend_anomaly_block(np.asarray(cube.values[:, rows, cols]), day_offsets)
+        else:
+            slope, anomaly = products['trend_slope'][rows, cols], products['latest_anomaly'][rows, cols]
+        stores['trend_slope'].write_tile(tile_row, tile_col, slope)
+        stores['latest_anomaly'].write_tile(tile_row, tile_col, anomaly)
+
+    return {name: store.path for name, store in stores.items()}
@@ -0,0 +1,126 @@
+"""
+Resilience scoring for Orun.io
+Water security, agricultural productivity, ecosystem health and community
+engagement scores for many projects at once from index statistics and
+community report counts
+"""
+
+from typing import Dict
+
+import numpy as np
+
+COMPONENTS = ['water_security', 'agricultural_productivity', 'ecosystem_health', 'community_engagement']
+COMPONENT_WEIGHTS = np.array([0.25, 0.25, 0.25, 0.25])
+
+# Months at the end of a project's record treated as its current state;
+# earlier months are the baseline the change is measured against
+RECENT_MONTHS = 12
+
+# (low, high) ranges mapped linearly onto 0-100
+NDWI_LEVEL_RANGE = (-0.3, 0.3)
+NDVI_LEVEL_RANGE = (0.1, 0.7)
+EVI_LEVEL_RANGE = (0.1, 0.5)
+INDEX_CHANGE_RANGE = (-0.1, 0.1)
+NDVI_CV_RANGE = (0.0, 0.5)
+REPORT_COUNT_SATURATION = 50
+
+INDEX_ORDER = ['NDVI', 'NDWI', 'EVI']
+
+
+def _scaled(values: np.ndarray, value_range: tuple) -> np.ndarray:
+    low, high = value_range
+    return np.clip((values - low) / (high - low), 0.0, 1.0) * 100
+
+
+def score_components(stats: Dict[str, np.ndarray]) -> Dict[str, np.ndarray]:
+    """
+    Component and overall scores (0-100) for many projects at once
+
+    Args:
+        stats: Per-project arrays 'ndvi_level', 'ndvi_change', 'ndvi_cv',
+            'ndwi_level', 'ndwi_change', 'evi_level' (NaN without data),
+            'report_count' and 'verified_share'
+
+    Returns:
+        Dict of per-project arrays keyed by COMPONENTS plus
+        'resilience_score', the weighted mean of the available components
+    """
+    # A missing baseline leaves the change neutral rather than unscored
+    ndwi_change = np.nan_to_num(stats['ndwi_change'], nan=0.0)
+    ndvi_change = np.nan_to_num(stats['ndvi_change'], nan=0.0)
+    water = np.where(np.isnan(stats['ndwi_level']), np.nan,
+                     0.6 * _scaled(stats['ndwi_level'], NDWI_LEVEL_RANGE)
+                     + 0.4 * _scaled(ndwi_change, INDEX_CHANGE_RANGE))
+    agriculture = np.where(np.isnan(stats['ndvi_level']), np.nan,
+                           0.6 * _scaled(stats['ndvi_level'], NDVI_LEVEL_RANGE)
+                           + 0.4 * _scaled(ndvi_change, INDEX_CHANGE_RANGE))
+    # Green cover and its month-to-month stability
+    ecosystem = 0.5 * _scaled(stats['evi_level'], EVI_LEVEL_RANGE) \
+        + 0.5 * (100 - _scaled(stats['ndvi_cv'], NDVI_CV_RANGE))
+    engagement = np.where(
+        stats['report_count'] > 0,
+        0.5 * _scaled(np.log1p(stats['report_count']), (0.0, np.log1p(REPORT_COUNT_SATURATION)))
+        + 0.5 * 100 * stats['verified_share'],
+        np.nan
+    )
+
+    components = np.stack([water, agriculture, ecosystem, engagement], axis=1)
+    available = ~np.isnan(components)
+    weights = np.where(available, COMPONENT_WEIGHTS, 0.0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        overall = np.where(available, components, 0.0) @ COMPONENT_WEIGHTS / weights.sum(axis=1)
+    result = {name: components[:, column] for column, name in enumerate(COMPONENTS)}
+    result['resilience_score'] = overall
+    return result
+
+
+def index_statistics(
+    project_rows: np.ndarray,
+    index_rows: np.ndarray,
+    months: np.ndarray,
+    counts: np.ndarray,
+    means: np.ndarray,
+    m2s: np.ndarray,
+    n_projects: int
+) -> Dict[str, np.ndarray]:
+    """
+    Recent level, change against baseline and variability from monthly aggregates
+
+    All arguments are per aggregate row: the project's position in
+    [0, n_projects), the index's position in INDEX_ORDER, the bucket's
+    month ordinal and its count, mean and M2. Sums are gathered per
+    (project, index) with bincount, so the whole portfolio is one pass.
+
+    Returns:
+        Dict of (n_projects,) arrays in the shape score_components() takes
+    """
+    n_indices = len(INDEX_ORDER)
+    size = n_projects * n_indices
+    group = project_rows * n_indices + index_rows
+
+    latest = np.full(n_projects, np.iinfo(np.int64).min)
+    np.maximum.at(latest, project_rows, months)
+    recent = months > latest[project_rows] - RECENT_MONTHS
+
+    weighted = counts * means
+    with np.errstate(invalid='ignore', divide='ignore'):
+        recent_n = np.bincount(group, counts * recent, size)
+        baseline_n = np.bincount(group, counts * ~recent, size)
+        level = np.bincount(group, weighted * recent, size) / recent_n
+        baseline = np.bincount(group, weighted * ~recent, size) / baseline_n
+        total_n = recent_n + baseline_n
+        total_mean = np.bincount(group, weighted, size) / total_n
+        # Pooled variance from per-bucket M2 and bucket means
+        variance = np.bincount(group, m2s + counts * means ** 2, size) / total_n - total_mean ** 2
+        cv = np.sqrt(np.maximum(variance, 0.0)) / np.abs(total_mean)
+
+    level, change, cv = (values.reshape(n_projects, n_indices) for values in (level, level - baseline, cv))
+    ndvi, ndwi, evi = (INDEX_ORDER.index(name) for name in ('NDVI', 'NDWI', 'EVI'))
+    return {
+        'ndvi_level': level[:, ndvi],
+        'ndvi_change': change[:, ndvi],
+        'ndvi_cv': cv[:, ndvi],
+        'ndwi_level': level[:, ndwi],
+        'ndwi_change': change[:, ndwi],
+        'evi_level': level[:, evi]
+    }
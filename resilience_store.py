@@ -0,0 +1,205 @@
+"""
+Materialized resilience scores for Orun.io
+Computes resilience components for the whole portfolio in one vectorized
+pass over the monthly satellite aggregates and community reports, and
+keeps every recomputation in a history table whose current rows serve
+lookups; only projects whose inputs changed are recomputed
+"""
+
+import hashlib
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Any, Iterable
+
+import numpy as np
+from sqlalchemy import Boolean, Column, DateTime, Float, Integer, String, Index, cast, func
+from sqlalchemy.orm import Session
+from models import Base, CommunityReport, Project
+
+from resilience import COMPONENTS, INDEX_ORDER, index_statistics, score_components
+from summary_aggregates import SatelliteAggregate
+
+# Bump when the scoring method changes so every project is recomputed
+SCORE_VERSION = 1
+
+# Sensor whose aggregates feed the score; index levels are not comparable
+# across sensors, so they are never pooled
+SCORE_SATELLITE = 'Sentinel-2'
+
+# Report submissions, the periodic refresh and the API can refresh at the
+# same time; each would retire the same current row and add its own
+_REFRESH_LOCK = threading.Lock()
+
+
+class ResilienceScore(Base):
+    """One computation of a project's resilience score; is_current marks the latest"""
+
+    __tablename__ = 'resilience_scores'
+    __table_args__ = (
+        Index('ix_resilience_scores_current', 'project_id', 'is_current'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, nullable=False, index=True)
+    resilience_score = Column(Float)
+    water_security = Column(Float)
+    agricultural_productivity = Column(Float)
+    ecosystem_health = Column(Float)
+    community_engagement = Column(Float)
+    input_fingerprint = Column(String(64), nullable=False)
+    is_current = Column(Boolean, nullable=False, default=True)
+    computed_at = Column(DateTime, default=datetime.utcnow)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'project_id': self.project_id,
+            'resilience_score': self.resilience_score,
+            'resilience_components': {name: getattr(self, name) for name in COMPONENTS},
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
+
+
+def _report_counts(db: Session, project_ids: Optional[List[int]] = None) -> Dict[int, tuple]:
+    """project_id -> (report count, verified report count)"""
+    query = db.query(
+        CommunityReport.project_id, func.count(CommunityReport.id),
+        func.sum(cast(func.coalesce(CommunityReport.is_verified, False), Integer))
+    ).group_by(CommunityReport.project_id)
+    if project_ids is not None:
+        query = query.filter(CommunityReport.project_id.in_(project_ids))
+    return {project_id: (count, verified or 0) for project_id, count, verified in query}
+
+
+def input_fingerprints(db: Session, project_ids: Optional[Iterable[int]] = None) -> Dict[int, str]:
+    """
+    Per-project fingerprint of everything the score reads
+
+    Aggregate observation counts and update times change whenever new
+    acquisitions are folded in; report and verification counts change
+    with community activity. Three grouped queries cover the portfolio.
+    """
+    projects = db.query(Project.id)
+    aggregates = db.query(
+        SatelliteAggregate.project_id, func.sum(SatelliteAggregate.count),
+        func.max(SatelliteAggregate.updated_at)
+    ).filter(
+        SatelliteAggregate.satellite == SCORE_SATELLITE
+    ).group_by(SatelliteAggregate.project_id)
+    if project_ids is not None:
+        project_ids = list(project_ids)
+        projects = projects.filter(Project.id.in_(project_ids))
+        aggregates = aggregates.filter(SatelliteAggregate.project_id.in_(project_ids))
+
+    satellite = {project_id: (count, updated) for project_id, count, updated in aggregates}
+    community = _report_counts(db, project_ids)
+    return {
+        project_id: hashlib.sha256(repr((
+            SCORE_VERSION, satellite.get(project_id), community.get(project_id)
+        )).encode()).hexdigest()
+        for project_id, in projects
+    }
+
+
+def compute_scores(db: Session, project_ids: List[int]) -> Dict[str, np.ndarray]:
+    """Scores for the given projects in one vectorized pass"""
+    position = {project_id: i for i, project_id in enumerate(project_ids)}
+    rows = db.query(
+        SatelliteAggregate.project_id, SatelliteAggregate.index_name, SatelliteAggregate.bucket,
+        SatelliteAggregate.count, SatelliteAggregate.mean, SatelliteAggregate.m2
+    ).filter(
+        SatelliteAggregate.project_id.in_(project_ids),
+        SatelliteAggregate.satellite == SCORE_SATELLITE,
+        SatelliteAggregate.index_name.in_(INDEX_ORDER)
+    ).all()
+    stats = index_statistics(
+        np.array([position[row[0]] for row in rows], dtype=np.int64),
+        np.array([INDEX_ORDER.index(row[1]) for row in rows], dtype=np.int64),
+        np.array([row[2].year * 12 + row[2].month - 1 for row in rows], dtype=np.int64),
+        np.array([row[3] for row in rows], dtype=float),
+        np.array([row[4] for row in rows], dtype=float),
+        np.array([row[5] for row in rows], dtype=float),
+        len(project_ids)
+    )
+
+    report_count = np.zeros(len(project_ids))
+    verified = np.zeros(len(project_ids))
+    for project_id, (count, verified_count) in _report_counts(db, project_ids).items():
+        report_count[position[project_id]] = count
+        verified[position[project_id]] = verified_count
+    stats['report_count'] = report_count
+    stats['verified_share'] = verified / np.maximum(report_count, 1)
+    return score_components(stats)
+
+
+def _rounded(value: float) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), 1)
+
+
+def refresh_resilience_scores(
+    db: Session,
+    project_ids: Optional[Iterable[int]] = None,
+    force: bool = False
+) -> Dict[str, int]:
+    """
+    Recompute scores for projects whose inputs changed since the last run
+
+    Each recomputation appends a new current row and retires the previous
+    one, so the table keeps the score history.
+
+    Args:
+        project_ids: Projects to check (default: the whole portfolio)
+        force (bool): Recompute even when inputs are unchanged
+
+    Returns:
+        Dict with 'checked' and 'recomputed' project counts
+    """
+    with _REFRESH_LOCK:
+        return _refresh(db, project_ids, force)
+
+
+def _refresh(db: Session, project_ids: Optional[Iterable[int]], force: bool) -> Dict[str, int]:
+    fingerprints = input_fingerprints(db, project_ids)
+    current = {
+        row.project_id: row
+        for row in db.query(ResilienceScore).filter(
+            ResilienceScore.is_current.is_(True),
+            ResilienceScore.project_id.in_(list(fingerprints))
+        )
+    }
+    changed = [
+        project_id for project_id, fingerprint in fingerprints.items()
+        if force or project_id not in current or current[project_id].input_fingerprint != fingerprint
+    ]
+    if changed:
+        scores = compute_scores(db, changed)
+        now = datetime.utcnow()
+        for i, project_id in enumerate(changed):
+            if project_id in current:
+                current[project_id].is_current = False
+            db.add(ResilienceScore(
+                project_id=project_id,
+                input_fingerprint=fingerprints[project_id],
+                is_current=True,
+                computed_at=now,
+                resilience_score=_rounded(scores['resilience_score'][i]),
+                **{name: _rounded(scores[name][i]) for name in COMPONENTS}
+            ))
+        db.commit()
+    return {'checked': len(fingerprints), 'recomputed': len(changed)}
+
+
+def get_resilience_score(db: Session, project_id: int) -> Optional[Dict[str, Any]]:
+    """Current materialized score for a project, or None if never computed"""
+    row = db.query(ResilienceScore).filter(
+        ResilienceScore.project_id == project_id,
+        ResilienceScore.is_current.is_(True)
+    ).first()
+    return row.to_dict() if row else None
+
+
+def get_resilience_history(db: Session, project_id: int, limit: int = 100) -> List[Dict[str, Any]]:
+    """Past scores for a project, newest first"""
+    rows = db.query(ResilienceScore).filter(
+        ResilienceScore.project_id == project_id
+    ).order_by(ResilienceScore.computed_at.desc(), ResilienceScore.id.desc()).limit(limit)
+    return [row.to_dict() for row in rows]
@@ -3,6 +3,10 @@ Satellite data processing service for Orun.io
 Handles Google Earth Engine integration and satellite data analysis
 """
 
+import asyncio
+import math
+import os
+from functools import partial
 import ee
 import pandas as pd
 import numpy as np
@@ -13,11 +17,73 @@ import json
 import requests
 from models import Project, SatelliteData
 from schemas import SatelliteIndices, SatelliteDataResponse
+from trend_engine import series_trends
+from raster_products import IndexCube, PRODUCTS_DIR, write_trend_anomaly_products
+from ee_jobs import EarthEngineJobManager
+from spectral_indices import add_ee_indices
+from phenology import series_to_grid, gap_fill_and_phenology
+from satellite_store import merge_index_series, bulk_upsert_satellite_data, get_watermark
+from baci import baci_analysis
+from impact_cache import invalidate as invalidate_impact_results, stored_result
+from synthetic_control import synthetic_control
+from carbon import BIOME_MODELS, carbon_stock_series
+from carbon_store import get_carbon_series, has_current_carbon_stock, project_sequestration, store_carbon_stock
+from cog_reader import open_reader, read_scene_bands
+from scene_catalog import SceneCatalog
+from spectral_indices import FusedIndexProgram
+from resilience_store import refresh_resilience_scores
+from shared_raster import pixel_trends
+from control_matching import ControlCandidateGrid, CONTROL_GRID_PATH
+from summary_aggregates import (
+    EMPTY_SUMMARY, update_aggregates, reset_aggregates, is_bucket_aligned, summarize_range
+)
+
+INDEX_NAMES = ['NDVI', 'NDWI', 'EVI']
+
+# Sensor -> Earth Engine surface-reflectance collection; only these sensors
+# can be processed, and each keeps its own watermark
+SENSOR_COLLECTIONS = {
+    'Sentinel-2': 'COPERNICUS/S2_SR'
+}
+
+# Sensor -> factor converting stored digital numbers to reflectance, for
+# pixels read from catalog scenes
+REFLECTANCE_SCALE = {
+    'Sentinel-2': 1e-4
+}
+
+# Local scene catalog whose COG scenes supply per-pixel index cubes
+SCENE_CATALOG_PATH = os.getenv('SCENE_CATALOG_PATH', os.path.join('data', 'scene_catalog.sqlite'))
+
+# Project type -> allometric biome for carbon stocks; other types are not modelled
+PROJECT_TYPE_BIOMES = {
+    'coastal_protection': 'mangrove',
+    'mangrove_restoration': 'mangrove',
+    'drought_resilience': 'dryland_cropland',
+    'agroforestry': 'dryland_cropland',
+    'water_management': 'wetland',
+    'wetland_restoration': 'wetland'
+}
+
+# Grid cell size approximating a Sentinel-2 100 km MGRS tile
+SCENE_FOOTPRINT_DEGREES = 0.9
+
+# BACI control ring width around a project, baseline length before project start,
+# and the zonal feature id used for the control area
+CONTROL_BUFFER_DEGREES = 0.05
+BACI_BASELINE_DAYS = 365
+CONTROL_FEATURE_ID = 0
+
+# Zonal feature ids of matched control cells count down from -1
+DONOR_FEATURE_ID_BASE = -1
+
+# Matched control cells per project when a control candidate grid is available
+CONTROL_MATCHES = 10
 
 class SatelliteService:
     """Service for processing satellite data and calculating environmental indices"""
     
-    def __init__(self):
+    def __init__(self, max_workers: int = 8):
         """Initialize Google Earth Engine"""
         try:
             ee.Initialize()
@@ -25,30 +91,31 @@ class SatelliteService:
         except Exception as e:
             print(f"Failed to initialize Google Earth Engine: {e}")
             self.initialized = False
+        
+        self.jobs = EarthEngineJobManager(ee, max_workers=max_workers)
+        self.control_grid: Optional[ControlCandidateGrid] = None
+        self.scene_catalog: Optional[SceneCatalog] = None
+        # Projects whose buffers are already excluded from the grid
+        self._excluded_projects: set = set()
     
     async def get_indices(
         self, 
         project_id: int, 
         start_date: str, 
         end_date: str, 
-        db: Session
+        db: Session,
+        satellite: str = 'Sentinel-2'
     ) -> SatelliteIndices:
         """Get satellite-derived indices for a project area"""
         
-        if not self.initialized:
-            raise Exception("Google Earth Engine not initialized")
-        
-        # Get project from database
-        project = db.query(Project).filter(Project.id == project_id).first()
-        if not project:
-            raise ValueError(f"Project {project_id} not found")
+        project = self._checked_project(project_id, db, satellite)
         
         # Convert project area to Earth Engine geometry
         project_geom = self._convert_to_ee_geometry(project.project_area)
         
         # Get satellite data
         indices_data = await self._process_satellite_data(
-            project_geom, start_date, end_date
+            project_geom, start_date, end_date, satellite
         )
         
         return SatelliteIndices(
@@ -58,121 +125,176 @@ class SatelliteService:
             summary_stats=self._calculate_summary_stats(indices_data)
         )
     
-    async def _process_satellite_data(
+    async def get_indices_batch(
         self, 
-        geometry: ee.Geometry, 
+        project_ids: List[int], 
         start_date: str, 
-        end_date: str
-    ) -> Dict[str, List[Dict[str, Any]]]:
-        """Process satellite data and calculate indices"""
-        
-        # Load Sentinel-2 collection
-        sentinel2 = (ee.ImageCollection('COPERNICUS/S2_SR')
-                    .filterDate(start_date, end_date)
-                    .filterBounds(geometry)
-                    .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)))
+        end_date: str, 
+        db: Session
+    ) -> Dict[int, SatelliteIndices]:
+        """Get satellite-derived indices for many projects, reading shared scenes once"""
         
-        # Calculate indices
-        def calculate_indices(image):
-            # NDVI calculation
-            ndvi = image.normalizedDifference(['B8', 'B4']).rename('NDVI')
-            
-            # NDWI calculation
-            ndwi = image.normalizedDifference(['B3', 'B8']).rename('NDWI')
-            
-            # EVI calculation
-            evi = image.expression(
-                '2.5 * ((NIR - RED) / (NIR + 6 * RED - 7.5 * BLUE + 1))',
-                {
-                    'NIR': image.select('B8'),
-                    'RED': image.select('B4'),
-                    'BLUE': image.select('B2')
-                }
-            ).rename('EVI')
-            
-            return image.addBands([ndvi, ndwi, evi])
+        if not self.initialized:
+            raise Exception("Google Earth Engine not initialized")
         
-        # Apply indices calculation
-        with_indices = sentinel2.map(calculate_indices)
-        
-        # Calculate mean values for the project area
-        def calculate_mean(image):
-            mean_values = image.select(['NDVI', 'NDWI', 'EVI']).reduceRegion(
-                reducer=ee.Reducer.mean(),
-                geometry=geometry,
-                scale=10,
-                maxPixels=1e9
+        projects = db.query(Project).filter(Project.id.in_(project_ids)).all()
+        missing = set(project_ids) - {project.id for project in projects}
+        if missing:
+            raise ValueError(f"Projects {sorted(missing)} not found")
+        
+        # Group projects whose areas fall in the same scene footprint cell
+        groups: Dict[tuple, List[Any]] = {}
+        for project in projects:
+            coordinates = self._project_coordinates(project.project_area)
+            groups.setdefault(self._footprint_key(coordinates), []).append(
+                (project.id, coordinates)
             )
-            
-            return image.set(mean_values)
         
-        # Get time series data
-        time_series = with_indices.map(calculate_mean)
+        # One collection query and one reduceRegions pass per scene for each group
+        async def process_group(members):
+            features = ee.FeatureCollection([
+                ee.Feature(ee.Geometry.Polygon(coordinates), {'project_id': project_id})
+                for project_id, coordinates in members
+            ])
+            footprint = ee.Geometry.Rectangle(self._bounds(
+                [point for _, coordinates in members for point in coordinates]
+            ))
+            collection = self._indices_collection(footprint, start_date, end_date)
+            return await self.jobs.evaluate_zonal_series(collection, features, INDEX_NAMES, scale=10)
+        
+        group_results = await asyncio.gather(*(process_group(m) for m in groups.values()))
+        
+        results = {}
+        for project_id in project_ids:
+            indices_data = next(
+                (r[project_id] for r in group_results if project_id in r),
+                {index_name: [] for index_name in INDEX_NAMES}
+            )
+            results[project_id] = SatelliteIndices(
+                project_id=project_id,
+                date_range={"start": start_date, "end": end_date},
+                indices=indices_data,
+                summary_stats=self._calculate_summary_stats(indices_data)
+            )
+        return results
+    
+    async def get_phenology(
+        self, 
+        project_id: int, 
+        start_date: str, 
+        end_date: str, 
+        db: Session,
+        method: str = 'harmonic'
+    ) -> Dict[str, Any]:
+        """Gap-filled index series and season metrics for a project area"""
         
-        # Convert to list of dictionaries
-        indices_data = {
-            'NDVI': [],
-            'NDWI': [],
-            'EVI': []
-        }
+        indices = await self.get_indices(project_id, start_date, end_date, db)
+        values, times, dates = series_to_grid(indices.indices)
+        if not dates:
+            return {'project_id': project_id, 'dates': [], 'indices': {}}
+        
+        first_day = datetime.strptime(dates[0], '%Y-%m-%d')
+        # Season years run from 1 January; metrics are reported per year
+        season_origin = (datetime(first_day.year, 1, 1) - first_day).days
+        result = gap_fill_and_phenology(values, times, method=method, season_origin=season_origin)
+        
+        def to_date(offset):
+            if np.isnan(offset):
+                return None
+            return (first_day + timedelta(days=float(offset))).strftime('%Y-%m-%d')
+        
+        phenology = {}
+        for row, index_name in enumerate(indices.indices.keys()):
+            phenology[index_name] = {
+                'filled': [None if np.isnan(v) else round(float(v), 4) for v in result['filled'][row]],
+                'seasons': [
+                    {
+                        'year': (first_day + timedelta(days=float(start + end) / 2)).year,
+                        'season_start': to_date(result['season_start'][row, season]),
+                        'season_end': to_date(result['season_end'][row, season]),
+                        'peak_date': to_date(result['peak_time'][row, season]),
+                        'peak_value': self._rounded_trend(result['peak_value'][row, season], 4),
+                        'amplitude': self._rounded_trend(result['amplitude'][row, season], 4),
+                        'integrated_greenness': self._rounded_trend(
+                            result['integrated_greenness'][row, season], 4
+                        )
+                    }
+                    for season, (start, end) in enumerate(result['seasons'])
+                ]
+            }
+        
+        return {'project_id': project_id, 'dates': dates, 'indices': phenology}
+    
+    async def _process_satellite_data(
+        self, 
+        geometry: ee.Geometry, 
+        start_date: str, 
+        end_date: str,
+        satellite: str = 'Sentinel-2'
+    ) -> Dict[str, List[Dict[str, Any]]]:
+        """Process satellite data and calculate indices"""
         
-        # This is a simplified version - in practice, you'd need to handle
-        # the asynchronous nature of Earth Engine operations
-        for index_name in ['NDVI', 'NDWI', 'EVI']:
-            # Get time series for this index
-            index_series = time_series.aggregate_array(index_name)
-            
-            # Convert to Python list (this would need proper async handling)
-            # For demo purposes, we'll create sample data
-            indices_data[index_name] = self._generate_sample_time_series(
-                start_date, end_date, index_name
-            )
+        with_indices = self._indices_collection(geometry, start_date, end_date, satellite)
         
-        return indices_data
+        # All indices are reduced together and evaluated once, off the event loop
+        return await self.jobs.evaluate_index_series(
+            with_indices, geometry, INDEX_NAMES, scale=10
+        )
     
-    def _generate_sample_time_series(
+    async def get_summary_stats(
         self, 
+        project_id: int, 
         start_date: str, 
         end_date: str, 
-        index_name: str
-    ) -> List[Dict[str, Any]]:
-        """Generate sample time series data for demonstration"""
+        db: Session,
+        satellite: str = 'Sentinel-2'
+    ) -> Dict[str, Dict[str, float]]:
+        """Get summary statistics, merging stored aggregates for month-aligned ranges"""
         
-        start = datetime.strptime(start_date, '%Y-%m-%d')
-        end = datetime.strptime(end_date, '%Y-%m-%d')
+        if is_bucket_aligned(start_date, end_date):
+            # Same checks as the rescanning path, so unknown projects fail alike
+            self._checked_project(project_id, db, satellite)
+            return summarize_range(db, project_id, start_date, end_date, INDEX_NAMES, satellite)
         
-        time_series = []
-        current_date = start
+        indices = await self.get_indices(project_id, start_date, end_date, db, satellite)
+        return indices.summary_stats
+    
+    def _indices_collection(
+        self, 
+        geometry: ee.Geometry, 
+        start_date: str, 
+        end_date: str,
+        satellite: str = 'Sentinel-2'
+    ) -> ee.ImageCollection:
+        """Sensor collection over a geometry with index bands added"""
         
-        # Base values for different indices
-        base_values = {
-            'NDVI': 0.3,
-            'NDWI': 0.1,
-            'EVI': 0.2
-        }
+        # Load the sensor's surface-reflectance collection
+        collection = (ee.ImageCollection(SENSOR_COLLECTIONS[satellite])
+                    .filterDate(start_date, end_date)
+                    .filterBounds(geometry)
+                    .filter(ee.Filter.lt('CLOUDY_PIXEL_PERCENTAGE', 20)))
         
-        while current_date <= end:
-            # Add some realistic variation
-            variation = np.random.normal(0, 0.05)
-            value = base_values[index_name] + variation
-            
-            # Ensure values are within valid ranges
-            if index_name == 'NDVI':
-                value = max(-1, min(1, value))
-            elif index_name == 'NDWI':
-                value = max(-1, min(1, value))
-            elif index_name == 'EVI':
-                value = max(-1, min(1, value))
-            
-            time_series.append({
-                'date': current_date.strftime('%Y-%m-%d'),
-                'value': round(value, 4),
-                'cloud_cover': round(np.random.uniform(0, 20), 2)
-            })
-            
-            current_date += timedelta(days=16)  # Sentinel-2 revisit time
+        # Calculate indices from the spectral index registry
+        def calculate_indices(image):
+            return add_ee_indices(image, INDEX_NAMES, sensor=satellite)
+        
+        # Apply indices calculation
+        return collection.map(calculate_indices)
+    
+    def _check_sensor(self, satellite: str):
+        if satellite not in SENSOR_COLLECTIONS:
+            raise ValueError(f"Unsupported satellite: {satellite}")
+    
+    def _checked_project(self, project_id: int, db: Session, satellite: str = 'Sentinel-2') -> Project:
+        """A project to read indices for, once Earth Engine and the sensor are checked"""
+        if not self.initialized:
+            raise Exception("Google Earth Engine not initialized")
+        self._check_sensor(satellite)
         
-        return time_series
+        project = db.query(Project).filter(Project.id == project_id).first()
+        if not project:
+            raise ValueError(f"Project {project_id} not found")
+        return project
     
     def _calculate_summary_stats(
         self, 
@@ -182,8 +304,15 @@ class SatelliteService:
         
         summary_stats = {}
         
-        for index_name, time_series in indices_data.items():
-            values = [point['value'] for point in time_series]
+        # Trends for all indices are computed together in one batched pass
+        index_names = list(indices_data.keys())
+        trends = series_trends([
+            [point['value'] for point in indices_data[index_name]]
+            for index_name in index_names
+        ])
+        
+        for row, index_name in enumerate(index_names):
+            values = [point['value'] for point in indices_data[index_name]]
             
             if values:
                 summary_stats[index_name] = {
@@ -191,34 +320,28 @@ class SatelliteService:
                     'std': round(np.std(values), 4),
                     'min': round(np.min(values), 4),
                     'max': round(np.max(values), 4),
-                    'trend': self._calculate_trend(values)
+                    'trend': self._rounded_trend(trends['ols_slope'][row]),
+                    'sens_slope': self._rounded_trend(trends['sens_slope'][row]),
+                    'trend_p_value': self._rounded_trend(trends['mk_p_value'][row], 4)
                 }
             else:
-                summary_stats[index_name] = {
-                    'mean': 0,
-                    'std': 0,
-                    'min': 0,
-                    'max': 0,
-                    'trend': 0
-                }
+                summary_stats[index_name] = dict(EMPTY_SUMMARY)
         
         return summary_stats
     
-    def _calculate_trend(self, values: List[float]) -> float:
-        """Calculate linear trend in values"""
-        if len(values) < 2:
-            return 0
-        
-        x = np.arange(len(values))
-        y = np.array(values)
-        
-        # Simple linear regression
-        slope = np.polyfit(x, y, 1)[0]
-        return round(slope, 6)
+    def _rounded_trend(self, value: float, digits: int = 6) -> Optional[float]:
+        """Round a trend statistic; undefined (NaN) results, e.g. from too few observations, are None"""
+        if np.isnan(value):
+            return None
+        return round(float(value), digits)
     
     def _convert_to_ee_geometry(self, project_area: str) -> ee.Geometry:
         """Convert project area from database to Earth Engine geometry"""
-        # This would convert the PostGIS geometry to Earth Engine format
+        return ee.Geometry.Polygon(self._project_coordinates(project_area))
+    
+    def _project_coordinates(self, project_area: str) -> List[List[float]]:
+        """Polygon ring [[lon, lat], ...] for a project area"""
+        # This would convert the PostGIS geometry to a coordinate ring
         # For demo purposes, we'll create a sample geometry
         
         # Sample coordinates for Makueni County, Kenya
@@ -230,86 +353,389 @@ class SatelliteService:
             [37.5, -2.0]
         ]
         
-        return ee.Geometry.Polygon(coordinates)
+        return coordinates
+    
+    def _bounds(self, coordinates: List[List[float]]) -> List[float]:
+        """Bounding box [min_lon, min_lat, max_lon, max_lat] of coordinates"""
+        lons = [point[0] for point in coordinates]
+        lats = [point[1] for point in coordinates]
+        return [min(lons), min(lats), max(lons), max(lats)]
+    
+    def _matched_control_cells(self, coordinates: List[List[float]], db: Session) -> List[Dict[str, Any]]:
+        """
+        Covariate-matched control cells from the candidate grid, if one is available
+
+        Cells within the buffer of any project are excluded before matching;
+        projects added since the last call are excluded as they appear.
+        """
+        if self.control_grid is None and os.path.exists(CONTROL_GRID_PATH):
+            self.control_grid = ControlCandidateGrid.load(CONTROL_GRID_PATH)
+            self._excluded_projects = set()
+        if self.control_grid is None:
+            return []
+        new = [(project_id, area) for project_id, area in db.query(Project.id, Project.project_area)
+               if project_id not in self._excluded_projects]
+        if new:
+            self.control_grid.exclude_projects([self._project_coordinates(area) for _, area in new])
+            self._excluded_projects.update(project_id for project_id, _ in new)
+        return self.control_grid.match(coordinates, k=CONTROL_MATCHES)
+    
+    def _mean_series(self, members: List[Dict[str, List[Dict[str, Any]]]]) -> Dict[str, List[Dict[str, Any]]]:
+        """Per-date mean of several areas' index series"""
+        merged = {}
+        for index_name in INDEX_NAMES:
+            values: Dict[str, List[float]] = {}
+            for member in members:
+                for point in member.get(index_name, []):
+                    values.setdefault(point['date'], []).append(point['value'])
+            merged[index_name] = [
+                {'date': date, 'value': sum(day) / len(day)} for date, day in sorted(values.items())
+            ]
+        return merged
+    
+    def _box_ring(self, bounds: List[float]) -> List[List[float]]:
+        min_lon, min_lat, max_lon, max_lat = bounds
+        return [[min_lon, min_lat], [max_lon, min_lat], [max_lon, max_lat], [min_lon, max_lat], [min_lon, min_lat]]
+    
+    def _control_rings(self, coordinates: List[List[float]]) -> List[List[List[float]]]:
+        """Control area: a ring of CONTROL_BUFFER_DEGREES around the project bounding box"""
+        min_lon, min_lat, max_lon, max_lat = self._bounds(coordinates)
+        pad = CONTROL_BUFFER_DEGREES
+        outer = [
+            [min_lon - pad, min_lat - pad], [max_lon + pad, min_lat - pad],
+            [max_lon + pad, max_lat + pad], [min_lon - pad, max_lat + pad],
+            [min_lon - pad, min_lat - pad]
+        ]
+        inner = [
+            [min_lon, min_lat], [min_lon, max_lat], [max_lon, max_lat],
+            [max_lon, min_lat], [min_lon, min_lat]
+        ]
+        return [outer, inner]
+    
+    def _footprint_key(self, coordinates: List[List[float]]) -> tuple:
+        """Scene footprint cell of a project: its centroid on a SCENE_FOOTPRINT_DEGREES grid"""
+        min_lon, min_lat, max_lon, max_lat = self._bounds(coordinates)
+        return (
+            math.floor((min_lon + max_lon) / 2 / SCENE_FOOTPRINT_DEGREES),
+            math.floor((min_lat + max_lat) / 2 / SCENE_FOOTPRINT_DEGREES)
+        )
     
     async def process_project_satellite_data(
         self, 
         project_id: int, 
-        db: Session
+        db: Session,
+        satellite: str = 'Sentinel-2',
+        full_refresh: bool = False
     ) -> Dict[str, Any]:
-        """Process satellite data for a specific project"""
+        """Process new satellite acquisitions for a specific project"""
         
         project = db.query(Project).filter(Project.id == project_id).first()
         if not project:
             raise ValueError(f"Project {project_id} not found")
-        
-        # Get satellite data for the project period
-        start_date = project.start_date.strftime('%Y-%m-%d')
+        self._check_sensor(satellite)
+        
+        # Only fetch acquisitions newer than the stored watermark
+        watermark = None if full_refresh else get_watermark(db, project_id, satellite)
+        if full_refresh:
+            reset_aggregates(db, project_id, satellite)
+            # Rewritten rows can keep the same watermark, so drop stored results
+            invalidate_impact_results(db, project_id)
+        if watermark is not None:
+            start = watermark + timedelta(days=1)
+        else:
+            start = project.start_date
+        start_date = start.strftime('%Y-%m-%d')
         end_date = datetime.now().strftime('%Y-%m-%d')
         
-        # Process satellite data
-        indices = await self.get_indices(project_id, start_date, end_date, db)
+        if start_date >= end_date:
+            return {
+                'message': 'Satellite data already up to date',
+                'project_id': project_id,
+                'watermark': watermark.strftime('%Y-%m-%d') if watermark else None,
+                'rows_written': 0,
+                # A biomass model change still recomputes the stored stocks
+                'carbon_dates_written': self.refresh_carbon_stock(project, db, start_date, end_date, satellite)
+            }
+        
+        # Process satellite data for the delta window
+        indices = await self.get_indices(project_id, start_date, end_date, db, satellite)
+        
+        # Store one merged row per acquisition with a bulk insert-or-update
+        rows = merge_index_series(project_id, satellite, indices.indices)
+        bulk_upsert_satellite_data(db, rows)
         
-        # Store results in database
-        for index_name, time_series in indices.indices.items():
-            for data_point in time_series:
-                satellite_data = SatelliteData(
-                    project_id=project_id,
-                    satellite='Sentinel-2',
-                    acquisition_date=datetime.strptime(data_point['date'], '%Y-%m-%d'),
-                    cloud_cover=data_point['cloud_cover']
-                )
-                
-                # Set index values
-                if index_name == 'NDVI':
-                    satellite_data.ndvi_mean = data_point['value']
-                elif index_name == 'NDWI':
-                    satellite_data.ndwi_mean = data_point['value']
-                elif index_name == 'EVI':
-                    satellite_data.evi_mean = data_point['value']
-                
-                db.add(satellite_data)
+        # Fold the delta into the running summary aggregates
+        update_aggregates(db, project_id, satellite, rows)
         
         db.commit()
         
+        # Keep the materialized resilience score in step with the new aggregates
+        if rows:
+            refresh_resilience_scores(db, [project_id])
+        
+        # Carbon stocks for the same window, from the catalog scenes' pixels
+        carbon_written = self.refresh_carbon_stock(project, db, start_date, end_date, satellite,
+                                                   full_refresh=full_refresh)
+        
+        new_watermark = rows[-1]['acquisition_date'] if rows else watermark
         return {
             'message': 'Satellite data processed successfully',
             'project_id': project_id,
+            'date_range': {'start': start_date, 'end': end_date},
+            'watermark': new_watermark.strftime('%Y-%m-%d') if new_watermark else None,
             'indices_processed': list(indices.indices.keys()),
-            'data_points': sum(len(ts) for ts in indices.indices.values())
+            'data_points': sum(len(ts) for ts in indices.indices.values()),
+            'rows_written': len(rows),
+            'carbon_dates_written': carbon_written
+        }
+    
+    def build_raster_products(
+        self, 
+        project_id: int, 
+        cubes: List[IndexCube],
+        output_dir: str = PRODUCTS_DIR,
+        workers: Optional[int] = None
+    ) -> Dict[str, Dict[str, str]]:
+        """Write per-pixel trend and latest-anomaly rasters for each index cube"""
+        
+        # Tiles are fitted across a process pool over shared memory, then stored
+        return {
+            cube.index_name: write_trend_anomaly_products(
+                project_id, cube, output_dir,
+                products=pixel_trends(cube.values, cube.day_offsets(), workers=workers)
+            )
+            for cube in cubes
         }
     
+    def build_carbon_stock(
+        self,
+        project_id: int,
+        cubes: Dict[str, IndexCube],
+        db: Session,
+        biome: Optional[str] = None,
+        biome_codes: Optional[np.ndarray] = None,
+        project_mask: Optional[np.ndarray] = None,
+        **options
+    ) -> Dict[str, Any]:
+        """
+        Store per-date carbon stocks from a project's EVI/NDVI cubes
+        
+        Args:
+            cubes: Index name -> IndexCube over the project area
+            biome (str): Biome of every pixel, or biome_codes as a raster
+            project_mask (np.ndarray): Pixels inside the project; the whole
+                grid by default
+            options: carbon_stock_series() keyword arguments
+        
+        Returns:
+            Dict with 'dates_written' and the stored series' sequestration
+        """
+        project = db.query(Project).filter(Project.id == project_id).first()
+        if not project:
+            raise ValueError(f"Project {project_id} not found")
+        
+        shape = next(iter(cubes.values())).shape
+        labels = np.ones(shape, dtype=np.int32) if project_mask is None \
+            else np.asarray(project_mask).astype(np.int32)
+        series = carbon_stock_series(cubes, biome, biome_codes, project_labels=labels,
+                                     project_ids=[project_id], **options)
+        written = store_carbon_stock(db, series)
+        db.commit()
+        
+        return {
+            'project_id': project_id,
+            'dates_written': written,
+            'sequestration': project_sequestration(db, project_id, project.start_date.strftime('%Y-%m-%d'))
+        }
+    
+    def _scene_catalog(self) -> Optional[SceneCatalog]:
+        if self.scene_catalog is None and os.path.exists(SCENE_CATALOG_PATH):
+            self.scene_catalog = SceneCatalog(SCENE_CATALOG_PATH)
+        return self.scene_catalog
+    
+    def catalog_index_cubes(
+        self,
+        coordinates: List[List[float]],
+        start_date: str,
+        end_date: str,
+        index_names: List[str],
+        satellite: str = 'Sentinel-2'
+    ) -> Dict[str, IndexCube]:
+        """
+        Per-pixel index cubes over a project's bounding box from catalog scenes
+        
+        Scenes are read window by window through the shared COG readers. The
+        first scene's pixel grid is the cube's; scenes on another grid are
+        skipped, and scenes sensed on the same day fill each other's gaps in
+        sensing order.
+        
+        Returns:
+            Index name -> IndexCube; empty without a catalog or scenes
+        """
+        catalog = self._scene_catalog()
+        if catalog is None:
+            return {}
+        program = FusedIndexProgram(index_names, satellite)
+        bounds = self._bounds(coordinates)
+        scenes = sorted(catalog.scenes_for_project(coordinates, start_date, end_date, sensors=[satellite]),
+                        key=lambda scene: scene['sensing_time'])
+        
+        grid, transform = None, None
+        by_date: Dict[str, Dict[str, np.ndarray]] = {}
+        for scene in scenes:
+            first_band = program.band_ids[0]
+            reader = open_reader(scene['bands'][first_band], scene['scene_id'], first_band)
+            window = reader.window_for_bounds(bounds)
+            if grid is None:
+                grid = (reader.transform, window)
+                row_off, col_off = window[0], window[1]
+                transform = dict(reader.transform, x0=reader.transform['x0'] + col_off * reader.transform['dx'],
+                                 y0=reader.transform['y0'] + row_off * reader.transform['dy'])
+            elif (reader.transform, window) != grid:
+                continue
+            bands = read_scene_bands(scene, program.band_ids, bounds)
+            if any(band.shape != window[2:] for band in bands.values()):
+                continue
+            values = program.evaluate(bands, REFLECTANCE_SCALE.get(satellite, 1.0))
+            day = scene['sensing_time'][:10]
+            if day in by_date:
+                for name, earlier in by_date[day].items():
+                    np.copyto(earlier, values[name], where=np.isnan(earlier))
+            else:
+                by_date[day] = values
+        
+        dates = sorted(by_date)
+        return {
+            name: IndexCube(name, np.stack([by_date[day][name] for day in dates]), dates, transform)
+            for name in index_names
+        } if dates else {}
+    
+    def refresh_carbon_stock(
+        self,
+        project: Project,
+        db: Session,
+        start_date: str,
+        end_date: str,
+        satellite: str = 'Sentinel-2',
+        full_refresh: bool = False
+    ) -> int:
+        """
+        Store carbon stocks for acquisitions from start_date to end_date
+        
+        Stocks are per date, so only the new window is read. Projects without
+        stocks from the current carbon_store.MODEL_VERSION (never built, or
+        built by an older biomass model) and full refreshes cover the
+        baseline year and the whole project history instead. Projects whose
+        type has no biome are skipped, as is everything without a scene
+        catalog.
+        
+        Returns:
+            int: Carbon-stock dates written
+        """
+        if self._scene_catalog() is None:
+            return 0
+        biome = PROJECT_TYPE_BIOMES.get((project.project_type or '').strip().lower().replace(' ', '_'))
+        if biome is None:
+            return 0
+        if full_refresh or not has_current_carbon_stock(db, project.id):
+            start_date = (project.start_date - timedelta(days=BACI_BASELINE_DAYS)).strftime('%Y-%m-%d')
+        if start_date >= end_date:
+            return 0
+        
+        cubes = self.catalog_index_cubes(self._project_coordinates(project.project_area), start_date, end_date,
+                                         [BIOME_MODELS[biome]['index']], satellite)
+        if not cubes:
+            return 0
+        return self.build_carbon_stock(project.id, cubes, db, biome=biome)['dates_written']
+    
+    def get_carbon_sequestration(self, project_id: int, db: Session, history: bool = False) -> Dict[str, Any]:
+        """Sequestration since project start from the stored carbon-stock series"""
+        
+        project = db.query(Project).filter(Project.id == project_id).first()
+        if not project:
+            raise ValueError(f"Project {project_id} not found")
+        
+        result = {
+            'project_id': project_id,
+            'sequestration': project_sequestration(db, project_id, project.start_date.strftime('%Y-%m-%d'))
+        }
+        if history:
+            result['carbon_stock'] = get_carbon_series(db, project_id, '1900-01-01',
+                                                       datetime.now().strftime('%Y-%m-%d'))
+        return result
+    
     async def get_control_area_comparison(
         self, 
         project_id: int, 
-        db: Session
+        db: Session,
+        end_date: Optional[str] = None,
+        baseline_days: int = BACI_BASELINE_DAYS
     ) -> Dict[str, Any]:
         """Compare project area with control areas"""
         
+        if not self.initialized:
+            raise Exception("Google Earth Engine not initialized")
+        
         project = db.query(Project).filter(Project.id == project_id).first()
         if not project:
             raise ValueError(f"Project {project_id} not found")
         
-        # This would implement the BACI methodology
-        # comparing treatment area with control areas
+        # BACI: project start splits before/after; matched grid cells (or a
+        # surrounding ring without a candidate grid) are the control, and
+        # the cells are also the donor pool for a synthetic control
+        intervention_date = project.start_date.strftime('%Y-%m-%d')
+        start_date = (project.start_date - timedelta(days=baseline_days)).strftime('%Y-%m-%d')
+        end_date = end_date or datetime.now().strftime('%Y-%m-%d')
+        
+        coordinates = self._project_coordinates(project.project_area)
+        control_cells = self._matched_control_cells(coordinates, db)
+        features = [ee.Feature(ee.Geometry.Polygon(coordinates), {'project_id': project_id})]
+        if control_cells:
+            # Matched cells are reduced separately: their mean is the BACI
+            # control and together they are the synthetic-control donor pool
+            cell_rings = [self._box_ring(cell['bounds']) for cell in control_cells]
+            features += [
+                ee.Feature(ee.Geometry.Polygon(ring), {'project_id': DONOR_FEATURE_ID_BASE - i})
+                for i, ring in enumerate(cell_rings)
+            ]
+            extent = [point for ring in cell_rings for point in ring] + coordinates
+        else:
+            rings = self._control_rings(coordinates)
+            features.append(ee.Feature(ee.Geometry.Polygon(rings), {'project_id': CONTROL_FEATURE_ID}))
+            extent = rings[0]
+        
+        footprint = ee.Geometry.Rectangle(self._bounds(extent))
+        collection = self._indices_collection(footprint, start_date, end_date)
+        series = await self.jobs.evaluate_zonal_series(
+            collection, ee.FeatureCollection(features), INDEX_NAMES, scale=10
+        )
         
+        empty = {index_name: [] for index_name in INDEX_NAMES}
+        treatment = series.get(project_id, empty)
+        donors = {
+            str(cell['cell']): series.get(DONOR_FEATURE_ID_BASE - i, empty)
+            for i, cell in enumerate(control_cells)
+        }
+        control = self._mean_series(list(donors.values())) if donors else series.get(CONTROL_FEATURE_ID, empty)
+        
+        loop = asyncio.get_running_loop()
+        analysis = await loop.run_in_executor(None, baci_analysis, treatment, control, intervention_date)
+        synthetic = None
+        if donors:
+            # Warm-start from the weights of the last stored fit
+            previous = (stored_result(db, project_id, 'baci') or {}).get('synthetic_control') or {}
+            synthetic = await loop.run_in_executor(None, partial(
+                synthetic_control, treatment, donors, intervention_date, INDEX_NAMES,
+                initial=previous.get('weights')
+            ))
         return {
             'project_id': project_id,
-            'treatment_area_stats': {
-                'ndvi_mean': 0.45,
-                'ndvi_std': 0.12,
-                'ndwi_mean': 0.15,
-                'ndwi_std': 0.08
-            },
-            'control_area_stats': {
-                'ndvi_mean': 0.32,
-                'ndvi_std': 0.15,
-                'ndwi_mean': 0.08,
-                'ndwi_std': 0.06
-            },
-            'treatment_effect': 0.13,  # Difference in NDVI
-            'confidence_interval': {'lower': 0.08, 'upper': 0.18},
-            'p_value': 0.02,
-            'significance': True
+            'date_range': {'start': start_date, 'end': end_date},
+            'control_cells': [
+                {'cell': cell['cell'], 'center': cell['center'], 'distance': cell['distance']}
+                for cell in control_cells
+            ],
+            **analysis,
+            'synthetic_control': synthetic
         }
 
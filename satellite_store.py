@@ -0,0 +1,180 @@
+"""
+Bulk persistence for satellite index data in Orun.io
+Merges per-index time series into one row per acquisition and writes them
+with a dialect-specific bulk insert-or-update
+"""
+
+import csv
+import io
+from datetime import datetime
+from typing import Dict, List, Optional, Any
+
+from sqlalchemy import func, tuple_
+from sqlalchemy.orm import Session
+from models import SatelliteData
+
+# Index name -> SatelliteData column
+INDEX_COLUMNS = {
+    'NDVI': 'ndvi_mean',
+    'NDWI': 'ndwi_mean',
+    'EVI': 'evi_mean'
+}
+
+# Natural key of a SatelliteData row; requires a unique constraint on these
+# columns for the ON CONFLICT paths
+KEY_COLUMNS = ['project_id', 'satellite', 'acquisition_date']
+VALUE_COLUMNS = ['cloud_cover'] + list(INDEX_COLUMNS.values())
+
+# Row counts above which Postgres writes go through COPY instead of VALUES
+COPY_THRESHOLD = 1000
+VALUES_BATCH_SIZE = 1000
+
+
+def merge_index_series(
+    project_id: int,
+    satellite: str,
+    indices_data: Dict[str, List[Dict[str, Any]]]
+) -> List[Dict[str, Any]]:
+    """Merge per-index series into one row per acquisition date"""
+    rows: Dict[str, Dict[str, Any]] = {}
+
+    for index_name, time_series in indices_data.items():
+        column = INDEX_COLUMNS.get(index_name)
+        if column is None:
+            continue
+        for data_point in time_series:
+            row = rows.get(data_point['date'])
+            if row is None:
+                row = rows[data_point['date']] = {
+                    'project_id': project_id,
+                    'satellite': satellite,
+                    'acquisition_date': datetime.strptime(data_point['date'], '%Y-%m-%d'),
+                    'cloud_cover': data_point.get('cloud_cover'),
+                    **{c: None for c in INDEX_COLUMNS.values()}
+                }
+            row[column] = data_point['value']
+
+    return [rows[date] for date in sorted(rows)]
+
+
+def get_watermark(db: Session, project_id: int, satellite: str) -> Optional[datetime]:
+    """
+    Latest stored acquisition date for a project and sensor
+
+    Acquisitions are only ever written through the upsert below, so the
+    newest stored row is the processing watermark. The lookup is served by
+    the (project_id, satellite, acquisition_date) unique index.
+    """
+    return db.query(func.max(SatelliteData.acquisition_date)).filter(
+        SatelliteData.project_id == project_id,
+        SatelliteData.satellite == satellite
+    ).scalar()
+
+
+def bulk_upsert_satellite_data(db: Session, rows: List[Dict[str, Any]]) -> int:
+    """
+    Insert or update merged SatelliteData rows in bulk
+
+    Existing rows with the same (project_id, satellite, acquisition_date) are
+    updated; index values missing from the new row keep their stored value.
+    The caller owns the transaction and commits.
+
+    Returns:
+        int: Number of rows written
+    """
+    if not rows:
+        return 0
+
+    dialect = db.get_bind().dialect.name
+    if dialect == 'postgresql':
+        if len(rows) >= COPY_THRESHOLD and _copy_upsert(db, rows):
+            return len(rows)
+        _values_upsert(db, rows, dialect)
+    elif dialect == 'sqlite':
+        _values_upsert(db, rows, dialect)
+    else:
+        _orm_upsert(db, rows)
+    return len(rows)
+
+
+def _values_upsert(db: Session, rows: List[Dict[str, Any]], dialect: str):
+    """Multi-row INSERT ... VALUES ... ON CONFLICT DO UPDATE in batches"""
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+
+    table = SatelliteData.__table__
+    for start in range(0, len(rows), VALUES_BATCH_SIZE):
+        statement = insert(table).values(rows[start:start + VALUES_BATCH_SIZE])
+        statement = statement.on_conflict_do_update(
+            index_elements=KEY_COLUMNS,
+            set_={
+                column: func.coalesce(statement.excluded[column], table.c[column])
+                for column in VALUE_COLUMNS
+            }
+        )
+        db.execute(statement)
+
+
+def _copy_upsert(db: Session, rows: List[Dict[str, Any]]) -> bool:
+    """COPY rows into a temporary stage table, then upsert from it in one statement"""
+    raw_connection = db.connection().connection.driver_connection
+    cursor = raw_connection.cursor()
+    if not hasattr(cursor, 'copy_expert'):
+        # Only psycopg2 exposes copy_expert; other drivers use VALUES batches
+        cursor.close()
+        return False
+
+    table_name = SatelliteData.__tablename__
+    stage = f'_{table_name}_stage'
+    columns = KEY_COLUMNS + VALUE_COLUMNS
+    column_list = ', '.join(columns)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(['' if row[c] is None else row[c] for c in columns])
+    buffer.seek(0)
+
+    updates = ', '.join(
+        f'{c} = COALESCE(EXCLUDED.{c}, {table_name}.{c})' for c in VALUE_COLUMNS
+    )
+    with cursor:
+        cursor.execute(
+            f'CREATE TEMP TABLE IF NOT EXISTS {stage} ON COMMIT DROP AS '
+            f'SELECT {column_list} FROM {table_name} WITH NO DATA'
+        )
+        cursor.copy_expert(f"COPY {stage} ({column_list}) FROM STDIN WITH (FORMAT csv)", buffer)
+        cursor.execute(
+            f'INSERT INTO {table_name} ({column_list}) '
+            f'SELECT DISTINCT ON ({", ".join(KEY_COLUMNS)}) {column_list} FROM {stage} '
+            f'ON CONFLICT ({", ".join(KEY_COLUMNS)}) DO UPDATE SET {updates}'
+        )
+        cursor.execute(f'TRUNCATE {stage}')
+    return True
+
+
+def _orm_upsert(db: Session, rows: List[Dict[str, Any]]):
+    """Portable fallback: one key lookup, then bulk insert and bulk update"""
+    keys = [tuple(row[c] for c in KEY_COLUMNS) for row in rows]
+    key_columns = [getattr(SatelliteData, c) for c in KEY_COLUMNS]
+    existing = dict(
+        ((project_id, satellite, acquisition_date), row_id)
+        for row_id, project_id, satellite, acquisition_date in db.query(
+            SatelliteData.id, *key_columns
+        ).filter(tuple_(*key_columns).in_(keys))
+    )
+
+    inserts, updates = [], []
+    for key, row in zip(keys, rows):
+        if key in existing:
+            updates.append(dict(
+                {c: row[c] for c in VALUE_COLUMNS if row[c] is not None},
+                id=existing[key]
+            ))
+        else:
+            inserts.append(row)
+
+    db.bulk_insert_mappings(SatelliteData, inserts)
+    db.bulk_update_mappings(SatelliteData, updates)
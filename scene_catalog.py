@@ -0,0 +1,205 @@
+"""
+Local scene catalog for Orun.io
+STAC-like index of available Sentinel-2 and Landsat scenes with an R-tree
+over footprints and a B-tree over sensing time, so scene selection for a
+project and date range needs no remote catalog query
+"""
+
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Any, Iterable, Sequence
+
+# Default cloud filter, matching CLOUDY_PIXEL_PERCENTAGE < 20 in SatelliteService
+DEFAULT_MAX_CLOUD = 20.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS scenes (
+    id INTEGER PRIMARY KEY,
+    scene_id TEXT NOT NULL UNIQUE,
+    sensor TEXT NOT NULL,
+    sensing_time REAL NOT NULL,
+    cloud_percentage REAL,
+    tile TEXT,
+    footprint TEXT NOT NULL,
+    bands TEXT NOT NULL,
+    properties TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_scenes_sensor_time ON scenes (sensor, sensing_time);
+CREATE VIRTUAL TABLE IF NOT EXISTS scene_footprints USING rtree (
+    id, min_x, max_x, min_y, max_y
+);
+"""
+
+
+def _to_epoch(value: Any) -> float:
+    """Epoch seconds from a datetime, 'YYYY-MM-DD' or ISO 8601 string"""
+    if isinstance(value, datetime):
+        parsed = value
+    elif len(value) == 10:
+        parsed = datetime.strptime(value, '%Y-%m-%d')
+    else:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def _bounds(coordinates: Sequence[Sequence[float]]) -> List[float]:
+    xs = [point[0] for point in coordinates]
+    ys = [point[1] for point in coordinates]
+    return [min(xs), min(ys), max(xs), max(ys)]
+
+
+class SceneCatalog:
+    """SQLite-backed scene catalog with spatial and temporal indexes"""
+
+    def __init__(self, path: str = ':memory:'):
+        """
+        Open or create a catalog
+
+        Args:
+            path (str): SQLite database file; ':memory:' for a transient catalog
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(SCHEMA)
+
+    def add_scenes(self, scenes: Iterable[Dict[str, Any]]) -> int:
+        """
+        Insert or replace scenes in one transaction
+
+        Each scene is a dict with 'scene_id', 'sensor', 'sensing_time',
+        'cloud_percentage', 'footprint' (ring of [lon, lat]), 'bands'
+        (band id -> file path or URL) and optional 'tile' and 'properties'.
+
+        Returns:
+            int: Number of scenes written
+        """
+        count = 0
+        with self._lock, self.connection:
+            for scene in scenes:
+                footprint = scene['footprint']
+                cursor = self.connection.execute(
+                    "INSERT INTO scenes (scene_id, sensor, sensing_time, cloud_percentage, tile, "
+                    "footprint, bands, properties) VALUES (?, ?, ?, ?, ?, ?, ?, ?) "
+                    "ON CONFLICT (scene_id) DO UPDATE SET sensor = excluded.sensor, "
+                    "sensing_time = excluded.sensing_time, cloud_percentage = excluded.cloud_percentage, "
+                    "tile = excluded.tile, footprint = excluded.footprint, bands = excluded.bands, "
+                    "properties = excluded.properties RETURNING id",
+                    (
+                        scene['scene_id'], scene['sensor'], _to_epoch(scene['sensing_time']),
+                        scene.get('cloud_percentage'), scene.get('tile'), json.dumps(footprint),
+                        json.dumps(scene['bands']), json.dumps(scene.get('properties', {}))
+                    )
+                )
+                row_id = cursor.fetchone()[0]
+                min_x, min_y, max_x, max_y = _bounds(footprint)
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO scene_footprints (id, min_x, max_x, min_y, max_y) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (row_id, min_x, max_x, min_y, max_y)
+                )
+                count += 1
+        return count
+
+    def add_stac_items(self, items: Iterable[Dict[str, Any]], sensor: Optional[str] = None) -> int:
+        """Ingest STAC item dicts (e.g. from a local STAC export)"""
+        def convert(item):
+            properties = item.get('properties', {})
+            geometry = item.get('geometry') or {}
+            if geometry.get('type') == 'Polygon':
+                footprint = geometry['coordinates'][0]
+            else:
+                x0, y0, x1, y1 = item['bbox']
+                footprint = [[x0, y0], [x1, y0], [x1, y1], [x0, y1], [x0, y0]]
+            return {
+                'scene_id': item['id'],
+                'sensor': sensor or properties.get('platform', item.get('collection', 'unknown')),
+                'sensing_time': properties['datetime'],
+                'cloud_percentage': properties.get('eo:cloud_cover'),
+                'tile': properties.get('s2:mgrs_tile') or properties.get('landsat:wrs_path'),
+                'footprint': footprint,
+                'bands': {name: asset['href'] for name, asset in item.get('assets', {}).items()},
+                'properties': properties
+            }
+        return self.add_scenes(convert(item) for item in items)
+
+    def search(
+        self,
+        bounds: Sequence[float],
+        start_date: str,
+        end_date: str,
+        max_cloud: Optional[float] = DEFAULT_MAX_CLOUD,
+        sensors: Optional[List[str]] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Scenes intersecting bounds within [start_date, end_date)
+
+        Mirrors filterBounds / filterDate / CLOUDY_PIXEL_PERCENTAGE filtering
+        on an Earth Engine collection. The footprint R-tree and the
+        (sensor, sensing_time) index keep this to a few milliseconds.
+
+        Args:
+            bounds (Sequence[float]): [min_lon, min_lat, max_lon, max_lat]
+            max_cloud (float): Exclusive cloud percentage limit; None to skip
+            sensors (List[str]): Restrict to these sensors
+        """
+        min_x, min_y, max_x, max_y = bounds
+        # CROSS JOIN pins the R-tree as the driving table: project footprints
+        # are far more selective than date ranges
+        sql = [
+            "SELECT s.* FROM scene_footprints f CROSS JOIN scenes s ON s.id = f.id",
+            "WHERE f.max_x >= ? AND f.min_x <= ? AND f.max_y >= ? AND f.min_y <= ?",
+            "AND s.sensing_time >= ? AND s.sensing_time < ?"
+        ]
+        params: List[Any] = [min_x, max_x, min_y, max_y, _to_epoch(start_date), _to_epoch(end_date)]
+        if max_cloud is not None:
+            sql.append("AND s.cloud_percentage < ?")
+            params.append(max_cloud)
+        if sensors:
+            sql.append(f"AND s.sensor IN ({', '.join('?' for _ in sensors)})")
+            params.extend(sensors)
+        sql.append("ORDER BY s.sensing_time")
+        if limit:
+            sql.append("LIMIT ?")
+            params.append(limit)
+
+        with self._lock:
+            rows = self.connection.execute(' '.join(sql), params).fetchall()
+        return [self._to_scene(row) for row in rows]
+
+    def scenes_for_project(
+        self,
+        coordinates: Sequence[Sequence[float]],
+        start_date: str,
+        end_date: str,
+        max_cloud: Optional[float] = DEFAULT_MAX_CLOUD,
+        sensors: Optional[List[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """Scenes covering a project polygon ring within a date range"""
+        return self.search(_bounds(coordinates), start_date, end_date, max_cloud, sensors)
+
+    def count(self) -> int:
+        with self._lock:
+            return self.connection.execute("SELECT COUNT(*) FROM scenes").fetchone()[0]
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def _to_scene(row: sqlite3.Row) -> Dict[str, Any]:
+        return {
+            'scene_id': row['scene_id'],
+            'sensor': row['sensor'],
+            'sensing_time': datetime.fromtimestamp(row['sensing_time'], tz=timezone.utc).isoformat(),
+            'cloud_percentage': row['cloud_percentage'],
+            'tile': row['tile'],
+            'footprint': json.loads(row['footprint']),
+            'bands': json.loads(row['bands']),
+            'properties': json.loads(row['properties'] or '{}')
+        }
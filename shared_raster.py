@@ -0,0 +1,316 @@
+"""
+Shared-memory raster exchange for Orun.io pipeline workers
+Process-pool stages receive small descriptors of rasters held in
+multiprocessing.shared_memory (or memory-mapped files) instead of pickled
+tiles, write per-pixel results in place and return only small reductions
+"""
+
+import os
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed, wait
+from contextlib import contextmanager
+from multiprocessing import shared_memory
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Any, Tuple
+
+import numpy as np
+
+from raster_products import DEFAULT_TILE_SIZE, iter_windows, trend_anomaly_block
+from zonal_stats import LabelRaster
+
+# Descriptor: ('shm', name, shape, dtype) or ('memmap', path, offset, shape, dtype)
+Descriptor = Tuple
+
+# Worker-side attachments, reused across tasks in the same process; the
+# oldest are released first so long-lived pools don't pin unlinked blocks
+MAX_ATTACHED = 16
+_ATTACHED: Dict[Descriptor, Tuple[Any, np.ndarray]] = {}
+
+
+class SharedArray:
+    """NumPy array backed by a named shared-memory block owned by this process"""
+
+    def __init__(self, shape: Tuple[int, ...], dtype: Any, fill: Optional[float] = None):
+        dtype = np.dtype(dtype)
+        size = max(int(np.prod(shape)) * dtype.itemsize, 1)
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+        if fill is not None:
+            self.array.fill(fill)
+        self.descriptor: Descriptor = ('shm', self.shm.name, tuple(shape), dtype.str)
+
+    @classmethod
+    def from_array(cls, source: np.ndarray) -> 'SharedArray':
+        shared = cls(source.shape, source.dtype)
+        shared.array[...] = source
+        return shared
+
+    def close(self):
+        """Release and unlink the block; copy out `array` first if it is still needed"""
+        self.array = None
+        self.shm.close()
+        self.shm.unlink()
+
+    def __enter__(self) -> 'SharedArray':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def describe(array: np.ndarray) -> Tuple[Descriptor, Optional[SharedArray]]:
+    """
+    Descriptor for handing an array to workers
+
+    File-backed memmaps are passed by path and offset without copying;
+    anything else is copied once into a new shared-memory block, which the
+    caller must close.
+    """
+    if isinstance(array, np.memmap) and array.filename and array.flags['C_CONTIGUOUS']:
+        return ('memmap', array.filename, array.offset, array.shape, array.dtype.str), None
+    shared = SharedArray.from_array(np.ascontiguousarray(array))
+    return shared.descriptor, shared
+
+
+def attach(descriptor: Descriptor) -> np.ndarray:
+    """Array view for a descriptor inside a worker process; memmaps (inputs only) are read-only"""
+    cached = _ATTACHED.get(descriptor)
+    if cached is not None:
+        return cached[1]
+
+    if descriptor[0] == 'memmap':
+        _, path, offset, shape, dtype = descriptor
+        array = np.memmap(path, dtype=np.dtype(dtype), mode='r', offset=offset, shape=shape)
+        handle = array
+    else:
+        _, name, shape, dtype = descriptor
+        try:
+            handle = shared_memory.SharedMemory(name=name, track=False)
+        except TypeError:
+            # Python < 3.13 always registers attachments with the resource
+            # tracker, which then unlinks the parent's block when a spawned
+            # worker exits (or double-unregisters it under fork)
+            from multiprocessing import resource_tracker
+            register = resource_tracker.register
+            resource_tracker.register = lambda *args, **kwargs: None
+            try:
+                handle = shared_memory.SharedMemory(name=name)
+            finally:
+                resource_tracker.register = register
+        array = np.ndarray(shape, dtype=np.dtype(dtype), buffer=handle.buf)
+    _ATTACHED[descriptor] = (handle, array)
+    while len(_ATTACHED) > MAX_ATTACHED:
+        stale = _ATTACHED.pop(next(iter(_ATTACHED)))[0]
+        if isinstance(stale, shared_memory.SharedMemory):
+            try:
+                stale.close()
+            except BufferError:
+                # A view is still alive; the mapping goes with it
+                pass
+    return array
+
+
+def _run_task(worker: Callable, inputs: Dict[str, Descriptor], outputs: Dict[str, Descriptor],
+              window: Tuple[slice, slice], params: Dict[str, Any]) -> Any:
+    views_in = {}
+    for name, descriptor in inputs.items():
+        # Workers only read their inputs; a stray write raises instead of
+        # silently changing the caller's raster
+        view = attach(descriptor).view()
+        view.flags.writeable = False
+        views_in[name] = view
+    views_out = {name: attach(d) for name, d in outputs.items()}
+    return worker(views_in, views_out, window, **params)
+
+
+@contextmanager
+def _shared_buffers(
+    inputs: Dict[str, np.ndarray],
+    outputs: Optional[Dict[str, Tuple[Tuple[int, ...], Any, float]]] = None
+) -> Iterator[Tuple[Dict[str, Descriptor], Dict[str, SharedArray]]]:
+    """Input descriptors and shared output buffers, released on exit"""
+    owned: List[SharedArray] = []
+    try:
+        input_descriptors = {}
+        for name, array in inputs.items():
+            descriptor, shared = describe(array)
+            input_descriptors[name] = descriptor
+            if shared is not None:
+                owned.append(shared)
+
+        output_arrays = {}
+        for name, (out_shape, dtype, fill) in (outputs or {}).items():
+            shared = SharedArray(out_shape, dtype, fill)
+            owned.append(shared)
+            output_arrays[name] = shared
+        yield input_descriptors, output_arrays
+    finally:
+        for shared in owned:
+            shared.close()
+
+
+def _tile_windows(inputs: Dict[str, np.ndarray], shape: Optional[Tuple[int, int]],
+                  tile_size: int) -> List[Tuple[slice, slice]]:
+    raster_shape = shape or next(iter(inputs.values())).shape[-2:]
+    return [(rows, cols) for _, _, rows, cols in iter_windows(raster_shape, tile_size)]
+
+
+def run_tiled(
+    worker: Callable,
+    inputs: Dict[str, np.ndarray],
+    outputs: Optional[Dict[str, Tuple[Tuple[int, ...], Any, float]]] = None,
+    windows: Optional[Iterable[Tuple[slice, slice]]] = None,
+    shape: Optional[Tuple[int, int]] = None,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    workers: Optional[int] = None,
+    params: Optional[Dict[str, Any]] = None,
+    executor: Optional[ProcessPoolExecutor] = None
+) -> Tuple[Dict[str, np.ndarray], List[Any]]:
+    """
+    Run a tile worker over a process pool with zero-copy raster exchange
+
+    Args:
+        worker: Top-level function worker(inputs, outputs, window, **params);
+            it reads its window from `inputs`, writes per-pixel results into
+            `outputs` and returns a small (picklable) reduction
+        inputs: Input rasters by name
+        outputs: Output rasters to allocate in shared memory, as name ->
+            (shape, dtype, fill value)
+        windows: (row slice, col slice) windows over the last two axes;
+            defaults to tiles of `shape` (or the first input's last two axes)
+        workers: Pool size when no executor is given
+
+    Returns:
+        Output arrays (copied out of shared memory) and the per-window
+        reductions in window order
+    """
+    params = params or {}
+    windows = list(windows) if windows is not None else _tile_windows(inputs, shape, tile_size)
+    with _shared_buffers(inputs, outputs) as (input_descriptors, output_arrays):
+        output_descriptors = {name: shared.descriptor for name, shared in output_arrays.items()}
+        pool = executor or ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+        try:
+            futures = [
+                pool.submit(_run_task, worker, input_descriptors, output_descriptors, window, params)
+                for window in windows
+            ]
+            reductions = [future.result() for future in futures]
+        finally:
+            if executor is None:
+                pool.shutdown()
+        results = {name: shared.array.copy() for name, shared in output_arrays.items()}
+    return results, reductions
+
+
+def stream_tiled(
+    worker: Callable,
+    inputs: Dict[str, np.ndarray],
+    windows: Optional[Iterable[Tuple[slice, slice]]] = None,
+    shape: Optional[Tuple[int, int]] = None,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    workers: Optional[int] = None,
+    params: Optional[Dict[str, Any]] = None,
+    executor: Optional[ProcessPoolExecutor] = None
+) -> Iterator[Tuple[Tuple[slice, slice], Any]]:
+    """
+    Yield (window, reduction) pairs as tiles finish, in completion order
+
+    Like run_tiled without shared outputs, for stages whose per-tile
+    reductions are consumed incrementally rather than collected.
+    """
+    params = params or {}
+    windows = list(windows) if windows is not None else _tile_windows(inputs, shape, tile_size)
+    with _shared_buffers(inputs) as (input_descriptors, _):
+        pool = executor or ProcessPoolExecutor(max_workers=workers or os.cpu_count())
+        futures = {}
+        try:
+            for window in windows:
+                futures[pool.submit(_run_task, worker, input_descriptors, {}, window, params)] = window
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+        finally:
+            # An abandoned stream must not leave tasks reading released buffers
+            for future in futures:
+                future.cancel()
+            if executor is None:
+                pool.shutdown()
+            else:
+                wait(futures)
+
+
+# Pipeline stage workers --------------------------------------------------------
+
+def _composite_worker(inputs, outputs, window, method='median'):
+    rows, cols = window
+    block = np.asarray(inputs['cube'][:, rows, cols], dtype=np.float32)
+    reducer = np.nanmedian if method == 'median' else np.nanmean
+    with warnings.catch_warnings():
+        # All-NaN pixels (cloud everywhere) stay NaN
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        outputs['composite'][rows, cols] = reducer(block, axis=0)
+    return int(np.isfinite(outputs['composite'][rows, cols]).sum())
+
+
+def _zonal_worker(inputs, outputs, window, n_labels=0):
+    rows, cols = window
+    tile = LabelRaster(np.asarray(inputs['labels'][rows, cols]), range(n_labels))
+    return tile.zonal_statistics({'values': inputs['values'][rows, cols]})['values']
+
+
+def _trend_worker(inputs, outputs, window, day_offsets=None):
+    rows, cols = window
+    slope, anomaly = trend_anomaly_block(np.asarray(inputs['cube'][:, rows, cols]), day_offsets)
+    outputs['trend_slope'][rows, cols] = slope
+    outputs['latest_anomaly'][rows, cols] = anomaly
+    return int(np.isfinite(slope).sum())
+
+
+def composite(cube: np.ndarray, method: str = 'median', workers: Optional[int] = None,
+              tile_size: int = DEFAULT_TILE_SIZE) -> np.ndarray:
+    """Per-pixel median (or mean) composite of a (dates, rows, cols) cube"""
+    outputs, _ = run_tiled(
+        _composite_worker, {'cube': cube},
+        outputs={'composite': (cube.shape[1:], np.float32, np.nan)},
+        tile_size=tile_size, workers=workers, params={'method': method}
+    )
+    return outputs['composite']
+
+
+def zonal_sums(labels: np.ndarray, values: np.ndarray, n_labels: int, workers: Optional[int] = None,
+               tile_size: int = DEFAULT_TILE_SIZE) -> Dict[str, np.ndarray]:
+    """
+    Per-label count, sum, sum of squares, min and max merged from tile partials
+
+    Each tile is reduced with the LabelRaster kernel from zonal_stats. Arrays
+    are indexed by label - 1; labels without valid pixels have count and
+    sums 0 and NaN min and max.
+    """
+    _, partials = run_tiled(
+        _zonal_worker, {'labels': labels, 'values': values},
+        tile_size=tile_size, workers=workers, params={'n_labels': n_labels}
+    )
+    merged = {
+        'count': np.zeros(n_labels, dtype=np.int64),
+        'sum': np.zeros(n_labels),
+        'sum_sq': np.zeros(n_labels),
+        'min': np.full(n_labels, np.nan),
+        'max': np.full(n_labels, np.nan)
+    }
+    # Labels without valid pixels in a tile have NaN partial statistics
+    for partial in partials:
+        merged['count'] += partial['count']
+        merged['sum'] += np.nan_to_num(partial['sum'])
+        merged['sum_sq'] += np.nan_to_num(partial['sum_sq'])
+        merged['min'] = np.fmin(merged['min'], partial['min'])
+        merged['max'] = np.fmax(merged['max'], partial['max'])
+    return merged
+
+
+def pixel_trends(cube: np.ndarray, day_offsets: np.ndarray, workers: Optional[int] = None,
+                 tile_size: int = DEFAULT_TILE_SIZE) -> Dict[str, np.ndarray]:
+    """Per-pixel trend slope (per year) and latest anomaly of a (dates, rows, cols) cube"""
+    products = {name: (cube.shape[1:], np.float32, np.nan) for name in ('trend_slope', 'latest_anomaly')}
+    outputs, _ = run_tiled(
+        _trend_worker, {'cube': cube}, outputs=products,
+        tile_size=tile_size, workers=workers, params={'day_offsets': np.asarray(day_offsets, dtype=float)}
+    )
+    return outputs
@@ -2,11 +2,17 @@
 Simple working API for Orun.io MVP
 """
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Query
 from fastapi.middleware.cors import CORSMiddleware
 import json
 import random
 from datetime import datetime, timedelta
+from typing import List, Optional
+
+import numpy as np
+
+from portfolio_cube import build_cube
+from resilience import COMPONENTS, score_components
 
 app = FastAPI(title="Orun.io MVP API")
 
@@ -30,6 +36,8 @@ PROJECTS = [
         "latitude": -1.8,
         "longitude": 37.6,
         "budget": 250000,
+        "beneficiaries": 5000,
+        "start_date": "2024-01-15",
         "funding_source": "Green Climate Fund",
         "status": "active"
     },
@@ -42,6 +50,8 @@ PROJECTS = [
         "latitude": 4.5,
         "longitude": 6.0,
         "budget": 500000,
+        "beneficiaries": 8000,
+        "start_date": "2024-02-01",
         "funding_source": "African Development Bank",
         "status": "active"
     },
@@ -54,6 +64,8 @@ PROJECTS = [
         "latitude": -19.5,
         "longitude": 22.5,
         "budget": 350000,
+        "beneficiaries": 3000,
+        "start_date": "2024-03-01",
         "funding_source": "Adaptation Fund",
         "status": "active"
     }
@@ -82,6 +94,44 @@ REPORTS = [
     }
 ]
 
+# Sample index statistics per project: recent level, change against the
+# pre-project baseline and NDVI month-to-month coefficient of variation
+SAMPLE_INDEX_STATS = {
+    1: {"ndvi_level": 0.46, "ndvi_change": 0.06, "ndvi_cv": 0.18, "ndwi_level": 0.17, "ndwi_change": 0.05, "evi_level": 0.31},
+    2: {"ndvi_level": 0.58, "ndvi_change": 0.08, "ndvi_cv": 0.09, "ndwi_level": 0.22, "ndwi_change": 0.03, "evi_level": 0.39},
+    3: {"ndvi_level": 0.41, "ndvi_change": 0.04, "ndvi_cv": 0.22, "ndwi_level": 0.26, "ndwi_change": 0.07, "evi_level": 0.27}
+}
+
+# Materialized resilience scores; projects whose inputs changed are stale
+RESILIENCE_SCORES = {}
+STALE_RESILIENCE = {p["id"] for p in PROJECTS}
+
+# Portfolio aggregates by country, project type, funding source and month,
+# kept up to date as reports and scores change
+PORTFOLIO_CUBE = build_cube([dict(p, funding=p["budget"]) for p in PROJECTS], REPORTS)
+
+def refresh_resilience_scores():
+    """Recompute stale projects' resilience scores in one vectorized pass"""
+    project_ids = sorted(STALE_RESILIENCE)
+    if not project_ids:
+        return
+    stats = {
+        name: np.array([SAMPLE_INDEX_STATS.get(pid, {}).get(name, np.nan) for pid in project_ids])
+        for name in ("ndvi_level", "ndvi_change", "ndvi_cv", "ndwi_level", "ndwi_change", "evi_level")
+    }
+    reports = [[r for r in REPORTS if r["project_id"] == pid] for pid in project_ids]
+    stats["report_count"] = np.array([len(r) for r in reports], dtype=float)
+    stats["verified_share"] = np.array([sum(x["is_verified"] for x in r) / max(len(r), 1) for r in reports])
+    scores = score_components(stats)
+    for i, pid in enumerate(project_ids):
+        RESILIENCE_SCORES[pid] = {
+            name: None if np.isnan(scores[name][i]) else round(float(scores[name][i]), 1)
+            for name in COMPONENTS + ["resilience_score"]
+        }
+        if pid in PORTFOLIO_CUBE:
+            PORTFOLIO_CUBE.set_resilience(pid, RESILIENCE_SCORES[pid]["resilience_score"])
+    STALE_RESILIENCE.clear()
+
 @app.get("/")
 async def root():
     return {"message": "Orun.io MVP API - Working!", "status": "operational"}
@@ -119,6 +169,9 @@ async def submit_report(report_data: dict):
         "created_at": datetime.now().isoformat()
     }
     REPORTS.append(new_report)
+    STALE_RESILIENCE.add(new_report["project_id"])
+    if new_report["project_id"] in PORTFOLIO_CUBE:
+        PORTFOLIO_CUBE.add_report(new_report)
     return {"message": "Report submitted successfully", "incentive": "$3.50 USD"}
 
 @app.get("/satellite/indices/{project_id}")
@@ -150,31 +203,51 @@ async def get_satellite_data(project_id: int):
 
 @app.get("/impact/analysis/{project_id}")
 async def get_impact_analysis(project_id: int):
+    refresh_resilience_scores()
+    scores = RESILIENCE_SCORES.get(project_id, {})
     return {
         "project_id": project_id,
         "treatment_effect": round(random.uniform(0.1, 0.3), 3),
         "p_value": round(random.uniform(0.01, 0.05), 3),
         "significance": True,
-        "resilience_score": round(random.uniform(70, 90), 1),
-        "resilience_components": {
-            "water_security": round(random.uniform(75, 95), 1),
-            "agricultural_productivity": round(random.uniform(65, 85), 1),
-            "ecosystem_health": round(random.uniform(70, 90), 1),
-            "community_engagement": round(random.uniform(80, 95), 1)
-        },
+        "resilience_score": scores.get("resilience_score"),
+        "resilience_components": {name: scores.get(name) for name in COMPONENTS},
         "is_verified": True
     }
 
 @app.get("/analytics/dashboard")
 async def get_dashboard():
+    totals = PORTFOLIO_CUBE.query()["totals"]
     return {
-        "total_projects": len(PROJECTS),
+        "total_projects": totals["projects"],
         "active_communities": 35,
-        "total_reports": len(REPORTS),
-        "verified_impact": len([r for r in REPORTS if r["is_verified"]]),
+        "total_reports": totals["reports"],
+        "verified_impact": totals["verified_reports"],
         "funding_unlocked": 2300000
     }
 
+@app.get("/analytics/cube")
+async def get_analytics_cube(
+    group_by: List[str] = Query([]),
+    country: Optional[List[str]] = Query(None),
+    project_type: Optional[List[str]] = Query(None),
+    funding_source: Optional[List[str]] = Query(None),
+    month_from: Optional[str] = None,
+    month_to: Optional[str] = None
+):
+    """Slice and dice portfolio aggregates, e.g. ?group_by=country&group_by=month"""
+    refresh_resilience_scores()
+    filters = {
+        name: values
+        for name, values in (("country", country), ("project_type", project_type),
+                             ("funding_source", funding_source))
+        if values
+    }
+    try:
+        return PORTFOLIO_CUBE.query(group_by, filters, month_from, month_to)
+    except ValueError as e:
+        return {"error": str(e)}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
@@ -0,0 +1,237 @@
+"""
+Spectral index registry and fused band-math compiler for Orun.io
+Indices are declared once as band expressions and either compiled into a
+single chunked NumPy program or applied to Earth Engine images
+"""
+
+import ast
+import numpy as np
+from typing import Dict, List, Optional, Any, Tuple
+
+# Band variable -> band id per sensor
+SENSOR_BANDS = {
+    'Sentinel-2': {
+        'BLUE': 'B2', 'GREEN': 'B3', 'RED': 'B4', 'NIR': 'B8', 'SWIR1': 'B11', 'SWIR2': 'B12'
+    },
+    'Landsat-8': {
+        'BLUE': 'SR_B2', 'GREEN': 'SR_B3', 'RED': 'SR_B4', 'NIR': 'SR_B5', 'SWIR1': 'SR_B6', 'SWIR2': 'SR_B7'
+    }
+}
+
+# Index name -> (expression over band variables, description)
+SPECTRAL_INDICES: Dict[str, Tuple[str, str]] = {
+    'NDVI': ('(NIR - RED) / (NIR + RED)', 'Normalized Difference Vegetation Index'),
+    'NDWI': ('(GREEN - NIR) / (GREEN + NIR)', 'Normalized Difference Water Index (McFeeters)'),
+    'EVI': ('2.5 * ((NIR - RED) / (NIR + 6 * RED - 7.5 * BLUE + 1))', 'Enhanced Vegetation Index'),
+    'SAVI': ('1.5 * (NIR - RED) / (NIR + RED + 0.5)', 'Soil Adjusted Vegetation Index'),
+    'NDMI': ('(NIR - SWIR1) / (NIR + SWIR1)', 'Normalized Difference Moisture Index'),
+    'MNDWI': ('(GREEN - SWIR1) / (GREEN + SWIR1)', 'Modified Normalized Difference Water Index'),
+    'NBR': ('(NIR - SWIR2) / (NIR + SWIR2)', 'Normalized Burn Ratio'),
+    'GNDVI': ('(NIR - GREEN) / (NIR + GREEN)', 'Green Normalized Difference Vegetation Index'),
+    'MSAVI': ('(2 * NIR + 1 - sqrt((2 * NIR + 1) ** 2 - 8 * (NIR - RED))) / 2',
+              'Modified Soil Adjusted Vegetation Index')
+}
+
+# Default block length (pixels) for fused evaluation; a few hundred KB per register
+DEFAULT_BLOCK_SIZE = 1 << 16
+
+_BINARY_OPS = {ast.Add: 'add', ast.Sub: 'sub', ast.Mult: 'mul', ast.Div: 'div', ast.Pow: 'pow'}
+_COMMUTATIVE = {'add', 'mul'}
+_FUNCTIONS = {'sqrt', 'abs'}
+_UFUNCS = {
+    'add': np.add, 'sub': np.subtract, 'mul': np.multiply, 'div': np.divide,
+    'pow': np.power, 'neg': np.negative, 'sqrt': np.sqrt, 'abs': np.absolute
+}
+
+
+def register_index(name: str, expression: str, description: str = ''):
+    """Add or replace an index definition in the registry"""
+    _parse(expression)
+    SPECTRAL_INDICES[name] = (expression, description)
+
+
+def _parse(expression: str) -> ast.AST:
+    tree = ast.parse(expression, mode='eval')
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Call):
+            if not (isinstance(node.func, ast.Name) and node.func.id in _FUNCTIONS and len(node.args) == 1):
+                raise ValueError(f"Unsupported function call in index expression: {expression}")
+        elif isinstance(node, ast.BinOp) and type(node.op) not in _BINARY_OPS:
+            raise ValueError(f"Unsupported operator in index expression: {expression}")
+        elif isinstance(node, ast.UnaryOp) and not isinstance(node.op, (ast.USub, ast.UAdd)):
+            raise ValueError(f"Unsupported operator in index expression: {expression}")
+    return tree.body
+
+
+class FusedIndexProgram:
+    """
+    Compiled program evaluating many indices in one pass over band blocks
+
+    All index expressions are merged into one expression DAG with common
+    subexpressions shared (NIR - RED is computed once for NDVI, EVI, SAVI
+    and MSAVI). Evaluation walks the rasters block by block: each band block
+    is read once, and every intermediate lives in a small reusable register
+    of block size, so no full-size temporaries are allocated.
+    """
+
+    def __init__(
+        self,
+        index_names: Optional[List[str]] = None,
+        sensor: str = 'Sentinel-2',
+        dtype: Any = np.float32
+    ):
+        self.index_names = list(index_names or SPECTRAL_INDICES)
+        unknown = [name for name in self.index_names if name not in SPECTRAL_INDICES]
+        if unknown:
+            raise ValueError(f"Unknown spectral indices: {unknown}")
+        self.band_map = SENSOR_BANDS[sensor]
+        self.dtype = np.dtype(dtype)
+
+        self._nodes: List[tuple] = []
+        self._node_ids: Dict[tuple, int] = {}
+        self.outputs = {
+            name: self._build(_parse(SPECTRAL_INDICES[name][0])) for name in self.index_names
+        }
+        self._schedule()
+
+    @property
+    def band_ids(self) -> List[str]:
+        """Band ids the program reads, in load order"""
+        return [self.band_map[node[1]] for node in self._nodes if node[0] == 'band']
+
+    def _intern(self, node: tuple) -> int:
+        if node[0] in _COMMUTATIVE:
+            node = (node[0],) + tuple(sorted(node[1:]))
+        if node not in self._node_ids:
+            self._node_ids[node] = len(self._nodes)
+            self._nodes.append(node)
+        return self._node_ids[node]
+
+    def _build(self, node: ast.AST) -> int:
+        if isinstance(node, ast.Name):
+            if node.id not in self.band_map:
+                raise ValueError(f"Unknown band variable {node.id}")
+            return self._intern(('band', node.id))
+        if isinstance(node, ast.Constant):
+            return self._intern(('const', float(node.value)))
+        if isinstance(node, ast.UnaryOp):
+            operand = self._build(node.operand)
+            return operand if isinstance(node.op, ast.UAdd) else self._intern(('neg', operand))
+        if isinstance(node, ast.Call):
+            return self._intern((node.func.id, self._build(node.args[0])))
+        return self._intern((_BINARY_OPS[type(node.op)], self._build(node.left), self._build(node.right)))
+
+    def _schedule(self):
+        """Assign each computed node a register, reusing registers after their last use"""
+        last_use = {}
+        for position, node in enumerate(self._nodes):
+            for operand in node[1:] if node[0] not in ('band', 'const') else ():
+                last_use[operand] = position
+        for output in self.outputs.values():
+            last_use[output] = len(self._nodes)
+
+        self._registers: Dict[int, int] = {}
+        free: List[int] = []
+        self.register_count = 0
+        for position, node in enumerate(self._nodes):
+            if node[0] == 'const':
+                continue
+            if free:
+                self._registers[position] = free.pop()
+            else:
+                self._registers[position] = self.register_count
+                self.register_count += 1
+            operands = node[1:] if node[0] != 'band' else ()
+            # An operand used twice (RED * RED) must only be freed once
+            for operand in dict.fromkeys(operands):
+                if operand in self._registers and last_use.get(operand) == position:
+                    free.append(self._registers[operand])
+
+    def _operand(self, node_id: int, registers: List[np.ndarray], length: int):
+        node = self._nodes[node_id]
+        if node[0] == 'const':
+            return self.dtype.type(node[1])
+        return registers[self._registers[node_id]][:length]
+
+    def evaluate(
+        self,
+        bands: Dict[str, np.ndarray],
+        scale: float = 1.0,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        out: Optional[Dict[str, np.ndarray]] = None
+    ) -> Dict[str, np.ndarray]:
+        """
+        Evaluate every index over full band rasters
+
+        Args:
+            bands (Dict[str, np.ndarray]): Band arrays keyed by band id (e.g.
+                'B8'), all the same shape; memory-mapped arrays are read
+                block by block
+            scale (float): Factor converting stored values to reflectance,
+                e.g. 1e-4 for Sentinel-2 L2A digital numbers
+            block_size (int): Pixels per block
+            out (Dict[str, np.ndarray]): Optional preallocated outputs
+
+        Returns:
+            Dict[str, np.ndarray]: Index arrays keyed by index name; pixels
+                where an expression is undefined are NaN
+        """
+        shape = np.shape(bands[self.band_ids[0]])
+        size = int(np.prod(shape))
+        flat_bands = {band_id: np.asarray(bands[band_id]).reshape(-1) for band_id in self.band_ids}
+        if out is None:
+            out = {name: np.empty(shape, dtype=self.dtype) for name in self.index_names}
+        flat_out = {name: out[name].reshape(-1) for name in self.index_names}
+
+        registers = [np.empty(min(block_size, size), dtype=self.dtype) for _ in range(self.register_count)]
+
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            for start in range(0, size, block_size):
+                stop = min(start + block_size, size)
+                length = stop - start
+                for node_id, node in enumerate(self._nodes):
+                    kind = node[0]
+                    if kind == 'const':
+                        continue
+                    target = registers[self._registers[node_id]][:length]
+                    if kind == 'band':
+                        source = flat_bands[self.band_map[node[1]]][start:stop]
+                        np.multiply(source, scale, out=target, casting='unsafe')
+                    elif len(node) == 3:
+                        _UFUNCS[kind](self._operand(node[1], registers, length),
+                                      self._operand(node[2], registers, length), out=target)
+                    else:
+                        _UFUNCS[kind](self._operand(node[1], registers, length), out=target)
+
+                for name, output in self.outputs.items():
+                    block = flat_out[name][start:stop]
+                    block[...] = self._operand(output, registers, length)
+                    block[~np.isfinite(block)] = np.nan
+
+        return out
+
+
+def compute_indices(
+    bands: Dict[str, np.ndarray],
+    index_names: Optional[List[str]] = None,
+    sensor: str = 'Sentinel-2',
+    scale: float = 1.0,
+    block_size: int = DEFAULT_BLOCK_SIZE
+) -> Dict[str, np.ndarray]:
+    """Compile and evaluate the requested indices in one fused pass"""
+    return FusedIndexProgram(index_names, sensor).evaluate(bands, scale, block_size)
+
+
+def add_ee_indices(image: Any, index_names: List[str], sensor: str = 'Sentinel-2') -> Any:
+    """Add registry indices as bands to an Earth Engine image"""
+    band_map = SENSOR_BANDS[sensor]
+    index_bands = []
+    for name in index_names:
+        expression = SPECTRAL_INDICES[name][0]
+        variables = {
+            node.id for node in ast.walk(_parse(expression)) if isinstance(node, ast.Name)
+        } - _FUNCTIONS
+        index_bands.append(image.expression(
+            expression, {variable: image.select(band_map[variable]) for variable in variables}
+        ).rename(name))
+    return image.addBands(index_bands)
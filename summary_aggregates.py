@@ -0,0 +1,236 @@
+"""
+Online summary-statistics aggregates for Orun.io
+Keeps mergeable running aggregates per project, sensor, index and monthly
+bucket so summary statistics for bucket-aligned ranges never rescan the
+series
+"""
+
+from datetime import date, datetime
+from typing import Dict, List, Optional, Any, Iterable
+
+from sqlalchemy import Column, Date, DateTime, Float, Integer, String, UniqueConstraint
+from sqlalchemy.orm import Session
+from models import Base
+
+from satellite_store import INDEX_COLUMNS
+
+# Summary of an index without observations, for stored and rescanned ranges alike
+EMPTY_SUMMARY = {'mean': 0, 'std': 0, 'min': 0, 'max': 0, 'trend': 0, 'sens_slope': None, 'trend_p_value': None}
+
+
+class RunningAggregate:
+    """
+    Mergeable summary of an ordered run of observations
+
+    Holds Welford mean/M2, min and max, plus sum(y) and sum(rank * y) where
+    rank is the observation's position within the run. Concatenating two
+    runs in time order keeps the positional OLS slope exact, matching the
+    'trend' of SatelliteService._calculate_summary_stats over the whole range.
+    """
+
+    def __init__(self, count: int = 0, mean: float = 0.0, m2: float = 0.0,
+                 minimum: float = float('inf'), maximum: float = float('-inf'),
+                 sum_y: float = 0.0, sum_ry: float = 0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+        self.minimum = minimum
+        self.maximum = maximum
+        self.sum_y = sum_y
+        self.sum_ry = sum_ry
+
+    def add(self, value: float):
+        """Append one observation later than all observations seen so far"""
+        rank = self.count
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+        self.minimum = min(self.minimum, value)
+        self.maximum = max(self.maximum, value)
+        self.sum_y += value
+        self.sum_ry += rank * value
+
+    def extend(self, values: Iterable[float]):
+        for value in values:
+            self.add(value)
+
+    def concat(self, later: 'RunningAggregate') -> 'RunningAggregate':
+        """Merge with an aggregate whose observations all come after this one's"""
+        if later.count == 0:
+            return RunningAggregate(**self.state())
+        if self.count == 0:
+            return RunningAggregate(**later.state())
+        count = self.count + later.count
+        delta = later.mean - self.mean
+        return RunningAggregate(
+            count=count,
+            mean=self.mean + delta * later.count / count,
+            m2=self.m2 + later.m2 + delta * delta * self.count * later.count / count,
+            minimum=min(self.minimum, later.minimum),
+            maximum=max(self.maximum, later.maximum),
+            sum_y=self.sum_y + later.sum_y,
+            # Later ranks shift by the number of earlier observations
+            sum_ry=self.sum_ry + later.sum_ry + self.count * later.sum_y
+        )
+
+    def state(self) -> Dict[str, float]:
+        return {
+            'count': self.count, 'mean': self.mean, 'm2': self.m2,
+            'minimum': self.minimum, 'maximum': self.maximum,
+            'sum_y': self.sum_y, 'sum_ry': self.sum_ry
+        }
+
+    def slope(self) -> float:
+        """OLS slope of value against observation rank"""
+        n = self.count
+        if n < 2:
+            return 0
+        sum_x = n * (n - 1) / 2
+        sxx = n * (n - 1) * (n + 1) / 12
+        return (self.sum_ry - sum_x * self.sum_y / n) / sxx
+
+    def summary(self) -> Dict[str, float]:
+        """
+        Summary in the shape returned by SatelliteService._calculate_summary_stats
+
+        Sen's slope and the Mann-Kendall p-value need every pair of
+        observations, which a mergeable aggregate does not keep, so they are
+        None; so is the trend of a single observation.
+        """
+        if self.count == 0:
+            return dict(EMPTY_SUMMARY)
+        return dict(
+            EMPTY_SUMMARY,
+            mean=round(self.mean, 4),
+            std=round((self.m2 / self.count) ** 0.5, 4),
+            min=round(self.minimum, 4),
+            max=round(self.maximum, 4),
+            trend=round(self.slope(), 6) if self.count >= 2 else None
+        )
+
+
+class SatelliteAggregate(Base):
+    """Stored running aggregate for one project, sensor, index and month"""
+
+    __tablename__ = 'satellite_aggregates'
+    __table_args__ = (
+        UniqueConstraint('project_id', 'satellite', 'index_name', 'bucket',
+                         name='uq_satellite_aggregate_bucket'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, nullable=False, index=True)
+    satellite = Column(String(32), nullable=False)
+    index_name = Column(String(16), nullable=False)
+    bucket = Column(Date, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+    mean = Column(Float, nullable=False, default=0.0)
+    m2 = Column(Float, nullable=False, default=0.0)
+    minimum = Column(Float)
+    maximum = Column(Float)
+    sum_y = Column(Float, nullable=False, default=0.0)
+    sum_ry = Column(Float, nullable=False, default=0.0)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def to_running(self) -> RunningAggregate:
+        return RunningAggregate(
+            count=self.count, mean=self.mean, m2=self.m2,
+            minimum=self.minimum if self.minimum is not None else float('inf'),
+            maximum=self.maximum if self.maximum is not None else float('-inf'),
+            sum_y=self.sum_y, sum_ry=self.sum_ry
+        )
+
+    def store(self, aggregate: RunningAggregate):
+        for name, value in aggregate.state().items():
+            setattr(self, name, value)
+
+
+def bucket_of(day: date) -> date:
+    """Monthly bucket start for a date"""
+    return date(day.year, day.month, 1)
+
+
+def update_aggregates(db: Session, project_id: int, satellite: str, rows: List[Dict[str, Any]]) -> int:
+    """
+    Fold newly stored SatelliteData rows of one sensor into the monthly aggregates
+
+    Rows must be newer than everything already aggregated for the project
+    and sensor, which the per-sensor watermark in
+    process_project_satellite_data guarantees. The caller commits.
+
+    Returns:
+        int: Number of aggregates touched
+    """
+    grouped: Dict[tuple, List[float]] = {}
+    for row in sorted(rows, key=lambda r: r['acquisition_date']):
+        bucket = bucket_of(row['acquisition_date'])
+        for index_name, column in INDEX_COLUMNS.items():
+            if row.get(column) is not None:
+                grouped.setdefault((index_name, bucket), []).append(row[column])
+    if not grouped:
+        return 0
+
+    existing = {
+        (aggregate.index_name, aggregate.bucket): aggregate
+        for aggregate in db.query(SatelliteAggregate).filter(
+            SatelliteAggregate.project_id == project_id,
+            SatelliteAggregate.satellite == satellite,
+            SatelliteAggregate.bucket.in_({bucket for _, bucket in grouped})
+        )
+    }
+
+    for (index_name, bucket), values in grouped.items():
+        stored = existing.get((index_name, bucket))
+        if stored is None:
+            stored = SatelliteAggregate(project_id=project_id, satellite=satellite,
+                                        index_name=index_name, bucket=bucket)
+            db.add(stored)
+            running = RunningAggregate()
+        else:
+            running = stored.to_running()
+        running.extend(values)
+        stored.store(running)
+
+    return len(grouped)
+
+
+def reset_aggregates(db: Session, project_id: int, satellite: str):
+    """Drop a project's aggregates for one sensor ahead of its full reprocess"""
+    db.query(SatelliteAggregate).filter(
+        SatelliteAggregate.project_id == project_id,
+        SatelliteAggregate.satellite == satellite
+    ).delete(synchronize_session=False)
+
+
+def is_bucket_aligned(start_date: str, end_date: str) -> bool:
+    """True when [start, end) covers whole monthly buckets"""
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date()
+    return start.day == 1 and end.day == 1 and start < end
+
+
+def summarize_range(
+    db: Session,
+    project_id: int,
+    start_date: str,
+    end_date: str,
+    index_names: Optional[List[str]] = None,
+    satellite: str = 'Sentinel-2'
+) -> Dict[str, Dict[str, float]]:
+    """Summary statistics for a bucket-aligned [start, end) range from one sensor's aggregates"""
+    if not is_bucket_aligned(start_date, end_date):
+        raise ValueError(f"Range {start_date}..{end_date} is not aligned to monthly buckets")
+
+    index_names = index_names or list(INDEX_COLUMNS)
+    merged = {index_name: RunningAggregate() for index_name in index_names}
+    for aggregate in db.query(SatelliteAggregate).filter(
+        SatelliteAggregate.project_id == project_id,
+        SatelliteAggregate.satellite == satellite,
+        SatelliteAggregate.index_name.in_(index_names),
+        SatelliteAggregate.bucket >= datetime.strptime(start_date, '%Y-%m-%d').date(),
+        SatelliteAggregate.bucket < datetime.strptime(end_date, '%Y-%m-%d').date()
+    ).order_by(SatelliteAggregate.bucket):
+        merged[aggregate.index_name] = merged[aggregate.index_name].concat(aggregate.to_running())
+
+    return {index_name: aggregate.summary() for index_name, aggregate in merged.items()}
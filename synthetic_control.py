@@ -0,0 +1,448 @@
+"""
+Synthetic-control estimator for Orun.io
+Fits non-negative donor weights that sum to one so a weighted mix of
+donor areas tracks a project's pre-treatment index series, for projects
+without a comparable control area. Fits are solved in batches with
+accelerated projected gradient descent on the simplex, warm-started from
+previous weights, and in-space placebo fits give the p-value.
+"""
+
+import warnings
+from typing import Dict, Hashable, List, Optional, Any
+
+import numpy as np
+
+from baci import SIGNIFICANCE_LEVEL
+
+SOLVER_TOLERANCE = 1e-7
+SOLVER_MAX_ITERATIONS = 2000
+
+# Gradient iterations between exact solves on the current support, and
+# pruning rounds per solve
+POLISH_INTERVAL = 10
+SUPPORT_ROUNDS = 2
+
+# Weights below this are reported as zero
+WEIGHT_REPORT_THRESHOLD = 1e-4
+
+# Post-period dates are scored only where donors holding at least this
+# share of a unit's weight are observed
+MIN_OBSERVED_WEIGHT = 0.5
+
+
+def project_simplex(values: np.ndarray, allowed: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Euclidean projection of each row onto the probability simplex
+
+    Entries where allowed is False are pinned to zero. Rows are sorted
+    once and the threshold is found from the cumulative sums, so a batch
+    projects in one pass.
+    """
+    values = np.asarray(values, dtype=float)
+    if allowed is not None:
+        values = np.where(allowed, values, -np.inf)
+    ordered = -np.sort(-values, axis=-1)
+    finite = np.isfinite(ordered)
+    cumulative = np.cumsum(np.where(finite, ordered, 0.0), axis=-1) - 1.0
+    ranks = np.arange(1, values.shape[-1] + 1)
+    # The condition holds on a prefix, so its length is the support size
+    support = ((ordered - cumulative / ranks > 0) & finite).sum(axis=-1, keepdims=True)
+    theta = np.take_along_axis(cumulative, np.maximum(support - 1, 0), axis=-1) / np.maximum(support, 1)
+    return np.where(np.isfinite(values), np.maximum(values - theta, 0.0), 0.0)
+
+
+def _face_solution(gram: np.ndarray, target: np.ndarray, support: np.ndarray) -> np.ndarray:
+    """Minimizer of 0.5 w'Gw - c'w with sum(w) = 1 and w = 0 off the support, per row"""
+    n_donors = target.shape[-1]
+    pair = support[:, :, None] & support[:, None, :]
+    system = np.zeros((len(target), n_donors + 1, n_donors + 1))
+    system[:, :n_donors, :n_donors] = np.where(pair, gram, 0.0)
+    diagonal = np.arange(n_donors)
+    # Unit rows pin off-support weights; a tiny ridge keeps collinear supports solvable
+    ridge = np.abs(gram).max(axis=(1, 2))[:, None] * 1e-12 + 1e-300
+    system[:, diagonal, diagonal] += np.where(support, ridge, 1.0)
+    system[:, :n_donors, n_donors] = support
+    system[:, n_donors, :n_donors] = support
+    rhs = np.concatenate([np.where(support, target, 0.0), np.ones((len(target), 1))], axis=1)
+    return np.linalg.solve(system, rhs[..., None])[:, :n_donors, 0]
+
+
+def support_solution(gram: np.ndarray, target: np.ndarray, support: np.ndarray,
+                     allowed: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    Exact minimizer over the simplex face spanned by each row's support
+
+    Solves the equality-constrained KKT system [G_SS 1; 1' 0][w; nu] =
+    [c_S; 1] for every row at once, dropping donors solved negative for a
+    few rounds. The result is optimal on the whole simplex when all
+    weights are non-negative and no allowed off-support donor has a
+    gradient below the support's.
+
+    Args:
+        gram (np.ndarray): (n, J, J), one Gram matrix per row
+        target, support, allowed (np.ndarray): (n, J)
+
+    Returns:
+        Dict with (n, J) 'weights' and boolean 'optimal' per row
+    """
+    for _ in range(SUPPORT_ROUNDS):
+        support = support & (_face_solution(gram, target, support) > 0)
+    weights = _face_solution(gram, target, support)
+
+    grad = np.matmul(gram, weights[..., None])[..., 0] - target
+    level = (grad * support).sum(axis=1, keepdims=True) / np.maximum(support.sum(axis=1, keepdims=True), 1)
+    slack = np.abs(gram).max(axis=(1, 2))[:, None] * 1e-9
+    optimal = (weights >= 0).all(axis=1) & support.any(axis=1) \
+        & (np.where(support | ~allowed, 0.0, grad - level) >= -slack).all(axis=1)
+    return {'weights': np.maximum(weights, 0.0), 'optimal': optimal}
+
+
+def simplex_least_squares(
+    gram: np.ndarray,
+    target: np.ndarray,
+    allowed: Optional[np.ndarray] = None,
+    initial: Optional[np.ndarray] = None,
+    tol: float = SOLVER_TOLERANCE,
+    max_iter: int = SOLVER_MAX_ITERATIONS
+) -> Dict[str, Any]:
+    """
+    Minimize 0.5 w'Gw - c'w over the simplex for batches of problems
+
+    Problems sharing a Gram matrix (a project's own fit and its placebo
+    fits) are rows of one (R, J) block, so each step is a matrix-matrix
+    product per Gram. FISTA with gradient-based momentum restarts; the
+    step is 1/L with L the largest eigenvalue of each Gram matrix. Every
+    POLISH_INTERVAL steps the support of each unsolved row is solved
+    exactly, which ends the slow tail on ill-conditioned donor pools;
+    solved rows are pinned and blocks leave the batch once every row is
+    solved or has stopped moving.
+
+    Args:
+        gram (np.ndarray): (J, J) or (P, J, J) symmetric X'X
+        target (np.ndarray): (R, J) or (P, R, J) X'y per problem
+        allowed (np.ndarray): Donors each problem may use, like target
+        initial (np.ndarray): Warm-start weights, like target
+
+    Returns:
+        Dict with 'weights' shaped like target and the 'iterations' run
+    """
+    target = np.asarray(target, dtype=float)
+    shape = target.shape
+    gram = np.asarray(gram, dtype=float).reshape((-1,) + gram.shape[-2:])
+    target = target.reshape((gram.shape[0], -1, shape[-1]))
+    allowed = np.ones(target.shape, dtype=bool) if allowed is None \
+        else np.asarray(allowed, dtype=bool).reshape(target.shape)
+    step = 1.0 / np.maximum(np.linalg.eigvalsh(gram)[:, -1], 1e-12)[:, None, None]
+
+    start = np.ones(target.shape) if initial is None \
+        else np.nan_to_num(np.asarray(initial, dtype=float)).reshape(target.shape)
+    # Rows without a usable warm start begin from equal weights
+    start = np.where(np.where(allowed, start, 0.0).sum(axis=-1, keepdims=True) > 0, start, 1.0)
+    weights = project_simplex(start, allowed)
+
+    active = np.arange(gram.shape[0])
+    current, momentum_point = weights.copy(), weights.copy()
+    t = np.ones(target.shape[:-1] + (1,))
+    solved = np.zeros(target.shape[:-1], dtype=bool)
+    iterations = 0
+    for iterations in range(1, max_iter + 1):
+        grad = momentum_point @ gram - target
+        updated = project_simplex(momentum_point - step * grad, allowed)
+        t_next = (1 + np.sqrt(1 + 4 * t ** 2)) / 2
+        # Restart momentum where the step went uphill
+        restart = (grad * (updated - current)).sum(axis=-1, keepdims=True) > 0
+        t_next = np.where(restart, 1.0, t_next)
+        momentum_point = np.where(restart, updated, updated + ((t - 1) / t_next) * (updated - current))
+        # Solved rows stay at their exact solution
+        updated = np.where(solved[..., None], current, updated)
+        momentum_point = np.where(solved[..., None], current, momentum_point)
+
+        unsettled = (np.abs(updated - current).max(axis=-1) >= tol) & ~solved
+        if iterations % POLISH_INTERVAL == 0:
+            block, row = np.nonzero(~solved)
+            polished = support_solution(gram[block], target[block, row],
+                                        (updated[block, row] > 0) & allowed[block, row], allowed[block, row])
+            block, row = block[polished['optimal']], row[polished['optimal']]
+            updated[block, row] = momentum_point[block, row] = polished['weights'][polished['optimal']]
+            solved[block, row] = True
+            unsettled[block, row] = False
+
+        weights[active] = updated
+        moving = unsettled.any(axis=-1)
+        if not moving.any():
+            break
+        if not moving.all():
+            active, gram, target = active[moving], gram[moving], target[moving]
+            step, allowed, solved = step[moving], allowed[moving], solved[moving]
+            updated, momentum_point, t_next = updated[moving], momentum_point[moving], t_next[moving]
+        current, t = updated, t_next
+    return {'weights': weights.reshape(shape), 'iterations': iterations}
+
+
+def _align(
+    treatment: Dict[str, List[Dict[str, Any]]],
+    donors: Dict[Hashable, Dict[str, List[Dict[str, Any]]]],
+    index_names: List[str]
+):
+    """Dates, (k, n) treated values and (k, n, J) donor values, NaN for gaps"""
+    series = [treatment] + list(donors.values())
+    dates = sorted({p['date'] for s in series for name in index_names for p in s.get(name, [])})
+    position = {date: i for i, date in enumerate(dates)}
+    values = np.full((len(series), len(index_names), len(dates)), np.nan)
+    for unit, unit_series in enumerate(series):
+        for row, name in enumerate(index_names):
+            for point in unit_series.get(name, []):
+                values[unit, row, position[point['date']]] = point['value']
+    return dates, values[0], np.moveaxis(values[1:], 0, -1)
+
+
+def prepare_problem(
+    treatment: Dict[str, List[Dict[str, Any]]],
+    donors: Dict[Hashable, Dict[str, List[Dict[str, Any]]]],
+    intervention_date: str,
+    index_names: Optional[List[str]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Standardized design of one synthetic-control fit
+
+    Pre-treatment series of all indices are stacked into one fitting
+    target, each scaled by the treated series' pre-period standard
+    deviation so no index dominates. Donors without pre-period
+    observations of every index are dropped; the remaining donors'
+    pre-period gaps are filled with the donor's pre-period mean for that
+    index. Post-period gaps stay NaN, as filling them with the baseline
+    would pull a shared post-period shift back into the effect.
+
+    Returns:
+        None without usable donors or without pre and post observations
+    """
+    index_names = index_names or list(treatment.keys())
+    dates, treated, donor_values = _align(treatment, donors, index_names)
+    n_donors = donor_values.shape[-1]
+    post = np.array(dates) >= intervention_date
+    if n_donors == 0 or not post.any() or post.all():
+        return None
+
+    with warnings.catch_warnings():
+        # Series without pre-period observations give NaN means and scales
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        donor_means = np.nanmean(donor_values[:, ~post], axis=1, keepdims=True)
+        scale = np.nanstd(treated[:, ~post], axis=1)
+    # A donor with nothing to fit on would enter as a made-up series
+    usable = ~np.isnan(donor_means[:, 0, :]).any(axis=0)
+    if not usable.any():
+        return None
+    donor_keys = [key for key, keep in zip(donors, usable) if keep]
+    donor_values, donor_means = donor_values[..., usable], donor_means[..., usable]
+    donor_values = np.where(np.isnan(donor_values) & ~post[:, None], donor_means, donor_values)
+    scale = np.where(np.isfinite(scale) & (scale > 0), scale, 1.0)[:, None]
+
+    observed = ~np.isnan(treated)
+    fit_rows = observed & ~post
+    test_rows = observed & post
+    standardized_donors = donor_values / scale[..., None]
+    standardized_treated = treated / scale
+    if not fit_rows.any() or not test_rows.any():
+        return None
+
+    # Weights sum to one, so removing the donor mean at every date from all
+    # units leaves the fit unchanged while dropping the shared level and
+    # seasonality that make the Gram matrix ill-conditioned
+    with warnings.catch_warnings():
+        # Post-period dates without any observed donor stay NaN
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        common = np.nanmean(standardized_donors, axis=-1)
+    standardized_donors = standardized_donors - common[..., None]
+    standardized_treated = standardized_treated - common
+    baseline = np.broadcast_to(donor_means / scale[..., None], standardized_donors.shape) - common[..., None]
+    fit_donors = standardized_donors[fit_rows]                         # (rows, J)
+    fit_treated = standardized_treated[fit_rows]
+    return {
+        'donor_keys': donor_keys,
+        'index_names': index_names,
+        'gram': fit_donors.T @ fit_donors / len(fit_treated),
+        'target': fit_donors.T @ fit_treated / len(fit_treated),
+        'fit_donors': fit_donors,
+        'fit_treated': fit_treated,
+        'test_donors': standardized_donors[test_rows],
+        'test_baseline': baseline[test_rows],
+        'test_treated': standardized_treated[test_rows],
+        'treated': treated,
+        'donor_values': donor_values,
+        'donor_means': donor_means,
+        'post': post
+    }
+
+
+def _rmspe(actual: np.ndarray, fitted: np.ndarray) -> np.ndarray:
+    """Per column, over the rows where both are defined"""
+    errors = (actual - fitted) ** 2
+    defined = ~np.isnan(errors)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.sqrt(np.where(defined, errors, 0.0).sum(axis=0) / defined.sum(axis=0))
+
+
+def _predict(donors: np.ndarray, baseline: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    """
+    (..., J) donor values with NaN gaps against (units, J) weights
+
+    A missing donor is taken to move from its pre-period baseline like the
+    observed ones: their departures from baseline are averaged with the
+    weights renormalized over them. Dates where the observed donors hold
+    less than MIN_OBSERVED_WEIGHT of the weight are NaN.
+    """
+    observed = ~np.isnan(donors)
+    share = observed @ weights.T
+    with np.errstate(invalid='ignore', divide='ignore'):
+        departure = np.where(observed, donors - baseline, 0.0) @ weights.T / share
+    return np.where(share >= MIN_OBSERVED_WEIGHT, baseline @ weights.T + departure, np.nan)
+
+
+def _rounded(value: float, digits: int = 4) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def _summarize(problem: Dict[str, Any], weights: np.ndarray, iterations: int,
+               primary_index: str) -> Dict[str, Any]:
+    """Effects, fit quality and placebo p-value from the treated and placebo weights"""
+    treated_weights = weights[0]
+    n_donors = len(problem['donor_keys'])
+
+    # Column 0 is the project, column j + 1 is donor j refitted as a placebo
+    fit_actual = np.column_stack([problem['fit_treated'], problem['fit_donors']])
+    test_actual = np.column_stack([problem['test_treated'], problem['test_donors']])
+    pre_rmspe = _rmspe(fit_actual, problem['fit_donors'] @ weights.T)
+    post_rmspe = _rmspe(test_actual, _predict(problem['test_donors'], problem['test_baseline'], weights))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = post_rmspe / pre_rmspe
+
+    # Placebos without scorable post-period dates don't count
+    placebos = ratio[1:][np.isfinite(ratio[1:])]
+    p_value = np.nan
+    if len(placebos) >= 2 and np.isfinite(ratio[0]):
+        p_value = ((placebos >= ratio[0]).sum() + 1) / (len(placebos) + 1)
+
+    synthetic = _predict(problem['donor_values'], problem['donor_means'], treated_weights[None, :])[..., 0]
+    gaps = problem['treated'] - synthetic
+    indices = {}
+    for row, index_name in enumerate(problem['index_names']):
+        post_gaps = gaps[row, problem['post']]
+        post_gaps = post_gaps[~np.isnan(post_gaps)]
+        indices[index_name] = {
+            'treatment_effect': _rounded(post_gaps.mean()) if post_gaps.size else None
+        }
+
+    headline = indices.get(primary_index) or next(iter(indices.values()), {})
+    p_value = _rounded(p_value)
+    return {
+        'donors': n_donors,
+        'weights': {
+            key: round(float(weight), 4)
+            for key, weight in zip(problem['donor_keys'], treated_weights)
+            if weight >= WEIGHT_REPORT_THRESHOLD
+        },
+        'treatment_effect': headline.get('treatment_effect'),
+        'pre_rmspe': _rounded(pre_rmspe[0]),
+        'post_rmspe': _rounded(post_rmspe[0]),
+        'rmspe_ratio': _rounded(ratio[0]),
+        'p_value': p_value,
+        'significance': p_value is not None and p_value < SIGNIFICANCE_LEVEL,
+        'iterations': iterations,
+        'indices': indices
+    }
+
+
+def synthetic_control_many(
+    jobs: Dict[Hashable, Dict[str, Any]],
+    primary_index: str = 'NDVI',
+    tol: float = SOLVER_TOLERANCE,
+    max_iter: int = SOLVER_MAX_ITERATIONS
+) -> Dict[Hashable, Optional[Dict[str, Any]]]:
+    """
+    Synthetic-control fits and placebo tests for many projects in one solve
+
+    Every project contributes its own fit plus one placebo fit per donor
+    (that donor as the treated unit, the others as its pool). All problems
+    are padded to the largest donor pool and solved as one batch.
+
+    Args:
+        jobs: key -> dict with 'treatment', 'donors' (donor key -> index
+            series), 'intervention_date' and optional 'index_names' and
+            'initial' (donor key -> previous weight, for a warm start)
+
+    Returns:
+        key -> synthetic_control() result, None where no fit is possible
+    """
+    problems = {
+        key: prepare_problem(job['treatment'], job['donors'], job['intervention_date'], job.get('index_names'))
+        for key, job in jobs.items()
+    }
+    active = [key for key, problem in problems.items() if problem is not None]
+    results: Dict[Hashable, Optional[Dict[str, Any]]] = {key: None for key in jobs}
+    if not active:
+        return results
+
+    # Pad every project to the largest donor pool; padded donors are never allowed
+    width = max(len(problems[key]['donor_keys']) for key in active)
+    rows = width + 1
+    grams = np.zeros((len(active), width, width))
+    targets = np.zeros((len(active), rows, width))
+    allowed = np.zeros((len(active), rows, width), dtype=bool)
+    initial = np.zeros((len(active), rows, width))
+    for block, key in enumerate(active):
+        problem = problems[key]
+        n_donors = len(problem['donor_keys'])
+        grams[block, :n_donors, :n_donors] = problem['gram']
+        # Row 0 is the project; row j + 1 refits donor j from the others,
+        # whose target is donor j's column of the Gram matrix
+        targets[block, 0, :n_donors] = problem['target']
+        targets[block, 1:n_donors + 1, :n_donors] = problem['gram']
+        allowed[block, :n_donors + 1, :n_donors] = True
+        allowed[block, np.arange(1, n_donors + 1), np.arange(n_donors)] = False
+        previous = jobs[key].get('initial') or {}
+        initial[block, 0, :n_donors] = [previous.get(donor, 0.0) for donor in problem['donor_keys']]
+    # Padding rows have no allowed donor; give them one so projection stays defined
+    allowed[:, :, 0] |= ~allowed.any(axis=-1)
+
+    warm_started = any(jobs[key].get('initial') for key in active)
+    solved = simplex_least_squares(
+        grams, targets, allowed, initial if warm_started else None, tol=tol, max_iter=max_iter
+    )
+
+    for block, key in enumerate(active):
+        problem = problems[key]
+        n_donors = len(problem['donor_keys'])
+        weights = solved['weights'][block, :n_donors + 1, :n_donors]
+        results[key] = _summarize(problem, weights, solved['iterations'], primary_index)
+    return results
+
+
+def synthetic_control(
+    treatment: Dict[str, List[Dict[str, Any]]],
+    donors: Dict[Hashable, Dict[str, List[Dict[str, Any]]]],
+    intervention_date: str,
+    index_names: Optional[List[str]] = None,
+    primary_index: str = 'NDVI',
+    initial: Optional[Dict[Hashable, float]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Synthetic-control estimate for one project
+
+    Args:
+        treatment: Project index series (index name -> [{'date', 'value'}])
+        donors: Donor key -> index series in the same shape
+        intervention_date (str): First post-treatment date ('%Y-%m-%d')
+        initial: Previous weights by donor key, used as a warm start
+
+    Returns:
+        Dict with donor 'weights', headline 'treatment_effect' (mean
+        post-treatment gap to the synthetic series), 'pre_rmspe',
+        'post_rmspe', 'rmspe_ratio', placebo 'p_value' and 'significance',
+        and per-index effects under 'indices'; None without usable donors or
+        without observations on both sides of the intervention
+    """
+    job = {
+        'treatment': treatment, 'donors': donors, 'intervention_date': intervention_date,
+        'index_names': index_names, 'initial': initial
+    }
+    return synthetic_control_many({0: job}, primary_index)[0]
@@ -0,0 +1,77 @@
+"""Minimal tiled GeoTIFF writer for reader tests"""
+
+import struct
+import zlib
+
+import numpy as np
+
+_SAMPLE_FORMATS = {np.dtype('uint16'): 1, np.dtype('int16'): 2, np.dtype('float32'): 3}
+
+
+def write_cog(path, array, tile=64, compress=True, predictor=False, origin=(37.0, -1.0), pixel=0.0001,
+              nodata=0):
+    """Write a single-band tiled little-endian GeoTIFF with deflate and optional predictor"""
+    array = np.asarray(array)
+    height, width = array.shape
+    blocks = []
+    for top in range(0, height, tile):
+        for left in range(0, width, tile):
+            block = np.zeros((tile, tile), dtype=array.dtype)
+            part = array[top:top + tile, left:left + tile]
+            block[:part.shape[0], :part.shape[1]] = part
+            if predictor:
+                block = np.concatenate([block[:, :1], np.diff(block, axis=1)], axis=1).astype(array.dtype)
+            data = block.astype(array.dtype.newbyteorder('<')).tobytes()
+            blocks.append(zlib.compress(data) if compress else data)
+
+    tags = {
+        256: (3, [width]), 257: (3, [height]), 258: (3, [array.dtype.itemsize * 8]),
+        259: (3, [8 if compress else 1]), 277: (3, [1]), 317: (3, [2 if predictor else 1]),
+        322: (3, [tile]), 323: (3, [tile]), 324: (4, [0] * len(blocks)),
+        325: (4, [len(block) for block in blocks]), 339: (3, [_SAMPLE_FORMATS[array.dtype]]),
+        33550: (12, [pixel, pixel, 0.0]), 33922: (12, [0.0, 0.0, 0.0, origin[0], origin[1], 0.0])
+    }
+    if nodata is not None:
+        tags[42113] = (2, f'{nodata}\x00'.encode())
+    codes = {2: ('c', 1), 3: ('H', 2), 4: ('I', 4), 12: ('d', 8)}
+
+    ifd_size = 2 + 12 * len(tags) + 4
+    extra = bytearray()
+    extra_start = 8 + ifd_size
+
+    def pack(field_type, values):
+        code, size = codes[field_type]
+        return values if field_type == 2 else struct.pack('<' + code * len(values), *values)
+
+    # Lay out out-of-line values, then the tile data after them
+    offsets = {}
+    for tag, (field_type, values) in sorted(tags.items()):
+        data = pack(field_type, values)
+        if len(data) > 4:
+            offsets[tag] = extra_start + len(extra)
+            extra += data
+    data_start = extra_start + len(extra)
+    tile_offsets, position = [], data_start
+    for block in blocks:
+        tile_offsets.append(position)
+        position += len(block)
+    tags[324] = (4, tile_offsets)
+    extra = bytearray()
+    for tag, (field_type, values) in sorted(tags.items()):
+        data = pack(field_type, values)
+        if len(data) > 4:
+            extra += data
+
+    out = bytearray(b'II*\x00' + struct.pack('<I', 8) + struct.pack('<H', len(tags)))
+    for tag, (field_type, values) in sorted(tags.items()):
+        data = pack(field_type, values)
+        count = len(values)
+        value = data.ljust(4, b'\x00') if len(data) <= 4 else struct.pack('<I', offsets[tag])
+        out += struct.pack('<HHI', tag, field_type, count) + value
+    out += struct.pack('<I', 0) + extra
+    assert len(out) == data_start
+    for block in blocks:
+        out += block
+    with open(path, 'wb') as f:
+        f.write(bytes(out))
+    return {'x0': origin[0], 'y0': origin[1], 'dx': pixel, 'dy': -pixel}
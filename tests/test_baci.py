@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+import baci
+from baci import align_series, baci_analysis, baci_effect, bootstrap_indices
+
+INDEX_NAMES = ['NDVI', 'EVI']
+
+
+def _dates(n):
+    return [str(np.datetime64('2021-01-01') + 10 * i) for i in range(n)]
+
+
+def _series(rng, dates, level, keep=0.8):
+    return {
+        index_name: [{'date': date, 'value': float(level + 0.1 * i + rng.normal(scale=0.05))}
+                     for date in dates if rng.random() < keep]
+        for i, index_name in enumerate(INDEX_NAMES)
+    }
+
+
+def _reference_effect(treatment, control, intervention_date, index_name):
+    """DiD from dicts of the dates where both areas observed the index"""
+    control_values = {point['date']: point['value'] for point in control[index_name]}
+    before, after = [], []
+    for point in treatment[index_name]:
+        if point['date'] in control_values:
+            difference = point['value'] - control_values[point['date']]
+            (before if point['date'] < intervention_date else after).append(difference)
+    return np.mean(after) - np.mean(before)
+
+
+def test_align_series_places_every_observation():
+    rng = np.random.default_rng(0)
+    dates = _dates(30)
+    treatment, control = _series(rng, dates, 0.5), _series(rng, dates, 0.4)
+    aligned_dates, treatment_values, control_values = align_series(treatment, control, INDEX_NAMES)
+    assert aligned_dates == sorted(aligned_dates)
+    for series, values in ((treatment, treatment_values), (control, control_values)):
+        for row, index_name in enumerate(INDEX_NAMES):
+            expected = {point['date']: point['value'] for point in series[index_name]}
+            for date, value in zip(aligned_dates, values[row]):
+                if date in expected:
+                    assert value == expected[date]
+                else:
+                    assert np.isnan(value)
+
+
+def test_effect_matches_per_index_difference_in_differences():
+    rng = np.random.default_rng(1)
+    dates = _dates(60)
+    treatment, control = _series(rng, dates, 0.5), _series(rng, dates, 0.4, keep=0.7)
+    result = baci_analysis(treatment, control, dates[25], n_bootstrap=200, n_permutations=200, seed=3)
+    for index_name in INDEX_NAMES:
+        expected = _reference_effect(treatment, control, dates[25], index_name)
+        assert result['indices'][index_name]['treatment_effect'] == pytest.approx(round(expected, 4), abs=1e-4)
+
+
+def test_bootstrap_matches_resample_loop(monkeypatch):
+    rng = np.random.default_rng(2)
+    n_before, n_after, n_bootstrap = 17, 23, 400
+    dates = _dates(n_before + n_after)
+    treatment = rng.normal(size=(2, len(dates))) + np.r_[np.zeros(n_before), 0.3 * np.ones(n_after)]
+    control = rng.normal(size=(2, len(dates)))
+    control[1, rng.random(len(dates)) < 0.2] = np.nan
+
+    result = baci_effect(dates, treatment, control, dates[n_before], n_bootstrap=n_bootstrap,
+                         n_permutations=10, seed=5)
+
+    # Replay the same resampling matrix and evaluate one resample at a time
+    indices = bootstrap_indices(n_before, n_after, n_bootstrap, np.random.default_rng(5))
+    differences = treatment - control
+    boot = np.empty((2, n_bootstrap))
+    for row in range(2):
+        for b in range(n_bootstrap):
+            sample = differences[row, indices[b]]
+            before, after = sample[:n_before], sample[n_before:]
+            boot[row, b] = np.mean(after[~np.isnan(after)]) - np.mean(before[~np.isnan(before)])
+    lower, upper = np.quantile(boot, [0.025, 0.975], axis=1)
+    np.testing.assert_allclose(result['ci_lower'], lower, rtol=1e-10)
+    np.testing.assert_allclose(result['ci_upper'], upper, rtol=1e-10)
+    np.testing.assert_allclose(result['std_error'], boot.std(axis=1, ddof=1), rtol=1e-10)
+    assert (result['ci_lower'] <= result['effect']).all() and (result['effect'] <= result['ci_upper']).all()
+
+    # Chunked resampling draws differently but reduces the same way
+    monkeypatch.setattr(baci, 'MAX_BOOTSTRAP_ELEMENTS', 2 * len(dates) * 7)
+    chunked = baci_effect(dates, treatment, control, dates[n_before], n_bootstrap=n_bootstrap,
+                          n_permutations=10, seed=5)
+    np.testing.assert_array_equal(chunked['effect'], result['effect'])
+    np.testing.assert_allclose(chunked['std_error'], result['std_error'], rtol=0.25)
+
+
+def test_bootstrap_indices_stay_within_period():
+    indices = bootstrap_indices(5, 8, 1000, np.random.default_rng(0))
+    assert indices.shape == (1000, 13)
+    assert (indices[:, :5] < 5).all()
+    assert ((indices[:, 5:] >= 5) & (indices[:, 5:] < 13)).all()
+
+
+def test_missing_period_gives_nan():
+    dates = _dates(6)
+    result = baci_effect(dates, np.ones((1, 6)), np.zeros((1, 6)), '2030-01-01', n_bootstrap=10)
+    assert result['n_after'][0] == 0
+    assert np.isnan(result['effect']).all() and np.isnan(result['p_value']).all()
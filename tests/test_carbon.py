@@ -0,0 +1,113 @@
+import math
+
+import numpy as np
+import pytest
+
+from carbon import (
+    BIOME_MODELS, BIOMES, CARBON_FRACTION, CO2_PER_CARBON, CURRENT_PERIOD_DAYS, MIN_VALID_FRACTION,
+    carbon_density, carbon_stock_series, sequestration
+)
+from raster_products import IndexCube
+
+TRANSFORM = {'x0': 36.0, 'y0': -3.0, 'dx': 0.0005, 'dy': -0.0005}
+
+
+def _pixel_density(biome, value):
+    model = BIOME_MODELS[biome]
+    above = min(model['a'] * max(value, 0.0) ** model['b'], model['max_agb'])
+    return above * (1 + model['root_shoot']) * CARBON_FRACTION * CO2_PER_CARBON
+
+
+def _pixel_area_ha(row):
+    lat = TRANSFORM['y0'] + (row + 0.5) * TRANSFORM['dy']
+    return abs(TRANSFORM['dx'] * TRANSFORM['dy']) * 111_320.0 ** 2 * math.cos(math.radians(lat)) / 10_000
+
+
+def _cubes(rng, n_dates, shape, cloud=0.3):
+    dates = [str(np.datetime64('2022-01-01') + 12 * i) for i in range(n_dates)]
+    cubes = {}
+    clouds = rng.random((n_dates,) + shape) < cloud
+    # Some dates are mostly clouded and must be dropped
+    clouds[::5] |= rng.random((len(clouds[::5]),) + shape) < 0.8
+    for name in ('EVI', 'NDVI'):
+        values = rng.uniform(-0.05, 0.8, size=(n_dates,) + shape).astype(np.float32)
+        values[clouds] = np.nan
+        cubes[name] = IndexCube(name, values, dates, TRANSFORM)
+    return cubes
+
+
+def test_stock_series_matches_pixel_loop():
+    rng = np.random.default_rng(0)
+    shape = (23, 31)
+    cubes = _cubes(rng, 15, shape)
+    codes = rng.integers(0, len(BIOMES) + 1, size=shape)
+    labels = rng.integers(0, 3, size=shape)
+    result = carbon_stock_series(cubes, biome_codes=codes, project_labels=labels, project_ids=[7, 9],
+                                 tile_size=8, workers=2)
+
+    for label, project_id in ((1, 7), (2, 9)):
+        series = result['projects'][project_id]
+        modelled = [(r, c) for r in range(shape[0]) for c in range(shape[1])
+                    if labels[r, c] == label and codes[r, c] > 0]
+        modelled_area = sum(_pixel_area_ha(r) for r, _ in modelled)
+        assert series['modelled_area_ha'] == pytest.approx(round(modelled_area, 4), abs=1e-4)
+        for t in range(len(result['dates'])):
+            weighted, valid_area = 0.0, 0.0
+            for r, c in modelled:
+                biome = BIOMES[codes[r, c] - 1]
+                value = cubes[BIOME_MODELS[biome]['index']].values[t, r, c]
+                if not np.isnan(value):
+                    weighted += _pixel_density(biome, float(value)) * _pixel_area_ha(r)
+                    valid_area += _pixel_area_ha(r)
+            fraction = valid_area / modelled_area
+            assert series['valid_fraction'][t] == pytest.approx(round(fraction, 4), abs=1e-4)
+            if fraction < MIN_VALID_FRACTION:
+                assert series['carbon_stock_tco2e'][t] is None
+            else:
+                expected = weighted / valid_area * modelled_area
+                assert series['carbon_stock_tco2e'][t] == pytest.approx(expected, rel=1e-5, abs=0.01)
+    assert any(value is None for value in result['projects'][7]['carbon_stock_tco2e'])
+
+
+def test_single_biome_matches_uniform_raster():
+    rng = np.random.default_rng(1)
+    cubes = _cubes(rng, 6, (12, 10))
+    codes = np.full((12, 10), BIOMES.index('wetland') + 1)
+    by_name = carbon_stock_series(cubes, biome='wetland', workers=1)
+    by_raster = carbon_stock_series(cubes, biome_codes=codes, workers=1)
+    assert by_name == by_raster
+
+
+@pytest.mark.parametrize('bad_code', [len(BIOMES) + 1, -1])
+def test_unknown_biome_codes_are_rejected(bad_code):
+    rng = np.random.default_rng(2)
+    cubes = _cubes(rng, 3, (6, 6))
+    codes = np.ones((6, 6), dtype=np.int64)
+    codes[2, 3] = bad_code
+    with pytest.raises(ValueError, match='Unknown biome codes'):
+        carbon_stock_series(cubes, biome_codes=codes, workers=1)
+    with pytest.raises(ValueError, match='Unknown biome codes'):
+        carbon_density({name: cube.values for name, cube in cubes.items()}, codes)
+
+
+def test_biome_needs_its_index_cube():
+    rng = np.random.default_rng(3)
+    cubes = _cubes(rng, 3, (6, 6))
+    with pytest.raises(ValueError, match='EVI'):
+        carbon_stock_series({'NDVI': cubes['NDVI']}, biome='mangrove', workers=1)
+
+
+def test_sequestration_matches_period_means():
+    rng = np.random.default_rng(4)
+    offsets = np.sort(rng.uniform(-500, 1500, size=90))
+    stocks = 1000 + offsets[None, :] * rng.uniform(0.1, 0.5, size=(4, 1)) + rng.normal(size=(4, 90))
+    stocks[rng.random(stocks.shape) < 0.1] = np.nan
+    result = sequestration(offsets, stocks, 0.0)
+    for row in range(4):
+        observed = ~np.isnan(stocks[row])
+        baseline = observed & (offsets < 0) & (offsets >= -365.25)
+        current = observed & (offsets >= 0) & (offsets > offsets.max() - CURRENT_PERIOD_DAYS)
+        change = stocks[row, current].mean() - stocks[row, baseline].mean()
+        elapsed = (offsets[current].mean() - offsets[baseline].mean()) / 365.25
+        assert result['sequestration'][row] == pytest.approx(change)
+        assert result['annual_rate'][row] == pytest.approx(change / elapsed)
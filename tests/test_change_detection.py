@@ -0,0 +1,101 @@
+import numpy as np
+
+from change_detection import (
+    CHANGE_LOSS, CHANGE_REGROWTH, CHANGE_STABLE, CUSUM_CRITICAL, change_maps, detect_breaks
+)
+from raster_products import IndexCube
+
+DAYS_PER_YEAR = 365.25
+
+
+def _reference(values, times, monitor_start, harmonics=1, critical=CUSUM_CRITICAL):
+    """One series at a time: least-squares history fit, then a CUSUM loop"""
+    columns = [np.ones_like(times)]
+    for k in range(1, harmonics + 1):
+        angle = 2 * np.pi * k * times / DAYS_PER_YEAR
+        columns.extend([np.cos(angle), np.sin(angle)])
+    design = np.stack(columns, axis=1)
+    history = times < monitor_start
+
+    results = []
+    for series in values:
+        fit_rows = history & ~np.isnan(series)
+        n_history = int(fit_rows.sum())
+        if n_history <= design.shape[1]:
+            results.append((np.nan, np.nan, np.nan))
+            continue
+        coefficients = np.linalg.lstsq(design[fit_rows], series[fit_rows], rcond=None)[0]
+        residuals = series - design @ coefficients
+        sigma = np.sqrt((residuals[fit_rows] ** 2).sum() / (n_history - design.shape[1]))
+
+        cusum, steps, found = 0.0, 0, None
+        for t in np.flatnonzero(~history):
+            if np.isnan(residuals[t]):
+                continue
+            steps += 1
+            cusum += residuals[t] / sigma
+            if abs(cusum) > critical * np.sqrt(n_history) * (1 + steps / n_history):
+                found = t
+                break
+        if found is None:
+            results.append((np.nan, np.nan, CHANGE_STABLE))
+            continue
+        tail = residuals[found:][~np.isnan(residuals[found:])]
+        magnitude = np.median(tail)
+        results.append((times[found], magnitude, CHANGE_LOSS if magnitude < 0 else CHANGE_REGROWTH))
+    return np.array(results).T
+
+
+def _series(rng, n_series, times, monitor_start):
+    seasonal = 0.5 + 0.2 * np.sin(2 * np.pi * times / DAYS_PER_YEAR)
+    values = seasonal + rng.normal(scale=0.03, size=(n_series, times.size))
+    # A third lose, a third regrow, at random times after monitoring starts
+    shifts = rng.choice([-0.25, 0.0, 0.2], size=n_series)
+    starts = rng.uniform(monitor_start, times.max(), size=n_series)
+    values += np.where(times[None, :] >= starts[:, None], shifts[:, None], 0.0)
+    values[rng.random(values.shape) < 0.15] = np.nan
+    return values
+
+
+def test_detect_breaks_matches_per_series_cusum():
+    rng = np.random.default_rng(0)
+    times = np.sort(rng.uniform(0, 4 * DAYS_PER_YEAR, size=120))
+    monitor_start = 2 * DAYS_PER_YEAR
+    values = _series(rng, 200, times, monitor_start)
+    # Too little history to fit the model
+    values[0, times < monitor_start] = np.nan
+    values[0, :2] = 0.5
+
+    breaks = detect_breaks(values, times, monitor_start)
+    break_time, magnitude, change_class = _reference(values, times, monitor_start)
+    np.testing.assert_array_equal(breaks['change_class'], change_class)
+    np.testing.assert_array_equal(breaks['break_time'], break_time)
+    np.testing.assert_allclose(breaks['magnitude'], magnitude, rtol=1e-6, atol=1e-9, equal_nan=True)
+    assert {CHANGE_LOSS, CHANGE_REGROWTH, CHANGE_STABLE} <= set(change_class[~np.isnan(change_class)])
+
+
+def test_min_magnitude_drops_small_breaks():
+    rng = np.random.default_rng(1)
+    times = np.sort(rng.uniform(0, 4 * DAYS_PER_YEAR, size=120))
+    values = _series(rng, 100, times, 2 * DAYS_PER_YEAR)
+    everything = detect_breaks(values, times, 2 * DAYS_PER_YEAR)
+    large = detect_breaks(values, times, 2 * DAYS_PER_YEAR, min_magnitude=0.15)
+    kept = np.abs(everything['magnitude']) >= 0.15
+    np.testing.assert_array_equal(np.isnan(large['break_time']), ~kept)
+    assert ((large['change_class'] == CHANGE_STABLE) == ~kept).all()
+
+
+def test_change_maps_match_whole_cube():
+    rng = np.random.default_rng(2)
+    dates = [str(np.datetime64('2020-01-03') + int(day)) for day in np.arange(0, 4 * 365, 16)]
+    times = np.arange(0, 4 * 365, 16, dtype=float)
+    values = _series(rng, 30 * 37, times, 730.0).T.reshape(len(dates), 30, 37).astype(np.float32)
+    cube = IndexCube('NDVI', values, dates)
+
+    maps = change_maps(cube, '2022-01-02', workers=2, tile_size=16)
+    breaks = detect_breaks(values.reshape(len(dates), -1).T.astype(float), times, 730.0)
+    for name in ('break_time', 'magnitude', 'change_class'):
+        np.testing.assert_allclose(maps[name], breaks[name].reshape(30, 37).astype(np.float32),
+                                   rtol=1e-6, equal_nan=True)
+    assert maps['loss_pixels'] == int((breaks['change_class'] == CHANGE_LOSS).sum())
+    assert maps['regrowth_pixels'] == int((breaks['change_class'] == CHANGE_REGROWTH).sum())
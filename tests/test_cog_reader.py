@@ -0,0 +1,107 @@
+import numpy as np
+import pytest
+
+import cog_reader
+from cog_reader import BlockCache, CogReader, open_reader, read_scene_bands, serve_static_ranges
+
+from cog_files import write_cog
+
+
+@pytest.fixture(autouse=True)
+def fresh_caches():
+    cog_reader.BLOCK_CACHE.clear()
+    cog_reader.clear_readers()
+    yield
+    cog_reader.clear_readers()
+
+
+@pytest.mark.parametrize('compress, predictor', [(False, False), (True, False), (True, True)])
+def test_windows_match_the_full_array(tmp_path, compress, predictor):
+    rng = np.random.default_rng(0)
+    array = rng.integers(1, 10000, size=(150, 210)).astype(np.uint16)
+    path = str(tmp_path / 'band.tif')
+    write_cog(path, array, tile=32, compress=compress, predictor=predictor)
+    reader = CogReader(path, cache=BlockCache())
+    assert (reader.height, reader.width) == array.shape
+    for _ in range(20):
+        row, col = rng.integers(-10, 150), rng.integers(-10, 210)
+        height, width = rng.integers(1, 90, size=2)
+        # Out-of-raster pixels are nodata, so the result lines up with the window
+        padded = np.pad(array, 100)
+        expected = padded[row + 100:row + 100 + height, col + 100:col + 100 + width]
+        np.testing.assert_array_equal(reader.read_window(row, col, height, width), expected)
+
+
+def test_windows_outside_rasters_without_nodata_raise(tmp_path):
+    array = np.arange(1, 40 * 40 + 1, dtype=np.uint16).reshape(40, 40)
+    path = str(tmp_path / 'band.tif')
+    write_cog(path, array, tile=16, nodata=None)
+    reader = CogReader(path)
+    assert reader.nodata is None
+    np.testing.assert_array_equal(reader.read_window(5, 10, 20, 30), array[5:25, 10:40])
+    with pytest.raises(ValueError, match='nodata'):
+        reader.read_window(-3, 10, 20, 20)
+    with pytest.raises(ValueError, match='nodata'):
+        reader.read_window(30, 30, 20, 20)
+
+
+def test_bounds_reads_mask_nodata(tmp_path):
+    array = np.arange(100 * 100, dtype=np.uint16).reshape(100, 100)
+    array[10, 20] = 0
+    path = str(tmp_path / 'band.tif')
+    transform = write_cog(path, array, tile=32)
+    reader = CogReader(path)
+    bounds = [transform['x0'] + 15 * transform['dx'], transform['y0'] + 40 * transform['dy'],
+              transform['x0'] + 45 * transform['dx'], transform['y0'] + 5 * transform['dy']]
+    window = reader.read_bounds(bounds)
+    expected = array[5:40, 15:45].astype(np.float32)
+    expected[expected == 0] = np.nan
+    np.testing.assert_array_equal(window, expected)
+
+
+def test_scene_reads_parse_each_band_once(tmp_path, monkeypatch):
+    rng = np.random.default_rng(1)
+    bands = {}
+    for band_id in ('B4', 'B8'):
+        path = str(tmp_path / f'{band_id}.tif')
+        write_cog(path, rng.integers(1, 10000, size=(128, 128)).astype(np.uint16), tile=32)
+        bands[band_id] = path
+    scene = {'scene_id': 'S2A_TEST', 'bands': bands}
+
+    header_reads = []
+    original = cog_reader.LocalSource.read
+
+    def counting_read(source, offset, length):
+        if offset == 0:
+            header_reads.append(source.path)
+        return original(source, offset, length)
+
+    monkeypatch.setattr(cog_reader.LocalSource, 'read', counting_read)
+    bounds = [37.0, -1.0 - 0.004, 37.004, -1.0]
+    first = read_scene_bands(scene, ['B4', 'B8'], bounds)
+    second = read_scene_bands(scene, ['B4', 'B8'], bounds)
+    assert sorted(header_reads) == sorted(bands.values())
+    for band_id in bands:
+        np.testing.assert_array_equal(first[band_id], second[band_id])
+    assert open_reader(bands['B4'], 'S2A_TEST', 'B4') is open_reader(bands['B4'], 'S2A_TEST', 'B4')
+
+
+def test_http_range_reads_match_local_reads(tmp_path):
+    rng = np.random.default_rng(3)
+    array = rng.integers(1, 10000, size=(200, 260)).astype(np.uint16)
+    write_cog(str(tmp_path / 'band.tif'), array, tile=32, predictor=True)
+    server, base_url = serve_static_ranges(str(tmp_path))
+    try:
+        remote = CogReader(f'{base_url}/band.tif', cache=BlockCache())
+        local = CogReader(str(tmp_path / 'band.tif'), cache=BlockCache())
+        assert type(remote.source).__name__ == 'HttpRangeSource'
+        assert (remote.height, remote.width, remote.transform) == (local.height, local.width, local.transform)
+        for row, col, height, width in [(0, 0, 10, 10), (-5, 250, 20, 20), (40, 70, 64, 90)]:
+            np.testing.assert_array_equal(remote.read_window(row, col, height, width),
+                                          local.read_window(row, col, height, width))
+        # Range requests fetched exactly the bytes the local reads did, not the whole file
+        assert remote.source.bytes_read == local.source.bytes_read
+        assert remote.source.bytes_read < (tmp_path / 'band.tif').stat().st_size
+    finally:
+        server.shutdown()
+        server.server_close()
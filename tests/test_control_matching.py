@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from control_matching import FEATURE_COLUMNS, ControlCandidateGrid, KDTree
+
+
+def _brute_force(points, query, k, allowed=None):
+    distances = np.sqrt(((points - query) ** 2).sum(axis=1))
+    candidates = np.flatnonzero(allowed) if allowed is not None else np.arange(len(points))
+    order = candidates[np.argsort(distances[candidates], kind='stable')][:k]
+    return order, distances[order]
+
+
+@pytest.mark.parametrize('leaf_size', [1, 8, 64])
+def test_kdtree_matches_brute_force(leaf_size):
+    rng = np.random.default_rng(leaf_size)
+    points = rng.normal(size=(2000, 5))
+    points[:50] = points[50:100]            # duplicated points tie on distance
+    tree = KDTree(points, leaf_size)
+    allowed = rng.random(len(points)) < 0.6
+    for query in rng.normal(size=(25, 5)) * 1.5:
+        for mask in (None, allowed):
+            indices, distances = tree.query(query, 12, mask)
+            expected_indices, expected_distances = _brute_force(points, query, 12, mask)
+            np.testing.assert_allclose(distances, expected_distances, rtol=1e-12)
+            # Ties may come back in either order; the neighbour sets agree
+            cutoff = expected_distances[-1] - 1e-9
+            assert set(indices[distances < cutoff]) == set(expected_indices[expected_distances < cutoff])
+            if mask is not None:
+                assert mask[indices].all()
+
+
+def test_kdtree_returns_fewer_when_few_points_are_allowed():
+    rng = np.random.default_rng(0)
+    points = rng.normal(size=(300, 3))
+    allowed = np.zeros(len(points), dtype=bool)
+    allowed[[5, 17, 250]] = True
+    indices, distances = KDTree(points, 16).query(np.zeros(3), 10, allowed)
+    expected, expected_distances = _brute_force(points, np.zeros(3), 10, allowed)
+    np.testing.assert_array_equal(indices, expected)
+    np.testing.assert_allclose(distances, expected_distances)
+    assert KDTree(np.empty((0, 3))).query(np.zeros(3), 4)[0].size == 0
+
+
+def _grid(rng, excluded_fraction=0.05):
+    transform = {'x0': 36.0, 'y0': 1.0, 'dx': 0.01, 'dy': -0.01}
+    shape = (60, 70)
+    rasters = {name: rng.normal(loc=i, scale=i + 1, size=shape) for i, name in enumerate(FEATURE_COLUMNS)}
+    rasters['elevation'][rng.random(shape) < 0.03] = np.nan
+    land_cover = rng.integers(1, 3, size=shape)
+    grid = ControlCandidateGrid.from_rasters(rasters, transform, land_cover, leaf_size=16)
+    grid.excluded[rng.random(grid.excluded.size) < excluded_fraction] = True
+    return grid
+
+
+def _expected_matches(grid, ring, k, buffer):
+    ring = np.asarray(ring)
+    lo, hi = ring.min(axis=0), ring.max(axis=0)
+    centers, scaled = grid.centers, grid.scaled
+    usable = ~np.isnan(scaled).any(axis=1)
+    inside = np.flatnonzero((centers >= lo).all(axis=1) & (centers <= hi).all(axis=1) & usable)
+    classes, counts = np.unique(grid.land_cover[inside], return_counts=True)
+    land_class = classes[np.argmax(counts)]
+    profile = scaled[inside].mean(axis=0)
+    near = (centers >= lo - buffer).all(axis=1) & (centers <= hi + buffer).all(axis=1)
+    allowed = usable & (grid.land_cover == land_class) & ~grid.excluded & ~near
+    return _brute_force(scaled, profile, k, allowed)
+
+
+def test_grid_match_matches_brute_force():
+    rng = np.random.default_rng(1)
+    grid = _grid(rng)
+    ring = [[36.2, 0.8], [36.3, 0.8], [36.3, 0.7], [36.2, 0.7], [36.2, 0.8]]
+    matches = grid.match(ring, k=15, buffer=0.05)
+    cells, distances = _expected_matches(grid, ring, 15, 0.05)
+    np.testing.assert_array_equal([match['cell'] for match in matches], cells)
+    np.testing.assert_allclose([match['distance'] for match in matches], np.round(distances, 6))
+
+    # Excluding a neighbouring project removes its cells from the matches
+    other = [[36.35, 0.75], [36.45, 0.75], [36.45, 0.65], [36.35, 0.65], [36.35, 0.75]]
+    assert grid.exclude_projects([other], buffer=0.02) > 0
+    matches = grid.match(ring, k=15, buffer=0.05)
+    cells, _ = _expected_matches(grid, ring, 15, 0.05)
+    np.testing.assert_array_equal([match['cell'] for match in matches], cells)
+
+
+def test_grid_round_trips_through_save(tmp_path):
+    grid = _grid(np.random.default_rng(2))
+    path = str(tmp_path / 'grid.npz')
+    grid.save(path)
+    loaded = ControlCandidateGrid.load(path)
+    ring = [[36.1, 0.9], [36.15, 0.9], [36.15, 0.85], [36.1, 0.85], [36.1, 0.9]]
+    assert loaded.match(ring, k=5) == grid.match(ring, k=5)
+
+
+def test_project_over_unusable_cells_profiles_nearest_usable_cell():
+    rng = np.random.default_rng(3)
+    grid = _grid(rng, excluded_fraction=0.0)
+    ring = [[36.2, 0.8], [36.3, 0.8], [36.3, 0.7], [36.2, 0.7], [36.2, 0.8]]
+    inside = grid.cells_in_box([36.2, 0.7, 36.3, 0.8])
+    features = grid.features.copy()
+    features[inside, 0] = np.nan
+    grid = ControlCandidateGrid(grid.centers, grid.cell_size, features, grid.land_cover, leaf_size=16)
+
+    usable = np.flatnonzero(~np.isnan(grid.scaled).any(axis=1))
+    distances = ((grid.centers[usable] - [36.25, 0.75]) ** 2).sum(axis=1)
+    nearest = usable[np.argmin(distances)]
+    profile, land_class = grid.project_profile(ring)
+    np.testing.assert_array_equal(profile, grid.scaled[nearest])
+    assert land_class == grid.land_cover[nearest]
+    assert not np.isnan([m['distance'] for m in grid.match(ring, k=5)]).any()
+
+    # Without any usable cell there is nothing to match against
+    empty = ControlCandidateGrid(grid.centers, grid.cell_size, np.full_like(features, np.nan))
+    assert empty.project_profile(ring) is None
+    assert empty.match(ring, k=5) == []
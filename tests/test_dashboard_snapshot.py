@@ -0,0 +1,119 @@
+import asyncio
+import threading
+
+import pytest
+
+from dashboard_snapshot import DashboardSnapshot
+
+
+class _Session:
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class _Store:
+    """Counters standing in for the database; a metric reads one value"""
+
+    def __init__(self):
+        self.values = {'projects': 0, 'reports': 0}
+        self.reads = 0
+        self.sessions = []
+        self.threads = set()
+        self.lock = threading.Lock()
+
+    def session_factory(self):
+        session = _Session()
+        with self.lock:
+            self.sessions.append(session)
+        return session
+
+    def metric(self, name, delay=0.0):
+        async def compute(db):
+            with self.lock:
+                self.reads += 1
+                self.threads.add(threading.get_ident())
+            await asyncio.sleep(delay)
+            return self.values[name]
+        return compute
+
+
+def _snapshot(store, ttl=60.0, delay=0.0):
+    return DashboardSnapshot({name: store.metric(name, delay) for name in store.values},
+                             store.session_factory, ttl=ttl)
+
+
+def test_reads_match_recomputing_after_writes():
+    store = _Store()
+    snapshot = _snapshot(store)
+
+    async def run():
+        for step in range(20):
+            if step % 3 == 0:
+                store.values['projects'] += 1
+                snapshot.invalidate()
+            assert await snapshot.get() == store.values
+    asyncio.run(run())
+    # One computation per write, every read in between served from memory
+    assert store.reads == 2 * 7
+    assert all(session.closed for session in store.sessions)
+
+
+def test_metrics_run_concurrently_on_their_own_sessions():
+    store = _Store()
+    snapshot = _snapshot(store, delay=0.05)
+    result = asyncio.run(snapshot.compute())
+    assert result == store.values
+    assert len(store.sessions) == 2 and len({id(s) for s in store.sessions}) == 2
+    assert len(store.threads) == 2
+
+
+def test_concurrent_readers_share_one_refresh():
+    store = _Store()
+    snapshot = _snapshot(store, delay=0.02)
+
+    async def run():
+        return await asyncio.gather(*(snapshot.get() for _ in range(10)))
+    assert asyncio.run(run()) == [store.values] * 10
+    assert store.reads == 2
+
+
+def test_stale_snapshot_refreshes_in_the_background():
+    store = _Store()
+    snapshot = _snapshot(store, ttl=0.0, delay=0.01)
+
+    async def run():
+        first = await snapshot.get()
+        store.values['reports'] = 5
+        # Past the TTL: the old figures come back at once while a refresh runs
+        stale = await snapshot.get()
+        await snapshot._refresh
+        return first, stale, await snapshot.get()
+    first, stale, fresh = asyncio.run(run())
+    assert first == stale == {'projects': 0, 'reports': 0}
+    assert fresh['reports'] == 5
+
+
+def test_failed_refresh_keeps_previous_snapshot():
+    store = _Store()
+    snapshot = _snapshot(store, ttl=0.0)
+    calls = {'n': 0}
+    good = store.metric('projects')
+
+    async def flaky(db):
+        calls['n'] += 1
+        if calls['n'] > 1:
+            raise RuntimeError("database unavailable")
+        return await good(db)
+    snapshot.metrics['projects'] = flaky
+
+    async def run():
+        first = await snapshot.get()
+        # Past the TTL this read starts the refresh that fails
+        await snapshot.get()
+        with pytest.raises(RuntimeError):
+            await snapshot._refresh
+        return first, await snapshot.get()
+    first, after = asyncio.run(run())
+    assert first == after == store.values
@@ -0,0 +1,57 @@
+import asyncio
+
+import fake_ee
+from ee_jobs import EarthEngineJobManager
+
+
+def _collection(start='2024-01-01', end='2024-03-01'):
+    def add_indices(image):
+        return image.addBands([
+            image.normalizedDifference(['B8', 'B4']).rename('NDVI'),
+            image.normalizedDifference(['B3', 'B8']).rename('NDWI')
+        ])
+    return fake_ee.ImageCollection('COPERNICUS/S2_SR').filterDate(start, end).map(add_indices)
+
+
+def _expected_ndvi(start='2024-01-01', end='2024-03-01'):
+    return [
+        round((scene.bands['B8'] - scene.bands['B4']) / (scene.bands['B8'] + scene.bands['B4']), 4)
+        for scene in fake_ee._synthetic_scenes(start, end)
+    ]
+
+
+def test_index_series_is_one_evaluation():
+    jobs = EarthEngineJobManager(fake_ee, max_workers=2)
+    fake_ee.reset_calls()
+    geometry = fake_ee.Geometry.Rectangle([37.5, -2.0, 37.8, -1.7])
+    series = asyncio.run(jobs.evaluate_index_series(_collection(), geometry, ['NDVI', 'NDWI']))
+    jobs.shutdown()
+
+    assert fake_ee.calls['getInfo'] == 1
+    assert [point['value'] for point in series['NDVI']] == _expected_ndvi()
+    assert len(series['NDWI']) == len(series['NDVI'])
+    dates = [point['date'] for point in series['NDVI']]
+    assert dates == sorted(dates) and dates[0] == '2024-01-01'
+
+
+def test_zonal_series_splits_by_project():
+    jobs = EarthEngineJobManager(fake_ee, max_workers=2)
+    features = fake_ee.FeatureCollection([
+        fake_ee.Feature(fake_ee.Geometry.Rectangle([0, 0, 1, 1]), {'project_id': project_id})
+        for project_id in (3, 8)
+    ])
+    fake_ee.reset_calls()
+    series = asyncio.run(jobs.evaluate_zonal_series(_collection(), features, ['NDVI']))
+    jobs.shutdown()
+
+    assert fake_ee.calls['getInfo'] == 1
+    assert set(series) == {3, 8}
+    assert [point['value'] for point in series[8]['NDVI']] == _expected_ndvi()
+
+
+def test_export_polls_until_complete():
+    jobs = EarthEngineJobManager(fake_ee, poll_interval=0)
+    task = fake_ee.batch.Export.table.toDrive(description='series')
+    status = asyncio.run(jobs.run_export(task))
+    jobs.shutdown()
+    assert status['state'] == 'COMPLETED'
@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+pytest.importorskip('models')
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import Session
+
+import impact_cache
+from impact_cache import ImpactResult, get_or_compute, invalidate, stored_result
+from models import CommunityReport, SatelliteData
+
+
+@pytest.fixture
+def db():
+    engine = create_engine('sqlite://')
+    for model in (SatelliteData, CommunityReport, ImpactResult):
+        model.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def _summary(db, project_id):
+    """The result an analysis would compute from the current data"""
+    count, total = db.query(func.count(SatelliteData.id), func.sum(SatelliteData.ndvi_mean)).filter(
+        SatelliteData.project_id == project_id
+    ).one()
+    reports = db.query(func.count(CommunityReport.id)).filter(
+        CommunityReport.project_id == project_id
+    ).scalar()
+    return {'acquisitions': count, 'ndvi_total': round(total or 0.0, 6), 'reports': reports}
+
+
+def _counting(db, project_id, calls):
+    async def compute():
+        calls.append(project_id)
+        return _summary(db, project_id)
+    return compute
+
+
+def test_cached_results_match_recomputing_after_random_writes(db):
+    rng = np.random.default_rng(0)
+    calls = []
+    start = datetime(2024, 1, 1)
+    acquisitions = {1: 0, 2: 0}
+    for step in range(60):
+        project_id = int(rng.integers(1, 3))
+        action = rng.integers(0, 4)
+        if action == 0:
+            acquisitions[project_id] += 1
+            db.add(SatelliteData(project_id=project_id, satellite='Sentinel-2',
+                                 acquisition_date=start + timedelta(days=5 * acquisitions[project_id]),
+                                 ndvi_mean=float(rng.random())))
+        elif action == 1:
+            db.add(CommunityReport(project_id=project_id, created_at=start, is_verified=0))
+        db.commit()
+
+        before = len(calls)
+        result = asyncio.run(get_or_compute(db, project_id, 'impact', _counting(db, project_id, calls)))
+        assert result == _summary(db, project_id)
+        # A write to the project forces a recompute; otherwise the stored result is reused
+        if action in (0, 1):
+            assert len(calls) == before + 1
+
+
+def test_parameters_and_versions_select_results(db, monkeypatch):
+    calls = []
+    compute = _counting(db, 1, calls)
+    asyncio.run(get_or_compute(db, 1, 'baci', compute, {'intervention_date': '2024-01-01'}))
+    asyncio.run(get_or_compute(db, 1, 'baci', compute, {'intervention_date': '2024-01-01'}))
+    assert len(calls) == 1
+    asyncio.run(get_or_compute(db, 1, 'baci', compute, {'intervention_date': '2024-06-01'}))
+    assert len(calls) == 2
+    monkeypatch.setitem(impact_cache.PARAMETER_VERSIONS, 'baci', 99)
+    asyncio.run(get_or_compute(db, 1, 'baci', compute, {'intervention_date': '2024-06-01'}))
+    assert len(calls) == 3
+    # One row per project and analysis, overwritten in place
+    assert db.query(ImpactResult).count() == 1
+
+
+def test_concurrent_misses_share_one_computation(db):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return {'value': 1}
+
+    async def run():
+        return await asyncio.gather(*(get_or_compute(db, 3, 'impact', compute) for _ in range(5)))
+
+    assert asyncio.run(run()) == [{'value': 1}] * 5
+    assert calls == [1]
+
+
+def test_failed_computation_is_not_stored(db):
+    async def fail():
+        raise RuntimeError("engine unavailable")
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(get_or_compute(db, 4, 'impact', fail))
+    assert stored_result(db, 4, 'impact') is None
+    assert not impact_cache._pending
+
+
+def test_invalidate_drops_stored_results(db):
+    calls = []
+    for analysis in ('impact', 'baci'):
+        asyncio.run(get_or_compute(db, 5, analysis, _counting(db, 5, calls)))
+    invalidate(db, 5, 'baci')
+    db.commit()
+    assert stored_result(db, 5, 'baci') is None
+    assert stored_result(db, 5, 'impact') == _summary(db, 5)
+    asyncio.run(get_or_compute(db, 5, 'impact', _counting(db, 5, calls)))
+    asyncio.run(get_or_compute(db, 5, 'baci', _counting(db, 5, calls)))
+    assert len(calls) == 3
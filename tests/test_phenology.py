@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from scipy.signal import savgol_filter
+
+from phenology import (
+    fit_harmonic, gap_fill_and_phenology, harmonic_design, interpolate_gaps, regular_grid, savgol_smooth
+)
+
+
+def _seasonal(times, peak_day=200.0):
+    return 0.3 + 0.25 * np.exp(-0.5 * (((times - peak_day + 182.6) % 365.25 - 182.6) / 40.0) ** 2)
+
+
+def _irregular_times(rng, years):
+    steps = rng.choice([5, 10, 15, 20], size=int(years * 365 / 8))
+    times = np.cumsum(steps).astype(float)
+    return times[times < years * 365.25]
+
+
+def test_harmonic_fit_matches_per_row_least_squares():
+    rng = np.random.default_rng(0)
+    times = _irregular_times(rng, 2)
+    values = _seasonal(times)[None, :] + rng.normal(0, 0.02, size=(6, len(times)))
+    values[rng.random(values.shape) < 0.3] = np.nan
+    fit = fit_harmonic(values, times, ridge=0.0)
+    design = harmonic_design(times)
+    for row in range(len(values)):
+        observed = ~np.isnan(values[row])
+        expected = np.linalg.lstsq(design[observed], values[row, observed], rcond=None)[0]
+        np.testing.assert_allclose(fit['coefficients'][row], expected, rtol=1e-6, atol=1e-9)
+
+
+def test_savgol_matches_scipy_on_complete_series():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(4, 50))
+    smoothed = savgol_smooth(values, window=7, order=2)
+    expected = savgol_filter(values, 7, 2, axis=1)
+    np.testing.assert_allclose(smoothed[:, 3:-3], expected[:, 3:-3], rtol=1e-9, atol=1e-12)
+
+
+def test_regular_grid_averages_each_bin():
+    times = np.array([0.0, 4.0, 6.0, 21.0])
+    values = np.array([[1.0, 2.0, 4.0, np.nan]])
+    grid, grid_times, positions = regular_grid(values, times, 5.0)
+    np.testing.assert_array_equal(positions, [0, 1, 1, 4])
+    np.testing.assert_array_equal(grid_times, [0, 5, 10, 15, 20])
+    np.testing.assert_array_equal(grid[0], [1.0, 3.0, np.nan, np.nan, np.nan])
+
+
+@pytest.mark.parametrize('method', ['harmonic', 'savgol'])
+def test_metrics_are_per_season_year(method):
+    rng = np.random.default_rng(2)
+    # Three years from 1 January plus half of a fourth, which is left out
+    times = _irregular_times(rng, 3.5)
+    values = _seasonal(times)[None, :] + rng.normal(0, 0.005, size=(2, len(times)))
+    result = gap_fill_and_phenology(values, times, method=method, window=9)
+
+    assert result['seasons'].shape == (3, 2)
+    assert result['peak_time'].shape == (2, 3)
+    expected_peaks = 200.0 + 365.25 * np.arange(3)
+    np.testing.assert_allclose(result['peak_time'], np.broadcast_to(expected_peaks, (2, 3)), atol=12)
+    assert (result['season_start'] < result['peak_time']).all()
+    assert (result['peak_time'] < result['season_end']).all()
+    assert (result['season_end'] < result['seasons'][:, 1]).all()
+    assert result['smoothed'].shape == values.shape
+
+
+def test_interpolate_gaps_matches_per_row_interp():
+    rng = np.random.default_rng(7)
+    times = np.sort(rng.uniform(0, 1000, size=60))
+    curves = rng.normal(size=(400, 60))
+    curves[rng.random(curves.shape) < 0.7] = np.nan
+    curves[0] = np.nan                  # no samples
+    curves[1] = np.nan
+    curves[1, 5] = 1.0                  # a single sample
+    curves[2, :10] = curves[2, -10:] = np.nan   # leading and trailing gaps
+
+    expected = curves.copy()
+    for row in range(len(curves)):
+        observed = ~np.isnan(curves[row])
+        if observed.sum() >= 2:
+            expected[row] = np.interp(times, times[observed], curves[row, observed])
+    np.testing.assert_allclose(interpolate_gaps(curves, times), expected, rtol=1e-12, atol=1e-12)
@@ -0,0 +1,164 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from portfolio_cube import DIMENSIONS, PortfolioCube, build_cube, month_label, month_ordinal
+
+COUNTRIES = ['Kenya', 'Ghana', 'Peru', None]
+TYPES = ['Agroforestry', 'Mangrove', 'Watershed']
+SOURCES = ['GCF', 'World Bank']
+
+
+def _portfolio(rng, n_projects=60, n_reports=400):
+    projects = [
+        {
+            'id': project_id,
+            'country': COUNTRIES[rng.integers(len(COUNTRIES))],
+            'project_type': TYPES[rng.integers(len(TYPES))],
+            'funding_source': SOURCES[rng.integers(len(SOURCES))],
+            'start_date': f"{rng.integers(2021, 2024)}-{rng.integers(1, 13):02d}-15",
+            'beneficiaries': int(rng.integers(0, 5000)),
+            'funding': round(float(rng.uniform(1e4, 1e6)), 2)
+        }
+        for project_id in range(1, n_projects + 1)
+    ]
+    reports = [
+        {
+            'project_id': int(rng.integers(1, n_projects + 1)),
+            'created_at': f"{rng.integers(2022, 2025)}-{rng.integers(1, 13):02d}-03T10:00:00",
+            'is_verified': bool(rng.random() < 0.4)
+        }
+        for _ in range(n_reports)
+    ]
+    resilience = {project['id']: round(float(rng.uniform(20, 90)), 1)
+                  for project in projects if rng.random() < 0.7}
+    return projects, reports, resilience
+
+
+def _group_by(projects, reports, resilience, group_by, filters=None, month_from=None, month_to=None):
+    """The same aggregates from a plain loop over the rows"""
+    filters = filters or {}
+    low = month_ordinal(month_from) if month_from else -1
+    high = month_ordinal(month_to) if month_to else 1 << 30
+    by_id = {project['id']: project for project in projects}
+
+    def key(project, month):
+        values = {name: project.get(name) or 'Unknown' for name in DIMENSIONS[:3]}
+        values['month'] = month_label(month)
+        if any(values[name] not in wanted for name, wanted in filters.items()) or not low <= month <= high:
+            return None
+        return tuple(values[name] for name in group_by)
+
+    groups = {}
+    empty = {'projects': 0, 'beneficiaries': 0, 'funding': 0.0, 'reports': 0, 'verified_reports': 0,
+             'scores': []}
+    for project in projects:
+        group = key(project, month_ordinal(project['start_date']))
+        if group is None:
+            continue
+        row = groups.setdefault(group, dict(empty, scores=[]))
+        row['projects'] += 1
+        row['beneficiaries'] += project['beneficiaries']
+        row['funding'] += project['funding']
+        if project['id'] in resilience:
+            row['scores'].append(resilience[project['id']])
+    for report in reports:
+        project = by_id.get(report['project_id'])
+        group = key(project, month_ordinal(report['created_at'])) if project else None
+        if group is None:
+            continue
+        row = groups.setdefault(group, dict(empty, scores=[]))
+        row['reports'] += 1
+        row['verified_reports'] += report['is_verified']
+    return groups
+
+
+def _assert_matches(result, expected, group_by):
+    assert len(result['rows']) == len(expected)
+    for row in result['rows']:
+        want = expected[tuple(row[name] for name in group_by)]
+        for name in ('projects', 'beneficiaries', 'reports', 'verified_reports'):
+            assert row[name] == want[name]
+        assert row['funding'] == pytest.approx(want['funding'], abs=0.01)
+        if want['scores']:
+            assert row['resilience_score'] == pytest.approx(round(np.mean(want['scores']), 1))
+        else:
+            assert row['resilience_score'] is None
+
+
+QUERIES = [
+    ((), {}, None, None),
+    (('country',), {}, None, None),
+    (('project_type', 'month'), {}, None, None),
+    (('country', 'funding_source'), {'project_type': ['Mangrove', 'Watershed']}, None, None),
+    (('month',), {'country': ['Kenya', 'Unknown']}, '2022-06', '2023-09'),
+    (tuple(DIMENSIONS), {}, '2023-01', None),
+]
+
+
+@pytest.mark.parametrize('group_by, filters, month_from, month_to', QUERIES)
+def test_query_matches_group_by(group_by, filters, month_from, month_to):
+    rng = np.random.default_rng(0)
+    projects, reports, resilience = _portfolio(rng)
+    # Reports of projects outside the portfolio are skipped
+    reports.append({'project_id': 999, 'created_at': '2023-01-01', 'is_verified': True})
+    cube = build_cube(projects, reports, resilience)
+    result = cube.query(group_by, filters, month_from, month_to)
+    expected = _group_by(projects, reports, resilience, group_by, filters, month_from, month_to)
+    _assert_matches(result, expected, group_by)
+
+
+def test_incremental_changes_match_rebuilding():
+    rng = np.random.default_rng(1)
+    projects, reports, resilience = _portfolio(rng)
+    cube = PortfolioCube(capacity=4)
+    cube.add_projects(projects[:40], resilience)
+    cube.add_reports(report for report in reports if report['project_id'] <= 40)
+    for project in projects[40:]:
+        cube.add_project(project, resilience.get(project['id']))
+    cube.add_reports(report for report in reports if report['project_id'] > 40)
+
+    # Move some projects, rescore others and drop a few
+    for project in projects[:10]:
+        project['country'] = 'Ghana'
+        project['start_date'] = '2020-03-01'
+        cube.update_project(project)
+    for project_id in (11, 12):
+        resilience[project_id] = 55.0
+        cube.set_resilience(project_id, 55.0)
+    resilience.pop(13, None)
+    cube.set_resilience(13, None)
+    removed = {20, 21, 22}
+    for project_id in removed:
+        cube.remove_project(project_id)
+    projects = [project for project in projects if project['id'] not in removed]
+    reports = [report for report in reports if report['project_id'] not in removed]
+
+    for group_by in itertools.chain.from_iterable(itertools.combinations(DIMENSIONS, n) for n in (0, 1, 2)):
+        _assert_matches(cube.query(group_by), _group_by(projects, reports, resilience, group_by), group_by)
+
+
+def test_update_keeps_stored_score_unless_given():
+    cube = PortfolioCube()
+    project = {'id': 1, 'country': 'Kenya', 'project_type': 'Mangrove', 'funding_source': 'GCF',
+               'start_date': '2023-02-01', 'beneficiaries': 10, 'funding': 100.0}
+    cube.add_project(project, 70.0)
+    cube.update_project(dict(project, country='Peru'))
+    assert cube.query()['totals']['resilience_score'] == 70.0
+    cube.update_project(project, 40.0)
+    assert cube.query()['totals']['resilience_score'] == 40.0
+
+
+def test_reports_for_unknown_projects_leave_cube_untouched():
+    cube = PortfolioCube()
+    cube.add_project({'id': 1, 'country': 'Kenya', 'project_type': 'Mangrove', 'funding_source': 'GCF',
+                      'start_date': '2023-02-01'})
+    before = cube.query(['month'])
+    with pytest.raises(KeyError):
+        cube.add_reports([{'project_id': 1, 'created_at': '2023-03-01'},
+                          {'project_id': 2, 'created_at': '2023-03-01'}])
+    assert cube.query(['month']) == before
+    # Removing the project afterwards doesn't leave negative report counts behind
+    cube.remove_project(1)
+    assert cube.query()['totals']['reports'] == 0
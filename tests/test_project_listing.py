@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('models')
+
+from sqlalchemy import Column, MetaData, Table, create_engine, insert
+from sqlalchemy.orm import Session
+
+from models import Project
+from project_listing import (
+    GEOMETRY_COLUMN, decode_cursor, encode_cursor, ensure_indexes, list_projects, parse_fields
+)
+
+COUNTRIES = ['Kenya', 'Ghana', 'Peru']
+TYPES = ['Agroforestry', 'Mangrove', 'Watershed']
+STATUSES = ['active', 'completed', 'planning']
+
+
+@pytest.fixture(scope='module')
+def listing():
+    """SQLite copy of the projects table without the geometry, plus the rows in it"""
+    engine = create_engine('sqlite://')
+    table = Table(Project.__table__.name, MetaData(), *(
+        Column(column.name, column.type, primary_key=column.primary_key)
+        for column in Project.__table__.c if column.name != GEOMETRY_COLUMN
+    ))
+    table.create(engine)
+    ensure_indexes(engine)
+    rng = np.random.default_rng(0)
+    # Sparse, shuffled ids so pages can't be told apart by offsets
+    ids = rng.choice(np.arange(1, 5000), size=700, replace=False)
+    rows = [
+        {
+            'id': int(project_id), 'name': f'project {project_id}',
+            'country': COUNTRIES[rng.integers(len(COUNTRIES))],
+            'project_type': TYPES[rng.integers(len(TYPES))],
+            'status': STATUSES[rng.integers(len(STATUSES))]
+        }
+        for project_id in ids
+    ]
+    with engine.begin() as connection:
+        connection.execute(insert(table), rows)
+    return engine, rows
+
+
+def _pages(db, limit, filters, fields):
+    pages, cursor = [], None
+    while True:
+        items, cursor = list_projects(db, cursor=cursor, limit=limit, filters=filters, fields=fields)
+        pages.append(items)
+        if cursor is None:
+            return pages
+        assert len(pages) <= 1000
+
+
+@pytest.mark.parametrize('limit', [1, 7, 100, 2000])
+@pytest.mark.parametrize('filters', [
+    {},
+    {'country': ['Kenya']},
+    {'country': ['Ghana', 'Peru'], 'status': ['active']},
+    {'project_type': ['Mangrove'], 'status': []},
+    {'country': ['Atlantis']}
+])
+def test_pages_match_sorted_scan(listing, limit, filters):
+    engine, rows = listing
+    fields = parse_fields('name,country,status')
+    expected = sorted(
+        ({name: row[name] for name in fields} for row in rows
+         if all(not values or row[name] in values for name, values in filters.items())),
+        key=lambda item: item['id']
+    )
+    with Session(engine) as db:
+        pages = _pages(db, limit, filters, fields)
+
+    assert [item for page in pages for item in page] == expected
+    capped = min(limit, 1000)
+    assert all(len(page) == capped for page in pages[:-1])
+    assert len(pages[-1]) <= capped
+    assert len(pages) == max(1, -(-len(expected) // capped))
+
+
+def test_cursor_resumes_after_any_id(listing):
+    engine, rows = listing
+    ids = sorted(row['id'] for row in rows)
+    fields = parse_fields('id')
+    with Session(engine) as db:
+        for after in (0, ids[0], ids[10] + 1, ids[-2], ids[-1]):
+            items, _ = list_projects(db, cursor=encode_cursor(after), limit=5, fields=fields)
+            assert [item['id'] for item in items] == [i for i in ids if i > after][:5]
+
+
+def test_bad_input_is_rejected(listing):
+    engine, _ = listing
+    assert decode_cursor(encode_cursor(42)) == 42
+    with pytest.raises(ValueError, match='cursor'):
+        decode_cursor('not a cursor')
+    with pytest.raises(ValueError, match='Unknown fields'):
+        parse_fields('name,secret')
+    with Session(engine) as db:
+        with pytest.raises(ValueError, match='Unknown filter'):
+            list_projects(db, filters={'name': ['x']}, fields=['id'])
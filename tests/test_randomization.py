@@ -0,0 +1,105 @@
+import itertools
+
+import numpy as np
+import pytest
+
+import randomization
+from randomization import permutation_labels, permutation_pvalues, permutation_pvalues_many
+
+
+def _did(differences, after):
+    observed = ~np.isnan(differences)
+    return differences[observed & after].mean() - differences[observed & ~after].mean()
+
+
+def _swapped_statistic(treatment, control, after, swaps):
+    """DiD after swapping the two areas' values on the dates where swaps is True"""
+    # The pre-period contrast is removed before the areas are exchangeable
+    baseline = np.nanmean((treatment - control)[~after])
+    treatment = treatment - baseline
+    permuted_treatment = np.where(swaps, control, treatment)
+    permuted_control = np.where(swaps, treatment, control)
+    return _did(permuted_treatment - permuted_control, after)
+
+
+def _data(rng, n_dates, effect=0.0):
+    after = np.arange(n_dates) >= n_dates // 2
+    control = 0.4 + rng.normal(scale=0.05, size=n_dates)
+    treatment = 0.6 + rng.normal(scale=0.05, size=n_dates) + effect * after
+    treatment[rng.random(n_dates) < 0.2] = np.nan
+    return treatment, control, after
+
+
+def test_labels_are_swaps():
+    labels = permutation_labels(7, 5000, np.random.default_rng(0))
+    assert labels.shape == (5000, 7)
+    assert set(np.unique(labels)) == {-1.0, 1.0}
+    assert abs(labels.mean()) < 0.02
+
+
+def test_matches_swapping_area_values():
+    rng = np.random.default_rng(1)
+    treatment, control, after = _data(rng, 24, effect=0.03)
+    result = permutation_pvalues(treatment - control, after, n_permutations=2000, seed=7)
+
+    labels = permutation_labels(24, 2000, np.random.default_rng(7))
+    effect = _did(treatment - control, after)
+    statistics = np.array([_swapped_statistic(treatment, control, after, row < 0) for row in labels])
+    exceed = (np.abs(statistics) >= abs(effect) * (1 - 1e-12)).sum()
+    assert result['effect'][0] == pytest.approx(effect)
+    assert result['p_value'][0] == pytest.approx((exceed + 1) / 2001)
+
+
+def test_monte_carlo_matches_exact_enumeration():
+    rng = np.random.default_rng(2)
+    treatment, control, after = _data(rng, 12, effect=0.04)
+    effect = _did(treatment - control, after)
+    statistics = np.array([
+        _swapped_statistic(treatment, control, after, np.array(swaps, dtype=bool))
+        for swaps in itertools.product([False, True], repeat=12)
+    ])
+    exact = (np.abs(statistics) >= abs(effect) * (1 - 1e-12)).mean()
+    result = permutation_pvalues(treatment - control, after, n_permutations=40000, seed=3)
+    assert result['p_value'][0] == pytest.approx(exact, abs=0.01)
+
+
+def test_null_p_values_are_calibrated():
+    rng = np.random.default_rng(4)
+    n_series, n_dates = 2000, 30
+    after = np.arange(n_dates) >= 12
+    # Different level per series, no effect
+    differences = rng.normal(size=(n_series, 1)) + rng.normal(scale=0.1, size=(n_series, n_dates))
+    result = permutation_pvalues(differences, after, n_permutations=500, seed=5)
+    rejected = (result['p_value'] < 0.05).mean()
+    assert 0.02 < rejected < 0.08
+
+    shifted = differences + 0.15 * after
+    assert (permutation_pvalues(shifted, after, n_permutations=500, seed=5)['p_value'] < 0.05).mean() > 0.9
+
+
+def test_missing_period_and_chunking(monkeypatch):
+    rng = np.random.default_rng(6)
+    differences = rng.normal(size=(3, 20))
+    after = np.arange(20) >= 8
+    differences[1, ~after] = np.nan
+    result = permutation_pvalues(differences, after, n_permutations=300, seed=1)
+    assert np.isnan(result['effect'][1]) and np.isnan(result['p_value'][1])
+    assert not np.isnan(result['p_value'][[0, 2]]).any()
+
+    monkeypatch.setattr(randomization, 'MAX_PERMUTATION_ELEMENTS', 20 * 7)
+    chunked = permutation_pvalues(differences, after, n_permutations=300, seed=1)
+    np.testing.assert_array_equal(chunked['p_value'], result['p_value'])
+
+
+def test_many_projects_match_single_runs():
+    rng = np.random.default_rng(8)
+    jobs = {}
+    for project in range(6):
+        n_dates = 18 if project % 2 else 25
+        after = rng.permutation(np.arange(n_dates) >= n_dates // 3)
+        jobs[project] = (rng.normal(size=(2, n_dates)) + 0.5 * after, after)
+    results = permutation_pvalues_many(jobs, n_permutations=4000, seed=0)
+    for key, (differences, after) in jobs.items():
+        single = permutation_pvalues(differences, after, n_permutations=4000, seed=key)
+        np.testing.assert_allclose(results[key]['effect'], single['effect'])
+        np.testing.assert_allclose(results[key]['p_value'], single['p_value'], atol=0.02)
@@ -0,0 +1,43 @@
+import numpy as np
+
+from raster_products import IndexCube, TiledRasterStore, trend_anomaly_block, write_trend_anomaly_products
+
+
+def _cube(rng, n_dates=12, shape=(37, 29)):
+    values = rng.normal(0.4, 0.1, size=(n_dates,) + shape).astype(np.float32)
+    values[rng.random(values.shape) < 0.25] = np.nan
+    dates = [f'2024-{month:02d}-15' for month in range(1, n_dates + 1)]
+    return IndexCube('NDVI', values, dates)
+
+
+def test_trend_anomaly_block_matches_per_pixel_reference():
+    rng = np.random.default_rng(0)
+    cube = _cube(rng)
+    days = cube.day_offsets()
+    slope, anomaly = trend_anomaly_block(cube.values, days)
+    for row in range(cube.shape[0]):
+        for col in range(cube.shape[1]):
+            series = cube.values[:, row, col].astype(float)
+            observed = np.flatnonzero(~np.isnan(series))
+            if len(observed) >= 2:
+                expected = np.polyfit(days[observed], series[observed], 1)[0] * 365.25
+                np.testing.assert_allclose(slope[row, col], expected, rtol=1e-6, atol=1e-9)
+            else:
+                assert np.isnan(slope[row, col])
+            if len(observed) >= 2:
+                expected = series[observed[-1]] - series[observed[:-1]].mean()
+                np.testing.assert_allclose(anomaly[row, col], expected, rtol=1e-6, atol=1e-9)
+            else:
+                assert np.isnan(anomaly[row, col])
+
+
+def test_tiled_products_match_whole_cube(tmp_path):
+    rng = np.random.default_rng(1)
+    cube = _cube(rng)
+    paths = write_trend_anomaly_products(7, cube, output_dir=str(tmp_path), tile_size=8)
+    slope, anomaly = trend_anomaly_block(cube.values, cube.day_offsets())
+    np.testing.assert_allclose(TiledRasterStore(paths['trend_slope']).read(), slope, rtol=1e-6)
+    np.testing.assert_allclose(TiledRasterStore(paths['latest_anomaly']).read(), anomaly, rtol=1e-6)
+
+    window = (slice(5, 30), slice(3, 20))
+    np.testing.assert_allclose(TiledRasterStore(paths['trend_slope']).read(window), slope[window], rtol=1e-6)
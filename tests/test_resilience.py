@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from resilience import COMPONENTS, INDEX_ORDER, RECENT_MONTHS, index_statistics, score_components
+
+
+def _observations(rng, n_projects):
+    """Raw (project, index, month, value) observations with gaps"""
+    rows = []
+    for project in range(n_projects):
+        first = int(rng.integers(0, 12))
+        last = first + int(rng.integers(1, 40))
+        for index in range(len(INDEX_ORDER)):
+            if rng.random() < 0.15:
+                continue
+            for month in range(first, last):
+                for _ in range(int(rng.integers(0, 4))):
+                    rows.append((project, index, 24000 + month, rng.normal(0.3 + 0.1 * index, 0.1)))
+    return np.array(rows)
+
+
+def _buckets(observations):
+    """Monthly count, mean and M2 per (project, index, month), like the stored aggregates"""
+    keys, inverse = np.unique(observations[:, :3], axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    values = observations[:, 3]
+    counts = np.bincount(inverse).astype(float)
+    means = np.bincount(inverse, values) / counts
+    m2s = np.bincount(inverse, (values - means[inverse]) ** 2)
+    return keys.astype(np.int64), counts, means, m2s
+
+
+def test_index_statistics_match_raw_observations():
+    rng = np.random.default_rng(0)
+    n_projects = 25
+    observations = _observations(rng, n_projects)
+    keys, counts, means, m2s = _buckets(observations)
+    stats = index_statistics(keys[:, 0], keys[:, 1], keys[:, 2], counts, means, m2s, n_projects)
+
+    for project in range(n_projects):
+        mine = observations[observations[:, 0] == project]
+        latest = mine[:, 2].max() if mine.size else None
+        for name in ('NDVI', 'NDWI', 'EVI'):
+            values = mine[mine[:, 1] == INDEX_ORDER.index(name)]
+            key = name.lower()
+            if values.size == 0:
+                assert np.isnan(stats[f'{key}_level'][project])
+                continue
+            recent = values[:, 2] > latest - RECENT_MONTHS
+            level = values[recent, 3].mean() if recent.any() else np.nan
+            assert stats[f'{key}_level'][project] == pytest.approx(level, nan_ok=True)
+            if name != 'EVI':
+                change = level - values[~recent, 3].mean() if (~recent).any() else np.nan
+                assert stats[f'{key}_change'][project] == pytest.approx(change, nan_ok=True)
+            if name == 'NDVI':
+                cv = values[:, 3].std() / abs(values[:, 3].mean())
+                assert stats['ndvi_cv'][project] == pytest.approx(cv)
+
+
+def test_score_components_average_available_components():
+    rng = np.random.default_rng(1)
+    n = 200
+    stats = {name: rng.uniform(-0.2, 0.8, n) for name in
+             ('ndvi_level', 'ndvi_change', 'ndvi_cv', 'ndwi_level', 'ndwi_change', 'evi_level')}
+    stats['report_count'] = rng.integers(0, 80, n).astype(float)
+    stats['verified_share'] = rng.random(n)
+    for name in ('ndvi_level', 'ndwi_level', 'ndvi_change'):
+        stats[name][rng.random(n) < 0.2] = np.nan
+    scores = score_components(stats)
+
+    for i in range(n):
+        components = [scores[name][i] for name in COMPONENTS]
+        assert all(np.isnan(value) or 0.0 <= value <= 100.0 for value in components)
+        available = [value for value in components if not np.isnan(value)]
+        assert scores['resilience_score'][i] == pytest.approx(np.mean(available))
+        assert np.isnan(scores['community_engagement'][i]) == (stats['report_count'][i] == 0)
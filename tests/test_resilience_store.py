@@ -0,0 +1,90 @@
+import threading
+from datetime import date, datetime
+
+import numpy as np
+import pytest
+
+pytest.importorskip('models')
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from models import CommunityReport, Project
+from resilience import INDEX_ORDER
+from resilience_store import (
+    SCORE_SATELLITE, ResilienceScore, compute_scores, get_resilience_history, get_resilience_score,
+    refresh_resilience_scores
+)
+from summary_aggregates import SatelliteAggregate
+
+
+@pytest.fixture
+def engine():
+    engine = create_engine('sqlite://', connect_args={'check_same_thread': False}, poolclass=StaticPool)
+    for model in (Project, CommunityReport, SatelliteAggregate, ResilienceScore):
+        model.__table__.create(engine)
+    rng = np.random.default_rng(0)
+    with Session(engine) as db:
+        for project_id in (1, 2, 3):
+            db.add(Project(id=project_id, name=f'project {project_id}'))
+            for index_name in INDEX_ORDER:
+                for month in range(18):
+                    db.add(SatelliteAggregate(
+                        project_id=project_id, satellite=SCORE_SATELLITE, index_name=index_name,
+                        bucket=date(2023 + month // 12, month % 12 + 1, 1), count=3,
+                        mean=float(rng.uniform(0.1, 0.6)), m2=0.01
+                    ))
+        # Another sensor's aggregates never feed the score
+        db.add(SatelliteAggregate(project_id=1, satellite='Landsat-8', index_name='NDVI',
+                                  bucket=date(2024, 6, 1), count=5, mean=-0.9, m2=0.0))
+        db.add(CommunityReport(project_id=1, created_at=datetime(2024, 1, 1), is_verified=1))
+        db.commit()
+    return engine
+
+
+def test_refresh_recomputes_only_changed_projects(engine):
+    with Session(engine) as db:
+        assert refresh_resilience_scores(db) == {'checked': 3, 'recomputed': 3}
+        assert refresh_resilience_scores(db) == {'checked': 3, 'recomputed': 0}
+
+        db.add(CommunityReport(project_id=2, created_at=datetime(2024, 2, 1), is_verified=0))
+        db.commit()
+        assert refresh_resilience_scores(db, [2]) == {'checked': 1, 'recomputed': 1}
+        assert refresh_resilience_scores(db) == {'checked': 3, 'recomputed': 0}
+
+        history = get_resilience_history(db, 2)
+        assert len(history) == 2
+        assert history[0]['resilience_components']['community_engagement'] is not None
+        assert history[1]['resilience_components']['community_engagement'] is None
+        assert get_resilience_score(db, 2) == history[0]
+
+
+def test_materialized_scores_match_scoring_each_project_alone(engine):
+    with Session(engine) as db:
+        refresh_resilience_scores(db)
+        for project_id in (1, 2, 3):
+            alone = compute_scores(db, [project_id])
+            stored = get_resilience_score(db, project_id)
+            assert stored['resilience_score'] == pytest.approx(round(float(alone['resilience_score'][0]), 1))
+
+
+def test_concurrent_refreshes_keep_one_current_row(engine):
+    factory = sessionmaker(bind=engine)
+
+    def refresh():
+        db = factory()
+        try:
+            refresh_resilience_scores(db, force=True)
+        finally:
+            db.close()
+
+    threads = [threading.Thread(target=refresh) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    with Session(engine) as db:
+        current = db.query(ResilienceScore).filter(ResilienceScore.is_current.is_(True)).all()
+        assert sorted(row.project_id for row in current) == [1, 2, 3]
+        assert db.query(ResilienceScore).count() == 12
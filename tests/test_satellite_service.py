@@ -0,0 +1,265 @@
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+import pytest
+
+pytest.importorskip('models')
+pytest.importorskip('schemas')
+pytest.importorskip('pandas')
+
+import fake_ee
+
+fake_ee.install()
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+import carbon_store
+import satellite_service
+from carbon import carbon_stock_series
+from carbon_store import CarbonStock
+from cog_files import write_cog
+from cog_reader import clear_readers
+from scene_catalog import SceneCatalog
+from control_matching import FEATURE_COLUMNS, ControlCandidateGrid
+from models import Project
+from raster_products import IndexCube, TiledRasterStore, trend_anomaly_block
+from satellite_service import INDEX_NAMES, SatelliteService
+from summary_aggregates import SatelliteAggregate, update_aggregates
+
+
+def _db(project):
+    db = mock.MagicMock()
+    db.query.return_value.filter.return_value.first.return_value = project
+    return db
+
+
+def test_project_starting_today_without_watermark_is_up_to_date(monkeypatch):
+    monkeypatch.setattr(satellite_service, 'get_watermark', lambda db, project_id, satellite: None)
+    project = SimpleNamespace(id=5, start_date=datetime.now() + timedelta(days=3))
+    result = asyncio.run(SatelliteService().process_project_satellite_data(5, _db(project)))
+    assert result['watermark'] is None
+    assert result['rows_written'] == 0
+
+
+def test_unsupported_sensor_is_rejected():
+    project = SimpleNamespace(id=5, start_date=datetime(2024, 1, 1))
+    with pytest.raises(ValueError, match='Unsupported satellite'):
+        asyncio.run(SatelliteService().process_project_satellite_data(5, _db(project), satellite='MODIS'))
+
+
+def test_empty_series_summary_has_the_same_keys():
+    stats = SatelliteService()._calculate_summary_stats({
+        'NDVI': [{'date': f'2024-01-{day:02d}', 'value': 0.1 * day} for day in range(1, 6)],
+        'EVI': []
+    })
+    assert stats['NDVI'].keys() == stats['EVI'].keys()
+    assert stats['EVI']['sens_slope'] is None
+
+
+def test_short_series_trends_are_undefined_not_significant():
+    series = [{'date': f'2024-01-{day:02d}', 'value': 0.1 * day} for day in range(1, 4)]
+    stats = SatelliteService()._calculate_summary_stats({
+        'NDVI': series[:1], 'EVI': series[:2], 'NDWI': series
+    })
+    # Mann-Kendall needs at least three observations
+    assert stats['NDVI']['trend_p_value'] is None and stats['EVI']['trend_p_value'] is None
+    assert stats['NDVI']['trend'] is None and stats['NDVI']['sens_slope'] is None
+    assert stats['EVI']['trend'] == pytest.approx(0.1)
+    assert 0 < stats['NDWI']['trend_p_value'] <= 1
+
+
+def test_month_aligned_summary_checks_project_and_matches_rescanning():
+    engine = create_engine('sqlite://')
+    for model in (Project, SatelliteAggregate):
+        model.__table__.create(engine)
+    service = SatelliteService()
+    with Session(engine) as db:
+        db.add(Project(id=1, name='farm'))
+        db.commit()
+        with pytest.raises(ValueError, match='not found'):
+            asyncio.run(service.get_summary_stats(2, '2024-01-01', '2024-03-01', db))
+        with pytest.raises(ValueError, match='Unsupported satellite'):
+            asyncio.run(service.get_summary_stats(1, '2024-01-01', '2024-03-01', db, satellite='MODIS'))
+
+        # Empty and single-observation ranges read the same from either path
+        stored = asyncio.run(service.get_summary_stats(1, '2024-01-01', '2024-03-01', db))
+        assert stored == service._calculate_summary_stats({name: [] for name in INDEX_NAMES})
+        update_aggregates(db, 1, 'Sentinel-2', [{'acquisition_date': datetime(2024, 1, 5), 'ndvi_mean': 0.4,
+                                                 'ndwi_mean': None, 'evi_mean': None}])
+        db.commit()
+        stored = asyncio.run(service.get_summary_stats(1, '2024-01-01', '2024-03-01', db))
+        rescanned = service._calculate_summary_stats({
+            'NDVI': [{'date': '2024-01-05', 'value': 0.4}], 'NDWI': [], 'EVI': []
+        })
+        assert stored == rescanned
+
+
+def test_batch_indices_match_per_project_requests():
+    projects = [SimpleNamespace(id=project_id, project_area=None) for project_id in (1, 2, 3)]
+    db = mock.MagicMock()
+    db.query.return_value.filter.return_value.all.return_value = projects
+    db.query.return_value.filter.return_value.first.side_effect = lambda: projects[0]
+    service = SatelliteService()
+
+    fake_ee.reset_calls()
+    batch = asyncio.run(service.get_indices_batch([1, 2, 3], '2024-01-01', '2024-03-01', db))
+    # The demo geometry puts every project in one footprint: one evaluation
+    assert fake_ee.calls['getInfo'] == 1
+
+    single = asyncio.run(service.get_indices(1, '2024-01-01', '2024-03-01', db))
+    for project_id in (1, 2, 3):
+        assert batch[project_id].indices == single.indices
+
+
+def _box(lon, lat, size=0.05):
+    return [[lon, lat], [lon + size, lat], [lon + size, lat + size], [lon, lat + size], [lon, lat]]
+
+
+def test_matched_controls_skip_other_projects(tmp_path, monkeypatch):
+    rng = np.random.default_rng(5)
+    rasters = {name: rng.normal(size=(50, 50)) for name in FEATURE_COLUMNS}
+    grid = ControlCandidateGrid.from_rasters(rasters, {'x0': 36.0, 'y0': 0.0, 'dx': 0.01, 'dy': 0.01})
+    path = str(tmp_path / 'grid.npz')
+    grid.save(path)
+    monkeypatch.setattr(satellite_service, 'CONTROL_GRID_PATH', path)
+
+    areas = {1: _box(36.1, 0.1), 2: _box(36.2, 0.3), 3: _box(36.35, 0.15)}
+    db = mock.MagicMock()
+    db.query.return_value = [(project_id, project_id) for project_id in (1, 2)]
+    service = SatelliteService()
+    monkeypatch.setattr(service, '_project_coordinates', lambda area: areas[area])
+
+    def matches():
+        return {match['cell'] for match in service._matched_control_cells(areas[1], db)}
+
+    def reference(project_ids):
+        fresh = ControlCandidateGrid.load(path)
+        fresh.exclude_projects([areas[project_id] for project_id in project_ids])
+        return {match['cell'] for match in fresh.match(areas[1], k=satellite_service.CONTROL_MATCHES)}
+
+    assert matches() == reference([1, 2])
+    # A project added later is excluded on the next match
+    db.query.return_value = [(project_id, project_id) for project_id in (1, 2, 3)]
+    assert matches() == reference([1, 2, 3])
+    near_others = np.concatenate([grid.cells_in_box(np.add([*areas[i][0], *areas[i][2]], [-0.05, -0.05, 0.05, 0.05]))
+                                  for i in (2, 3)])
+    assert not matches() & set(near_others.tolist())
+
+
+@pytest.mark.parametrize('method', ['harmonic', 'savgol'])
+def test_phenology_is_reported_per_year(method):
+    project = SimpleNamespace(id=5, project_area=None)
+    result = asyncio.run(SatelliteService().get_phenology(5, '2023-01-01', '2025-01-01', _db(project), method))
+    seasons = result['indices']['NDVI']['seasons']
+    assert [season['year'] for season in seasons] == [2023, 2024]
+    assert all(season['peak_date'].startswith(str(season['year'])) for season in seasons)
+
+
+def _scene_catalog(tmp_path, rng, days, shape=(90, 120)):
+    """Catalog of Sentinel-2 scenes with red and NIR COGs on one grid; returns it and the reflectances"""
+    catalog = SceneCatalog(str(tmp_path / 'catalog.sqlite'))
+    footprint = [[37.0, -1.0], [37.012, -1.0], [37.012, -1.009], [37.0, -1.009], [37.0, -1.0]]
+    reflectance = []
+    for i, day in enumerate(days):
+        red = rng.integers(300, 900, size=shape).astype(np.uint16)
+        nir = rng.integers(1500, 4000, size=shape).astype(np.uint16)
+        # Cloud masks come through as nodata
+        red[rng.random(shape) < 0.2] = 0
+        bands = {}
+        for band_id, values in (('B4', red), ('B8', nir)):
+            path = str(tmp_path / f'scene{i}_{band_id}.tif')
+            write_cog(path, values, tile=32)
+            bands[band_id] = path
+        catalog.add_scenes([{'scene_id': f'S2_{i}', 'sensor': 'Sentinel-2', 'sensing_time': f'{day}T08:00:00Z',
+                             'cloud_percentage': 5.0, 'footprint': footprint, 'bands': bands}])
+        reflectance.append((day, np.where(red == 0, np.nan, red * 1e-4), nir * 1e-4))
+    catalog.close()
+    return str(tmp_path / 'catalog.sqlite'), reflectance
+
+
+def test_catalog_cubes_and_carbon_stock_follow_the_pipeline(tmp_path, monkeypatch):
+    rng = np.random.default_rng(6)
+    days = ['2023-03-02', '2023-06-10', '2023-06-10', '2024-02-01', '2024-05-20']
+    path, reflectance = _scene_catalog(tmp_path, rng, days)
+    monkeypatch.setattr(satellite_service, 'SCENE_CATALOG_PATH', path)
+    clear_readers()
+    area = [[37.002, -1.001], [37.007, -1.001], [37.007, -1.006], [37.002, -1.006], [37.002, -1.001]]
+    service = SatelliteService()
+    monkeypatch.setattr(service, '_project_coordinates', lambda project_area: area)
+
+    # Reference: NDVI per scene over the project window, same-day scenes filling each other's gaps
+    rows, cols = slice(10, 60), slice(20, 70)
+    expected = {}
+    for day, red, nir in reflectance:
+        ndvi = ((nir - red) / (nir + red))[rows, cols]
+        expected[day] = ndvi if day not in expected else np.where(np.isnan(expected[day]), ndvi, expected[day])
+    cubes = service.catalog_index_cubes(area, '2023-01-01', '2025-01-01', ['NDVI'])
+    assert cubes['NDVI'].dates == sorted(expected)
+    np.testing.assert_allclose(cubes['NDVI'].values, np.stack([expected[day] for day in sorted(expected)]),
+                               rtol=1e-5)
+    assert cubes['NDVI'].transform['x0'] == pytest.approx(37.002)
+
+    engine = create_engine('sqlite://')
+    for model in (Project, CarbonStock):
+        model.__table__.create(engine)
+    with Session(engine) as db:
+        project = Project(id=4, name='wetland', project_type='Water Management', start_date=datetime(2023, 9, 1))
+        db.add(project)
+        db.commit()
+        # The first run covers the baseline year, not just the window asked for
+        assert service.refresh_carbon_stock(project, db, '2024-05-01', '2024-06-01') == 4
+        stored = service.get_carbon_sequestration(4, db, history=True)['carbon_stock']
+        reference = carbon_stock_series(cubes, biome='wetland', workers=1)['total']['carbon_stock_tco2e']
+        assert [row['carbon_stock_tco2e'] for row in stored] == pytest.approx(reference)
+
+        # Later runs read only their window
+        assert service.refresh_carbon_stock(project, db, '2024-05-01', '2024-06-01') == 1
+        # A model change recomputes everything, even with nothing new to read
+        monkeypatch.setattr(carbon_store, 'MODEL_VERSION', carbon_store.MODEL_VERSION + 1)
+        assert service.get_carbon_sequestration(4, db, history=True)['carbon_stock'] == []
+        assert service.refresh_carbon_stock(project, db, '2024-06-01', '2024-06-01') == 4
+        assert len(service.get_carbon_sequestration(4, db, history=True)['carbon_stock']) == 4
+
+        # Project types without a biome are not modelled
+        project.project_type = 'Education'
+        assert service.refresh_carbon_stock(project, db, '2023-01-01', '2025-01-01') == 0
+
+
+def test_raster_products_are_fitted_across_workers(tmp_path):
+    rng = np.random.default_rng(4)
+    values = rng.normal(0.5, 0.1, size=(10, 40, 30)).astype(np.float32)
+    values[rng.random(values.shape) < 0.3] = np.nan
+    cube = IndexCube('NDVI', values, [f'2024-{month:02d}-10' for month in range(1, 11)])
+    paths = SatelliteService().build_raster_products(3, [cube], output_dir=str(tmp_path), workers=2)
+    slope, anomaly = trend_anomaly_block(cube.values, cube.day_offsets())
+    np.testing.assert_allclose(TiledRasterStore(paths['NDVI']['trend_slope']).read(), slope, rtol=1e-6)
+    np.testing.assert_allclose(TiledRasterStore(paths['NDVI']['latest_anomaly']).read(), anomaly, rtol=1e-6)
+
+
+def test_carbon_stock_is_stored_and_read_back():
+    engine = create_engine('sqlite://')
+    for model in (Project, CarbonStock):
+        model.__table__.create(engine)
+    rng = np.random.default_rng(0)
+    dates = [str(np.datetime64('2022-01-01') + 10 * i) for i in range(150)]
+    growth = np.linspace(0.2, 0.6, len(dates))[:, None, None]
+    cubes = {'NDVI': IndexCube('NDVI', (growth + rng.normal(0, 0.02, (len(dates), 8, 8))).astype(np.float32),
+                               dates)}
+    service = SatelliteService()
+    with Session(engine) as db:
+        db.add(Project(id=3, name='dam', start_date=datetime(2023, 1, 1)))
+        db.commit()
+        built = service.build_carbon_stock(3, cubes, db, biome='wetland', workers=1)
+        read = service.get_carbon_sequestration(3, db, history=True)
+
+    assert built['dates_written'] == len(dates)
+    assert read['sequestration'] == built['sequestration']
+    assert read['sequestration']['sequestration'] > 0
+    expected = carbon_stock_series(cubes, biome='wetland', workers=1)['total']['carbon_stock_tco2e']
+    assert [row['carbon_stock_tco2e'] for row in read['carbon_stock']] == expected
+    with pytest.raises(ValueError, match='not found'):
+        service.get_carbon_sequestration(4, Session(engine))
@@ -0,0 +1,69 @@
+from datetime import datetime
+
+import pytest
+
+pytest.importorskip('models')
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from models import SatelliteData
+import satellite_store
+from satellite_store import (
+    INDEX_COLUMNS, KEY_COLUMNS, bulk_upsert_satellite_data, get_watermark, merge_index_series
+)
+
+
+def _series(dates, offset):
+    return {
+        index_name: [{'date': date, 'value': round(offset + i * 0.01 + j * 0.1, 4), 'cloud_cover': 5.0}
+                     for j, date in enumerate(dates)]
+        for i, index_name in enumerate(INDEX_COLUMNS)
+    }
+
+
+def _stored(db):
+    return {
+        tuple(getattr(row, c) for c in KEY_COLUMNS): {c: getattr(row, c) for c in INDEX_COLUMNS.values()}
+        for row in db.query(SatelliteData)
+    }
+
+
+@pytest.fixture
+def db():
+    engine = create_engine('sqlite://')
+    SatelliteData.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def test_merge_index_series_writes_one_row_per_date():
+    series = _series(['2024-01-11', '2024-01-01'], 0.2)
+    series['EVI'] = series['EVI'][:1]
+    rows = merge_index_series(4, 'Sentinel-2', series)
+    assert [row['acquisition_date'] for row in rows] == [datetime(2024, 1, 1), datetime(2024, 1, 11)]
+    assert rows[0]['evi_mean'] is None and rows[1]['evi_mean'] == 0.22
+
+
+@pytest.mark.parametrize('upsert', ['dialect', 'orm'])
+def test_bulk_upsert_matches_row_by_row_merge(db, upsert):
+    first = merge_index_series(1, 'Sentinel-2', _series(['2024-01-01', '2024-01-06'], 0.2))
+    second = merge_index_series(1, 'Sentinel-2', _series(['2024-01-06', '2024-01-11'], 0.5))
+    second[0]['ndwi_mean'] = None
+
+    expected = {}
+    for row in first + second:
+        key = tuple(row[c] for c in KEY_COLUMNS)
+        stored = expected.setdefault(key, {c: None for c in INDEX_COLUMNS.values()})
+        stored.update({c: row[c] for c in INDEX_COLUMNS.values() if row[c] is not None})
+
+    for rows in (first, second):
+        if upsert == 'orm':
+            satellite_store._orm_upsert(db, rows)
+        else:
+            bulk_upsert_satellite_data(db, rows)
+    db.commit()
+
+    assert _stored(db) == expected
+    assert get_watermark(db, 1, 'Sentinel-2') == datetime(2024, 1, 11)
+    assert get_watermark(db, 1, 'Landsat-8') is None
@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from scene_catalog import SceneCatalog
+
+
+def _scenes(rng, count):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    scenes = []
+    for i in range(count):
+        x, y = rng.uniform(30, 40), rng.uniform(-5, 5)
+        size = rng.uniform(0.2, 1.0)
+        scenes.append({
+            'scene_id': f'S{i:05d}',
+            'sensor': 'Sentinel-2' if i % 3 else 'Landsat-8',
+            'sensing_time': (start + timedelta(hours=float(rng.uniform(0, 24 * 365)))).isoformat(),
+            'cloud_percentage': float(rng.uniform(0, 60)),
+            'footprint': [[x, y], [x + size, y], [x + size, y + size], [x, y + size], [x, y]],
+            'bands': {'B4': f's3://scenes/S{i:05d}/B4.tif'}
+        })
+    return scenes
+
+
+def _brute_force(scenes, bounds, start, end, max_cloud, sensors):
+    min_x, min_y, max_x, max_y = bounds
+    start_time = datetime.fromisoformat(start).replace(tzinfo=timezone.utc)
+    end_time = datetime.fromisoformat(end).replace(tzinfo=timezone.utc)
+    matches = []
+    for scene in scenes:
+        xs = [point[0] for point in scene['footprint']]
+        ys = [point[1] for point in scene['footprint']]
+        sensed = datetime.fromisoformat(scene['sensing_time'])
+        if (max(xs) >= min_x and min(xs) <= max_x and max(ys) >= min_y and min(ys) <= max_y
+                and start_time <= sensed < end_time
+                and (max_cloud is None or scene['cloud_percentage'] < max_cloud)
+                and (not sensors or scene['sensor'] in sensors)):
+            matches.append(scene)
+    return [scene['scene_id'] for scene in sorted(matches, key=lambda s: s['sensing_time'])]
+
+
+def test_search_matches_linear_scan():
+    rng = np.random.default_rng(0)
+    scenes = _scenes(rng, 3000)
+    catalog = SceneCatalog()
+    assert catalog.add_scenes(scenes) == 3000
+
+    for _ in range(25):
+        x, y = rng.uniform(30, 40), rng.uniform(-5, 5)
+        bounds = [x, y, x + rng.uniform(0.05, 2), y + rng.uniform(0.05, 2)]
+        start = f'2024-{rng.integers(1, 7):02d}-01'
+        end = f'2024-{rng.integers(7, 13):02d}-01'
+        for max_cloud, sensors in ((20.0, None), (None, ['Landsat-8'])):
+            found = [scene['scene_id'] for scene in catalog.search(bounds, start, end, max_cloud, sensors)]
+            assert found == _brute_force(scenes, bounds, start, end, max_cloud, sensors)
+    catalog.close()
+
+
+def test_re_adding_a_scene_replaces_it():
+    rng = np.random.default_rng(1)
+    scene = _scenes(rng, 1)[0]
+    catalog = SceneCatalog()
+    catalog.add_scenes([scene])
+    moved = dict(scene, footprint=[[0, 0], [1, 0], [1, 1], [0, 1], [0, 0]], cloud_percentage=1.0)
+    catalog.add_scenes([moved])
+    assert catalog.count() == 1
+    assert catalog.scenes_for_project(moved['footprint'], '2024-01-01', '2025-01-01')[0]['scene_id'] == scene['scene_id']
+    assert catalog.search([30, -5, 41, 6], '2024-01-01', '2025-01-01', max_cloud=None) == []
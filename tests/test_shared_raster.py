@@ -0,0 +1,94 @@
+import warnings
+
+import numpy as np
+import pytest
+
+from raster_products import trend_anomaly_block
+from shared_raster import _run_task, composite, describe, pixel_trends, zonal_sums
+
+
+def _expected_zonal(labels, values, n_labels):
+    expected = {name: np.full(n_labels, np.nan) for name in ('sum', 'sum_sq', 'min', 'max')}
+    expected['count'] = np.zeros(n_labels, dtype=np.int64)
+    for label in range(1, n_labels + 1):
+        selected = values[(labels == label) & ~np.isnan(values)]
+        expected['count'][label - 1] = selected.size
+        expected['sum'][label - 1] = selected.sum()
+        expected['sum_sq'][label - 1] = (selected * selected).sum()
+        if selected.size:
+            expected['min'][label - 1] = selected.min()
+            expected['max'][label - 1] = selected.max()
+    return expected
+
+
+def _assert_zonal(result, expected):
+    np.testing.assert_array_equal(result['count'], expected['count'])
+    for name in ('sum', 'sum_sq', 'min', 'max'):
+        np.testing.assert_allclose(result[name], expected[name], rtol=1e-12, equal_nan=True)
+
+
+def test_zonal_sums_match_per_label_reduction():
+    rng = np.random.default_rng(0)
+    labels = rng.integers(0, 7, size=(45, 70))
+    values = rng.normal(size=(45, 70))
+    values[rng.random(values.shape) < 0.2] = np.nan
+    # Label 6 never has a valid pixel
+    values[labels == 6] = np.nan
+    result = zonal_sums(labels, values, 6, workers=2, tile_size=16)
+    _assert_zonal(result, _expected_zonal(labels, values, 6))
+
+
+def test_zonal_sums_without_tiles():
+    result = zonal_sums(np.zeros((0, 0), dtype=np.int64), np.zeros((0, 0)), 3, workers=1)
+    np.testing.assert_array_equal(result['count'], np.zeros(3))
+    np.testing.assert_array_equal(result['sum'], np.zeros(3))
+    assert np.isnan(result['min']).all() and np.isnan(result['max']).all()
+
+
+def test_memmap_inputs(tmp_path):
+    rng = np.random.default_rng(1)
+    labels = np.lib.format.open_memmap(tmp_path / 'labels.npy', mode='w+', dtype=np.int32, shape=(30, 40))
+    labels[...] = rng.integers(0, 4, size=labels.shape)
+    values = np.lib.format.open_memmap(tmp_path / 'values.npy', mode='w+', dtype=np.float64, shape=(30, 40))
+    values[...] = rng.normal(size=values.shape)
+    labels.flush()
+    values.flush()
+    result = zonal_sums(labels, values, 3, workers=2, tile_size=16)
+    _assert_zonal(result, _expected_zonal(np.asarray(labels), np.asarray(values), 3))
+
+
+def test_worker_inputs_are_read_only(tmp_path):
+    source = np.lib.format.open_memmap(tmp_path / 'cube.npy', mode='w+', dtype=np.float32, shape=(4, 4))
+    source[...] = 1.0
+    source.flush()
+    descriptor, shared = describe(source)
+    assert shared is None
+
+    def _write(inputs, outputs, window):
+        inputs['cube'][window] = 0.0
+
+    with pytest.raises(ValueError):
+        _run_task(_write, {'cube': descriptor}, {}, (slice(0, 2), slice(0, 2)), {})
+    assert (np.asarray(source) == 1.0).all()
+
+
+def test_composite_matches_nanmedian():
+    rng = np.random.default_rng(2)
+    cube = rng.normal(size=(9, 37, 50)).astype(np.float32)
+    cube[rng.random(cube.shape) < 0.3] = np.nan
+    cube[:, 0, 0] = np.nan
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        expected = np.nanmedian(cube, axis=0)
+    np.testing.assert_allclose(composite(cube, workers=2, tile_size=16), expected, equal_nan=True)
+
+
+def test_pixel_trends_match_whole_cube():
+    rng = np.random.default_rng(3)
+    day_offsets = np.sort(rng.uniform(0, 900, size=12))
+    cube = (rng.normal(size=(12, 33, 41)) + day_offsets[:, None, None] / 365.25).astype(np.float32)
+    cube[rng.random(cube.shape) < 0.25] = np.nan
+    slope, anomaly = trend_anomaly_block(cube, day_offsets)
+    result = pixel_trends(cube, day_offsets, workers=2, tile_size=16)
+    np.testing.assert_allclose(result['trend_slope'], slope.astype(np.float32), rtol=1e-5, equal_nan=True)
+    np.testing.assert_allclose(result['latest_anomaly'], anomaly.astype(np.float32), rtol=1e-5, equal_nan=True)
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+import spectral_indices
+from spectral_indices import SENSOR_BANDS, FusedIndexProgram, register_index
+
+
+def _reference(expression, bands, band_map, scale):
+    variables = {name: bands[band_id].astype(np.float64) * scale for name, band_id in band_map.items()}
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        result = eval(expression, {'__builtins__': {}, 'sqrt': np.sqrt, 'abs': np.abs}, variables)
+    result = np.asarray(result, dtype=np.float64)
+    result[~np.isfinite(result)] = np.nan
+    return result
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    monkeypatch.setattr(spectral_indices, 'SPECTRAL_INDICES', dict(spectral_indices.SPECTRAL_INDICES))
+    register_index('XSQ', 'RED*RED + (GREEN - BLUE)')
+    register_index('SQSUM', 'sqrt(NIR * NIR + RED * RED) - abs(NIR - NIR * 2)')
+    return spectral_indices.SPECTRAL_INDICES
+
+
+@pytest.mark.parametrize('sensor', list(SENSOR_BANDS))
+def test_fused_program_matches_direct_numpy(registry, sensor):
+    rng = np.random.default_rng(0)
+    band_map = SENSOR_BANDS[sensor]
+    bands = {band_id: rng.integers(0, 10000, size=(61, 47)).astype(np.uint16) for band_id in band_map.values()}
+    bands[band_map['NIR']][0, :5] = 0
+    bands[band_map['RED']][0, :5] = 0
+
+    # Blocks smaller than the raster exercise register reuse across blocks;
+    # float64 registers keep near-zero denominators comparable
+    fused = FusedIndexProgram(sensor=sensor, dtype=np.float64).evaluate(bands, scale=1e-4, block_size=1000)
+    assert set(fused) == set(registry)
+    for name, (expression, _) in registry.items():
+        expected = _reference(expression, bands, band_map, 1e-4)
+        # Alone, an index gets no register sharing from the others
+        alone = FusedIndexProgram([name], sensor, dtype=np.float64).evaluate(bands, 1e-4, 1000)[name]
+        for result in (fused[name], alone):
+            np.testing.assert_allclose(result, expected, rtol=1e-9, atol=1e-12, equal_nan=True,
+                                       err_msg=name)
+
+
+def test_live_values_never_share_a_register(registry):
+    for names in (['XSQ'], ['SQSUM'], None):
+        program = FusedIndexProgram(names)
+        computed = [i for i, node in enumerate(program._nodes) if node[0] != 'const']
+        last_use = {i: i for i in computed}
+        for position, node in enumerate(program._nodes):
+            for operand in (node[1:] if node[0] not in ('band', 'const') else ()):
+                last_use[operand] = position
+        for output in program.outputs.values():
+            last_use[output] = len(program._nodes)
+        for position in computed:
+            # Values defined by now and still needed after this node
+            live = [i for i in computed if i < position and last_use[i] > position] + [position]
+            registers = [program._registers[i] for i in live]
+            assert len(set(registers)) == len(registers), (names, position)
@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+pytest.importorskip('models')
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from summary_aggregates import (
+    RunningAggregate, SatelliteAggregate, reset_aggregates, summarize_range, update_aggregates
+)
+
+
+def _rows(rng, start, n, offset):
+    return [
+        {'acquisition_date': start + timedelta(days=5 * i),
+         'ndvi_mean': offset + rng.normal(0, 0.05) + 0.001 * i,
+         'ndwi_mean': None if i % 4 == 0 else rng.normal(0.1, 0.02),
+         'evi_mean': rng.normal(0.3, 0.03)}
+        for i in range(n)
+    ]
+
+
+def _expected(values):
+    values = np.asarray(values)
+    return {
+        'mean': round(values.mean(), 4),
+        'std': round(values.std(), 4),
+        'min': round(values.min(), 4),
+        'max': round(values.max(), 4),
+        'trend': round(np.polyfit(np.arange(len(values)), values, 1)[0], 6)
+    }
+
+
+@pytest.fixture
+def db():
+    engine = create_engine('sqlite://')
+    SatelliteAggregate.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def test_concatenated_runs_match_whole_series():
+    rng = np.random.default_rng(0)
+    values = rng.normal(size=50)
+    merged = RunningAggregate()
+    for chunk in np.array_split(values, 7):
+        part = RunningAggregate()
+        part.extend(chunk)
+        merged = merged.concat(part)
+    summary = merged.summary()
+    for name, value in _expected(values).items():
+        assert summary[name] == pytest.approx(value, abs=1e-6)
+
+
+def test_sensors_are_aggregated_and_reset_separately(db):
+    rng = np.random.default_rng(1)
+    sentinel = _rows(rng, datetime(2024, 1, 2), 60, 0.4)
+    landsat = _rows(rng, datetime(2024, 1, 4), 40, 0.7)
+    # Folded in several deltas, as successive watermark runs would
+    for start in range(0, 60, 25):
+        update_aggregates(db, 1, 'Sentinel-2', sentinel[start:start + 25])
+    update_aggregates(db, 1, 'Landsat-8', landsat)
+    db.commit()
+
+    summary = summarize_range(db, 1, '2024-02-01', '2024-08-01', satellite='Sentinel-2')
+    in_range = [row for row in sentinel if datetime(2024, 2, 1) <= row['acquisition_date'] < datetime(2024, 8, 1)]
+    for index_name, column in (('NDVI', 'ndvi_mean'), ('NDWI', 'ndwi_mean')):
+        expected = _expected([row[column] for row in in_range if row[column] is not None])
+        for name, value in expected.items():
+            assert summary[index_name][name] == pytest.approx(value, abs=1e-6)
+    assert summary['NDVI']['sens_slope'] is None
+
+    reset_aggregates(db, 1, 'Sentinel-2')
+    db.commit()
+    assert summarize_range(db, 1, '2024-01-01', '2025-01-01', satellite='Sentinel-2')['NDVI']['mean'] == 0
+    landsat_summary = summarize_range(db, 1, '2024-01-01', '2025-01-01', satellite='Landsat-8')
+    assert landsat_summary['NDVI']['mean'] == pytest.approx(_expected([r['ndvi_mean'] for r in landsat])['mean'])
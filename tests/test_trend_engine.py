@@ -0,0 +1,66 @@
+import itertools
+
+import numpy as np
+from scipy import stats
+
+from trend_engine import batch_trends, ols_slopes, series_trends
+
+
+def _brute_force(values, times):
+    observed = ~np.isnan(values)
+    y, x = values[observed], times[observed]
+    pairs = [(i, j) for i, j in itertools.combinations(range(len(y)), 2) if x[j] != x[i]]
+    slopes = [(y[j] - y[i]) / (x[j] - x[i]) for i, j in pairs]
+    s = sum(np.sign(y[j] - y[i]) for i, j in pairs)
+    return {
+        'ols_slope': np.polyfit(x, y, 1)[0],
+        'sens_slope': np.median(slopes),
+        'mk_s': s
+    }
+
+
+def test_batch_trends_matches_per_series_reference():
+    rng = np.random.default_rng(0)
+    times = np.cumsum(rng.integers(1, 20, size=40)).astype(float)
+    values = rng.normal(size=(25, 40)) + rng.normal(size=(25, 1)) * times / 100
+    values[rng.random(values.shape) < 0.2] = np.nan
+
+    # A small chunk bound exercises the row-chunked pairwise path
+    result = batch_trends(values, times=times, max_pair_elements=1000)
+    for row in range(len(values)):
+        expected = _brute_force(values[row], times)
+        for name, value in expected.items():
+            np.testing.assert_allclose(result[name][row], value, rtol=1e-9, atol=1e-12)
+
+
+def test_ols_slopes_match_polyfit():
+    rng = np.random.default_rng(2)
+    times = np.cumsum(rng.integers(1, 20, size=30)).astype(float)
+    values = rng.normal(size=(40, 30)) + rng.normal(size=(40, 1)) * times / 50
+    values[rng.random(values.shape) < 0.3] = np.nan
+    values[0, 1:] = np.nan
+    slopes = ols_slopes(values, times)
+    assert np.isnan(slopes[0])
+    for row in range(1, len(values)):
+        observed = ~np.isnan(values[row])
+        np.testing.assert_allclose(slopes[row], np.polyfit(times[observed], values[row, observed], 1)[0],
+                                   rtol=1e-9, atol=1e-12)
+    np.testing.assert_array_equal(slopes, batch_trends(values, times)['ols_slope'])
+
+
+def test_mann_kendall_p_value_matches_normal_approximation():
+    rng = np.random.default_rng(1)
+    values = rng.normal(size=(10, 30)) + np.linspace(0, 1, 30)
+    result = batch_trends(values)
+    for row in range(len(values)):
+        n = 30
+        s = result['mk_s'][row]
+        z = (s - np.sign(s)) / np.sqrt(n * (n - 1) * (2 * n + 5) / 18.0)
+        np.testing.assert_allclose(result['mk_p_value'][row], 2 * stats.norm.sf(abs(z)), atol=1e-6)
+
+
+def test_short_series_have_undefined_statistics():
+    result = series_trends([[], [1.0], [1.0, 2.0]])
+    assert np.isnan(result['ols_slope'][:2]).all()
+    assert result['ols_slope'][2] == 1.0
+    assert np.isnan(result['mk_p_value']).all()
@@ -0,0 +1,103 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('models')
+
+from scipy import ndimage
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import Session
+
+from water_extent import (
+    WaterExtent, get_water_series, label_components, store_water_extent, union_find, water_extent
+)
+
+
+def _water_mask(rng, shape, fraction=0.45):
+    # Smoothed noise gives blobs that cross tile seams
+    noise = ndimage.uniform_filter(rng.random(shape), size=5)
+    return noise > np.quantile(noise, 1 - fraction)
+
+
+def test_union_find_matches_connected_components():
+    rng = np.random.default_rng(0)
+    n_nodes = 500
+    a = rng.integers(0, n_nodes, size=350)
+    b = rng.integers(0, n_nodes, size=350)
+    roots = union_find(n_nodes, a, b)
+    graph = coo_matrix((np.ones(a.size), (a, b)), shape=(n_nodes, n_nodes))
+    _, expected = connected_components(graph, directed=False)
+    # Same partition, each component rooted at its smallest member
+    for component in np.unique(expected):
+        members = np.flatnonzero(expected == component)
+        assert (roots[members] == members.min()).all()
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_label_components_match_ndimage_label(seed):
+    mask = _water_mask(np.random.default_rng(seed), (57, 83))
+    labels, n_components = label_components(mask)
+    expected, n_expected = ndimage.label(mask)
+    assert n_components == n_expected
+    # Both number components in raster order of their first pixel
+    np.testing.assert_array_equal(labels, expected)
+
+
+def test_tiled_water_bodies_match_whole_raster():
+    rng = np.random.default_rng(4)
+    mask = _water_mask(rng, (70, 90))
+    index = np.where(mask, 0.4, -0.3).astype(np.float32)
+    index[rng.random(index.shape) < 0.02] = np.nan
+    projects = np.zeros(index.shape, dtype=np.int32)
+    projects[:35, :45] = 1
+    projects[35:, 45:] = 2
+
+    result = water_extent(inputs={'index': index}, project_labels=projects, project_ids=[10, 20],
+                          geographic=False, pixel_area_m2=10000.0, tile_size=16, workers=2)
+
+    water = index > 0.0
+    labels, n_bodies = ndimage.label(water)
+    body_areas = ndimage.sum(np.ones(index.shape), labels, index=np.arange(1, n_bodies + 1))
+    assert result['water_bodies'] == n_bodies
+    assert result['largest_body_ha'] == pytest.approx(body_areas.max())
+    assert result['water_area_ha'] == pytest.approx(water.sum())
+    assert result['valid_area_ha'] == pytest.approx((~np.isnan(index)).sum())
+    for label, project_id in ((1, 10), (2, 20)):
+        assert result['projects'][project_id]['water_area_ha'] == pytest.approx((water & (projects == label)).sum())
+
+
+@pytest.fixture
+def db():
+    engine = create_engine('sqlite://')
+    WaterExtent.__table__.create(engine)
+    with Session(engine) as session:
+        yield session
+
+
+def _results(dates, offset):
+    return [
+        {'acquisition_date': date,
+         'projects': {project_id: {'water_area_ha': offset + i + project_id, 'valid_area_ha': 100.0}
+                      for project_id in (1, 2)}}
+        for i, date in enumerate(dates)
+    ]
+
+
+def test_store_water_extent_queries_once_per_project(db):
+    store_water_extent(db, _results(['2024-01-01', '2024-01-11'], 0.0))
+    db.commit()
+
+    selects = []
+    event.listen(db.get_bind(), 'before_cursor_execute',
+                 lambda conn, cursor, statement, *args: selects.append(statement)
+                 if statement.lstrip().upper().startswith('SELECT') else None)
+    written = store_water_extent(db, _results(['2024-01-11', '2024-01-21', '2024-01-31'], 10.0))
+    db.commit()
+
+    assert written == 6
+    assert len(selects) == 2
+    series = get_water_series(db, 2, '2024-01-01', '2024-12-31')
+    assert [row['date'] for row in series] == ['2024-01-01', '2024-01-11', '2024-01-21', '2024-01-31']
+    assert [row['water_area_ha'] for row in series] == [2.0, 12.0, 13.0, 14.0]
+    assert series[0]['water_fraction'] == pytest.approx(0.02)
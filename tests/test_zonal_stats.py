@@ -0,0 +1,74 @@
+import numpy as np
+
+from zonal_stats import LabelRaster, plot_zonal_table
+
+TRANSFORM = {'x0': 36.0, 'y0': -1.0, 'dx': 0.001, 'dy': -0.001}
+
+
+def _inside(x, y, ring):
+    inside = False
+    for (x0, y0), (x1, y1) in zip(ring[:-1], ring[1:]):
+        if (y0 > y) != (y1 > y) and x < x0 + (y - y0) * (x1 - x0) / (y1 - y0):
+            inside = not inside
+    return inside
+
+
+def _polygons(rng, count):
+    polygons = {}
+    for plot in range(count):
+        cx, cy = 36.0 + rng.uniform(0.005, 0.075), -1.0 - rng.uniform(0.005, 0.055)
+        angles = np.sort(rng.uniform(0, 2 * np.pi, size=7))
+        radii = rng.uniform(0.001, 0.006, size=7)
+        ring = [[cx + r * np.cos(a), cy + r * np.sin(a)] for a, r in zip(angles, radii)]
+        polygons[f'plot-{plot}'] = ring + ring[:1]
+    return polygons
+
+
+def test_burned_labels_match_point_in_polygon():
+    rng = np.random.default_rng(0)
+    polygons = _polygons(rng, 12)
+    raster = LabelRaster.from_polygons(polygons, TRANSFORM, (60, 80))
+    expected = np.zeros((60, 80), dtype=np.int32)
+    for label, ring in enumerate(polygons.values(), start=1):
+        for row in range(60):
+            for col in range(80):
+                x = TRANSFORM['x0'] + (col + 0.5) * TRANSFORM['dx']
+                y = TRANSFORM['y0'] + (row + 0.5) * TRANSFORM['dy']
+                if _inside(x, y, ring):
+                    expected[row, col] = label
+    np.testing.assert_array_equal(raster.labels, expected)
+
+
+def test_zonal_statistics_match_per_plot_reduction():
+    rng = np.random.default_rng(1)
+    labels = rng.integers(0, 9, size=(40, 50))
+    labels[labels == 5] = 0                    # plot 5 has no pixels
+    plot_ids = [100 + i for i in range(8)]
+    values = rng.normal(0.4, 0.2, size=(40, 50))
+    values[rng.random(values.shape) < 0.2] = np.nan
+    values[labels == 3] = np.nan               # plot 3 is fully clouded
+
+    stats = LabelRaster(labels, plot_ids).zonal_statistics({'NDVI': values})['NDVI']
+    for i in range(len(plot_ids)):
+        plot_values = values[labels == i + 1]
+        plot_values = plot_values[~np.isnan(plot_values)]
+        assert stats['count'][i] == len(plot_values)
+        if len(plot_values) == 0:
+            assert np.isnan([stats[name][i] for name in ('sum', 'min', 'max', 'mean', 'std')]).all()
+            continue
+        np.testing.assert_allclose(
+            [stats['sum'][i], stats['min'][i], stats['max'][i], stats['mean'][i], stats['std'][i]],
+            [plot_values.sum(), plot_values.min(), plot_values.max(), plot_values.mean(), plot_values.std()],
+            rtol=1e-9, atol=1e-12
+        )
+
+
+def test_table_has_one_record_per_plot_index_and_scene():
+    labels = np.array([[0, 1, 1], [2, 2, 0]])
+    raster = LabelRaster(labels, ['a', 'b'])
+    scenes = [('2024-01-01', {'NDVI': np.ones((2, 3)), 'EVI': np.zeros((2, 3))}),
+              ('2024-01-06', {'NDVI': np.full((2, 3), 2.0), 'EVI': np.zeros((2, 3))})]
+    table = plot_zonal_table(raster, scenes, {'a': 1, 'b': 2})
+    assert len(table) == 2 * 2 * 2
+    assert table[0] == {'plot_id': 'a', 'project_id': 1, 'acquisition_date': '2024-01-01', 'index': 'NDVI',
+                        'count': 2, 'sum': 2.0, 'sum_sq': 2.0, 'min': 1.0, 'max': 1.0, 'mean': 1.0, 'std': 0.0}
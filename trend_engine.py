@@ -0,0 +1,175 @@
+"""
+Batched trend engine for Orun.io
+Computes OLS slope, Sen's slope, Mann-Kendall significance and lag-1
+autocorrelation for many index time series in one vectorized pass
+"""
+
+import warnings
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+# Upper bound on (series x pairs) elements materialized per chunk for the
+# pairwise statistics (Sen's slope and Mann-Kendall), ~32 MB of float64
+MAX_PAIR_ELEMENTS = 4_000_000
+
+
+def stack_series(series: Sequence[Sequence[float]]) -> np.ndarray:
+    """Stack ragged value lists into a 2-D array padded with NaN"""
+    length = max((len(values) for values in series), default=0)
+    stacked = np.full((len(series), length), np.nan)
+    for row, values in enumerate(series):
+        stacked[row, :len(values)] = np.asarray(values, dtype=float)
+    return stacked
+
+
+def _erfc(x: np.ndarray) -> np.ndarray:
+    """Vectorized complementary error function for x >= 0 (A&S 7.1.26)"""
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741
+           + t * (-1.453152027 + t * 1.061405429))))
+    return poly * np.exp(-x * x)
+
+
+def _ols_slope(values: np.ndarray, times: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Least-squares slope per row, ignoring NaN gaps"""
+    count = mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        x = np.where(mask, times, 0.0)
+        y = np.where(mask, values, 0.0)
+        x_mean = x.sum(axis=1) / count
+        y_mean = y.sum(axis=1) / count
+        dx = np.where(mask, times - x_mean[:, None], 0.0)
+        dy = np.where(mask, values - y_mean[:, None], 0.0)
+        sxx = (dx * dx).sum(axis=1)
+        slope = (dx * dy).sum(axis=1) / sxx
+    slope[(count < 2) | (sxx == 0)] = np.nan
+    return slope
+
+
+def _lag1_autocorrelation(values: np.ndarray, mask: np.ndarray) -> np.ndarray:
+    """Lag-1 autocorrelation per row over consecutive observed samples"""
+    count = mask.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.where(mask, values, 0.0).sum(axis=1) / count
+        anomaly = np.where(mask, values - mean[:, None], 0.0)
+        both = mask[:, 1:] & mask[:, :-1]
+        numerator = (anomaly[:, 1:] * anomaly[:, :-1] * both).sum(axis=1)
+        denominator = (anomaly * anomaly).sum(axis=1)
+        autocorr = numerator / denominator
+    autocorr[(count < 3) | (denominator == 0)] = np.nan
+    return autocorr
+
+
+def _tie_correction(values: np.ndarray) -> np.ndarray:
+    """Sum of t(t-1)(2t+5) over groups of tied values in each row"""
+    rows, length = values.shape
+    if length < 2:
+        return np.zeros(rows)
+    ordered = np.sort(values, axis=1)  # NaN sorts last and never ties
+    new_group = np.ones_like(ordered, dtype=bool)
+    new_group[:, 1:] = ordered[:, 1:] != ordered[:, :-1]
+    group_id = np.cumsum(new_group, axis=1) - 1 + np.arange(rows)[:, None] * length
+    sizes = np.bincount(group_id.ravel(), minlength=rows * length).reshape(rows, length)
+    sizes = sizes.astype(float)
+    return (sizes * (sizes - 1) * (2 * sizes + 5)).sum(axis=1)
+
+
+def _pairwise_statistics(
+    values: np.ndarray,
+    times: np.ndarray,
+    max_pair_elements: int
+) -> Dict[str, np.ndarray]:
+    """Sen's slope and Mann-Kendall S over all ordered pairs, chunked by row"""
+    rows, length = values.shape
+    first, second = np.triu_indices(length, k=1)
+    time_step = times[second] - times[first]
+    usable = time_step != 0
+    first, second, time_step = first[usable], second[usable], time_step[usable]
+
+    sens_slope = np.full(rows, np.nan)
+    mk_s = np.zeros(rows)
+    if first.size == 0:
+        return {'sens_slope': sens_slope, 'mk_s': mk_s}
+
+    chunk = max(1, max_pair_elements // first.size)
+    for start in range(0, rows, chunk):
+        block = values[start:start + chunk]
+        differences = block[:, second] - block[:, first]
+        mk_s[start:start + chunk] = np.nansum(np.sign(differences), axis=1)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            sens_slope[start:start + chunk] = np.nanmedian(differences / time_step, axis=1)
+    return {'sens_slope': sens_slope, 'mk_s': mk_s}
+
+
+def _series_array(values: np.ndarray, times: Optional[np.ndarray]):
+    """(n_series, n_times) values and validated (n_times,) times"""
+    values = np.atleast_2d(np.asarray(values, dtype=float))
+    length = values.shape[1]
+    if times is None:
+        times = np.arange(length, dtype=float)
+    times = np.asarray(times, dtype=float)
+    if times.shape != (length,):
+        raise ValueError(f"times must have shape ({length},), got {times.shape}")
+    return values, times
+
+
+def ols_slopes(values: np.ndarray, times: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    OLS slope of every row alone, without the pairwise statistics
+
+    Same as batch_trends(values, times)['ols_slope'] in O(n_times) per
+    series, for callers such as per-pixel rasters that need nothing else.
+    """
+    values, times = _series_array(values, times)
+    return _ols_slope(values, times, ~np.isnan(values))
+
+
+def batch_trends(
+    values: np.ndarray,
+    times: Optional[np.ndarray] = None,
+    max_pair_elements: int = MAX_PAIR_ELEMENTS
+) -> Dict[str, np.ndarray]:
+    """
+    Calculate trend statistics for every row of a 2-D array of series
+
+    Args:
+        values (np.ndarray): Array of shape (n_series, n_times); NaN marks gaps
+        times (np.ndarray): Optional shared sample times of shape (n_times,),
+            e.g. days since the first acquisition; defaults to 0..n_times-1
+        max_pair_elements (int): Memory bound for the pairwise statistics
+
+    Returns:
+        Dict[str, np.ndarray]: Per-series 'ols_slope', 'sens_slope', 'mk_s',
+            'mk_z', 'mk_p_value', 'lag1_autocorr' and observation 'count'.
+            Slopes are NaN where fewer than two observations are available.
+    """
+    values, times = _series_array(values, times)
+    mask = ~np.isnan(values)
+    count = mask.sum(axis=1)
+
+    pairwise = _pairwise_statistics(values, times, max_pair_elements)
+    mk_s = pairwise['mk_s']
+
+    # Mann-Kendall variance with tie correction and continuity-corrected Z
+    n = count.astype(float)
+    variance = (n * (n - 1) * (2 * n + 5) - _tie_correction(values)) / 18.0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mk_z = np.where(variance > 0, (mk_s - np.sign(mk_s)) / np.sqrt(variance), 0.0)
+    mk_p_value = np.minimum(1.0, _erfc(np.abs(mk_z) / np.sqrt(2.0)))
+    mk_p_value[count < 3] = np.nan
+
+    return {
+        'ols_slope': _ols_slope(values, times, mask),
+        'sens_slope': pairwise['sens_slope'],
+        'mk_s': mk_s,
+        'mk_z': mk_z,
+        'mk_p_value': mk_p_value,
+        'lag1_autocorr': _lag1_autocorrelation(values, mask),
+        'count': count
+    }
+
+
+def series_trends(series: List[List[float]]) -> Dict[str, np.ndarray]:
+    """Convenience wrapper for ragged lists of values sampled at equal steps"""
+    return batch_trends(stack_series(series))
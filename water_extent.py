@@ -0,0 +1,356 @@
+"""
+Surface-water extent engine for Orun.io
+Thresholds MNDWI/NDWI tile by tile in a process pool, labels water bodies
+with connected components merged across tile seams, and tracks water area
+per project per acquisition without holding a full scene in memory
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Optional, Any, Tuple
+
+import numpy as np
+from sqlalchemy import Column, Date, DateTime, Float, Integer, UniqueConstraint
+from sqlalchemy.orm import Session
+from models import Base
+
+from cog_reader import open_reader
+from raster_products import DEFAULT_TILE_SIZE, row_pixel_areas
+from shared_raster import stream_tiled
+from spectral_indices import FusedIndexProgram
+
+# Water index -> threshold above which a pixel is classed as open water
+WATER_THRESHOLDS = {'MNDWI': 0.0, 'NDWI': 0.0}
+
+
+def union_find(n_nodes: int, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """
+    Root (smallest member) of every node's component for edges a[i] -- b[i]
+
+    Vectorized hooking and pointer jumping: each round hooks the larger root
+    of every edge onto the smaller one, then flattens parents to roots,
+    until no edge joins two different roots.
+    """
+    parent = np.arange(n_nodes)
+    a = np.asarray(a, dtype=np.int64)
+    b = np.asarray(b, dtype=np.int64)
+    while a.size:
+        root_a, root_b = parent[a], parent[b]
+        differ = root_a != root_b
+        if not differ.any():
+            break
+        low = np.minimum(root_a[differ], root_b[differ])
+        high = np.maximum(root_a[differ], root_b[differ])
+        np.minimum.at(parent, high, low)
+        while True:
+            jumped = parent[parent]
+            if np.array_equal(jumped, parent):
+                break
+            parent = jumped
+        a, b = a[differ], b[differ]
+    return parent
+
+
+def label_components(mask: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    4-connected component labels of a boolean raster
+
+    Returns:
+        Labels (0 for background, 1..n numbered in raster order) and n
+    """
+    height, width = mask.shape
+    labels = np.zeros(mask.shape, dtype=np.int32)
+    flat = mask.reshape(-1)
+    pixels = np.flatnonzero(flat)
+    if pixels.size == 0:
+        return labels, 0
+
+    node = np.full(flat.size, -1, dtype=np.int64)
+    node[pixels] = np.arange(pixels.size)
+    grid = node.reshape(height, width)
+    horizontal = (grid[:, :-1] >= 0) & (grid[:, 1:] >= 0)
+    vertical = (grid[:-1, :] >= 0) & (grid[1:, :] >= 0)
+    a = np.concatenate([grid[:, :-1][horizontal], grid[:-1, :][vertical]])
+    b = np.concatenate([grid[:, 1:][horizontal], grid[1:, :][vertical]])
+
+    roots = union_find(pixels.size, a, b)
+    unique_roots, component = np.unique(roots, return_inverse=True)
+    labels.reshape(-1)[pixels] = component + 1
+    return labels, len(unique_roots)
+
+
+def _read_index(inputs, window, index_name, sensor, scale, sources):
+    """Water index for a window, from an index raster, band rasters or COGs"""
+    rows, cols = window
+    if 'index' in inputs:
+        return np.asarray(inputs['index'][rows, cols], dtype=np.float32)
+
+    program = FusedIndexProgram([index_name], sensor)
+    if sources:
+        bands = {}
+        for band_id in program.band_ids:
+            reader = open_reader(sources[band_id], band=band_id)
+            tile = reader.read_window(rows.start, cols.start, rows.stop - rows.start, cols.stop - cols.start)
+            tile = tile.astype(np.float32)
+            if reader.nodata is not None:
+                tile[tile == reader.nodata] = np.nan
+            bands[band_id] = tile
+    else:
+        bands = {band_id: inputs[band_id][rows, cols] for band_id in program.band_ids}
+    return program.evaluate(bands, scale)[index_name]
+
+
+def _water_tile_worker(inputs, outputs, window, index_name='MNDWI', sensor='Sentinel-2', scale=1.0,
+                       threshold=0.0, transform=None, geographic=True, pixel_area_m2=100.0,
+                       n_projects=0, sources=None):
+    rows, cols = window
+    values = _read_index(inputs, window, index_name, sensor, scale, sources)
+    valid = ~np.isnan(values)
+    water = valid & (values > threshold)
+
+    labels, n_components = label_components(water)
+    areas = np.broadcast_to(row_pixel_areas(transform, rows, geographic, pixel_area_m2)[:, None], water.shape)
+    result = {
+        'valid_area': float(areas[valid].sum()),
+        'water_area': float(areas[water].sum()),
+        'component_areas': np.bincount(labels.reshape(-1), weights=areas.reshape(-1),
+                                       minlength=n_components + 1)[1:],
+        # Seam labels are all the merge step needs from the tile
+        'edges': {'top': labels[0].copy(), 'bottom': labels[-1].copy(),
+                  'left': labels[:, 0].copy(), 'right': labels[:, -1].copy()}
+    }
+    if n_projects:
+        projects = np.asarray(inputs['projects'][rows, cols]).reshape(-1)
+        flat_areas = areas.reshape(-1)
+        result['project_valid'] = np.bincount(projects[valid.reshape(-1)],
+                                              weights=flat_areas[valid.reshape(-1)], minlength=n_projects + 1)
+        result['project_water'] = np.bincount(projects[water.reshape(-1)],
+                                              weights=flat_areas[water.reshape(-1)], minlength=n_projects + 1)
+    return result
+
+
+class WaterBodyMerger:
+    """Accumulates streamed tile results and joins components across seams"""
+
+    def __init__(self, n_projects: int = 0):
+        self.n_projects = n_projects
+        self.valid_area = 0.0
+        self.water_area = 0.0
+        self.project_valid = np.zeros(n_projects + 1)
+        self.project_water = np.zeros(n_projects + 1)
+        self._areas: List[np.ndarray] = []
+        self._tiles: Dict[Tuple[int, int], Tuple[int, int, int, Dict[str, np.ndarray]]] = {}
+        self._offset = 0
+
+    def add(self, window: Tuple[slice, slice], result: Dict[str, Any]):
+        rows, cols = window
+        self.valid_area += result['valid_area']
+        self.water_area += result['water_area']
+        if self.n_projects:
+            self.project_valid += result['project_valid']
+            self.project_water += result['project_water']
+        # Tile components get global ids offset..offset+n-1
+        self._tiles[(rows.start, cols.start)] = (rows.stop, cols.stop, self._offset, result['edges'])
+        self._areas.append(result['component_areas'])
+        self._offset += len(result['component_areas'])
+
+    def body_areas(self) -> np.ndarray:
+        """Areas (ha) of water bodies after joining components that touch across seams"""
+        if self._offset == 0:
+            return np.zeros(0)
+        a, b = [], []
+        for (row_start, col_start), (row_stop, col_stop, offset, edges) in self._tiles.items():
+            for neighbor_key, own_edge, their_edge in (
+                ((row_start, col_stop), 'right', 'left'),
+                ((row_stop, col_start), 'bottom', 'top')
+            ):
+                neighbor = self._tiles.get(neighbor_key)
+                if neighbor is None:
+                    continue
+                mine, theirs = edges[own_edge], neighbor[3][their_edge]
+                touching = (mine > 0) & (theirs > 0)
+                a.append(offset + mine[touching] - 1)
+                b.append(neighbor[2] + theirs[touching] - 1)
+
+        roots = union_find(
+            self._offset,
+            np.concatenate(a) if a else np.zeros(0, dtype=np.int64),
+            np.concatenate(b) if b else np.zeros(0, dtype=np.int64)
+        )
+        areas = np.bincount(roots, weights=np.concatenate(self._areas), minlength=self._offset)
+        return areas[np.unique(roots)]
+
+    def summary(self, min_body_ha: float = 0.0) -> Dict[str, Any]:
+        bodies = self.body_areas()
+        bodies = bodies[bodies >= min_body_ha]
+        return {
+            'water_area_ha': round(self.water_area, 4),
+            'valid_area_ha': round(self.valid_area, 4),
+            'water_fraction': round(self.water_area / self.valid_area, 6) if self.valid_area else None,
+            'water_bodies': int(bodies.size),
+            'largest_body_ha': round(float(bodies.max()), 4) if bodies.size else 0.0
+        }
+
+
+def water_extent(
+    inputs: Optional[Dict[str, np.ndarray]] = None,
+    sources: Optional[Dict[str, str]] = None,
+    shape: Optional[Tuple[int, int]] = None,
+    transform: Optional[Dict[str, float]] = None,
+    index_name: str = 'MNDWI',
+    sensor: str = 'Sentinel-2',
+    scale: float = 1.0,
+    threshold: Optional[float] = None,
+    project_labels: Optional[np.ndarray] = None,
+    project_ids: Optional[List[int]] = None,
+    geographic: bool = True,
+    pixel_area_m2: float = 100.0,
+    min_body_ha: float = 0.0,
+    tile_size: int = DEFAULT_TILE_SIZE,
+    workers: Optional[int] = None,
+    executor: Optional[ProcessPoolExecutor] = None
+) -> Dict[str, Any]:
+    """
+    Water area and water bodies for one acquisition
+
+    Pixels come from `inputs` ('index' with a precomputed water index, or
+    band rasters keyed by band id) or from COG `sources` (band id -> path
+    or URL) read window by window inside the workers. Pass memory-mapped
+    arrays or COG sources for basin-sized scenes; in-memory arrays are
+    copied once into shared memory.
+
+    Args:
+        transform (Dict[str, float]): Grid origin and pixel size ('x0',
+            'y0', 'dx', 'dy'); COG georeferencing is used when omitted
+        threshold (float): Water threshold; WATER_THRESHOLDS default
+        project_labels (np.ndarray): Label raster (0 background, i + 1 for
+            project_ids[i]), e.g. LabelRaster.labels, for per-project area
+        geographic (bool): Transform in degrees (area scaled by latitude)
+            rather than metres
+        pixel_area_m2 (float): Pixel area when there is no transform
+        min_body_ha (float): Smallest body counted in 'water_bodies'
+
+    Returns:
+        Dict with 'water_area_ha', 'valid_area_ha', 'water_fraction',
+        'water_bodies', 'largest_body_ha' and, with project labels, 'projects'
+    """
+    inputs = dict(inputs or {})
+    if sources:
+        first = open_reader(next(iter(sources.values())))
+        shape = shape or (first.height, first.width)
+        transform = transform or first.transform
+    n_projects = len(project_ids) if project_ids is not None else 0
+    if n_projects:
+        inputs['projects'] = project_labels
+
+    merger = WaterBodyMerger(n_projects)
+    params = {
+        'index_name': index_name, 'sensor': sensor, 'scale': scale,
+        'threshold': WATER_THRESHOLDS.get(index_name, 0.0) if threshold is None else threshold,
+        'transform': transform, 'geographic': geographic, 'pixel_area_m2': pixel_area_m2,
+        'n_projects': n_projects, 'sources': sources
+    }
+    for window, result in stream_tiled(_water_tile_worker, inputs, shape=shape, tile_size=tile_size,
+                                       workers=workers, params=params, executor=executor):
+        merger.add(window, result)
+
+    summary = merger.summary(min_body_ha)
+    if n_projects:
+        summary['projects'] = {
+            project_id: {
+                'water_area_ha': round(float(merger.project_water[i + 1]), 4),
+                'valid_area_ha': round(float(merger.project_valid[i + 1]), 4)
+            }
+            for i, project_id in enumerate(project_ids)
+        }
+    return summary
+
+
+def water_extent_series(
+    acquisitions: Iterable[Tuple[str, Dict[str, Any]]],
+    workers: Optional[int] = None,
+    **options
+) -> Iterator[Dict[str, Any]]:
+    """
+    Yield water_extent() results per acquisition, sharing one process pool
+
+    Args:
+        acquisitions: (acquisition_date, water_extent keyword arguments such
+            as 'inputs' or 'sources') pairs
+        options: Keyword arguments common to every acquisition
+    """
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for acquisition_date, scene_options in acquisitions:
+            result = water_extent(executor=executor, **dict(options, **scene_options))
+            result['acquisition_date'] = acquisition_date
+            yield result
+
+
+class WaterExtent(Base):
+    """Surface-water area for one project and acquisition"""
+
+    __tablename__ = 'water_extent'
+    __table_args__ = (
+        UniqueConstraint('project_id', 'acquisition_date', name='uq_water_extent_acquisition'),
+    )
+
+    id = Column(Integer, primary_key=True)
+    project_id = Column(Integer, nullable=False, index=True)
+    acquisition_date = Column(Date, nullable=False)
+    water_area_ha = Column(Float, nullable=False)
+    valid_area_ha = Column(Float, nullable=False)
+    water_fraction = Column(Float)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+def store_water_extent(db: Session, results: Iterable[Dict[str, Any]]) -> int:
+    """
+    Upsert per-project water area rows from water_extent_series() results
+
+    Stored rows are prefetched with one query per project; a later result
+    for the same project and date replaces an earlier one. The caller commits.
+    """
+    areas: Dict[int, Dict[Any, Dict[str, float]]] = {}
+    for result in results:
+        acquisition_date = datetime.strptime(result['acquisition_date'], '%Y-%m-%d').date()
+        for project_id, area in result.get('projects', {}).items():
+            areas.setdefault(project_id, {})[acquisition_date] = area
+
+    written = 0
+    for project_id, by_date in areas.items():
+        existing = {
+            row.acquisition_date: row
+            for row in db.query(WaterExtent).filter(
+                WaterExtent.project_id == project_id,
+                WaterExtent.acquisition_date.in_(list(by_date))
+            )
+        }
+        for acquisition_date, area in by_date.items():
+            row = existing.get(acquisition_date)
+            if row is None:
+                row = WaterExtent(project_id=project_id, acquisition_date=acquisition_date)
+                db.add(row)
+            row.water_area_ha = area['water_area_ha']
+            row.valid_area_ha = area['valid_area_ha']
+            row.water_fraction = (area['water_area_ha'] / area['valid_area_ha']
+                                  if area['valid_area_ha'] else None)
+            written += 1
+    return written
+
+
+def get_water_series(db: Session, project_id: int, start_date: str, end_date: str) -> List[Dict[str, Any]]:
+    """Stored surface-water series for a project"""
+    rows = db.query(WaterExtent).filter(
+        WaterExtent.project_id == project_id,
+        WaterExtent.acquisition_date >= datetime.strptime(start_date, '%Y-%m-%d').date(),
+        WaterExtent.acquisition_date <= datetime.strptime(end_date, '%Y-%m-%d').date()
+    ).order_by(WaterExtent.acquisition_date).all()
+    return [
+        {
+            'date': row.acquisition_date.strftime('%Y-%m-%d'),
+            'water_area_ha': row.water_area_ha,
+            'valid_area_ha': row.valid_area_ha,
+            'water_fraction': row.water_fraction
+        }
+        for row in rows
+    ]